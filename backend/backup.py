@@ -0,0 +1,513 @@
+# Streaming Database Backup
+# نسخ احتياطي متدفق: NDJSON مضغوط (gzip أو zstd) مجموعة بعد مجموعة من الـ cursor
+#
+# صيغة الملف (سطر JSON لكل سطر):
+#   {"__backup__": "manifest", ...}                        ← رأس الملف
+#   {"__backup__": "collection", "name": "users"}          ← بداية مجموعة
+#   {...مستند...}                                          ← المستندات كما هي (Extended JSON)
+#   {"__backup__": "collection_end", "name": "users", "count": N, "sha256": "..."}
+#   ...
+#   {"__backup__": "end", "total_documents": N, "collections": {...}}
+#
+# الـ checksum = sha256 لأسطر المستندات (بدون أسطر التحكم) لكل مجموعة.
+#
+# النسخ التزايدي: كل نسخة مسجلة في backup_chain مع علامة (watermark) لكل مجموعة
+# على updated_at / created_at، أو resume token لـ change stream إذا كانت القاعدة replica set.
+# النسخة التزايدية تحتوي فقط المستندات الجديدة/المعدلة منذ النسخة السابقة (parent_id)،
+# وفي وضع change stream أيضاً أسطر الحذف: {"__backup__": "delete", "_id": ...}
+
+from bson import json_util
+from pymongo import DeleteOne, ReplaceOne
+from datetime import datetime, timezone, timedelta
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import gzip
+import hashlib
+import io
+import os
+import uuid
+import zlib
+
+# zstandard اختيارية - gzip متوفر دائماً
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+BACKUP_FORMAT = 'ndjson-backup'
+BACKUP_VERSION = 2
+BACKUP_MARKER = '__backup__'
+BACKUP_BATCH_SIZE = 1000
+
+BACKUP_CHAIN_COLLECTION = 'backup_chain'
+
+# مجموعات مشتقة يمكن إعادة بنائها أو خاصة بالنسخ نفسه - لا تُنسخ
+BACKUP_EXCLUDED_COLLECTIONS = {'report_cache', BACKUP_CHAIN_COLLECTION}
+
+# حقول العلامة للنسخ التزايدي (بالترتيب)
+WATERMARK_FIELDS = ('updated_at', 'created_at')
+
+# تداخل زمني يغطي الكتابات التي بدأت قبل النسخة السابقة وانتهت بعدها
+# (التكرار غير ضار لأن الاستعادة تستبدل حسب _id)
+BACKUP_WATERMARK_OVERLAP_SECONDS = int(os.environ.get('BACKUP_WATERMARK_OVERLAP_SECONDS', 300))
+
+# auto = استخدام change streams إذا كانت القاعدة replica set
+BACKUP_CHANGE_STREAMS = os.environ.get('BACKUP_CHANGE_STREAMS', 'auto').lower() != 'false'
+
+COMPRESSIONS = {
+    'gzip': ('application/gzip', '.ndjson.gz'),
+    'zstd': ('application/zstd', '.ndjson.zst'),
+    'none': ('application/x-ndjson', '.ndjson'),
+}
+
+_JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+
+def encode_line(obj: dict) -> bytes:
+    return json_util.dumps(obj, json_options=_JSON_OPTIONS, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def decode_line(line: bytes) -> dict:
+    return json_util.loads(line)
+
+
+async def list_backup_collections(db) -> List[str]:
+    """كل المجموعات الموجودة (counters, audit_logs, exchange_rates, visual_templates, ...)"""
+    names = await db.list_collection_names()
+    return sorted(
+        name for name in names
+        if not name.startswith('system.') and name not in BACKUP_EXCLUDED_COLLECTIONS
+    )
+
+
+class _Compressor:
+    """ضاغط متدفق بنفس الواجهة لـ gzip / zstd / بدون ضغط"""
+
+    def __init__(self, compression: str):
+        if compression == 'gzip':
+            self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)
+            self._compress, self._flush = self._obj.compress, self._obj.flush
+        elif compression == 'zstd':
+            if not ZSTD_AVAILABLE:
+                raise ValueError("zstd compression requires the zstandard package")
+            self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+            self._compress, self._flush = self._obj.compress, self._obj.flush
+        elif compression == 'none':
+            self._compress, self._flush = (lambda data: data), (lambda: b'')
+        else:
+            raise ValueError(f"Unknown compression: {compression}")
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def flush(self) -> bytes:
+        return self._flush()
+
+
+async def iter_backup_lines(
+    db,
+    collections: List[str],
+    manifest: dict,
+    queries: Optional[Dict[str, dict]] = None,
+    on_collection_end=None
+) -> AsyncIterator[List[bytes]]:
+    """
+    أسطر النسخة (غير مضغوطة) على دفعات
+    queries: فلتر اختياري لكل مجموعة (للنسخ التزايدي)
+    on_collection_end(name, count, sha256): يُستدعى بعد كل مجموعة
+    """
+    queries = queries or {}
+    summary = {}
+    total = 0
+
+    yield [encode_line({BACKUP_MARKER: 'manifest', 'format': BACKUP_FORMAT, 'version': BACKUP_VERSION,
+                        'collections': collections, **manifest})]
+
+    for name in collections:
+        digest = hashlib.sha256()
+        count = 0
+        batch = [encode_line({BACKUP_MARKER: 'collection', 'name': name})]
+
+        cursor = db[name].find(queries.get(name, {})).sort('_id', 1).batch_size(BACKUP_BATCH_SIZE)
+        async for doc in cursor:
+            line = encode_line(doc)
+            digest.update(line)
+            batch.append(line)
+            count += 1
+            if len(batch) >= BACKUP_BATCH_SIZE:
+                yield batch
+                batch = []
+
+        checksum = digest.hexdigest()
+        batch.append(encode_line({BACKUP_MARKER: 'collection_end', 'name': name, 'count': count, 'sha256': checksum}))
+        yield batch
+
+        summary[name] = {'count': count, 'sha256': checksum}
+        total += count
+        if on_collection_end:
+            await on_collection_end(name, count, checksum)
+
+    yield [encode_line({BACKUP_MARKER: 'end', 'total_documents': total, 'collections': summary,
+                        'finished_at': datetime.now(timezone.utc).isoformat()})]
+
+
+async def compress_batches(batches: AsyncIterator[List[bytes]], compression: str = 'gzip') -> AsyncIterator[bytes]:
+    """ضغط دفعات الأسطر أثناء إنتاجها - ذاكرة ثابتة مهما كان حجم البيانات"""
+    compressor = _Compressor(compression)
+    async for batch in batches:
+        chunk = compressor.compress(b''.join(batch))
+        if chunk:
+            yield chunk
+    tail = compressor.flush()
+    if tail:
+        yield tail
+
+
+async def stream_backup(
+    db,
+    collections: List[str],
+    manifest: dict,
+    compression: str = 'gzip',
+    queries: Optional[Dict[str, dict]] = None,
+    on_collection_end=None
+) -> AsyncIterator[bytes]:
+    """النسخة الكاملة (أو المفلترة بـ queries) مضغوطة على دفعات"""
+    async for chunk in compress_batches(
+        iter_backup_lines(db, collections, manifest, queries, on_collection_end), compression
+    ):
+        yield chunk
+
+
+# ============ Incremental ============
+
+async def _watermark_fields(db, name: str) -> List[str]:
+    """
+    حقول العلامة للمجموعة، حسب أحدث مستند
+    updated_at لا يظهر إلا في المستندات المعدلة، لذلك يُستخدم الحقلان معاً
+    المجموعات بدون أي حقل تاريخ (مثل counters) تُنسخ كاملة في كل مرة
+    """
+    latest = await db[name].find_one({}, sort=[('_id', -1)])
+    if latest and not any(field in latest for field in WATERMARK_FIELDS):
+        return []
+    return list(WATERMARK_FIELDS)
+
+
+def _since_query(fields: List[str], since: str) -> dict:
+    """المستندات التي تغيرت بعد since - التواريخ مخزنة كنص ISO وأحياناً كـ datetime"""
+    since_dt = datetime.fromisoformat(since)
+    clauses = []
+    for field in fields:
+        clauses.append({field: {'$gt': since}})
+        clauses.append({field: {'$gt': since_dt}})
+    return {'$or': clauses}
+
+
+async def get_change_stream_position(db) -> Tuple[Optional[dict], object]:
+    """
+    (resume token, operationTime) الحاليين إذا كانت القاعدة replica set
+    (None, None) على خادم منفرد أو عند تعطيل BACKUP_CHANGE_STREAMS
+    """
+    if not BACKUP_CHANGE_STREAMS:
+        return None, None
+    try:
+        hello = await db.command('hello')
+        if not hello.get('setName'):
+            return None, None
+        async with db.watch() as stream:
+            await stream.try_next()
+            return stream.resume_token, hello.get('operationTime')
+    except Exception:
+        return None, None
+
+
+async def plan_backup(db, collections: List[str], mode: str = 'full') -> dict:
+    """
+    تحضير نسخة كاملة أو تزايدية: المعرف، الأب في السلسلة، العلامات والفلاتر
+    ValueError إذا طُلبت نسخة تزايدية بدون نسخة سابقة
+    """
+    started_at = datetime.now(timezone.utc).isoformat()
+    parent = None
+    if mode == 'incremental':
+        parent = await db[BACKUP_CHAIN_COLLECTION].find_one({}, sort=[('created_at', -1)])
+        if not parent:
+            raise ValueError("No previous backup to build an incremental backup on")
+    elif mode != 'full':
+        raise ValueError(f"Unknown backup mode: {mode}")
+
+    backup_id = str(uuid.uuid4())
+    resume_token, operation_time = await get_change_stream_position(db)
+    plan = {
+        'backup_id': backup_id,
+        'parent_id': parent['backup_id'] if parent else None,
+        'chain_id': parent['chain_id'] if parent else backup_id,
+        'sequence': parent['sequence'] + 1 if parent else 0,
+        'mode': mode,
+        'source': 'snapshot' if mode == 'full' else 'watermark',
+        'started_at': started_at,
+        'watermarks': {},
+        'queries': {},
+        'resume_token': resume_token,
+        'since_token': None,
+        'until': operation_time
+    }
+
+    if parent and parent.get('resume_token') and resume_token is not None:
+        plan['source'] = 'change_stream'
+        plan['since_token'] = parent['resume_token']
+
+    for name in collections:
+        fields = await _watermark_fields(db, name)
+        watermark = {'fields': fields, 'to': started_at}
+        previous = (parent or {}).get('watermarks', {}).get(name, {}).get('to')
+        if plan['source'] == 'watermark' and fields and previous:
+            since = (datetime.fromisoformat(previous) - timedelta(seconds=BACKUP_WATERMARK_OVERLAP_SECONDS)).isoformat()
+            watermark['from'] = since
+            plan['queries'][name] = _since_query(fields, since)
+        # المجموعات بدون حقول تاريخ أو الجديدة منذ النسخة السابقة تُنسخ كاملة
+        plan['watermarks'][name] = watermark
+
+    return plan
+
+
+def plan_manifest(plan: dict) -> dict:
+    """معلومات السلسلة في رأس الملف"""
+    return {
+        'backup_id': plan['backup_id'],
+        'parent_id': plan['parent_id'],
+        'chain_id': plan['chain_id'],
+        'sequence': plan['sequence'],
+        'mode': plan['mode'],
+        'source': plan['source'],
+        'watermarks': plan['watermarks']
+    }
+
+
+async def iter_change_lines(db, collections: List[str], manifest: dict, resume_after: dict, until=None) -> AsyncIterator[List[bytes]]:
+    """
+    أسطر النسخة من change stream (منذ resume_after حتى until)
+    التغييرات المتتالية على نفس المجموعة في كتلة واحدة؛ المجموعة قد تظهر في عدة كتل
+    """
+    yield [encode_line({BACKUP_MARKER: 'manifest', 'format': BACKUP_FORMAT, 'version': BACKUP_VERSION,
+                        'collections': collections, **manifest})]
+
+    wanted = set(collections)
+    summary = {}
+    total = 0
+    current, digest, count, batch = None, None, 0, []
+
+    def close_block():
+        batch.append(encode_line({BACKUP_MARKER: 'collection_end', 'name': current, 'count': count, 'sha256': digest.hexdigest()}))
+        summary.setdefault(current, {'count': 0})['count'] += count
+
+    async with db.watch(full_document='updateLookup', resume_after=resume_after) as stream:
+        while True:
+            change = await stream.try_next()
+            if change is None or (until is not None and change['clusterTime'] > until):
+                break
+            name = change.get('ns', {}).get('coll')
+            if name not in wanted:
+                continue
+            if change['operationType'] in ('insert', 'update', 'replace'):
+                if change.get('fullDocument') is None:
+                    continue  # حُذف لاحقاً - سطر الحذف سيأتي بعده
+                line = encode_line(change['fullDocument'])
+            elif change['operationType'] == 'delete':
+                line = encode_line({BACKUP_MARKER: 'delete', '_id': change['documentKey']['_id']})
+            else:
+                continue
+
+            if name != current:
+                if current is not None:
+                    close_block()
+                current, digest, count = name, hashlib.sha256(), 0
+                batch.append(encode_line({BACKUP_MARKER: 'collection', 'name': name}))
+            digest.update(line)
+            batch.append(line)
+            count += 1
+            total += 1
+            if len(batch) >= BACKUP_BATCH_SIZE:
+                yield batch
+                batch = []
+
+    if current is not None:
+        close_block()
+    batch.append(encode_line({BACKUP_MARKER: 'end', 'total_documents': total, 'collections': summary,
+                              'finished_at': datetime.now(timezone.utc).isoformat()}))
+    yield batch
+
+
+async def stream_planned_backup(db, collections: List[str], plan: dict, manifest: dict, compression: str = 'gzip') -> AsyncIterator[bytes]:
+    """
+    النسخة حسب الخطة (كاملة / تزايدية) مضغوطة
+    تُسجل في backup_chain فقط بعد إرسال آخر سطر - النسخة المقطوعة لا تحرك العلامات
+    """
+    counts = {}
+
+    async def on_collection_end(name, count, checksum):
+        counts[name] = count
+
+    manifest = {**manifest, **plan_manifest(plan)}
+    if plan['source'] == 'change_stream':
+        lines = iter_change_lines(db, collections, manifest, plan['since_token'], plan['until'])
+    else:
+        lines = iter_backup_lines(db, collections, manifest, plan['queries'], on_collection_end)
+
+    async for chunk in compress_batches(lines, compression):
+        yield chunk
+
+    await db[BACKUP_CHAIN_COLLECTION].insert_one({
+        'backup_id': plan['backup_id'],
+        'parent_id': plan['parent_id'],
+        'chain_id': plan['chain_id'],
+        'sequence': plan['sequence'],
+        'mode': plan['mode'],
+        'source': plan['source'],
+        'started_at': plan['started_at'],
+        'watermarks': plan['watermarks'],
+        'resume_token': plan['resume_token'],
+        'counts': counts,
+        'compression': compression,
+        'created_at': datetime.now(timezone.utc).isoformat()
+    })
+
+
+# ============ Reading ============
+
+def open_backup(path: str):
+    """فتح ملف نسخة حسب الترويسة (gzip / zstd / بدون ضغط) كملف ثنائي مفكوك الضغط"""
+    with open(path, 'rb') as probe:
+        magic = probe.read(4)
+    if magic[:2] == b'\x1f\x8b':
+        return gzip.open(path, 'rb')
+    if magic == b'\x28\xb5\x2f\xfd':
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstd backup requires the zstandard package")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path, 'rb')
+
+
+def iter_backup(stream) -> Iterator[Tuple[str, object]]:
+    """
+    قراءة النسخة سطراً سطراً
+    يُنتج: ('manifest', dict) / ('doc', (collection, doc)) / ('delete', (collection, _id))
+           / ('collection_end', dict) / ('end', dict)
+    يتحقق من العدد والـ checksum لكل مجموعة
+    """
+    current = None
+    digest = None
+    count = 0
+
+    for line in stream:
+        if not line.strip():
+            continue
+        if line.startswith(b'{"' + BACKUP_MARKER.encode()):
+            control = decode_line(line)
+            kind = control[BACKUP_MARKER]
+            if kind == 'collection':
+                current, digest, count = control['name'], hashlib.sha256(), 0
+                continue
+            if kind == 'delete':
+                if current is None:
+                    raise ValueError("Delete outside of a collection block")
+                digest.update(line)
+                count += 1
+                yield 'delete', (current, control['_id'])
+                continue
+            if kind == 'collection_end':
+                if control['count'] != count or control['sha256'] != digest.hexdigest():
+                    raise ValueError(f"Checksum mismatch in collection {control['name']}")
+                current = None
+            yield kind, control
+            continue
+
+        if current is None:
+            raise ValueError("Document outside of a collection block")
+        digest.update(line)
+        count += 1
+        yield 'doc', (current, decode_line(line))
+
+
+# ============ Restore ============
+
+def read_manifest(path: str) -> dict:
+    with open_backup(path) as stream:
+        kind, manifest = next(iter_backup(stream))
+    if kind != 'manifest':
+        raise ValueError(f"{path}: not a backup archive")
+    return manifest
+
+
+def validate_chain(manifests: List[dict]):
+    """النسخة الأولى كاملة وكل نسخة تالية ابنة النسخة التي قبلها"""
+    if not manifests:
+        raise ValueError("No backup files given")
+    if manifests[0].get('mode', 'full') != 'full':
+        raise ValueError("The first backup in the chain must be a full backup")
+    for previous, manifest in zip(manifests, manifests[1:]):
+        if manifest.get('mode') != 'incremental' or manifest.get('parent_id') != previous.get('backup_id'):
+            raise ValueError(
+                f"Backup {manifest.get('backup_id')} does not follow {previous.get('backup_id')} in the chain"
+            )
+
+
+async def replay_backup(db, path: str, batch_size: int = BACKUP_BATCH_SIZE) -> Dict[str, int]:
+    """
+    تطبيق ملف نسخة واحد:
+    - كامل: تفريغ كل مجموعة موجودة في الملف ثم إدخالها
+    - تزايدي: استبدال حسب _id (upsert) وتطبيق أسطر الحذف بالترتيب
+    """
+    counts: Dict[str, int] = {}
+    pending: List = []
+    pending_collection = None
+    full = True
+    cleared = set()
+
+    async def flush():
+        nonlocal pending
+        if not pending:
+            return
+        if full:
+            await db[pending_collection].insert_many(pending, ordered=False)
+        else:
+            await db[pending_collection].bulk_write(pending, ordered=True)
+        pending = []
+
+    with open_backup(path) as stream:
+        for kind, payload in iter_backup(stream):
+            if kind == 'manifest':
+                full = payload.get('mode', 'full') == 'full'
+                continue
+            if kind not in ('doc', 'delete'):
+                continue
+            name, value = payload
+            if name != pending_collection:
+                await flush()
+                pending_collection = name
+                if full and name not in cleared:
+                    await db[name].delete_many({})
+                    cleared.add(name)
+            if full:
+                pending.append(value)
+            elif kind == 'doc':
+                pending.append(ReplaceOne({'_id': value['_id']}, value, upsert=True))
+            else:
+                pending.append(DeleteOne({'_id': value}))
+            counts[name] = counts.get(name, 0) + 1
+            if len(pending) >= batch_size:
+                await flush()
+        await flush()
+
+    return counts
+
+
+async def restore_backup_chain(db, paths: List[str], log=print) -> Dict[str, int]:
+    """استعادة نسخة كاملة ثم النسخ التزايدية بالترتيب"""
+    validate_chain([read_manifest(path) for path in paths])
+    totals: Dict[str, int] = {}
+    for path in paths:
+        counts = await replay_backup(db, path)
+        log(f"✅ {os.path.basename(path)}: {sum(counts.values())} records in {len(counts)} collections")
+        for name, count in counts.items():
+            totals[name] = totals.get(name, 0) + count
+    return totals
@@ -0,0 +1,130 @@
+# Delayed Transfer Monitoring
+# تنبيه المدير بالحوالات المعلقة لفترة طويلة (بدل المرور على كل الحوالات المعلقة مع كل فحص)
+#
+# - لكل حد (24 / 48 ساعة) علامة watermark = آخر created_at تم فحصه لذلك الحد:
+#   كل فحص يقرأ فقط الحوالات التي تجاوزت الحد منذ الفحص السابق
+#   (status=pending, watermark < created_at <= الآن - الحد) عبر فهرس (status, created_at)
+# - transfer_escalations: {_id: transfer_id, threshold_hours} آخر حد نُبّه عنه لكل حوالة،
+#   فلا يتكرر الإشعار لنفس الحد (ولا يُرسل إشعار 24 لحوالة نُبّه عنها بـ 48)
+# - الإشعارات تُدرج دفعات (notify_batch)
+
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import os
+
+# ============ Configuration ============
+
+# (الحد بالساعات، الشدة) - الأعلى أولاً
+DELAYED_TRANSFER_THRESHOLDS: List[Tuple[int, str]] = sorted([
+    (int(os.environ.get('DELAYED_TRANSFER_HIGH_HOURS', 48)), 'high'),
+    (int(os.environ.get('DELAYED_TRANSFER_MEDIUM_HOURS', 24)), 'medium'),
+], reverse=True)
+DELAYED_TRANSFER_CHECK_MINUTES = float(os.environ.get('DELAYED_TRANSFER_CHECK_MINUTES', 15))
+DELAYED_TRANSFER_BATCH_SIZE = 500
+
+ESCALATIONS_COLLECTION = 'transfer_escalations'
+# بعدها لا تعود الحوالة إلى الفحص (العلامات تجاوزتها) - السجل لم يعد لازماً
+ESCALATION_RETENTION_DAYS = 30
+MONITORING_STATE_COLLECTION = 'monitoring_state'
+STATE_ID = 'delayed_transfers'
+
+_PROJECTION = {'_id': 0, 'id': 1, 'transfer_code': 1, 'sender_name': 1, 'from_agent_id': 1, 'created_at': 1}
+
+
+async def create_indexes(db):
+    await db[ESCALATIONS_COLLECTION].create_index(
+        [('escalated_at', 1)], expireAfterSeconds=ESCALATION_RETENTION_DAYS * 86400
+    )
+
+
+def delay_hours(transfer: dict, now: datetime) -> float:
+    created_at = datetime.fromisoformat(transfer['created_at'].replace('Z', '+00:00'))
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (now - created_at).total_seconds() / 3600
+
+
+def build_notification(transfer: dict, hours: float, severity: str) -> dict:
+    """إشعار المدير (نفس نص الفحص اليدوي السابق)"""
+    return {
+        'title': "⏰ حوالة متأخرة!",
+        'message': f"الحوالة رقم {transfer['transfer_code']} معلقة منذ {hours:.1f} ساعة. المرسل: {transfer['sender_name']}",
+        'severity': severity,
+        'related_transfer_id': transfer['id'],
+        'related_agent_id': transfer.get('from_agent_id'),
+        'notification_type': 'delayed_transfer'
+    }
+
+
+async def _escalate(db, transfers: List[dict], threshold: int, severity: str, now: datetime,
+                    notify_batch: Callable[[List[dict]], Awaitable]) -> int:
+    ids = [t['id'] for t in transfers]
+    already = {
+        doc['_id'] for doc in await db[ESCALATIONS_COLLECTION].find(
+            {'_id': {'$in': ids}, 'threshold_hours': {'$gte': threshold}}, {'_id': 1}
+        ).to_list(None)
+    }
+    pending = [t for t in transfers if t['id'] not in already]
+    if not pending:
+        return 0
+    await notify_batch([build_notification(t, delay_hours(t, now), severity) for t in pending])
+    await db[ESCALATIONS_COLLECTION].bulk_write([
+        UpdateOne(
+            {'_id': transfer['id']},
+            {'$max': {'threshold_hours': threshold}, '$set': {'escalated_at': now}},
+            upsert=True
+        )
+        for transfer in pending
+    ], ordered=False)
+    return len(pending)
+
+
+async def scan_delayed_transfers(db, notify_batch: Callable[[List[dict]], Awaitable],
+                                 now: Optional[datetime] = None,
+                                 batch_size: int = DELAYED_TRANSFER_BATCH_SIZE) -> Dict[str, int]:
+    """
+    فحص تزايدي لكل الحدود - يعيد عدد الحوالات التي نُبّه عنها لكل حد
+    notify_batch(notifications): إنشاء الإشعارات دفعة واحدة
+    """
+    now = now or datetime.now(timezone.utc)
+    state = await db[MONITORING_STATE_COLLECTION].find_one({'_id': STATE_ID}) or {}
+    watermarks = state.get('watermarks', {})
+    escalated = {}
+
+    for threshold, severity in DELAYED_TRANSFER_THRESHOLDS:
+        cutoff = (now - timedelta(hours=threshold)).isoformat()
+        created_at = {'$lte': cutoff}
+        if watermarks.get(str(threshold)):
+            created_at['$gt'] = watermarks[str(threshold)]
+
+        count = 0
+        batch = []
+        cursor = db.transfers.find(
+            {'status': 'pending', 'created_at': created_at}, _PROJECTION
+        ).sort('created_at', 1).batch_size(batch_size)
+        async for transfer in cursor:
+            batch.append(transfer)
+            if len(batch) >= batch_size:
+                count += await _escalate(db, batch, threshold, severity, now, notify_batch)
+                batch = []
+        if batch:
+            count += await _escalate(db, batch, threshold, severity, now, notify_batch)
+
+        # العلامة تتقدم بعد نجاح الدفعات فقط - الفشل يعيد الفحص من نفس النقطة
+        watermarks[str(threshold)] = cutoff
+        await db[MONITORING_STATE_COLLECTION].update_one(
+            {'_id': STATE_ID}, {'$set': {f'watermarks.{threshold}': cutoff, 'updated_at': now}}, upsert=True
+        )
+        escalated[f'{threshold}h'] = count
+    return escalated
+
+
+async def count_delayed_transfers(db, now: Optional[datetime] = None) -> int:
+    """عدد الحوالات المعلقة حالياً أكثر من أقل حد"""
+    now = now or datetime.now(timezone.utc)
+    lowest = min(threshold for threshold, _ in DELAYED_TRANSFER_THRESHOLDS)
+    return await db.transfers.count_documents({
+        'status': 'pending',
+        'created_at': {'$lt': (now - timedelta(hours=lowest)).isoformat()}
+    })
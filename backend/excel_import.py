@@ -0,0 +1,394 @@
+# Excel Design Import
+# تحويل ورقة Excel (قالب وصل) إلى عناصر مصمم الوصولات
+#
+# - parse_design(): مرور واحد على النطاق المستخدم
+#   * خريطة (صف، عمود) → المنطقة المدمجة تُبنى مرة واحدة (بدل فحص كل المناطق لكل خلية)
+#   * مواقع الأعمدة والصفوف مجاميع تراكمية مسبقة (بدل جمع كل الأعمدة السابقة لكل خلية)
+#   * التنسيق يُستخرج مرة واحدة لكل style_id (القوالب تكرر نفس التنسيقات)
+# - التحليل في process pool محدود الحجم (openpyxl لا يحرر الـ GIL - thread لا يكفي)
+# - الملفات الكبيرة (>= EXCEL_IMPORT_ASYNC_KB): مهمة في excel_import_jobs
+#   والنتيجة تُجلب لاحقاً بـ job_id (أي عملية uvicorn تقرأ نفس المجموعة)
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from zipfile import BadZipFile
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+EXCEL_IMPORT_WORKERS = int(os.environ.get('EXCEL_IMPORT_WORKERS', 2))
+EXCEL_IMPORT_MAX_BYTES = int(os.environ.get('EXCEL_IMPORT_MAX_MB', 10)) * 1024 * 1024
+# أكبر من هذا → job_id بدل انتظار النتيجة في نفس الطلب
+EXCEL_IMPORT_ASYNC_BYTES = int(os.environ.get('EXCEL_IMPORT_ASYNC_KB', 512)) * 1024
+# عدد الخلايا في النطاق المستخدم (ملف صغير مضغوط قد يحتوي ملايين الخلايا)
+EXCEL_IMPORT_MAX_CELLS = int(os.environ.get('EXCEL_IMPORT_MAX_CELLS', 500000))
+EXCEL_IMPORT_TIMEOUT_SECONDS = float(os.environ.get('EXCEL_IMPORT_TIMEOUT_SECONDS', 120))
+EXCEL_IMPORT_JOB_HOURS = float(os.environ.get('EXCEL_IMPORT_JOB_HOURS', 24))
+
+JOBS_COLLECTION = 'excel_import_jobs'
+
+PAGE_SIZES = {
+    'A4_portrait': {'width': 794, 'height': 1123},
+    'A4_landscape': {'width': 1123, 'height': 794},
+    'A5_portrait': {'width': 559, 'height': 794},
+    'A5_landscape': {'width': 794, 'height': 559},
+    'thermal_80mm': {'width': 302, 'height': 600},
+}
+EXCEL_PAGE_SIZES = ('A4_portrait', 'A4_landscape', 'A5_portrait', 'A5_landscape')
+
+# معامل التحويل من Excel لبكسل
+# Excel column width: 1 unit = ~7 pixels
+# Excel row height: 1 unit = ~1.33 pixels
+COL_TO_PX = 7
+ROW_TO_PX = 1.33
+DEFAULT_COLUMN_WIDTH = 8.43
+DEFAULT_ROW_HEIGHT = 15
+
+
+class ExcelImportError(ValueError):
+    pass
+
+
+# ============ Parsing ============
+
+def _rgb(color) -> Optional[str]:
+    """لون openpyxl → RRGGBB (بدون alpha) أو None"""
+    try:
+        rgb = color.rgb
+        if not isinstance(rgb, str):
+            return None
+        return rgb[2:] if len(rgb) == 8 else rgb
+    except AttributeError:
+        return None
+
+
+def _background(fill) -> str:
+    # فقط إذا كان fill_type موجود وليس None، وتجاهل الأبيض والأسود الافتراضي
+    if not fill or not fill.fill_type or fill.fill_type == 'none':
+        return 'transparent'
+    color = getattr(fill, 'fgColor', None)
+    rgb = _rgb(color) if color else None
+    if rgb and len(color.rgb) in (6, 8) and rgb.lower() not in ('ffffff', '000000'):
+        return f'#{rgb}'
+    return 'transparent'
+
+
+def _cell_style(cell) -> dict:
+    """تنسيق الخلية (يعتمد فقط على style_id)"""
+    style = {
+        'font_size': 11,
+        'font_weight': 'normal',
+        'text_color': '#000000',
+        'bg_color': _background(cell.fill),
+        'text_align': 'right',
+        'border_width': 0,
+        'border_color': '#000000',
+        'borders': (False, False, False, False),  # top, bottom, left, right
+    }
+
+    font = cell.font
+    if font:
+        if font.size:
+            style['font_size'] = int(font.size)
+        if font.bold:
+            style['font_weight'] = 'bold'
+        if font.color:
+            rgb = _rgb(font.color)
+            if rgb:
+                style['text_color'] = f'#{rgb}'
+
+    if cell.alignment and cell.alignment.horizontal in ('center', 'left'):
+        style['text_align'] = cell.alignment.horizontal
+
+    border = cell.border
+    if border:
+        top, bottom, left, right = (
+            bool(side and side.style) for side in (border.top, border.bottom, border.left, border.right)
+        )
+        style['borders'] = (top, bottom, left, right)
+        if top:
+            style['border_width'] = 2 if border.top.style == 'thick' else 1
+        if border.top and border.top.color:
+            rgb = _rgb(border.top.color)
+            if rgb:
+                style['border_color'] = f'#{rgb}'
+    return style
+
+
+def _element(element_id: int, element_type: str, x, y, width, height, **fields) -> dict:
+    element = {
+        'id': str(element_id),
+        'type': element_type,
+        'x': int(x),
+        'y': int(y),
+        'width': int(width),
+        'height': int(height),
+        'text': '',
+        'fontSize': 14,
+        'fontWeight': 'normal',
+        'color': '#000000',
+        'backgroundColor': 'transparent',
+        'textAlign': 'right',
+        'borderWidth': 0,
+        'borderColor': '#000000',
+        'fontFamily': 'Arial',
+        'borderStyle': 'solid',
+        'letterSpacing': '0',
+        'opacity': 1,
+        'rotation': 0
+    }
+    element.update(fields)
+    return element
+
+
+def _offsets(sizes: List[float], scale: float) -> List[float]:
+    """offsets[i] = مجموع الأحجام قبل i (بالبكسل) - offsets[0] = 0"""
+    offsets = [0.0]
+    total = 0.0
+    for size in sizes:
+        total += size
+        offsets.append(total * scale)
+    return offsets
+
+
+def _page_size(sheet, default: str) -> str:
+    excel_page_size = default
+    excel_orientation = 'landscape'
+    if sheet.page_setup:
+        if sheet.page_setup.paperSize == 9:  # A4
+            excel_page_size = 'A4'
+        elif sheet.page_setup.paperSize == 11:  # A5
+            excel_page_size = 'A5'
+        if sheet.page_setup.orientation == 'portrait':
+            excel_orientation = 'portrait'
+    page_size = f"{excel_page_size}_{excel_orientation}"
+    return page_size if page_size in EXCEL_PAGE_SIZES else default
+
+
+def parse_design(contents: bytes, page_size: str = 'A5_landscape', filename: str = '') -> dict:
+    """
+    ملف xlsx → {'suggested_name', 'elements', 'page_size'}
+    دالة مستقلة (بدون قاعدة بيانات) لتعمل داخل process pool
+    """
+    from openpyxl import load_workbook
+    from openpyxl.utils import get_column_letter
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        workbook = load_workbook(io.BytesIO(contents))
+    except (InvalidFileException, BadZipFile, KeyError) as e:
+        raise ExcelImportError(f"ملف Excel غير صالح: {str(e)}")
+    sheet = workbook.active
+
+    max_row, max_col = sheet.max_row, sheet.max_column
+    if max_row * max_col > EXCEL_IMPORT_MAX_CELLS:
+        raise ExcelImportError(f"الورقة كبيرة جداً ({max_row} × {max_col} خلية)")
+
+    # مواقع الأعمدة والصفوف مرة واحدة
+    column_widths = [
+        sheet.column_dimensions[get_column_letter(col)].width or DEFAULT_COLUMN_WIDTH for col in range(1, max_col + 1)
+    ]
+    row_heights = [sheet.row_dimensions[row].height or DEFAULT_ROW_HEIGHT for row in range(1, max_row + 1)]
+    x_offsets = _offsets(column_widths, COL_TO_PX)
+    y_offsets = _offsets(row_heights, ROW_TO_PX)
+
+    # الخلية الرئيسية (أعلى-يسار) → حجم المنطقة المدمجة، والخلايا الثانوية تُتجاهل تماماً
+    merged_sizes: Dict[Tuple[int, int], Tuple[float, float]] = {}
+    merged_covered: Set[Tuple[int, int]] = set()
+    for merged_range in sheet.merged_cells.ranges:
+        # openpyxl ينشئ MergedCell لكل خلية مدمجة - المناطق دائماً داخل النطاق المستخدم
+        min_col, min_row, last_col, last_row = merged_range.bounds
+        merged_sizes[(min_row, min_col)] = (
+            sum(column_widths[min_col - 1:last_col]) * COL_TO_PX,
+            sum(row_heights[min_row - 1:last_row]) * ROW_TO_PX,
+        )
+        for row in range(min_row, last_row + 1):
+            for col in range(min_col, last_col + 1):
+                merged_covered.add((row, col))
+
+    styles: Dict[int, dict] = {}
+    elements = []
+    element_id = 1
+
+    for row in sheet.iter_rows():
+        for cell in row:
+            if cell.value is None:
+                continue
+            position = (cell.row, cell.column)
+            size = merged_sizes.get(position)
+            if size is None and position in merged_covered:
+                continue
+
+            x = x_offsets[cell.column - 1]
+            y = y_offsets[cell.row - 1]
+            if size is not None:
+                cell_width, cell_height = size
+            else:
+                cell_width, cell_height = column_widths[cell.column - 1] * COL_TO_PX, row_heights[cell.row - 1] * ROW_TO_PX
+
+            style_id = cell.style_id
+            style = styles.get(style_id)
+            if style is None:
+                style = styles[style_id] = _cell_style(cell)
+
+            border_width = style['border_width']
+            border_color = style['border_color']
+            has_top, has_bottom, has_left, has_right = style['borders']
+
+            # حدود كاملة: الحدود والخلفية على عنصر النص نفسه
+            # حدود جزئية: خطوط فردية والنص بدون حدود
+            if not all(style['borders']) and any(style['borders']):
+                line = {'backgroundColor': border_color, 'borderColor': border_color}
+                if has_top:
+                    elements.append(_element(element_id, 'line', x, y, cell_width, 2, **line))
+                    element_id += 1
+                if has_bottom:
+                    elements.append(_element(element_id, 'line', x, y + cell_height - 2, cell_width, 2, **line))
+                    element_id += 1
+                if has_left:
+                    elements.append(_element(element_id, 'vertical_line', x, y, 2, cell_height, **line))
+                    element_id += 1
+                if has_right:
+                    elements.append(_element(element_id, 'vertical_line', x + cell_width - 2, y, 2, cell_height, **line))
+                    element_id += 1
+                border_width = 0
+
+            elements.append(_element(
+                element_id, 'static_text', x, y, cell_width, cell_height,
+                text=str(cell.value).strip(),
+                fontSize=style['font_size'],
+                fontWeight=style['font_weight'],
+                color=style['text_color'],
+                backgroundColor=style['bg_color'],
+                textAlign=style['text_align'],
+                borderWidth=border_width,
+                borderColor=border_color,
+            ))
+            element_id += 1
+
+    return {
+        'suggested_name': (filename or '').replace('.xlsx', '').replace('.xls', ''),
+        'elements': elements,
+        'page_size': _page_size(sheet, page_size)
+    }
+
+
+# ============ Importer ============
+
+class ExcelImporter:
+    def __init__(self, db, workers: int = EXCEL_IMPORT_WORKERS, timeout: float = EXCEL_IMPORT_TIMEOUT_SECONDS,
+                 collection: str = JOBS_COLLECTION):
+        self.collection = db[collection]
+        self.workers = workers
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def create_indexes(self):
+        await self.collection.create_index([('created_at', 1)], expireAfterSeconds=int(EXCEL_IMPORT_JOB_HOURS * 3600))
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: fork لعملية فيها event loop وخيوط motor قد يعلق
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @staticmethod
+    def check_size(contents: bytes):
+        if len(contents) > EXCEL_IMPORT_MAX_BYTES:
+            raise ExcelImportError(f"حجم الملف أكبر من {EXCEL_IMPORT_MAX_BYTES // (1024 * 1024)} MB")
+
+    @staticmethod
+    def is_large(contents: bytes) -> bool:
+        return len(contents) >= EXCEL_IMPORT_ASYNC_BYTES
+
+    async def parse(self, contents: bytes, page_size: str, filename: str = '') -> dict:
+        """التحليل في process pool - ExcelImportError لملف غير صالح أو كبير جداً"""
+        self.check_size(contents)
+        future = asyncio.get_running_loop().run_in_executor(self.pool, parse_design, contents, page_size, filename)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # العملية تكمل في الخلفية - لا يمكن إيقافها، لكن الطلب لا ينتظرها
+            raise ExcelImportError(f"تجاوز تحليل الملف {int(self.timeout)} ثانية")
+        except BrokenProcessPool:
+            # عملية توقفت (ذاكرة غير كافية مثلاً) - pool جديد للطلب التالي
+            self._pool = None
+            raise ExcelImportError("فشل تحليل الملف (نفدت الموارد)")
+
+    # ============ Jobs ============
+
+    async def submit(self, contents: bytes, page_size: str, filename: str, user_id: str) -> str:
+        """تحليل في الخلفية → job_id"""
+        self.check_size(contents)
+        job_id = str(uuid.uuid4())
+        await self.collection.insert_one({
+            '_id': job_id,
+            'status': 'pending',
+            'filename': filename,
+            'created_by': user_id,
+            'created_at': datetime.now(timezone.utc)
+        })
+        task = asyncio.create_task(self._run(job_id, contents, page_size, filename))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id
+
+    async def _run(self, job_id: str, contents: bytes, page_size: str, filename: str):
+        try:
+            result = await self.parse(contents, page_size, filename)
+            update = {'status': 'done', 'result': result}
+        except ExcelImportError as e:
+            update = {'status': 'failed', 'error': str(e)}
+        except Exception as e:
+            logger.error(f"Error importing from Excel (job {job_id}): {str(e)}")
+            update = {'status': 'failed', 'error': f"خطأ في استيراد ملف Excel: {str(e)}"}
+        update['finished_at'] = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one({'_id': job_id}, {'$set': update})
+        except Exception as e:
+            # النتيجة أكبر من حد المستند مثلاً
+            logger.error(f"Error saving Excel import job {job_id}: {str(e)}")
+            await self.collection.update_one(
+                {'_id': job_id},
+                {'$set': {'status': 'failed', 'error': f"خطأ في حفظ نتيجة الاستيراد: {str(e)}",
+                          'finished_at': update['finished_at']}}
+            )
+
+    async def job(self, job_id: str) -> Optional[dict]:
+        """{'job_id', 'status': pending | done | failed, 'result' | 'error'} أو None"""
+        job = await self.collection.find_one({'_id': job_id})
+        if job is None:
+            return None
+        created_at = job['created_at']
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        if job['status'] == 'pending' and datetime.now(timezone.utc) - created_at > timedelta(seconds=self.timeout * 2):
+            # العملية التي استلمت الملف توقفت قبل إنهاء المهمة
+            job['status'] = 'failed'
+            job['error'] = "توقف الاستيراد قبل اكتماله - أعد رفع الملف"
+        response = {'job_id': job['_id'], 'status': job['status'], 'filename': job.get('filename')}
+        if job['status'] == 'done':
+            response['result'] = job['result']
+        elif job['status'] == 'failed':
+            response['error'] = job.get('error')
+        return response
@@ -0,0 +1,201 @@
+# Exchange Rate Service
+# السعر الحالي في الذاكرة + سجل الأسعار في مجموعة time-series
+#
+# نوعان من الأسعار (كما في server.py):
+# - buy_sell: exchange_rates (buy_rate / sell_rate) - عمليات الصرافة
+# - daily:    exchange_rates_daily (rate لكل تاريخ) - تقويم القطع
+#
+# - current(): من الذاكرة، يُقرأ من القاعدة مرة كل EXCHANGE_RATE_CACHE_TTL_SECONDS كحد أقصى
+#   (العمليات الأخرى ترى السعر الجديد خلال TTL) وفوراً في العملية التي كتبت السعر
+# - record(): كل كتابة تُضاف إلى exchange_rate_history مع version متزايد لكل نوع
+#   {ts, kind, version, ...حقول السعر}
+# - history() / rate_at(): مسح نطاق (kind, ts) - السعر الساري في لحظة معينة (تقويم بأثر رجعي)
+# - MongoDB أقدم من 5.0 (بدون time-series): مجموعة عادية بفهرس (kind, ts)
+
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import CollectionInvalid, OperationFailure
+from typing import Dict, List, Optional, Tuple
+import copy
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+EXCHANGE_RATE_CACHE_TTL_SECONDS = float(os.environ.get('EXCHANGE_RATE_CACHE_TTL_SECONDS', 10))
+
+KIND_BUY_SELL = 'buy_sell'
+KIND_DAILY = 'daily'
+KINDS = {
+    # النوع: (المجموعة، حقل الترتيب)
+    KIND_BUY_SELL: ('exchange_rates', 'updated_at'),
+    KIND_DAILY: ('exchange_rates_daily', 'created_at'),
+}
+
+HISTORY_COLLECTION = 'exchange_rate_history'
+HISTORY_BACKFILL_BATCH = 1000
+
+
+def parse_time(value) -> datetime:
+    """ISO (نص أو datetime) → datetime بتوقيت UTC - تاريخ فقط = نهاية ذلك اليوم"""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    value = str(value)
+    if len(value) == 10:
+        value += 'T23:59:59.999999'
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def day_start(date: str) -> datetime:
+    """YYYY-MM-DD → بداية اليوم UTC (وقت سريان السعر اليومي)"""
+    return datetime.fromisoformat(str(date)[:10]).replace(tzinfo=timezone.utc)
+
+
+def point_time(kind: str, doc: dict, time_field: str) -> datetime:
+    """السعر اليومي يسري من بداية يومه وليس من وقت إدخاله"""
+    if kind == KIND_DAILY and doc.get('date'):
+        return day_start(doc['date'])
+    return parse_time(doc[time_field])
+
+
+class ExchangeRateService:
+    def __init__(self, db, ttl: float = EXCHANGE_RATE_CACHE_TTL_SECONDS, collection: str = HISTORY_COLLECTION):
+        self.db = db
+        self.ttl = ttl
+        self.history_name = collection
+        self.entries: Dict[str, Tuple[float, Optional[dict]]] = {}  # {kind: (expires_at, doc)}
+
+    @property
+    def history_collection(self):
+        return self.db[self.history_name]
+
+    # ============ Setup ============
+
+    async def create_indexes(self):
+        await self.db.exchange_rates.create_index([('updated_at', -1)])
+        await self.db.exchange_rates_daily.create_index([('created_at', -1)])
+        await self.db.exchange_rates_daily.create_index([('date', 1)])
+
+        # العملية التي تنشئ المجموعة فقط تنقل الأسعار السابقة (الأخرى تحصل على CollectionInvalid)
+        created = False
+        if self.history_name not in await self.db.list_collection_names():
+            try:
+                await self._create_history_collection()
+                created = True
+            except CollectionInvalid:
+                pass
+        await self.history_collection.create_index([('kind', 1), ('ts', -1)])
+        if created:
+            count = await self.backfill()
+            if count:
+                logger.info(f"Exchange rate history backfilled: {count} points")
+
+    async def _create_history_collection(self):
+        try:
+            await self.db.create_collection(
+                self.history_name,
+                timeseries={'timeField': 'ts', 'metaField': 'kind', 'granularity': 'hours'}
+            )
+        except OperationFailure as e:
+            logger.warning(f"Time-series collection unavailable ({str(e)}) - using a regular collection")
+            await self.db.create_collection(self.history_name)
+
+    async def backfill(self) -> int:
+        """نقل الأسعار السابقة إلى السجل (مرة واحدة عند إنشاء المجموعة)"""
+        total = 0
+        for kind, (name, time_field) in KINDS.items():
+            version = 0
+            batch = []
+            async for doc in self.db[name].find({}, {'_id': 0}).sort(time_field, 1):
+                if not doc.get(time_field):
+                    continue
+                version += 1
+                batch.append(self._point(kind, doc, point_time(kind, doc, time_field), version))
+                if len(batch) >= HISTORY_BACKFILL_BATCH:
+                    await self.history_collection.insert_many(batch)
+                    batch = []
+            if batch:
+                await self.history_collection.insert_many(batch)
+            if version:
+                await self.db.counters.update_one(
+                    {'_id': f'exchange_rate_{kind}'}, {'$max': {'seq': version}}, upsert=True
+                )
+            total += version
+        return total
+
+    # ============ Current rate ============
+
+    async def current(self, kind: str) -> Optional[dict]:
+        """آخر سعر (نسخة) أو None إذا لم يُحدد سعر بعد"""
+        entry = self.entries.get(kind)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            return copy.copy(entry[1])
+
+        name, time_field = KINDS[kind]
+        doc = await self.db[name].find_one({}, {'_id': 0}, sort=[(time_field, -1)])
+        if self.ttl > 0:
+            self.entries[kind] = (now + self.ttl, doc)
+        return copy.copy(doc)
+
+    def invalidate(self, kind: Optional[str] = None):
+        if kind is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(kind, None)
+
+    # ============ History ============
+
+    @staticmethod
+    def _point(kind: str, doc: dict, at: datetime, version: int) -> dict:
+        return {**{k: v for k, v in doc.items() if k != '_id'}, 'ts': at, 'kind': kind, 'version': version}
+
+    async def record(self, kind: str, doc: dict, at: Optional[datetime] = None) -> int:
+        """
+        تسجيل سعر جديد بعد كتابته في مجموعته - يعيد رقم النسخة
+        at: وقت السريان - الآن افتراضياً، وبداية doc['date'] للسعر اليومي
+        السعر الحالي في هذه العملية يُحدّث فوراً
+        """
+        counter = await self.db.counters.find_one_and_update(
+            {'_id': f'exchange_rate_{kind}'},
+            {'$inc': {'seq': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        version = counter['seq']
+        if at is None:
+            at = day_start(doc['date']) if kind == KIND_DAILY and doc.get('date') else datetime.now(timezone.utc)
+        await self.history_collection.insert_one(self._point(kind, doc, at, version))
+        self.invalidate(kind)
+        return version
+
+    async def history(self, kind: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      limit: int = 100) -> List[dict]:
+        """نقاط السجل من الأحدث"""
+        query = {'kind': kind}
+        if since or until:
+            query['ts'] = {}
+            if since:
+                query['ts']['$gte'] = since
+            if until:
+                query['ts']['$lte'] = until
+        cursor = self.history_collection.find(query, {'_id': 0}).sort('ts', -1).limit(limit)
+        return [self._public(point) for point in await cursor.to_list(length=limit)]
+
+    async def rate_at(self, kind: str, at: datetime) -> Optional[dict]:
+        """السعر الساري في لحظة معينة (آخر نقطة قبلها)"""
+        point = await self.history_collection.find_one(
+            {'kind': kind, 'ts': {'$lte': at}}, {'_id': 0}, sort=[('ts', -1)]
+        )
+        return self._public(point) if point else None
+
+    @staticmethod
+    def _public(point: dict) -> dict:
+        point = dict(point)
+        point.pop('kind', None)
+        point['effective_at'] = point.pop('ts').replace(tzinfo=timezone.utc).isoformat()
+        return point
@@ -0,0 +1,23 @@
+# Iraqi Governorates
+# رموز المحافظات العراقية - مشتركة بين الخادم وسكربتات الترحيل
+
+GOVERNORATE_CODE_TO_NAME = {
+    'BG': 'بغداد',
+    'BS': 'البصرة',
+    'NJ': 'النجف',
+    'KR': 'كربلاء',
+    'BB': 'بابل',
+    'AN': 'الأنبار',
+    'DY': 'ديالى',
+    'WS': 'واسط',
+    'SA': 'صلاح الدين',
+    'NI': 'نينوى',
+    'DQ': 'ذي قار',
+    'QA': 'القادسية',
+    'MY': 'المثنى',
+    'MI': 'ميسان',
+    'KI': 'كركوك',
+    'ER': 'أربيل',
+    'SU': 'السليمانية',
+    'DH': 'دهوك'
+}
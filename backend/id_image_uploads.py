@@ -0,0 +1,308 @@
+# ID Image Upload Pipeline
+# رفع صور الهويات بدون إيقاف الـ event loop
+#
+# 1. save(): تصغير الصورة وإعادة ترميزها JPEG (Pillow في thread pool) ثم كتابتها في
+#    ID_IMAGE_STORAGE_DIR (كتابة ذرية + fsync) وتسجيل مهمة محجوزة (held) في id_image_uploads
+#    → الحوالة تكتمل فوراً
+# 2. release() بعد كتابة الحوالة/الإيصال بـ id_image_upload_id (وإلا قد ينتهي الرفع قبلها
+#    ولا يجد on_uploaded ما يحدّثه). مهمة لم تُحرر تُرفع بعد ID_IMAGE_HOLD_SECONDS
+# 3. workers في الخلفية ترفع الملف (Cloudinary أو مجلد محلي) مع إعادة المحاولة
+#    (تأخير متزايد) ثم تستدعي on_uploaded لتحديث id_image_url في الحوالة والإيصال
+#
+# الملف محلي على الجهاز الذي استلم الطلب: كل مهمة تحمل host ولا يرفعها إلا workers
+# نفس الجهاز (عدة عمليات uvicorn على نفس الجهاز تتشارك المجلد والمهام).
+#
+# ID_IMAGE_BACKEND:
+# - cloudinary (افتراضي): cloudinary.uploader.upload في thread
+# - local: نسخ إلى ID_IMAGE_LOCAL_DIR (للتطوير والاختبار بدون Cloudinary)
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from pymongo import ReturnDocument
+from typing import Awaitable, Callable, Optional, Tuple
+import asyncio
+import io
+import logging
+import os
+import shutil
+import socket
+import uuid
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+ID_IMAGE_BACKEND = os.environ.get('ID_IMAGE_BACKEND', 'cloudinary').lower()
+ID_IMAGE_STORAGE_DIR = Path(os.environ.get('ID_IMAGE_STORAGE_DIR', Path(__file__).parent / 'storage' / 'id_images'))
+ID_IMAGE_LOCAL_DIR = Path(os.environ.get('ID_IMAGE_LOCAL_DIR', Path(__file__).parent / 'storage' / 'id_images_uploaded'))
+ID_IMAGE_LOCAL_BASE_URL = os.environ.get('ID_IMAGE_LOCAL_BASE_URL', '')
+ID_IMAGE_CLOUDINARY_FOLDER = 'money_transfer/id_images'
+
+# صور الهواتف (4000px وعدة ميغابايت) تكفي بـ 1600px لقراءة الهوية
+ID_IMAGE_MAX_DIMENSION = int(os.environ.get('ID_IMAGE_MAX_DIMENSION', 1600))
+ID_IMAGE_JPEG_QUALITY = int(os.environ.get('ID_IMAGE_JPEG_QUALITY', 82))
+ID_IMAGE_MAX_BYTES = int(os.environ.get('ID_IMAGE_MAX_MB', 15)) * 1024 * 1024
+
+ID_IMAGE_UPLOAD_WORKERS = int(os.environ.get('ID_IMAGE_UPLOAD_WORKERS', 2))
+ID_IMAGE_UPLOAD_RETRIES = int(os.environ.get('ID_IMAGE_UPLOAD_RETRIES', 8))
+ID_IMAGE_RETRY_BASE_SECONDS = 5
+ID_IMAGE_RETRY_MAX_SECONDS = 600
+# مهمة "uploading" لم تنته خلال هذه المدة (توقف العملية) تعود للطابور
+ID_IMAGE_UPLOAD_LEASE_SECONDS = 300
+# مهمة held لم يحررها الطلب (توقف قبل كتابة الحوالة) تُرفع بعد هذه المدة
+ID_IMAGE_HOLD_SECONDS = 300
+
+UPLOADS_COLLECTION = 'id_image_uploads'
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+# ============ Image processing ============
+
+def prepare_image(data: bytes, max_dimension: int = ID_IMAGE_MAX_DIMENSION,
+                  quality: int = ID_IMAGE_JPEG_QUALITY) -> bytes:
+    """تصحيح الاتجاه (EXIF) + تصغير + JPEG بدون بيانات EXIF (الموقع وغيره)"""
+    if len(data) > ID_IMAGE_MAX_BYTES:
+        raise InvalidImageError('Image too large')
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # تقليل حجم فك الترميز للصور الكبيرة جداً قبل التحميل الكامل
+            image.draft('RGB', (max_dimension, max_dimension))
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+            return output.getvalue()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(f'Invalid image: {str(e)}')
+
+
+def _write_durable(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ============ Storage backends ============
+
+class CloudinaryBackend:
+    name = 'cloudinary'
+
+    def __init__(self, folder: str = ID_IMAGE_CLOUDINARY_FOLDER):
+        self.folder = folder
+
+    def upload(self, path: Path, public_id: str) -> str:
+        import cloudinary.uploader
+        result = cloudinary.uploader.upload(
+            str(path),
+            folder=self.folder,
+            public_id=public_id,
+            overwrite=True,
+            resource_type='image',
+            format='jpg'
+        )
+        return result['secure_url']
+
+
+class LocalBackend:
+    """بديل Cloudinary: نسخ الملف إلى مجلد (الرابط = ID_IMAGE_LOCAL_BASE_URL/اسم الملف أو file://)"""
+    name = 'local'
+
+    def __init__(self, directory: Path = ID_IMAGE_LOCAL_DIR, base_url: str = ID_IMAGE_LOCAL_BASE_URL):
+        self.directory = Path(directory)
+        self.base_url = base_url.rstrip('/')
+
+    def upload(self, path: Path, public_id: str) -> str:
+        target = self.directory / f"{public_id}.jpg"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target)
+        return f"{self.base_url}/{target.name}" if self.base_url else target.resolve().as_uri()
+
+
+def create_backend(backend: str = ID_IMAGE_BACKEND):
+    return LocalBackend() if backend == 'local' else CloudinaryBackend()
+
+
+# ============ Pipeline ============
+
+class IdImagePipeline:
+    def __init__(self, db, backend=None, storage_dir: Path = ID_IMAGE_STORAGE_DIR,
+                 workers: int = ID_IMAGE_UPLOAD_WORKERS, max_attempts: int = ID_IMAGE_UPLOAD_RETRIES,
+                 collection: str = UPLOADS_COLLECTION):
+        self.collection = db[collection]
+        self.backend = backend or create_backend()
+        self.storage_dir = Path(storage_dir)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.host = socket.gethostname()
+        # Pillow و رفع Cloudinary (مكتبة متزامنة) خارج الـ event loop
+        self.executor = ThreadPoolExecutor(max_workers=max(workers, 2), thread_name_prefix='id-image')
+        self.on_uploaded: Optional[Callable[[dict, str], Awaitable]] = None
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    async def create_indexes(self):
+        await self.collection.create_index([('host', 1), ('status', 1), ('next_attempt_at', 1)])
+        await self.collection.create_index([('transfer_id', 1)])
+        # سجل المهام المكتملة لا يلزم بعد شهر
+        await self.collection.create_index([('uploaded_at', 1)], expireAfterSeconds=30 * 86400)
+
+    async def prepare(self, data: bytes) -> bytes:
+        """prepare_image في thread pool (نفس الصورة = نفس البايتات، يصلح مفتاحاً لكاش قراءة الهوية)"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, prepare_image, data)
+
+    async def save(self, data: bytes, transfer_id: str) -> Tuple[str, bytes]:
+        """
+        تجهيز الصورة وحفظها محلياً وتسجيل مهمة الرفع (held - تُرفع بعد release)
+        يعيد (upload_id, JPEG المصغر) - InvalidImageError إذا لم تكن صورة صالحة
+        """
+        jpeg = await self.prepare(data)
+        upload_id = str(uuid.uuid4())
+        path = self.storage_dir / f"{upload_id}.jpg"
+        await asyncio.get_running_loop().run_in_executor(self.executor, _write_durable, path, jpeg)
+
+        now = datetime.now(timezone.utc)
+        await self.collection.insert_one({
+            '_id': upload_id,
+            'transfer_id': transfer_id,
+            'host': self.host,
+            'path': str(path),
+            'size': len(jpeg),
+            'original_size': len(data),
+            'status': 'held',
+            'attempts': 0,
+            'next_attempt_at': now + timedelta(seconds=ID_IMAGE_HOLD_SECONDS),
+            'created_at': now
+        })
+        return upload_id, jpeg
+
+    async def release(self, upload_id: Optional[str]):
+        """الحوالة/الإيصال يحملان id_image_upload_id الآن - الرفع يبدأ فوراً"""
+        if not upload_id:
+            return
+        await self.collection.update_one(
+            {'_id': upload_id, 'status': 'held'},
+            {'$set': {'status': 'pending', 'next_attempt_at': datetime.now(timezone.utc)}}
+        )
+        self._wakeup.set()
+
+    async def discard(self, upload_id: Optional[str]):
+        """الطلب لم يكتب الحوالة (استلمها طلب آخر) - حذف المهمة المحجوزة وملفها"""
+        if not upload_id:
+            return
+        job = await self.collection.find_one_and_delete({'_id': upload_id, 'status': 'held'})
+        if job is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, Path(job['path']).unlink)
+        except FileNotFoundError:
+            pass
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {'host': self.host, 'status': {'$in': ['held', 'pending', 'uploading']}, 'next_attempt_at': {'$lte': now}},
+            {
+                '$set': {'status': 'uploading', 'next_attempt_at': now + timedelta(seconds=ID_IMAGE_UPLOAD_LEASE_SECONDS)},
+                '$inc': {'attempts': 1}
+            },
+            sort=[('next_attempt_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _process(self, job: dict):
+        loop = asyncio.get_running_loop()
+        path = Path(job['path'])
+        try:
+            url = await loop.run_in_executor(self.executor, self.backend.upload, path, job['_id'])
+        except Exception as e:
+            if job['attempts'] >= self.max_attempts:
+                logger.error(f"ID image upload {job['_id']} failed after {job['attempts']} attempts: {str(e)}")
+                await self.collection.update_one({'_id': job['_id']}, {'$set': {'status': 'failed', 'error': str(e)}})
+                return
+            delay = min(ID_IMAGE_RETRY_BASE_SECONDS * 2 ** (job['attempts'] - 1), ID_IMAGE_RETRY_MAX_SECONDS)
+            logger.warning(f"ID image upload {job['_id']} attempt {job['attempts']} failed ({str(e)}) - retry in {delay}s")
+            await self.collection.update_one({'_id': job['_id']}, {'$set': {
+                'status': 'pending',
+                'error': str(e),
+                'next_attempt_at': datetime.now(timezone.utc) + timedelta(seconds=delay)
+            }})
+            return
+
+        if self.on_uploaded is not None:
+            await self.on_uploaded(job, url)
+        await self.collection.update_one({'_id': job['_id']}, {'$set': {
+            'status': 'done',
+            'url': url,
+            'uploaded_at': datetime.now(timezone.utc)
+        }, '$unset': {'error': ''}})
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    async def run_once(self) -> bool:
+        """رفع مهمة واحدة مستحقة (False = لا توجد)"""
+        job = await self._claim()
+        if job is None:
+            return False
+        await self._process(job)
+        return True
+
+    async def _worker(self):
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"ID image upload worker: {str(e)}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=ID_IMAGE_RETRY_BASE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def retry(self, upload_id: str) -> bool:
+        """إعادة مهمة فاشلة إلى الطابور"""
+        result = await self.collection.update_one(
+            {'_id': upload_id, 'status': 'failed'},
+            {'$set': {'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.now(timezone.utc)}}
+        )
+        self._wakeup.set()
+        return result.modified_count == 1
+
+    async def stats(self) -> dict:
+        rows = await self.collection.aggregate([
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+        ]).to_list(None)
+        failed = await self.collection.find(
+            {'status': 'failed'}, {'_id': 1, 'transfer_id': 1, 'error': 1, 'created_at': 1}
+        ).sort('created_at', -1).limit(50).to_list(50)
+        return {
+            'backend': self.backend.name,
+            'counts': {row['_id']: row['count'] for row in rows},
+            'failed': [{'upload_id': f.pop('_id'), **f} for f in failed]
+        }
@@ -0,0 +1,215 @@
+# ID Card Name Extraction
+# قراءة الاسم من صورة الهوية (LLM Vision) بدون إيقاف الـ event loop
+#
+# - كاش حسب sha256 لمحتوى الصورة في id_name_extractions (TTL): إعادة إرسال نفس الصورة
+#   (التحقق من الاسم ثم الاستلام، أو إعادة المحاولة) لا تستدعي النموذج مرة أخرى
+# - نفس الصورة في طلبين متزامنين = استدعاء واحد (الثاني ينتظر نتيجة الأول)
+# - حد للاستدعاءات المتزامنة (Semaphore) ومهلة لكل استدعاء
+# - مكتبات SDK المتزامنة تعمل في thread pool بحجم الحد نفسه
+# - عميل httpx واحد مشترك لتحميل الصور من الروابط
+# - نوعان من الطلب: three_part (الاستلام - الاسم الثلاثي) و full (التحقق - الاسم الكامل
+#   ثلاثي أو رباعي)، ولكل نوع كاش منفصل
+#
+# ID_EXTRACTION_BACKEND:
+# - emergent (افتراضي): LlmChat من emergentintegrations (EMERGENT_LLM_KEY)
+# - stub: اسم ثابت مشتق من hash الصورة أو ID_EXTRACTION_STUB_NAME (للاختبار بدون شبكة)
+# - none: معطل
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import asyncio
+import base64
+import hashlib
+import inspect
+import logging
+import os
+import uuid
+
+import httpx
+
+try:
+    from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
+    EMERGENT_AI_AVAILABLE = True
+except ImportError:
+    EMERGENT_AI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+ID_EXTRACTION_BACKEND = os.environ.get('ID_EXTRACTION_BACKEND', 'emergent').lower()
+ID_EXTRACTION_MODEL = os.environ.get('ID_EXTRACTION_MODEL', 'gpt-4o')
+ID_EXTRACTION_STUB_NAME = os.environ.get('ID_EXTRACTION_STUB_NAME', '')
+ID_EXTRACTION_CONCURRENCY = int(os.environ.get('ID_EXTRACTION_CONCURRENCY', 4))
+ID_EXTRACTION_TIMEOUT_SECONDS = float(os.environ.get('ID_EXTRACTION_TIMEOUT_SECONDS', 30))
+ID_EXTRACTION_DOWNLOAD_TIMEOUT_SECONDS = float(os.environ.get('ID_EXTRACTION_DOWNLOAD_TIMEOUT_SECONDS', 15))
+# الأسماء بيانات شخصية - لا تبقى أكثر من اللازم لتكرار نفس الصورة
+ID_EXTRACTION_CACHE_DAYS = float(os.environ.get('ID_EXTRACTION_CACHE_DAYS', 7))
+
+EXTRACTIONS_COLLECTION = 'id_name_extractions'
+
+NAME_THREE_PART = 'three_part'
+NAME_FULL = 'full'
+
+# (system, user) لكل نوع
+PROMPTS = {
+    NAME_THREE_PART: (
+        "أنت خبير في قراءة الهويات العراقية. مهمتك استخراج الاسم الثلاثي الكامل بالعربي من صورة الهوية.",
+        "اقرأ الاسم الثلاثي الكامل من هذه الهوية العراقية. أجب فقط بالاسم الثلاثي بدون أي نص إضافي. مثال: أحمد علي حسن"
+    ),
+    NAME_FULL: (
+        "أنت خبير في استخراج البيانات من بطاقات الهوية العراقية.",
+        "يرجى استخراج الاسم الكامل من هذه الصورة.\n"
+        "أعد الاسم فقط بدون أي كلام إضافي.\n"
+        "إذا كان الاسم ثلاثي، أعده كما هو.\n"
+        "إذا كان الاسم رباعي، أعده كاملاً."
+    ),
+}
+
+
+# ============ Backends ============
+
+class EmergentBackend:
+    name = 'emergent'
+
+    def __init__(self, api_key: str, model: str = ID_EXTRACTION_MODEL):
+        self.api_key = api_key
+        self.model = model
+
+    async def extract(self, image_base64: str, mode: str = NAME_THREE_PART) -> str:
+        system_prompt, user_prompt = PROMPTS[mode]
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=f"id-card-{uuid.uuid4()}",
+            system_message=system_prompt
+        ).with_model("openai", self.model)
+        return await chat.send_message(UserMessage(
+            text=user_prompt,
+            file_contents=[ImageContent(image_base64=image_base64)]
+        ))
+
+
+class StubBackend:
+    """بديل محلي: نفس الصورة تعطي دائماً نفس الاسم (متزامن - يمر عبر الـ thread pool مثل أي SDK متزامن)"""
+    name = 'stub'
+    NAMES = ['أحمد علي حسن', 'محمد جاسم كاظم', 'علي حسين عباس', 'زينب كريم جواد']
+
+    def __init__(self, fixed_name: str = ID_EXTRACTION_STUB_NAME):
+        self.fixed_name = fixed_name
+
+    def extract(self, image_base64: str, mode: str = NAME_THREE_PART) -> str:
+        if self.fixed_name:
+            return self.fixed_name
+        digest = hashlib.sha256(image_base64.encode()).digest()
+        return self.NAMES[digest[0] % len(self.NAMES)]
+
+
+def create_backend(backend: str = ID_EXTRACTION_BACKEND):
+    """None = القراءة غير متاحة (المكتبة أو المفتاح غير موجود)"""
+    if backend == 'stub':
+        return StubBackend()
+    if backend == 'emergent' and EMERGENT_AI_AVAILABLE:
+        api_key = os.environ.get('EMERGENT_LLM_KEY')
+        if api_key:
+            return EmergentBackend(api_key)
+    return None
+
+
+# ============ Extractor ============
+
+class IdNameExtractor:
+    def __init__(self, db, backend=None, concurrency: int = ID_EXTRACTION_CONCURRENCY,
+                 timeout: float = ID_EXTRACTION_TIMEOUT_SECONDS, cache_days: float = ID_EXTRACTION_CACHE_DAYS,
+                 collection: str = EXTRACTIONS_COLLECTION):
+        self.collection = db[collection]
+        self.backend = backend if backend is not None else create_backend()
+        self.timeout = timeout
+        self.cache_days = cache_days
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # الاستدعاء المتزامن الذي تجاوز المهلة يكمل في خيطه - حجم الـ pool يبقيه ضمن الحد
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='id-extract')
+        self._http: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def available(self) -> bool:
+        return self.backend is not None
+
+    async def create_indexes(self):
+        await self.collection.create_index([('created_at', 1)], expireAfterSeconds=int(self.cache_days * 86400))
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=ID_EXTRACTION_DOWNLOAD_TIMEOUT_SECONDS)
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def extract(self, image_data: bytes = None, image_url: str = None, mode: str = NAME_THREE_PART) -> dict:
+        """
+        {'success': True, 'extracted_name', 'cached'} أو {'success': False, 'error'}
+        image_data: بايتات الصورة، أو image_url لتحميلها
+        mode: NAME_THREE_PART (الاستلام) أو NAME_FULL (التحقق من الاسم)
+        """
+        if not self.available:
+            return {'success': False, 'error': 'AI features not available'}
+
+        if image_data is None:
+            try:
+                response = await self.http.get(image_url)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                return {'success': False, 'error': 'Failed to download image'}
+            image_data = response.content
+
+        key = hashlib.sha256(image_data).hexdigest()
+        if mode != NAME_THREE_PART:
+            key = f"{key}:{mode}"
+        cached = await self.collection.find_one({'_id': key})
+        if cached:
+            return {'success': True, 'extracted_name': cached['extracted_name'], 'cached': True}
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._extract(key, image_data, mode))
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        try:
+            # shield: إلغاء طلب واحد (انقطاع الاتصال) لا يلغي الاستدعاء على الطلبات المنتظرة
+            name = await asyncio.shield(future)
+        except asyncio.TimeoutError:
+            logger.error(f"ID name extraction timed out after {self.timeout}s")
+            return {'success': False, 'error': 'ID name extraction timed out'}
+        except Exception as e:
+            logger.error(f"Error reading ID card with AI: {str(e)}")
+            return {'success': False, 'error': str(e)}
+        return {'success': True, 'extracted_name': name, 'cached': False}
+
+    def _done(self, key: str, future: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not future.cancelled():
+            # الخطأ يصل للمنتظرين - هذا فقط لتجنب "exception was never retrieved" إن لم يبق أحد
+            future.exception()
+
+    async def _extract(self, key: str, image_data: bytes, mode: str) -> str:
+        image_base64 = base64.b64encode(image_data).decode('utf-8')
+        async with self._semaphore:
+            if inspect.iscoroutinefunction(self.backend.extract):
+                call = self.backend.extract(image_base64, mode)
+            else:
+                call = asyncio.get_running_loop().run_in_executor(self.executor, self.backend.extract, image_base64, mode)
+            name = (await asyncio.wait_for(call, self.timeout)).strip()
+
+        if name:
+            await self.collection.update_one(
+                {'_id': key},
+                {'$set': {'extracted_name': name, 'backend': self.backend.name,
+                          'created_at': datetime.now(timezone.utc)}},
+                upsert=True
+            )
+        return name
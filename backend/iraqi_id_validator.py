@@ -2,36 +2,8 @@
 # التحقق البسيط من مطابقة الاسم
 
 from typing import Tuple
-import re
 
-def normalize_name(name: str) -> str:
-    """
-    تطبيع الاسم للمقارنة (إزالة المسافات، التشكيل، توحيد الحروف)
-    """
-    if not name:
-        return ""
-    
-    # تحويل إلى lowercase
-    name = name.lower().strip()
-    
-    # إزالة التشكيل العربي
-    arabic_diacritics = re.compile("""
-        ّ    | # Tashdid
-        َ    | # Fatha
-        ً    | # Tanwin Fath
-        ُ    | # Damma
-        ٌ    | # Tanwin Damm
-        ِ    | # Kasra
-        ٍ    | # Tanwin Kasr
-        ْ    | # Sukun
-        ـ     # Tatwil/Kashida
-    """, re.VERBOSE)
-    name = re.sub(arabic_diacritics, '', name)
-    
-    # إزالة المسافات الزائدة
-    name = ' '.join(name.split())
-    
-    return name
+from name_matching import first_name_similarity, first_names_match, normalize_name
 
 def extract_first_name(full_name: str) -> str:
     """
@@ -81,23 +53,12 @@ def match_first_name(name1: str, name2: str) -> Tuple[bool, str, dict]:
         result['similarity'] = 100
         return True, "الاسم الأول متطابق تماماً", result
     
-    # مطابقة جزئية (أول 3 أحرف)
-    min_length = min(len(first_name1), len(first_name2))
-    if min_length >= 3:
-        # حساب التشابه
-        matching_chars = sum(1 for a, b in zip(first_name1, first_name2) if a == b)
-        similarity = (matching_chars / max(len(first_name1), len(first_name2))) * 100
-        result['similarity'] = similarity
-        
-        # إذا كان التشابه أكثر من 70%
-        if similarity >= 70:
-            result['match'] = True
-            return True, f"الاسم الأول متشابه ({similarity:.0f}%)", result
-        
-        # إذا كانت أول 3 أحرف متطابقة
-        if first_name1[:3] == first_name2[:3]:
-            result['match'] = True
-            return True, "الاسم الأول متشابه (أول 3 أحرف متطابقة)", result
+    # مطابقة جزئية (خطأ إملائي واحد في اسم طويل) - راجع name_matching.py
+    similarity = first_name_similarity(first_name1, first_name2) * 100
+    result['similarity'] = similarity
+    if first_names_match(first_name1, first_name2):
+        result['match'] = True
+        return True, f"الاسم الأول متشابه ({similarity:.0f}%)", result
     
     # لا يوجد تطابق
     return False, f"الاسم الأول غير متطابق: '{first_name1}' ≠ '{first_name2}'", result
@@ -0,0 +1,43 @@
+# Non-blocking Logging
+# تسجيل غير حاجب: الـ handlers الفعلية (stream / file) تعمل في خيط QueueListener
+# والطلبات تضع السجل في طابور فقط (QueueHandler) بدل الكتابة المتزامنة على stderr
+
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import logging
+import queue
+
+_listener: Optional[QueueListener] = None
+_installed = None  # (logger, queue_handler)
+
+
+def start_queue_logging(logger: Optional[logging.Logger] = None) -> QueueListener:
+    """نقل handlers الـ logger (الجذر افتراضياً) خلف طابور - يُستدعى بعد logging.basicConfig"""
+    global _listener, _installed
+    if _listener is not None:
+        return _listener
+    logger = logger or logging.getLogger()
+    handlers = [h for h in logger.handlers if not isinstance(h, QueueHandler)]
+    records = queue.SimpleQueue()
+    for handler in handlers:
+        logger.removeHandler(handler)
+    queue_handler = QueueHandler(records)
+    logger.addHandler(queue_handler)
+    _installed = (logger, queue_handler)
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_queue_logging():
+    """تفريغ الطابور وإعادة الـ handlers الأصلية عند الإيقاف"""
+    global _listener, _installed
+    if _listener is None:
+        return
+    _listener.stop()
+    logger, queue_handler = _installed
+    logger.removeHandler(queue_handler)
+    for handler in _listener.handlers:
+        logger.addHandler(handler)
+    _listener = None
+    _installed = None
@@ -0,0 +1,205 @@
+# Arabic Name Matching
+# تطبيع ومطابقة الأسماء العربية (التحقق من الهوية، كشف التكرار، البحث)
+#
+# - التطبيع بجداول str.translate مُعدة مرة واحدة: حذف التشكيل والتطويل،
+#   توحيد (أ إ آ ٱ → ا)، (ى ئ ی → ي)، (ة → ه)، (ؤ → و)، (ک → ك)، والأرقام العربية
+# - "عبد الله" و "عبدالله"، "ابو بكر" و "ابوبكر" = نفس المقطع
+# - التشابه Jaro-Winkler لكل مقطع حسب ترتيبه (الاسم، الأب، الجد) - كاش لأزواج المقاطع
+#   لأن الأسماء تتكرر كثيراً (محمد، علي، حسين...)
+# - المطابقة تتطلب كل مقطع "مكافئاً": نفس المقطع بعد التطبيع، أو حرف واحد مختلف في مقطع
+#   من 5 أحرف أو أكثر. الأسماء القصيرة المختلفة متشابهة جداً بالأرقام (حسن/حسين 0.93،
+#   محمد/محمود 0.95) لكنها أشخاص مختلفون - التشابه للترتيب فقط
+# - rank_names(): اسم واحد مقابل آلاف المرشحين (التطبيع مرة واحدة لكل مرشح)
+
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
+import os
+
+# ============ Configuration ============
+
+# أقل تشابه لاعتبار الاسمين "متطابقين جزئياً" (أخطاء إملائية بسيطة)
+NAME_MATCH_THRESHOLD = float(os.environ.get('NAME_MATCH_THRESHOLD', 0.9))
+# كل مقطع على حدة: المتوسط وحده يخفي اسماً أول مختلفاً ("محمد علي" / "احمد علي")
+NAME_TOKEN_THRESHOLD = float(os.environ.get('NAME_TOKEN_THRESHOLD', 0.85))
+JARO_WINKLER_PREFIX_SCALE = 0.1
+# أقصر مقطع يُقبل فيه خطأ إملائي (حرف واحد)، ويأخذ مكافأة البادئة في Jaro-Winkler
+MIN_FUZZY_TOKEN_LENGTH = 5
+
+EXACT_MATCH = 'exact_match'
+PARTIAL_MATCH = 'partial_match'
+NO_MATCH = 'no_match'
+
+# ============ Normalisation ============
+
+_DIACRITICS = [chr(c) for c in range(0x064B, 0x0653)] + ['ٰ', 'ـ']  # التشكيل + ألف خنجرية + تطويل
+_LETTERS = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ی': 'ي',
+    'ة': 'ه',
+    'ؤ': 'و',
+    'ک': 'ك',
+}
+_DIGITS = {chr(0x0660 + i): str(i) for i in range(10)}
+_PUNCTUATION = {c: ' ' for c in '.,-_/\\()"\'،؛'}
+
+_TRANSLATION = str.maketrans({
+    **{c: None for c in _DIACRITICS},
+    **_LETTERS,
+    **_DIGITS,
+    **_PUNCTUATION,
+})
+
+# مقاطع تُلصق بما بعدها: "عبد الله" → "عبدالله"
+_JOINED_PREFIXES = frozenset({'عبد', 'ابو', 'ام'})
+
+
+@lru_cache(maxsize=65536)
+def name_tokens(name: str) -> Tuple[str, ...]:
+    """مقاطع الاسم بعد التطبيع"""
+    if not name:
+        return ()
+    parts = name.translate(_TRANSLATION).casefold().split()
+    if _JOINED_PREFIXES.isdisjoint(parts):
+        return tuple(parts)
+    tokens = []
+    i = 0
+    while i < len(parts):
+        if parts[i] in _JOINED_PREFIXES and i + 1 < len(parts):
+            tokens.append(parts[i] + parts[i + 1])
+            i += 2
+        else:
+            tokens.append(parts[i])
+            i += 1
+    return tuple(tokens)
+
+
+def normalize_name(name: str) -> str:
+    """تطبيع الاسم للمقارنة والتخزين"""
+    return ' '.join(name_tokens(name))
+
+
+# ============ Similarity ============
+
+def jaro_winkler(s1: str, s2: str) -> float:
+    """تشابه Jaro-Winkler بين 0 و 1 (Jaro فقط للمقاطع الأقصر من MIN_FUZZY_TOKEN_LENGTH)"""
+    if s1 == s2:
+        return 1.0
+    len1, len2 = len(s1), len(s2)
+    if not len1 or not len2:
+        return 0.0
+
+    window = max(max(len1, len2) // 2 - 1, 0)
+    matched2 = [False] * len2
+    matches1 = []
+    for i, c in enumerate(s1):
+        for j in range(max(0, i - window), min(i + window + 1, len2)):
+            if not matched2[j] and s2[j] == c:
+                matched2[j] = True
+                matches1.append(c)
+                break
+    m = len(matches1)
+    if not m:
+        return 0.0
+    matches2 = [s2[j] for j in range(len2) if matched2[j]]
+    transpositions = sum(a != b for a, b in zip(matches1, matches2)) // 2
+    jaro = (m / len1 + m / len2 + (m - transpositions) / m) / 3
+    if min(len1, len2) < MIN_FUZZY_TOKEN_LENGTH:
+        return jaro
+
+    prefix = 0
+    for a, b in zip(s1[:4], s2[:4]):
+        if a != b:
+            break
+        prefix += 1
+    return jaro + prefix * JARO_WINKLER_PREFIX_SCALE * (1 - jaro)
+
+
+@lru_cache(maxsize=262144)
+def _token_similarity(a: str, b: str) -> float:
+    return jaro_winkler(a, b)
+
+
+def tokens_equivalent(a: str, b: str) -> bool:
+    """نفس المقطع، أو استبدال حرف واحد في مقطعين بنفس الطول >= MIN_FUZZY_TOKEN_LENGTH"""
+    if a == b:
+        return True
+    if len(a) != len(b) or len(a) < MIN_FUZZY_TOKEN_LENGTH:
+        return False
+    return sum(x != y for x, y in zip(a, b)) <= 1
+
+
+def tokens_similarity(tokens1: Sequence[str], tokens2: Sequence[str], token_threshold: float = 0.0) -> float:
+    """
+    متوسط تشابه المقاطع المشتركة بالترتيب (اسم ثلاثي مقابل رباعي = أول ثلاثة مقاطع)
+    token_threshold > 0 (مطابقة وليس ترتيباً): 0 إذا كان أي مقطع أقل منه أو غير مكافئ
+    """
+    n = min(len(tokens1), len(tokens2))
+    if not n:
+        return 0.0
+    total = 0.0
+    for i in range(n):
+        score = _token_similarity(tokens1[i], tokens2[i])
+        if token_threshold and (score < token_threshold or not tokens_equivalent(tokens1[i], tokens2[i])):
+            return 0.0
+        total += score
+    return total / n
+
+
+def name_similarity(name1: str, name2: str) -> float:
+    return tokens_similarity(name_tokens(name1), name_tokens(name2))
+
+
+def match_names(extracted: str, expected: str, threshold: float = NAME_MATCH_THRESHOLD,
+                token_threshold: float = NAME_TOKEN_THRESHOLD) -> Tuple[str, float]:
+    """
+    مقارنة اسم (من الهوية) مع الاسم المتوقع → (الحالة، التشابه)
+    exact_match: نفس المقاطع بعد التطبيع
+    partial_match: ثلاثي مقابل رباعي بنفس البداية، أو تشابه >= threshold في مقطعين على الأقل
+                   (وكل مقطع مكافئ و >= token_threshold)
+    """
+    tokens1, tokens2 = name_tokens(extracted), name_tokens(expected)
+    if not tokens1 or not tokens2:
+        return NO_MATCH, 0.0
+    if tokens1 == tokens2:
+        return EXACT_MATCH, 1.0
+    score = tokens_similarity(tokens1, tokens2, token_threshold)
+    if min(len(tokens1), len(tokens2)) >= 2 and score and score >= threshold:
+        return PARTIAL_MATCH, score
+    return NO_MATCH, score
+
+
+def first_name_similarity(name1: str, name2: str) -> float:
+    tokens1, tokens2 = name_tokens(name1), name_tokens(name2)
+    if not tokens1 or not tokens2:
+        return 0.0
+    return _token_similarity(tokens1[0], tokens2[0])
+
+
+def first_names_match(name1: str, name2: str) -> bool:
+    """نفس الاسم الأول (حسن ≠ حسين، محمد ≠ محمود)، مع خطأ إملائي واحد للأسماء الطويلة"""
+    tokens1, tokens2 = name_tokens(name1), name_tokens(name2)
+    return bool(tokens1 and tokens2) and tokens_equivalent(tokens1[0], tokens2[0])
+
+
+# ============ Batch ============
+
+def rank_names(name: str, candidates: Iterable[str], threshold: float = 0.0, token_threshold: float = 0.0,
+               limit: Optional[int] = None) -> List[Tuple[int, float]]:
+    """
+    تشابه اسم واحد مع قائمة مرشحين → [(موقع المرشح، التشابه)] من الأعلى، فقط >= threshold
+    token_threshold: كما في match_names (0 = ترتيب فقط، للبحث)
+    (اسم من مقطع واحد لا يُقارن إلا بمقطع واحد - "محمد" ليس تكراراً لـ "محمد علي حسن")
+    """
+    query = name_tokens(name)
+    if not query:
+        return []
+    scored = []
+    for index, candidate in enumerate(candidates):
+        tokens = name_tokens(candidate)
+        if len(tokens) != len(query) and min(len(tokens), len(query)) < 2:
+            continue
+        score = tokens_similarity(query, tokens, token_threshold)
+        if score and score >= threshold:
+            scored.append((index, score))
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:limit] if limit else scored
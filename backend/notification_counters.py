@@ -0,0 +1,88 @@
+# Notification Unread Counters
+# عدادات الإشعارات غير المقروءة (بدل count_documents مع كل طلب /api/notifications)
+#
+# مستند لكل صندوق في notification_counters:
+# - {_id: <user_id>, unread}: إشعارات المستخدم (الصراف)
+# - {_id: 'admin', unread}: صندوق المدير = كل الإشعارات غير المقروءة في النظام
+#
+# create_notification يرفع العداد و mark-read ينقصه (فقط إذا تغيرت حالة الإشعار فعلاً).
+# العداد غير الموجود يُحسب مرة واحدة من notifications عند أول قراءة، والتعليم
+# الجماعي كمقروء يعيده إلى قيمة دقيقة.
+
+from pymongo import ReturnDocument
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+COUNTERS_COLLECTION = 'notification_counters'
+ADMIN_INBOX = 'admin'
+
+
+def inbox_key(user_id: Optional[str]) -> str:
+    """مفتاح العداد: المستخدم أو صندوق المدير (None)"""
+    return user_id or ADMIN_INBOX
+
+
+def inbox_query(user_id: Optional[str]) -> dict:
+    """فلتر الإشعارات التابعة للصندوق"""
+    return {'user_id': user_id} if user_id else {}
+
+
+class UnreadCounters:
+    def __init__(self, db, collection: str = COUNTERS_COLLECTION):
+        self.notifications = db.notifications
+        self.collection = db[collection]
+
+    async def get(self, user_id: Optional[str] = None) -> int:
+        key = inbox_key(user_id)
+        doc = await self.collection.find_one({'_id': key})
+        if doc is None:
+            unread = await self.notifications.count_documents({**inbox_query(user_id), 'is_read': False})
+            # $setOnInsert: إذا سبقنا طلب آخر تبقى قيمته
+            doc = await self.collection.find_one_and_update(
+                {'_id': key},
+                {'$setOnInsert': {'unread': unread}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        return max(doc['unread'], 0)
+
+    async def add(self, user_id: Optional[str], delta: int) -> Dict[str, int]:
+        """
+        تعديل عداد المستخدم وصندوق المدير معاً (إشعار المستخدم يظهر للمدير أيضاً)
+        يعيد القيم الجديدة {key: unread} للعدادات الموجودة فقط - غير الموجود يُحسب عند أول قراءة
+        """
+        counts = {}
+        for key in {inbox_key(user_id), ADMIN_INBOX}:
+            try:
+                doc = await self.collection.find_one_and_update(
+                    {'_id': key},
+                    {'$inc': {'unread': delta}},
+                    return_document=ReturnDocument.AFTER
+                )
+            except Exception as e:
+                logger.warning(f"Unread counter update failed for {key}: {str(e)}")
+                continue
+            if doc is not None:
+                counts[key] = max(doc['unread'], 0)
+        return counts
+
+    async def mark_all_read(self, user_id: Optional[str] = None) -> Dict[str, int]:
+        """تعليم كل إشعارات الصندوق كمقروءة وإعادة ضبط العدادات المتأثرة"""
+        result = await self.notifications.update_many(
+            {**inbox_query(user_id), 'is_read': False},
+            {'$set': {'is_read': True}}
+        )
+        if user_id is None:
+            # كل الإشعارات أصبحت مقروءة - كل العدادات صفر
+            await self.collection.update_many({}, {'$set': {'unread': 0}})
+            return {ADMIN_INBOX: 0}
+
+        await self.collection.update_one({'_id': user_id}, {'$set': {'unread': 0}}, upsert=True)
+        counts = {user_id: 0}
+        if result.modified_count:
+            counts.update(await self.add(None, -result.modified_count))
+        return counts
@@ -0,0 +1,279 @@
+# Rate Limiting
+# نظام موحد للحد من الطلبات: sliding-window counter بحالة O(1) لكل مفتاح
+#
+# الحالة لكل مفتاح: بداية النافذة الحالية، عدد النافذة السابقة، عدد النافذة الحالية، وقت انتهاء الحظر
+# التقدير = السابقة × (الجزء المتبقي منها داخل النافذة المنزلقة) + الحالية
+#
+# الخلفيات:
+# - memory: داخل العملية، LRU محدود بعدد المفاتيح + انتهاء تلقائي (TTL)
+# - mongo: مشتركة بين العمليات (workers) - تحديث ذري واحد لكل طلب + TTL index
+#
+# يُستخدم في: RateLimitMiddleware، محاولات تسجيل الدخول، محاولات PIN، حظر IP (security_config)
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import logging
+import math
+import os
+import time
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower()
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000))
+RATE_LIMIT_COLLECTION = 'rate_limits'
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """
+    limit طلب/محاولة خلال window_seconds
+    lockout_seconds > 0: عند التجاوز يُحظر المفتاح لهذه المدة (مثل قفل تسجيل الدخول)
+    """
+    name: str
+    limit: int
+    window_seconds: float
+    lockout_seconds: float = 0
+
+    def ttl(self) -> float:
+        return 2 * self.window_seconds + self.lockout_seconds
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_at: float        # epoch seconds
+    retry_after: float = 0
+
+
+def _window_start(now: float, window: float) -> float:
+    return math.floor(now / window) * window
+
+
+def _estimate(now: float, window: float, window_start: float, previous: float, current: float) -> float:
+    elapsed = now - window_start
+    return previous * max(0.0, (window - elapsed) / window) + current
+
+
+def _result(policy: RateLimitPolicy, now: float, state: list, allowed: bool) -> RateLimitResult:
+    window_start, previous, current, locked_until = state
+    if locked_until and locked_until > now:
+        return RateLimitResult(False, policy.limit, 0, locked_until, locked_until - now)
+    used = math.ceil(_estimate(now, policy.window_seconds, window_start, previous, current))
+    reset_at = window_start + policy.window_seconds
+    return RateLimitResult(
+        allowed,
+        policy.limit,
+        max(0, policy.limit - used),
+        reset_at,
+        0 if allowed else max(0.0, reset_at - now)
+    )
+
+
+def _roll(state: list, now: float, window: float):
+    """نقل العدادات إذا بدأت نافذة جديدة"""
+    start = _window_start(now, window)
+    if state[0] == start:
+        return
+    state[1] = state[2] if state[0] == start - window else 0
+    state[2] = 0
+    state[0] = start
+
+
+# ============ Backends ============
+
+class MemoryBackend:
+    """داخل العملية: OrderedDict كـ LRU + انتهاء حسب آخر استخدام"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.entries = OrderedDict()  # {'policy:key': (expires_at, [window_start, previous, current, locked_until])}
+
+    def _evict(self, now: float):
+        # الأقدم استخداماً في البداية - التوقف عند أول مدخل صالح (O(1) مستهلك)
+        while self.entries:
+            key, (expires_at, _) = next(iter(self.entries.items()))
+            if expires_at > now and len(self.entries) <= self.max_keys:
+                break
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def _key(policy: RateLimitPolicy, key: str) -> str:
+        # مثل MongoBackend: مدخل لكل (سياسة، مفتاح) - login و requests على نفس IP منفصلان
+        return f'{policy.name}:{key}'
+
+    def _state(self, policy: RateLimitPolicy, key: str, now: float) -> list:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= now:
+            state = [_window_start(now, policy.window_seconds), 0, 0, 0]
+        else:
+            state = entry[1]
+        self.entries[key] = (now + policy.ttl(), state)
+        self.entries.move_to_end(key)
+        return state
+
+    async def hit(self, policy: RateLimitPolicy, key: str, now: float, cost: int) -> RateLimitResult:
+        key = self._key(policy, key)
+        state = self._state(policy, key, now)
+        self._evict(now)
+        if state[3] and state[3] > now:
+            return _result(policy, now, state, False)
+        if state[3]:
+            # انتهى الحظر - بداية جديدة
+            state[:] = [_window_start(now, policy.window_seconds), 0, 0, 0]
+        _roll(state, now, policy.window_seconds)
+        state[2] += cost
+        used = _estimate(now, policy.window_seconds, state[0], state[1], state[2])
+        if used > policy.limit:
+            if policy.lockout_seconds:
+                state[3] = now + policy.lockout_seconds
+                self.entries[key] = (now + policy.ttl(), state)
+            else:
+                # الطلب المرفوض لا يُحتسب
+                state[2] -= cost
+            return _result(policy, now, state, False)
+        return _result(policy, now, state, True)
+
+    async def peek(self, policy: RateLimitPolicy, key: str, now: float) -> RateLimitResult:
+        entry = self.entries.get(self._key(policy, key))
+        if entry is None or entry[0] <= now:
+            return RateLimitResult(True, policy.limit, policy.limit, now + policy.window_seconds)
+        state = list(entry[1])
+        if state[3] and state[3] > now:
+            return _result(policy, now, state, False)
+        _roll(state, now, policy.window_seconds)
+        used = _estimate(now, policy.window_seconds, state[0], state[1], state[2])
+        return _result(policy, now, state, used < policy.limit)
+
+    async def reset(self, policy: RateLimitPolicy, key: str):
+        self.entries.pop(self._key(policy, key), None)
+
+    def size(self) -> int:
+        return len(self.entries)
+
+
+class MongoBackend:
+    """
+    مشتركة بين العمليات: مستند لكل (سياسة، مفتاح) في rate_limits
+    كل طلب = find_one_and_update واحد بـ pipeline (ذري)، و expires_at عليه TTL index
+    """
+
+    def __init__(self, db, collection: str = RATE_LIMIT_COLLECTION):
+        self.collection = db[collection]
+
+    async def create_indexes(self):
+        await self.collection.create_index([('expires_at', 1)], expireAfterSeconds=0)
+
+    async def hit(self, policy: RateLimitPolicy, key: str, now: float, cost: int) -> RateLimitResult:
+        window = policy.window_seconds
+        start = _window_start(now, window)
+        locked = {'$gt': [{'$ifNull': ['$locked_until', 0]}, now]}
+        doc = await self.collection.find_one_and_update(
+            {'_id': f'{policy.name}:{key}'},
+            [{'$set': {
+                'previous': {'$cond': [locked, '$previous', {'$switch': {
+                    'branches': [
+                        {'case': {'$eq': ['$window_start', start]}, 'then': '$previous'},
+                        {'case': {'$eq': ['$window_start', start - window]}, 'then': '$current'}
+                    ],
+                    'default': 0
+                }}]},
+                'current': {'$cond': [locked, '$current', {'$add': [
+                    {'$cond': [{'$eq': ['$window_start', start]}, '$current', 0]}, cost
+                ]}]},
+                'window_start': {'$cond': [locked, '$window_start', start]},
+                'locked_until': {'$cond': [locked, '$locked_until', 0]},
+                'expires_at': datetime.fromtimestamp(now + policy.ttl(), timezone.utc)
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        state = [doc['window_start'], doc['previous'], doc['current'], doc.get('locked_until') or 0]
+        if state[3] > now:
+            return _result(policy, now, state, False)
+        used = _estimate(now, window, state[0], state[1], state[2])
+        if used > policy.limit:
+            if policy.lockout_seconds:
+                state[3] = now + policy.lockout_seconds
+                await self.collection.update_one(
+                    {'_id': f'{policy.name}:{key}'},
+                    {'$set': {
+                        'locked_until': state[3],
+                        'previous': 0,
+                        'current': 0,
+                        'expires_at': datetime.fromtimestamp(now + policy.ttl(), timezone.utc)
+                    }}
+                )
+            else:
+                # الطلب المرفوض لا يُحتسب
+                state[2] -= cost
+                await self.collection.update_one({'_id': f'{policy.name}:{key}'}, {'$inc': {'current': -cost}})
+            return _result(policy, now, state, False)
+        return _result(policy, now, state, True)
+
+    async def peek(self, policy: RateLimitPolicy, key: str, now: float) -> RateLimitResult:
+        doc = await self.collection.find_one({'_id': f'{policy.name}:{key}'})
+        if not doc:
+            return RateLimitResult(True, policy.limit, policy.limit, now + policy.window_seconds)
+        state = [doc['window_start'], doc['previous'], doc['current'], doc.get('locked_until') or 0]
+        if state[3] > now:
+            return _result(policy, now, state, False)
+        _roll(state, now, policy.window_seconds)
+        used = _estimate(now, policy.window_seconds, state[0], state[1], state[2])
+        return _result(policy, now, state, used < policy.limit)
+
+    async def reset(self, policy: RateLimitPolicy, key: str):
+        await self.collection.delete_one({'_id': f'{policy.name}:{key}'})
+
+
+# ============ Limiter ============
+
+class RateLimiter:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+
+    async def hit(self, policy: RateLimitPolicy, key: str, cost: int = 1) -> RateLimitResult:
+        """تسجيل طلب/محاولة وإرجاع هل هو مسموح"""
+        try:
+            return await self.backend.hit(policy, key, time.time(), cost)
+        except Exception as e:
+            # الخلفية المشتركة غير متاحة - السماح بدل إيقاف الخدمة
+            logger.error(f"Rate limit backend error ({policy.name}): {str(e)}")
+            return RateLimitResult(True, policy.limit, policy.limit, time.time() + policy.window_seconds)
+
+    async def peek(self, policy: RateLimitPolicy, key: str) -> RateLimitResult:
+        """الحالة بدون تسجيل محاولة (هل المفتاح محظور حالياً؟)"""
+        try:
+            return await self.backend.peek(policy, key, time.time())
+        except Exception as e:
+            logger.error(f"Rate limit backend error ({policy.name}): {str(e)}")
+            return RateLimitResult(True, policy.limit, policy.limit, time.time() + policy.window_seconds)
+
+    async def reset(self, policy: RateLimitPolicy, key: str):
+        try:
+            await self.backend.reset(policy, key)
+        except Exception as e:
+            logger.error(f"Rate limit backend error ({policy.name}): {str(e)}")
+
+
+_rate_limiter = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    return _rate_limiter
+
+
+def configure_rate_limiter(db=None, backend: str = RATE_LIMIT_BACKEND) -> RateLimiter:
+    """اختيار الخلفية عند بدء التطبيق (RATE_LIMIT_BACKEND=memory|mongo)"""
+    if backend == 'mongo' and db is not None:
+        _rate_limiter.backend = MongoBackend(db)
+    else:
+        _rate_limiter.backend = MemoryBackend()
+    return _rate_limiter
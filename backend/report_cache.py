@@ -0,0 +1,213 @@
+# Report Result Cache
+# كاش نتائج التقارير المالية (ميزان المراجعة، قائمة الدخل، الميزانية، العمولات، الأرباح)
+#
+# المفتاح = (التقرير، المعاملات، نسخة البيانات)
+# - الفترات المغلقة (قبل بداية الشهر الحالي) تُخزن بنسخة "closed" لا تتغير إلا عند
+#   كتابة قيد بتاريخ قديم، لذلك تبقى صالحة عملياً إلى الأبد.
+# - الفترة الحالية تُخزن بنسخة "current" يرفعها كل مسار كتابة (قيود / عمولات / صرافة).
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Iterable, Optional
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_MB', 64)) * 1024 * 1024
+REPORT_CACHE_PERSIST = os.environ.get('REPORT_CACHE_PERSIST', 'false').lower() == 'true'
+REPORT_CACHE_CURRENT_TTL_HOURS = int(os.environ.get('REPORT_CACHE_CURRENT_TTL_HOURS', 24))
+
+# مجالات البيانات التي تعتمد عليها التقارير
+DOMAIN_JOURNAL = 'journal'          # journal_entries + chart_of_accounts
+DOMAIN_COMMISSIONS = 'commissions'  # admin_commissions
+DOMAIN_EXCHANGE = 'exchange'        # exchange_operations
+
+
+def current_period_start() -> str:
+    """أول يوم في الشهر الحالي (UTC) - كل ما قبله فترة مغلقة"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-01')
+
+
+def is_closed_period(period_end: Optional[str]) -> bool:
+    """
+    period_end: آخر يوم مشمول في التقرير (YYYY-MM-DD أو ISO كامل)
+    التقرير بدون نهاية يشمل الفترة الحالية دائماً
+    """
+    if not period_end:
+        return False
+    return period_end[:10] < current_period_start()
+
+
+class _LRUStore:
+    """LRU محدود بالذاكرة (بالبايت) داخل العملية"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()  # {key: (etag, body)}
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, etag: str, body: bytes):
+        if len(body) > self.max_bytes // 4:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[1])
+        self.entries[key] = (etag, body)
+        self.size += len(body)
+        while self.size > self.max_bytes and self.entries:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+class ReportCache:
+    """
+    كاش التقارير: LRU في الذاكرة + طبقة اختيارية محفوظة في MongoDB (report_cache)
+    نسخ البيانات محفوظة في counters حتى تكون مشتركة بين جميع العمليات (workers)
+    """
+
+    def __init__(self, db, max_bytes: int = REPORT_CACHE_MAX_BYTES, persist: bool = REPORT_CACHE_PERSIST):
+        self.db = db
+        self.persist = persist
+        self.memory = _LRUStore(max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    async def create_indexes(self):
+        if self.persist:
+            # المدخلات الحالية فقط لها expires_at؛ المدخلات المغلقة تبقى
+            await self.db.report_cache.create_index([("expires_at", 1)], expireAfterSeconds=0)
+
+    # ============ Versions ============
+
+    async def get_versions(self, domains: Iterable[str]) -> dict:
+        ids = [f'report_version_{d}' for d in domains]
+        docs = await self.db.counters.find({'_id': {'$in': ids}}).to_list(length=len(ids))
+        by_id = {doc['_id']: doc for doc in docs}
+        return {
+            d: (by_id.get(f'report_version_{d}', {}).get('current', 0),
+                by_id.get(f'report_version_{d}', {}).get('closed', 0))
+            for d in domains
+        }
+
+    async def bump(self, domain: str, affected_date: Optional[str] = None):
+        """
+        يُستدعى من مسارات الكتابة. affected_date: تاريخ البيانات المكتوبة
+        إذا كان داخل فترة مغلقة تُبطل نسخة الفترات المغلقة أيضاً
+        """
+        inc = {'current': 1}
+        if affected_date and is_closed_period(affected_date):
+            inc['closed'] = 1
+        try:
+            await self.db.counters.update_one(
+                {'_id': f'report_version_{domain}'},
+                {'$inc': inc},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error bumping report version {domain}: {str(e)}")
+
+    # ============ Serving ============
+
+    def _key(self, report: str, params: dict, versions: dict, closed: bool) -> str:
+        scope = 'closed' if closed else 'current'
+        version_part = {d: v[1] if closed else v[0] for d, v in versions.items()}
+        raw = json.dumps([report, params, version_part, scope], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def _persisted_get(self, key: str):
+        doc = await self.db.report_cache.find_one({'_id': key}, {'etag': 1, 'body': 1})
+        if doc:
+            return doc['etag'], doc['body'].encode()
+        return None
+
+    async def _persisted_put(self, key: str, report: str, etag: str, body: bytes, closed: bool):
+        doc = {
+            'report': report,
+            'etag': etag,
+            'body': body.decode(),
+            'closed': closed,
+            'created_at': datetime.now(timezone.utc)
+        }
+        if not closed:
+            doc['expires_at'] = datetime.now(timezone.utc) + timedelta(hours=REPORT_CACHE_CURRENT_TTL_HOURS)
+        try:
+            await self.db.report_cache.replace_one({'_id': key}, doc, upsert=True)
+        except Exception as e:
+            # مستند أكبر من 16MB أو خطأ اتصال - الكاش في الذاكرة يكفي
+            logger.warning(f"Report cache persist skipped for {report}: {str(e)}")
+
+    async def serve(
+        self,
+        request: Request,
+        report: str,
+        params: dict,
+        domains: Iterable[str],
+        compute: Callable[[], Awaitable[dict]],
+        period_end: Optional[str] = None
+    ) -> Response:
+        """إرجاع التقرير من الكاش أو حسابه، مع ETag و 304 عند التطابق"""
+        closed = is_closed_period(period_end)
+        versions = await self.get_versions(domains)
+        key = self._key(report, params, versions, closed)
+
+        entry = self.memory.get(key)
+        if entry is None and self.persist:
+            entry = await self._persisted_get(key)
+            if entry is not None:
+                self.memory.put(key, *entry)
+
+        if entry is not None:
+            self.hits += 1
+            cache_status = 'hit'
+            etag, body = entry
+        else:
+            self.misses += 1
+            cache_status = 'miss'
+            result = await compute()
+            body = json.dumps(jsonable_encoder(result), ensure_ascii=False).encode()
+            etag = f'"{key[:32]}"'
+            self.memory.put(key, etag, body)
+            if self.persist:
+                await self._persisted_put(key, report, etag, body, closed)
+
+        headers = {
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+            'X-Report-Cache': cache_status
+        }
+        if request.headers.get('if-none-match') == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type='application/json', headers=headers)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.memory.entries),
+            'memory_bytes': self.memory.size,
+            'max_bytes': self.memory.max_bytes,
+            'persist': self.persist
+        }
+
+    async def clear(self):
+        self.memory.clear()
+        if self.persist:
+            await self.db.report_cache.delete_many({})
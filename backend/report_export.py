@@ -0,0 +1,123 @@
+# Streaming Report Export
+# تصدير التقارير وكشوف الحساب بصيغة CSV / XLSX مباشرة من cursor قاعدة البيانات
+#
+# - CSV: يُرسل على دفعات أثناء القراءة من الـ cursor (يبدأ التحميل فوراً)
+# - XLSX: openpyxl في وضع write_only (الصفوف تُكتب إلى ملف مؤقت وليس للذاكرة)
+#   ثم يُرسل الملف على دفعات. صيغة xlsx ملف zip لذلك يبدأ الإرسال بعد آخر صف.
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterable, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote
+import asyncio
+import csv
+import io
+import re
+import tempfile
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+CSV_FLUSH_ROWS = 500
+FILE_CHUNK_SIZE = 64 * 1024
+
+# (field, header)
+Columns = List[Tuple[str, str]]
+
+# نص يبدأ بهذه الأحرف يُنفذ كمعادلة في Excel (اسم مرسل مثل =HYPERLINK(...))
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def validate_export_format(format: Optional[str]) -> Optional[str]:
+    """None = JSON عادي"""
+    if format is None or format == 'json':
+        return None
+    format = format.lower()
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="صيغة التصدير غير مدعومة (csv أو xlsx)")
+    return format
+
+
+async def _aiter(rows):
+    if hasattr(rows, '__aiter__'):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+def _cell(value):
+    """الأرقام تبقى أرقاماً، والنص الذي يبدأ كمعادلة يُسبق بـ ' ليُعرض كنص"""
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        value = str(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def _csv_chunks(rows, columns: Columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM حتى يفتح Excel النص العربي بشكل صحيح
+    buffer.write('\ufeff')
+    writer.writerow([header for _, header in columns])
+
+    pending = 0
+    async for row in _aiter(rows):
+        writer.writerow([_cell(row.get(field)) for field, _ in columns])
+        pending += 1
+        if pending >= CSV_FLUSH_ROWS:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+async def _xlsx_chunks(rows, columns: Columns, sheet_title: str):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet_title = re.sub(r'[\[\]:*?/\\]', '_', sheet_title)[:31] or 'Sheet1'
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.sheet_view.rightToLeft = True
+    sheet.append([header for _, header in columns])
+
+    async for row in _aiter(rows):
+        sheet.append([_cell(row.get(field)) for field, _ in columns])
+
+    with tempfile.TemporaryFile() as tmp:
+        await asyncio.to_thread(workbook.save, tmp)
+        tmp.seek(0)
+        while True:
+            chunk = await asyncio.to_thread(tmp.read, FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def stream_export(
+    rows: Union[AsyncIterable[dict], Iterable[dict]],
+    columns: Columns,
+    format: str,
+    filename: str
+) -> StreamingResponse:
+    """StreamingResponse لصفوف تأتي من cursor (async) أو من قائمة صغيرة"""
+    if format == 'csv':
+        body = _csv_chunks(rows, columns)
+        media_type = 'text/csv; charset=utf-8'
+    else:
+        body = _xlsx_chunks(rows, columns, filename)
+        media_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    full_name = f"{filename}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            'Content-Disposition': f"attachment; filename*=UTF-8''{quote(full_name)}",
+            'Cache-Control': 'no-store'
+        }
+    )
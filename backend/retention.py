@@ -0,0 +1,318 @@
+# Data Retention
+# سياسات الاحتفاظ للمجموعات التي تنمو بلا حد (notifications / pin_attempts / audit_logs)
+# حتى تبقى المجموعات الساخنة وفهارسها صغيرة بما يكفي للذاكرة
+#
+# - notifications: expires_at يُحدد عند الإنشاء حسب النوع ثم الشدة (TTL index).
+#   الـ TTL يشمل المقروء فقط (partialFilterExpression) حتى تبقى عدادات غير المقروء صحيحة:
+#   الإشعار غير المقروء يُحذف بعد قراءته إذا تجاوز expires_at.
+# - pin_attempts: expires_at بعد PIN_ATTEMPTS_RETENTION_DAYS.
+# - audit_logs: الأشهر الأقدم من AUDIT_HOT_MONTHS تُنقل إلى audit_logs_archive
+#   (مستند لكل AUDIT_ARCHIVE_CHUNK سجل: NDJSON مضغوط بـ gzip + قوائم للبحث).
+#
+# المستندات الأقدم من هذا النظام (بدون expires_at) تُحذف في run_retention حسب created_at.
+# created_at نص ISO (UTC) في كل المجموعات، لذلك المقارنة النصية تطابق الترتيب الزمني.
+
+from bson import Binary
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from typing import Dict, List, Optional
+import asyncio
+import gzip
+import logging
+import os
+
+from backup import encode_line, decode_line
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+# 0 = بدون حذف
+NOTIFICATION_RETENTION_DAYS = {
+    'low': int(os.environ.get('NOTIFICATION_RETENTION_DAYS_LOW', 30)),
+    'medium': int(os.environ.get('NOTIFICATION_RETENTION_DAYS_MEDIUM', 90)),
+    'high': int(os.environ.get('NOTIFICATION_RETENTION_DAYS_HIGH', 365)),
+    'critical': int(os.environ.get('NOTIFICATION_RETENTION_DAYS_CRITICAL', 0)),
+}
+# أنواع تشغيلية كثيرة العدد - تسبق سياسة الشدة
+NOTIFICATION_TYPE_RETENTION_DAYS = {
+    'new_transfer': int(os.environ.get('NOTIFICATION_RETENTION_DAYS_NEW_TRANSFER', 14)),
+    'transfer_received': int(os.environ.get('NOTIFICATION_RETENTION_DAYS_TRANSFER_RECEIVED', 14)),
+}
+PIN_ATTEMPTS_RETENTION_DAYS = int(os.environ.get('PIN_ATTEMPTS_RETENTION_DAYS', 90))
+
+# عدد الأشهر (بما فيها الحالي) التي تبقى في audit_logs
+AUDIT_HOT_MONTHS = int(os.environ.get('AUDIT_HOT_MONTHS', 3))
+AUDIT_ARCHIVE_CHUNK = int(os.environ.get('AUDIT_ARCHIVE_CHUNK', 5000))
+AUDIT_ARCHIVE_COLLECTION = 'audit_logs_archive'
+
+# كل كم ساعة يعمل في scheduler (0 = التشغيل يدوياً فقط عبر POST /api/admin/retention/run)
+RETENTION_INTERVAL_HOURS = float(os.environ.get('RETENTION_INTERVAL_HOURS', 24))
+RETENTION_LOCK_COLLECTION = 'retention_runs'
+RETENTION_LOCK_MINUTES = 60
+
+
+# ============ Policies ============
+
+def notification_retention_days(notification: dict) -> int:
+    days = NOTIFICATION_TYPE_RETENTION_DAYS.get(notification.get('type'))
+    if days is None:
+        days = NOTIFICATION_RETENTION_DAYS.get(notification.get('severity'), 0)
+    return days
+
+
+def notification_expires_at(notification: dict, now: Optional[datetime] = None) -> Optional[datetime]:
+    """قيمة expires_at للإشعار الجديد (None = يُحتفظ به)"""
+    days = notification_retention_days(notification)
+    if not days:
+        return None
+    return (now or datetime.now(timezone.utc)) + timedelta(days=days)
+
+
+def pin_attempt_expires_at(now: Optional[datetime] = None) -> Optional[datetime]:
+    if not PIN_ATTEMPTS_RETENTION_DAYS:
+        return None
+    return (now or datetime.now(timezone.utc)) + timedelta(days=PIN_ATTEMPTS_RETENTION_DAYS)
+
+
+async def create_retention_indexes(db):
+    await db.notifications.create_index(
+        [('expires_at', 1)], expireAfterSeconds=0, partialFilterExpression={'is_read': True}
+    )
+    await db.pin_attempts.create_index([('expires_at', 1)], expireAfterSeconds=0)
+    await db.pin_attempts.create_index([('created_at', 1)])
+    await db.audit_logs.create_index([('created_at', 1)])
+    archive = db[AUDIT_ARCHIVE_COLLECTION]
+    await archive.create_index([('month', 1), ('seq', 1)])
+    await archive.create_index([('transfer_ids', 1)])
+    await archive.create_index([('user_ids', 1)])
+    await archive.create_index([('actions', 1)])
+
+
+# ============ Legacy documents (without expires_at) ============
+
+async def sweep_expired(db, now: datetime) -> Dict[str, int]:
+    """حذف المستندات القديمة التي أُنشئت قبل expires_at - نفس السياسات أعلاه"""
+    deleted = {'notifications': 0, 'pin_attempts': 0}
+    legacy_read = {'expires_at': {'$exists': False}, 'is_read': True}
+
+    for notification_type, days in NOTIFICATION_TYPE_RETENTION_DAYS.items():
+        if days:
+            result = await db.notifications.delete_many({
+                **legacy_read, 'type': notification_type,
+                'created_at': {'$lt': (now - timedelta(days=days)).isoformat()}
+            })
+            deleted['notifications'] += result.deleted_count
+
+    for severity, days in NOTIFICATION_RETENTION_DAYS.items():
+        if days:
+            result = await db.notifications.delete_many({
+                **legacy_read, 'severity': severity,
+                'type': {'$nin': list(NOTIFICATION_TYPE_RETENTION_DAYS)},
+                'created_at': {'$lt': (now - timedelta(days=days)).isoformat()}
+            })
+            deleted['notifications'] += result.deleted_count
+
+    if PIN_ATTEMPTS_RETENTION_DAYS:
+        result = await db.pin_attempts.delete_many({
+            'expires_at': {'$exists': False},
+            'created_at': {'$lt': (now - timedelta(days=PIN_ATTEMPTS_RETENTION_DAYS)).isoformat()}
+        })
+        deleted['pin_attempts'] = result.deleted_count
+    return deleted
+
+
+# ============ Audit log archive ============
+
+def _month_start(month: str) -> str:
+    return f"{month}-01"
+
+
+def _next_month(month: str) -> str:
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+
+
+def hot_months_start(now: datetime, hot_months: int = AUDIT_HOT_MONTHS) -> str:
+    """أول شهر يبقى في audit_logs (YYYY-MM)"""
+    index = now.year * 12 + now.month - 1 - max(hot_months - 1, 0)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _compress(docs: List[dict]) -> bytes:
+    return gzip.compress(b''.join(encode_line(doc) for doc in docs))
+
+
+def _decompress(data: bytes) -> List[dict]:
+    return [decode_line(line) for line in gzip.decompress(data).splitlines() if line]
+
+
+async def _finish_chunk(db, chunk: dict):
+    """حذف سجلات الـ chunk من audit_logs ثم تعليمه كمكتمل (آمن للتكرار بعد انقطاع)"""
+    docs = await asyncio.to_thread(_decompress, chunk['data'])
+    ids = [doc['_id'] for doc in docs]
+    for start in range(0, len(ids), 1000):
+        await db.audit_logs.delete_many({'_id': {'$in': ids[start:start + 1000]}})
+    await db[AUDIT_ARCHIVE_COLLECTION].update_one({'_id': chunk['_id']}, {'$set': {'state': 'complete'}})
+
+
+async def recover_pending_chunks(db) -> int:
+    """chunks كُتبت ولم تُحذف سجلاتها من audit_logs (انقطاع أثناء الأرشفة)"""
+    pending = await db[AUDIT_ARCHIVE_COLLECTION].find({'state': 'pending'}).to_list(None)
+    for chunk in pending:
+        await _finish_chunk(db, chunk)
+    return len(pending)
+
+
+async def archive_audit_month(db, month: str, chunk_size: int = AUDIT_ARCHIVE_CHUNK) -> int:
+    """نقل سجلات الشهر (YYYY-MM) من audit_logs إلى audit_logs_archive"""
+    archive = db[AUDIT_ARCHIVE_COLLECTION]
+    query = {'created_at': {'$gte': _month_start(month), '$lt': _month_start(_next_month(month))}}
+    last = await archive.find_one({'month': month}, {'seq': 1}, sort=[('seq', -1)])
+    seq = last['seq'] + 1 if last else 0
+    archived = 0
+
+    while True:
+        docs = await db.audit_logs.find(query).sort([('created_at', 1), ('_id', 1)]).limit(chunk_size).to_list(chunk_size)
+        if not docs:
+            return archived
+        chunk = {
+            '_id': f"{month}:{seq:05d}",
+            'month': month,
+            'seq': seq,
+            'state': 'pending',
+            'count': len(docs),
+            'first_created_at': docs[0]['created_at'],
+            'last_created_at': docs[-1]['created_at'],
+            'transfer_ids': sorted({d['transfer_id'] for d in docs if d.get('transfer_id')}),
+            'user_ids': sorted({d['user_id'] for d in docs if d.get('user_id')}),
+            'actions': sorted({d['action'] for d in docs if d.get('action')}),
+            'compression': 'gzip',
+            'data': Binary(await asyncio.to_thread(_compress, docs)),
+            'archived_at': datetime.now(timezone.utc)
+        }
+        chunk['compressed_bytes'] = len(chunk['data'])
+        await archive.insert_one(chunk)
+        await _finish_chunk(db, chunk)
+        archived += len(docs)
+        seq += 1
+
+
+async def archive_audit_logs(db, now: datetime) -> Dict[str, int]:
+    """أرشفة كل الأشهر الأقدم من AUDIT_HOT_MONTHS (الأقدم أولاً)"""
+    if not AUDIT_HOT_MONTHS:
+        return {}
+    cutoff = _month_start(hot_months_start(now))
+    archived = {}
+    while True:
+        oldest = await db.audit_logs.find_one({'created_at': {'$lt': cutoff}}, {'created_at': 1}, sort=[('created_at', 1)])
+        if oldest is None:
+            return archived
+        month = oldest['created_at'][:7]
+        archived[month] = await archive_audit_month(db, month)
+
+
+async def search_audit_archive(
+    db,
+    transfer_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    action: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = 100
+) -> List[dict]:
+    """
+    البحث في الأرشيف (الأحدث أولاً): القوائم في كل chunk تستبعد ما لا يطابق بدون فك الضغط
+    start_date / end_date: YYYY-MM-DD أو ISO (end_date شامل لليوم كاملاً)
+    """
+    query = {'state': 'complete'}
+    if transfer_id:
+        query['transfer_ids'] = transfer_id
+    if user_id:
+        query['user_ids'] = user_id
+    if action:
+        query['actions'] = action
+    if start_date:
+        query['last_created_at'] = {'$gte': start_date}
+    if end_date:
+        end_date = end_date + 'T23:59:59.999999' if len(end_date) == 10 else end_date
+        query['first_created_at'] = {'$lte': end_date}
+
+    results = []
+    chunks = db[AUDIT_ARCHIVE_COLLECTION].find(query).sort([('month', -1), ('seq', -1)])
+    async for chunk in chunks:
+        docs = await asyncio.to_thread(_decompress, chunk['data'])
+        for doc in reversed(docs):
+            if transfer_id and doc.get('transfer_id') != transfer_id:
+                continue
+            if user_id and doc.get('user_id') != user_id:
+                continue
+            if action and doc.get('action') != action:
+                continue
+            if start_date and doc['created_at'] < start_date:
+                continue
+            if end_date and doc['created_at'] > end_date:
+                continue
+            doc.pop('_id', None)
+            results.append(doc)
+            if len(results) >= limit:
+                return results
+    return results
+
+
+async def archive_stats(db) -> List[dict]:
+    """عدد السجلات والحجم المضغوط لكل شهر في الأرشيف"""
+    return await db[AUDIT_ARCHIVE_COLLECTION].aggregate([
+        {'$group': {
+            '_id': '$month',
+            'chunks': {'$sum': 1},
+            'records': {'$sum': '$count'},
+            'compressed_bytes': {'$sum': '$compressed_bytes'}
+        }},
+        {'$sort': {'_id': -1}},
+        {'$project': {'_id': 0, 'month': '$_id', 'chunks': 1, 'records': 1, 'compressed_bytes': 1}}
+    ]).to_list(None)
+
+
+# ============ Run ============
+
+async def _acquire_lock(db, now: datetime) -> bool:
+    """عملية واحدة فقط تشغل الاحتفاظ في نفس الوقت (عدة workers)"""
+    try:
+        doc = await db[RETENTION_LOCK_COLLECTION].find_one_and_update(
+            {'_id': 'lock', 'locked_until': {'$lt': now}},
+            {'$set': {'locked_until': now + timedelta(minutes=RETENTION_LOCK_MINUTES), 'pid': os.getpid()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return False
+    return doc is not None
+
+
+async def _release_lock(db):
+    await db[RETENTION_LOCK_COLLECTION].update_one({'_id': 'lock'}, {'$set': {'locked_until': datetime.now(timezone.utc)}})
+
+
+async def run_retention(db) -> Optional[dict]:
+    """تشغيل كل السياسات مرة واحدة - None إذا كانت عملية أخرى تعمل"""
+    now = datetime.now(timezone.utc)
+    if not await _acquire_lock(db, now):
+        return None
+    try:
+        recovered = await recover_pending_chunks(db)
+        deleted = await sweep_expired(db, now)
+        archived = await archive_audit_logs(db, now)
+        stats = {
+            'started_at': now.isoformat(),
+            'deleted': deleted,
+            'archived_audit_logs': archived,
+            'recovered_chunks': recovered
+        }
+        await db[RETENTION_LOCK_COLLECTION].update_one({'_id': 'lock'}, {'$set': {'last_run': stats}})
+        logger.info(f"Retention run: deleted={deleted} archived={archived}")
+        return stats
+    finally:
+        await _release_lock(db)
+
@@ -0,0 +1,152 @@
+# In-process Scheduler
+# مهام دورية داخل العملية مع قفل في MongoDB حتى يعمل كل تشغيل في worker واحد فقط
+#
+# مستند لكل مهمة في scheduler_jobs: {_id: name, next_run_at, locked_until, owner, last_run}
+# - كل worker يفحص المهمة كل poll ثانية، والذي يحجز المستند (next_run_at و locked_until
+#   في الماضي) بـ find_one_and_update هو الذي يشغلها
+# - locked_until = مدة الحجز: إذا توقف الـ worker أثناء التشغيل يأخذها غيره بعد انتهائها
+# - next_run_at مشترك: إعادة تشغيل الخادم لا تعيد تشغيل المهمة قبل موعدها
+# - trigger(): تشغيل يدوي فوري بنفس القفل (يتجاهل next_run_at فقط) - لا يتداخل مع التشغيل الدوري
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+SCHEDULER_COLLECTION = 'scheduler_jobs'
+SCHEDULER_POLL_SECONDS = float(os.environ.get('SCHEDULER_POLL_SECONDS', 30))
+
+
+@dataclass
+class Job:
+    name: str
+    interval: float                    # ثوانٍ بين بداية تشغيلين
+    func: Callable[[], Awaitable]
+    lease: float                       # أقصى مدة متوقعة للتشغيل
+
+
+class JobLockedError(RuntimeError):
+    """المهمة قيد التشغيل في worker آخر (أو هذا)"""
+    pass
+
+
+class Scheduler:
+    def __init__(self, db, poll_seconds: float = SCHEDULER_POLL_SECONDS, collection: str = SCHEDULER_COLLECTION):
+        self.collection = db[collection]
+        self.poll_seconds = poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def add_job(self, name: str, interval_seconds: float, func: Callable[[], Awaitable],
+                lease_seconds: Optional[float] = None):
+        self.jobs[name] = Job(name, interval_seconds, func, lease_seconds or max(interval_seconds, 600))
+
+    async def start(self):
+        if self._tasks:
+            return
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _claim(self, job: Job, force: bool = False) -> bool:
+        """force: بدون انتظار next_run_at (تشغيل يدوي) - القفل locked_until يبقى شرطاً"""
+        now = datetime.now(timezone.utc)
+        # أول تشغيل للمهمة (أو مهمة جديدة)
+        await self.collection.update_one(
+            {'_id': job.name},
+            {'$setOnInsert': {'next_run_at': now, 'locked_until': now}},
+            upsert=True
+        )
+        query = {'_id': job.name, 'locked_until': {'$lte': now}}
+        if not force:
+            query['next_run_at'] = {'$lte': now}
+        doc = await self.collection.find_one_and_update(
+            query,
+            {'$set': {'locked_until': now + timedelta(seconds=job.lease), 'owner': self.owner}},
+            return_document=ReturnDocument.AFTER
+        )
+        return doc is not None
+
+    async def run_job(self, job: Job) -> bool:
+        """تشغيل المهمة إذا حان موعدها ولم يحجزها worker آخر"""
+        if not await self._claim(job):
+            return False
+        await self._execute(job)
+        return True
+
+    async def trigger(self, job: Job) -> Any:
+        """
+        تشغيل يدوي الآن بنفس القفل - يعيد نتيجة المهمة
+        JobLockedError إذا كانت قيد التشغيل، والموعد التالي يُحسب من هذا التشغيل
+        """
+        if not await self._claim(job, force=True):
+            raise JobLockedError(job.name)
+        result, error = await self._execute(job)
+        if error is not None:
+            raise RuntimeError(error)
+        return result
+
+    async def _execute(self, job: Job):
+        """تشغيل مهمة محجوزة وتسجيل last_run وفك القفل - يعيد (النتيجة، الخطأ)"""
+        started = time.monotonic()
+        error = None
+        try:
+            result = await job.func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e)
+            result = None
+            logger.error(f"Scheduled job {job.name} failed: {error}")
+        now = datetime.now(timezone.utc)
+        await self.collection.update_one(
+            {'_id': job.name, 'owner': self.owner},
+            {'$set': {
+                'next_run_at': now + timedelta(seconds=job.interval),
+                'locked_until': now,
+                'last_run': {
+                    'finished_at': now,
+                    'duration_ms': round((time.monotonic() - started) * 1000, 1),
+                    'owner': self.owner,
+                    'error': error,
+                    'result': result if isinstance(result, dict) else None
+                }
+            }}
+        )
+        return result, error
+
+    async def _loop(self, job: Job):
+        poll = min(self.poll_seconds, job.interval)
+        while True:
+            try:
+                await self.run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # القاعدة غير متاحة مؤقتاً
+                logger.warning(f"Scheduler {job.name}: {str(e)}")
+            await asyncio.sleep(poll)
+
+    async def status(self) -> List[dict]:
+        docs = await self.collection.find({'_id': {'$in': list(self.jobs)}}).to_list(None)
+        by_name = {doc.pop('_id'): doc for doc in docs}
+        return [
+            {'name': job.name, 'interval_seconds': job.interval, **by_name.get(job.name, {})}
+            for job in self.jobs.values()
+        ]
@@ -9,8 +9,14 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 import secrets
 import hashlib
+import logging
 import re
 
+from rate_limiter import RateLimitPolicy, get_rate_limiter
+from session_store import get_session_store
+
+security_logger = logging.getLogger('security')
+
 # ============ Rate Limiting ============
 # حماية من هجمات DDoS والطلبات الكثيرة
 
@@ -143,102 +149,52 @@ def validate_file_upload(filename: str, file_size: int) -> tuple[bool, str]:
 # ============ IP Blocking ============
 # حظر IP في حالة محاولات الاختراق
 
-blocked_ips = set()
-failed_attempts = {}  # {ip: [(timestamp, action), ...]}
+# 10 محاولات فاشلة خلال ساعة = حظر لمدة ساعة (rate_limiter.py - محدود الذاكرة ومشترك بين العمليات)
+FAILED_ATTEMPTS_LIMIT = RateLimitPolicy('failed_attempts', 10, 3600, 3600)
 
-def check_ip_blocked(ip: str) -> bool:
+async def check_ip_blocked(ip: str) -> bool:
     """التحقق من حظر IP"""
-    return ip in blocked_ips
+    result = await get_rate_limiter().peek(FAILED_ATTEMPTS_LIMIT, ip)
+    return not result.allowed
 
-def record_failed_attempt(ip: str, action: str = 'login'):
-    """تسجيل محاولة فاشلة"""
-    now = datetime.now(timezone.utc)
-    
-    if ip not in failed_attempts:
-        failed_attempts[ip] = []
-    
-    # إزالة المحاولات القديمة (أكثر من ساعة)
-    failed_attempts[ip] = [
-        (ts, act) for ts, act in failed_attempts[ip]
-        if (now - ts).total_seconds() < 3600
-    ]
-    
-    # إضافة المحاولة الجديدة
-    failed_attempts[ip].append((now, action))
-    
-    # حظر IP إذا تجاوز 10 محاولات فاشلة
-    if len(failed_attempts[ip]) >= 10:
-        blocked_ips.add(ip)
-        return True
-    
-    return False
+async def record_failed_attempt(ip: str, action: str = 'login'):
+    """تسجيل محاولة فاشلة - True إذا تم حظر IP"""
+    result = await get_rate_limiter().hit(FAILED_ATTEMPTS_LIMIT, ip)
+    return not result.allowed
 
-def clear_failed_attempts(ip: str):
+async def clear_failed_attempts(ip: str):
     """مسح المحاولات الفاشلة عند النجاح"""
-    if ip in failed_attempts:
-        failed_attempts[ip] = []
+    await get_rate_limiter().reset(FAILED_ATTEMPTS_LIMIT, ip)
 
 # ============ Session Security ============
 # إدارة الجلسات بشكل آمن
 
-active_sessions = {}  # {user_id: {session_id: {token, ip, created_at, last_active}}}
+# التخزين في session_store.py (داخل العملية أو MongoDB حسب SESSION_STORE)
+# session_store.MAX_SESSIONS_PER_USER: حد أقصى 3 جلسات لكل مستخدم افتراضياً
 
-MAX_SESSIONS_PER_USER = 3  # حد أقصى 3 جلسات لكل مستخدم
-
-def create_session(user_id: str, ip: str, token: str) -> str:
-    """إنشاء جلسة جديدة"""
+async def create_session(user_id: str, ip: str, token: str) -> str:
+    """إنشاء جلسة جديدة (تُحذف أقدم جلسة إذا تجاوز الحد)"""
     session_id = generate_secure_token()
-    
-    if user_id not in active_sessions:
-        active_sessions[user_id] = {}
-    
-    # حذف الجلسات القديمة إذا تجاوز الحد
-    if len(active_sessions[user_id]) >= MAX_SESSIONS_PER_USER:
-        # حذف أقدم جلسة
-        oldest_session = min(
-            active_sessions[user_id].items(),
-            key=lambda x: x[1]['last_active']
-        )[0]
-        del active_sessions[user_id][oldest_session]
-    
-    active_sessions[user_id][session_id] = {
-        'token': hash_token(token),
-        'ip': ip,
-        'created_at': datetime.now(timezone.utc),
-        'last_active': datetime.now(timezone.utc)
-    }
-    
+    await get_session_store().create(user_id, session_id, hash_token(token), ip)
     return session_id
 
-def validate_session(user_id: str, token: str, ip: str) -> bool:
-    """التحقق من صحة الجلسة"""
-    if user_id not in active_sessions:
-        return False
-    
-    token_hash = hash_token(token)
+async def validate_session(user_id: str, token: str, ip: str) -> bool:
+    """التحقق من صحة الجلسة وتحديث آخر نشاط"""
+    session = await get_session_store().validate(user_id, hash_token(token))
     
-    for session_id, session_data in active_sessions[user_id].items():
-        if session_data['token'] == token_hash:
-            # تحديث آخر نشاط
-            session_data['last_active'] = datetime.now(timezone.utc)
-            
-            # التحقق من IP (اختياري - يمكن تعطيله للأجهزة المتنقلة)
-            # if session_data['ip'] != ip:
-            #     return False
-            
-            return True
+    # التحقق من IP (اختياري - يمكن تعطيله للأجهزة المتنقلة)
+    # if session and session['ip'] != ip:
+    #     return False
     
-    return False
+    return session is not None
 
-def revoke_session(user_id: str, session_id: str):
+async def revoke_session(user_id: str, session_id: str):
     """إلغاء جلسة"""
-    if user_id in active_sessions and session_id in active_sessions[user_id]:
-        del active_sessions[user_id][session_id]
+    await get_session_store().revoke(user_id, session_id)
 
-def revoke_all_sessions(user_id: str):
+async def revoke_all_sessions(user_id: str):
     """إلغاء جميع جلسات المستخدم"""
-    if user_id in active_sessions:
-        active_sessions[user_id] = {}
+    await get_session_store().revoke_all(user_id)
 
 # ============ Audit Logging ============
 # تسجيل جميع العمليات الحساسة
@@ -268,7 +224,7 @@ def log_security_event(
     }
     
     # يمكن حفظها في قاعدة البيانات أو ملف log
-    print(f"[SECURITY] {event}")
+    security_logger.warning("[SECURITY] %s", event)
     return event
 
 # ============ Data Encryption ============
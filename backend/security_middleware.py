@@ -1,50 +1,124 @@
 # Security Middleware for FastAPI
 # Middleware لإضافة طبقات الأمان
+#
+# middleware واحد بصيغة ASGI مباشرة (بدون BaseHTTPMiddleware) يجمع كل الطبقات بالترتيب:
+# حظر IP → تسجيل الطلب → حد الطلبات → منع الحقن → فحص CORS → مهلة الطلب
+# ثم يضيف Security Headers و X-Process-Time و X-RateLimit-* عند بدء الاستجابة.
+# بدون مهام إضافية أو تغليف للـ stream لكل طبقة - الاستجابات المتدفقة تمر كما هي.
+#
+# الاستخدام:
+#     app.add_middleware(SecurityMiddleware, max_requests=100, window=60, timeout_seconds=30)
 
-from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.middleware.trustedhost import TrustedHostMiddleware
-from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
-from datetime import datetime, timezone
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from typing import List, Optional
+from urllib.parse import unquote_plus
+import asyncio
+import logging
+import math
 import time
 
 from security_config import (
     check_ip_blocked,
-    record_failed_attempt,
     log_security_event,
-    SECURITY_HEADERS,
-    sanitize_input
+    SECURITY_HEADERS
 )
+from rate_limiter import RateLimitPolicy, get_rate_limiter
+
+logger = logging.getLogger('security')
+
+# routes لا يُسجل رابطها كاملاً
+SENSITIVE_ROUTES = ('/login', '/register')
+
+DANGEROUS_PATTERNS = [
+    r'\$where',
+    r'\$function',
+    r'<script',
+    r'javascript:',
+    r'onerror=',
+    r'onload=',
+]
+
+_SECURITY_HEADERS_RAW = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in SECURITY_HEADERS.items()]
+# تُحذف من الاستجابة (Security Headers تُستبدل بالقيم أعلاه)
+_REMOVED_HEADERS = {b'server', b'x-powered-by'} | {name for name, _ in _SECURITY_HEADERS_RAW}
+
+
+class SecurityMiddleware:
+    """
+    Middleware شامل للأمان (ASGI)
+    - max_requests=None: تعطيل حد الطلبات / timeout_seconds=None: تعطيل المهلة
+    - allowed_origins: تسجيل الطلبات من origin غير مسموح (بدون رفض)
+    """
+
+    def __init__(
+        self,
+        app,
+        max_requests: Optional[int] = 100,
+        window: int = 60,
+        timeout_seconds: Optional[float] = 30,
+        allowed_origins: Optional[List[str]] = None,
+        log_requests: bool = True,
+        check_injection: bool = True
+    ):
+        self.app = app
+        self.policy = RateLimitPolicy('requests', max_requests, window) if max_requests else None
+        self.timeout_seconds = timeout_seconds
+        self.allowed_origins = set(allowed_origins) if allowed_origins else None
+        self.log_requests = log_requests
+        self.patterns = [p.lower() for p in DANGEROUS_PATTERNS] if check_injection else []
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get('client')
+        client_ip = client[0] if client else 'unknown'
+        start_time = time.time()
 
-class SecurityMiddleware(BaseHTTPMiddleware):
-    """Middleware شامل للأمان"""
-    
-    async def dispatch(self, request: Request, call_next):
-        # الحصول على IP
-        client_ip = request.client.host
-        
         # 1. التحقق من حظر IP
-        if check_ip_blocked(client_ip):
+        if await check_ip_blocked(client_ip):
             log_security_event(
                 action='blocked_ip_access',
                 user_id=None,
                 ip=client_ip,
                 status='blocked'
             )
-            return JSONResponse(
-                status_code=403,
-                content={"detail": "تم حظر الوصول من هذا IP"}
-            )
-        
-        # 2. تسجيل وقت البداية
-        start_time = time.time()
-        
-        # 3. معالجة الطلب
+            await JSONResponse(status_code=403, content={"detail": "تم حظر الوصول من هذا IP"})(scope, receive, send)
+            return
+
+        path = scope.get('path', '')
+        query = scope.get('query_string', b'').decode('latin-1')
+        target = f"{path}?{query}" if query else path
+        method = scope.get('method', '')
+        state = {'status': None, 'limit': None}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+                message['headers'] = [
+                    (k, v) for k, v in message.get('headers', []) if k.lower() not in _REMOVED_HEADERS
+                ]
+                # 2. إضافة Security Headers
+                message['headers'].extend(_SECURITY_HEADERS_RAW)
+                headers = MutableHeaders(scope=message)
+                headers['X-Process-Time'] = str(time.time() - start_time)
+                limit = state['limit']
+                if limit is not None and limit.allowed:
+                    headers['X-RateLimit-Limit'] = str(limit.limit)
+                    headers['X-RateLimit-Remaining'] = str(limit.remaining)
+                    headers['X-RateLimit-Reset'] = str(int(limit.reset_at))
+            await send(message)
+
+        # 3. تسجيل الطلب (بدون query للـ routes الحساسة)
+        log_target = path if any(route in path for route in SENSITIVE_ROUTES) else target
+        if self.log_requests:
+            logger.info("[REQUEST] %s %s from %s", method, log_target, client_ip)
+
         try:
-            response = await call_next(request)
+            await self._handle(scope, receive, send_wrapper, client_ip, target, state)
         except Exception as e:
-            # تسجيل الخطأ
             log_security_event(
                 action='request_error',
                 user_id=None,
@@ -53,180 +127,80 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                 details={'error': str(e)}
             )
             raise
-        
-        # 4. إضافة Security Headers
-        for header_name, header_value in SECURITY_HEADERS.items():
-            response.headers[header_name] = header_value
-        
-        # 5. تسجيل وقت الاستجابة
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        
-        # 6. إزالة headers غير آمنة
-        response.headers.pop("Server", None)
-        response.headers.pop("X-Powered-By", None)
-        
-        return response
-
-
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware لتسجيل جميع الطلبات"""
-    
-    async def dispatch(self, request: Request, call_next):
-        # تسجيل الطلب
-        client_ip = request.client.host
-        method = request.method
-        url = str(request.url)
-        
-        # عدم تسجيل routes الحساسة بالكامل
-        sensitive_routes = ['/login', '/register']
-        log_url = url if not any(route in url for route in sensitive_routes) else url.split('?')[0]
-        
-        print(f"[REQUEST] {method} {log_url} from {client_ip}")
-        
-        response = await call_next(request)
-        
-        # تسجيل الاستجابة
-        print(f"[RESPONSE] {method} {log_url} - Status: {response.status_code}")
-        
-        return response
-
-
-class InputSanitizationMiddleware(BaseHTTPMiddleware):
-    """Middleware لتنظيف المدخلات"""
-    
-    async def dispatch(self, request: Request, call_next):
-        # تنظيف query parameters
-        if request.query_params:
-            # لا يمكن تعديل query_params مباشرة، لكن يمكن التحقق منها
-            pass
-        
-        # معالجة الطلب
-        response = await call_next(request)
-        return response
-
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Middleware للحد من الطلبات"""
-    
-    def __init__(self, app, max_requests: int = 100, window: int = 60):
-        super().__init__(app)
-        self.max_requests = max_requests
-        self.window = window  # بالثواني
-        self.requests = {}  # {ip: [(timestamp), ...]}
-    
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        now = time.time()
-        
-        # تنظيف الطلبات القديمة
-        if client_ip in self.requests:
-            self.requests[client_ip] = [
-                ts for ts in self.requests[client_ip]
-                if now - ts < self.window
-            ]
-        else:
-            self.requests[client_ip] = []
-        
-        # التحقق من الحد
-        if len(self.requests[client_ip]) >= self.max_requests:
-            return JSONResponse(
-                status_code=429,
-                content={"detail": "تجاوزت الحد الأقصى للطلبات. يرجى المحاولة لاحقاً."}
-            )
-        
-        # إضافة الطلب الحالي
-        self.requests[client_ip].append(now)
-        
-        response = await call_next(request)
-        
-        # إضافة معلومات Rate Limit في الـ headers
-        response.headers["X-RateLimit-Limit"] = str(self.max_requests)
-        response.headers["X-RateLimit-Remaining"] = str(
-            self.max_requests - len(self.requests[client_ip])
-        )
-        response.headers["X-RateLimit-Reset"] = str(int(now + self.window))
-        
-        return response
-
-
-class SQLInjectionProtectionMiddleware(BaseHTTPMiddleware):
-    """Middleware للحماية من SQL/NoSQL Injection"""
-    
-    DANGEROUS_PATTERNS = [
-        r'\$where',
-        r'\$function',
-        r'<script',
-        r'javascript:',
-        r'onerror=',
-        r'onload=',
-    ]
-    
-    async def dispatch(self, request: Request, call_next):
-        # فحص URL
-        url_lower = str(request.url).lower()
-        
-        for pattern in self.DANGEROUS_PATTERNS:
-            if pattern.lower() in url_lower:
+        finally:
+            if self.log_requests:
+                logger.info("[RESPONSE] %s %s - Status: %s", method, log_target, state['status'])
+
+    async def _handle(self, scope, receive, send, client_ip: str, target: str, state: dict):
+        # 4. حد الطلبات
+        if self.policy is not None:
+            result = await get_rate_limiter().hit(self.policy, client_ip)
+            state['limit'] = result
+            if not result.allowed:
+                await JSONResponse(
+                    status_code=429,
+                    content={"detail": "تجاوزت الحد الأقصى للطلبات. يرجى المحاولة لاحقاً."},
+                    headers={"Retry-After": str(math.ceil(result.retry_after))}
+                )(scope, receive, send)
+                return
+
+        # 5. منع الحقن في الرابط (بعد فك الترميز %3C...)
+        target_lower = unquote_plus(target).lower()
+        for pattern in self.patterns:
+            if pattern in target_lower:
                 log_security_event(
                     action='injection_attempt',
                     user_id=None,
-                    ip=request.client.host,
+                    ip=client_ip,
                     status='blocked',
-                    details={'pattern': pattern, 'url': str(request.url)}
+                    details={'pattern': pattern, 'url': target}
                 )
-                return JSONResponse(
-                    status_code=400,
-                    content={"detail": "طلب غير صالح"}
+                await JSONResponse(status_code=400, content={"detail": "طلب غير صالح"})(scope, receive, send)
+                return
+
+        # 6. فحص Origin (تسجيل فقط)
+        if self.allowed_origins is not None:
+            origin = next((v.decode('latin-1') for k, v in scope.get('headers', []) if k == b'origin'), None)
+            if origin and origin not in self.allowed_origins:
+                log_security_event(
+                    action='cors_violation',
+                    user_id=None,
+                    ip=client_ip,
+                    status='warning',
+                    details={'origin': origin}
                 )
-        
-        response = await call_next(request)
-        return response
 
+        # 7. مهلة الطلب
+        if not self.timeout_seconds:
+            await self.app(scope, receive, send)
+            return
+        await self._call_with_timeout(scope, receive, send)
 
-class TimeoutMiddleware(BaseHTTPMiddleware):
-    """Middleware للحد من وقت الطلب"""
-    
-    def __init__(self, app, timeout_seconds: int = 30):
-        super().__init__(app)
-        self.timeout_seconds = timeout_seconds
-    
-    async def dispatch(self, request: Request, call_next):
-        import asyncio
-        
-        try:
-            response = await asyncio.wait_for(
-                call_next(request),
-                timeout=self.timeout_seconds
-            )
-            return response
-        except asyncio.TimeoutError:
-            return JSONResponse(
-                status_code=504,
-                content={"detail": "انتهت مهلة الطلب"}
-            )
+    async def _call_with_timeout(self, scope, receive, send):
+        """المهلة حتى بدء الاستجابة فقط - الاستجابات المتدفقة الطويلة لا تُقطع"""
+        started = asyncio.Event()
 
+        async def send_started(message):
+            if message['type'] == 'http.response.start':
+                started.set()
+            await send(message)
 
-class CORSSecurityMiddleware(BaseHTTPMiddleware):
-    """Middleware محكم لـ CORS"""
-    
-    def __init__(self, app, allowed_origins: list):
-        super().__init__(app)
-        self.allowed_origins = allowed_origins
-    
-    async def dispatch(self, request: Request, call_next):
-        origin = request.headers.get('origin')
-        
-        # التحقق من Origin
-        if origin and origin not in self.allowed_origins:
-            # يمكن رفض الطلب أو تسجيله
-            log_security_event(
-                action='cors_violation',
-                user_id=None,
-                ip=request.client.host,
-                status='warning',
-                details={'origin': origin}
-            )
-        
-        response = await call_next(request)
-        return response
+        task = asyncio.ensure_future(self.app(scope, receive, send_started))
+        waiter = asyncio.ensure_future(started.wait())
+        try:
+            await asyncio.wait({task, waiter}, timeout=self.timeout_seconds, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            waiter.cancel()
+
+        if not started.is_set() and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            await JSONResponse(status_code=504, content={"detail": "انتهت مهلة الطلب"})(scope, receive, send)
+            return
+        await task
@@ -1,7 +1,9 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from dotenv import load_dotenv
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
@@ -14,9 +16,7 @@ import bcrypt
 import jwt
 import random
 import cloudinary
-import cloudinary.uploader
 import socketio
-from collections import defaultdict
 import asyncio
 import base64
 from cryptography.fernet import Fernet
@@ -32,7 +32,42 @@ except ImportError:
     ImageContent = None
     print("⚠️ emergentintegrations غير متوفرة - ميزات AI معطلة")
 
-import httpx
+
+from report_cache import ReportCache, DOMAIN_JOURNAL, DOMAIN_COMMISSIONS, DOMAIN_EXCHANGE
+from report_export import stream_export, validate_export_format
+from governorates import GOVERNORATE_CODE_TO_NAME
+from user_cache import UserCache
+from log_queue import start_queue_logging, stop_queue_logging
+from rate_limiter import RateLimitPolicy, MongoBackend, configure_rate_limiter
+from session_store import MongoSessionStore, configure_session_store
+from notification_counters import UnreadCounters, ADMIN_INBOX
+from scheduler import Job, JobLockedError, Scheduler, SCHEDULER_ENABLED
+from id_image_uploads import IdImagePipeline, InvalidImageError
+from id_name_extraction import IdNameExtractor, NAME_FULL, NAME_THREE_PART
+from exchange_rates import ExchangeRateService, KINDS as EXCHANGE_RATE_KINDS, KIND_BUY_SELL, KIND_DAILY, day_start, parse_time
+from wallet import WalletService, InsufficientBalanceError, WalletNotFoundError
+from excel_import import ExcelImporter, ExcelImportError
+from name_matching import match_names, rank_names, EXACT_MATCH, NAME_MATCH_THRESHOLD, NAME_TOKEN_THRESHOLD
+from delayed_transfers import (
+    scan_delayed_transfers, count_delayed_transfers, DELAYED_TRANSFER_CHECK_MINUTES,
+    create_indexes as create_delayed_transfer_indexes
+)
+from retention import (
+    notification_expires_at, pin_attempt_expires_at, create_retention_indexes, run_retention,
+    search_audit_archive, archive_stats, RETENTION_INTERVAL_HOURS, RETENTION_LOCK_COLLECTION,
+    NOTIFICATION_RETENTION_DAYS, NOTIFICATION_TYPE_RETENTION_DAYS, PIN_ATTEMPTS_RETENTION_DAYS, AUDIT_HOT_MONTHS
+)
+from socket_manager import (
+    BoundedAsyncServer, create_client_manager, rooms_for_user, transfer_rooms, agent_room, gov_room, ADMIN_ROOM
+)
+from backup import (
+    stream_planned_backup, plan_backup, list_backup_collections, BACKUP_CHAIN_COLLECTION,
+    COMPRESSIONS as BACKUP_COMPRESSIONS, ZSTD_AVAILABLE
+)
+from transfer_rollups import (
+    apply_transfer_transition, create_rollup_indexes, merge_rebuilt_rollups, rebuild_transfer_rollups,
+    query_transfer_rollups, GROUP_BY_FIELDS
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -42,6 +77,19 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Report result cache (in-process LRU + optional persisted tier)
+report_cache = ReportCache(db)
+user_cache = UserCache(db)
+rate_limiter = configure_rate_limiter(db)
+session_store = configure_session_store(db)
+unread_counters = UnreadCounters(db)
+scheduler = Scheduler(db)
+id_image_pipeline = IdImagePipeline(db)
+id_name_extractor = IdNameExtractor(db)
+exchange_rate_service = ExchangeRateService(db)
+wallet_service = WalletService(db)
+excel_importer = ExcelImporter(db)
+
 # JWT Config
 JWT_SECRET = os.environ.get('JWT_SECRET', 'secret')
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
@@ -55,33 +103,15 @@ cipher = Fernet(ENCRYPTION_KEY)
 # Transit Account ID (constant)
 TRANSIT_ACCOUNT_ID = "transit_account_main"
 
-# Iraqi Governorate Code to Name Mapping
-GOVERNORATE_CODE_TO_NAME = {
-    'BG': 'بغداد',
-    'BS': 'البصرة',
-    'NJ': 'النجف',
-    'KR': 'كربلاء',
-    'BB': 'بابل',
-    'AN': 'الأنبار',
-    'DY': 'ديالى',
-    'WS': 'واسط',
-    'SA': 'صلاح الدين',
-    'NI': 'نينوى',
-    'DQ': 'ذي قار',
-    'QA': 'القادسية',
-    'MY': 'المثنى',
-    'MI': 'ميسان',
-    'KI': 'كركوك',
-    'ER': 'أربيل',
-    'SU': 'السليمانية',
-    'DH': 'دهوك'
-}
-
 # Security Config
 MAX_LOGIN_ATTEMPTS = int(os.environ.get('MAX_LOGIN_ATTEMPTS', 5))
 LOCKOUT_DURATION = int(os.environ.get('LOCKOUT_DURATION_MINUTES', 15))
 MAX_PIN_ATTEMPTS = int(os.environ.get('MAX_PIN_ATTEMPTS', 5))
 
+# Merge commissions from completed transfers (pre admin_commissions data) into /admin-commissions.
+# Can be turned off once POST /admin-commissions/backfill-legacy has been run.
+ADMIN_COMMISSIONS_LEGACY_UNION = os.environ.get('ADMIN_COMMISSIONS_LEGACY_UNION', 'true').lower() == 'true'
+
 # Cloudinary Config
 cloudinary.config(
     cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'),
@@ -90,12 +120,13 @@ cloudinary.config(
     secure=True
 )
 
-# Rate limiting storage
-login_attempts = defaultdict(lambda: {'count': 0, 'locked_until': None})
-pin_attempts_cache = defaultdict(lambda: {'count': 0, 'locked_until': None})
+# Rate limiting (rate_limiter.py) - الخلفية حسب RATE_LIMIT_BACKEND
+LOGIN_RATE_LIMIT = RateLimitPolicy('login', MAX_LOGIN_ATTEMPTS, LOCKOUT_DURATION * 60, LOCKOUT_DURATION * 60)
+PIN_RATE_LIMIT = RateLimitPolicy('pin', MAX_PIN_ATTEMPTS, LOCKOUT_DURATION * 60, LOCKOUT_DURATION * 60)
 
 # Socket.IO setup
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+# client_manager: توزيع الأحداث بين workers (socket_manager.py - SOCKETIO_MANAGER)
+sio = BoundedAsyncServer(async_mode='asgi', cors_allowed_origins='*', client_manager=create_client_manager(db))
 
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -138,7 +169,48 @@ async def create_database_indexes():
         await db.admin_commissions.create_index([("agent_id", 1), ("type", 1)])
         await db.admin_commissions.create_index([("transfer_id", 1)])
         await db.admin_commissions.create_index([("created_at", -1)])
-        
+
+        # Transfer OLAP rollups (analytics)
+        await create_rollup_indexes(db)
+        if not await db.transfer_rollups.find_one({}) and await db.transfers.find_one({}):
+            rows = await rebuild_transfer_rollups(db)
+            logger.info(f"Backfilled {rows} transfer rollup rows")
+        
+        # Report cache (persisted tier)
+        await report_cache.create_indexes()
+
+        # Incremental backups (chain + watermark fields on the busiest collections)
+        await db[BACKUP_CHAIN_COLLECTION].create_index([("created_at", -1)])
+        if isinstance(rate_limiter.backend, MongoBackend):
+            await rate_limiter.backend.create_indexes()
+        if isinstance(session_store, MongoSessionStore):
+            await session_store.create_indexes()
+        await db.transfers.create_index([("updated_at", 1)])
+        await db.journal_entries.create_index([("created_at", 1)])
+        await db.journal_entries.create_index([("updated_at", 1)])
+        await db.notifications.create_index([("created_at", 1)])
+        # cursor pagination (created_at, id) لصندوق المدير وللمستخدم
+        await db.notifications.create_index([("created_at", -1), ("id", -1)])
+        await db.notifications.create_index([("user_id", 1), ("created_at", -1), ("id", -1)])
+        await db.notifications.create_index([("user_id", 1), ("is_read", 1)])
+        
+        # Retention (TTL on notifications / pin_attempts, audit log archive)
+        await create_retention_indexes(db)
+        await create_delayed_transfer_indexes(db)
+        await id_image_pipeline.create_indexes()
+        await id_name_extractor.create_indexes()
+        await exchange_rate_service.create_indexes()
+        await excel_importer.create_indexes()
+
+        # Commission daily rollups (reports)
+        await db.commission_daily_rollups.create_index(
+            [("day", 1), ("agent_id", 1), ("currency", 1), ("type", 1)], unique=True
+        )
+        await db.commission_daily_rollups.create_index([("agent_id", 1), ("day", 1)])
+        if not await db.commission_daily_rollups.find_one({}) and await db.admin_commissions.find_one({}):
+            rows = await rebuild_commission_daily_rollups()
+            logger.info(f"Backfilled {rows} commission daily rollup rows")
+
         # Receipts indexes
         await db.receipts.create_index([("transfer_id", 1)])
         await db.receipts.create_index([("received_by", 1)])
@@ -148,6 +220,27 @@ async def create_database_indexes():
     except Exception as e:
         logger.error(f"Error creating indexes: {str(e)}")
 
+@app.on_event("startup")
+async def start_user_cache_invalidation():
+    """Cross-worker invalidation channel for the authenticated-user cache (optional)"""
+    await user_cache.start()
+
+@app.on_event("startup")
+async def start_scheduler():
+    """Periodic jobs (one worker per run, see scheduler.py). SCHEDULER_ENABLED=false disables them"""
+    if DELAYED_TRANSFER_CHECK_MINUTES > 0:
+        scheduler.add_job('delayed_transfers', DELAYED_TRANSFER_CHECK_MINUTES * 60, run_delayed_transfer_check)
+    if RETENTION_INTERVAL_HOURS > 0:
+        scheduler.add_job('retention', RETENTION_INTERVAL_HOURS * 3600, lambda: run_retention(db), lease_seconds=3600)
+    if SCHEDULER_ENABLED:
+        await scheduler.start()
+
+@app.on_event("startup")
+async def start_id_image_uploads():
+    """Background upload of ID images saved by the receive endpoints (id_image_uploads.py)"""
+    id_image_pipeline.on_uploaded = patch_uploaded_id_image
+    await id_image_pipeline.start()
+
 # ============ AI Monitoring Functions ============
 
 async def check_duplicate_transfers(sender_name: str, receiver_name: str, amount: float, currency: str) -> dict:
@@ -159,21 +252,28 @@ async def check_duplicate_transfers(sender_name: str, receiver_name: str, amount
     today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
     today_end = today_start + timedelta(days=1)
     
-    # Search for transfers with same sender/receiver name and amount today
+    # Same amount today, then same (or near-identical) sender/receiver name - name_matching.py
     query = {
         'created_at': {
             '$gte': today_start.isoformat(),
             '$lt': today_end.isoformat()
         },
         'amount': amount,
-        'currency': currency,
-        '$or': [
-            {'sender_name': sender_name},
-            {'receiver_name': receiver_name}
-        ]
+        'currency': currency
     }
     
-    duplicates = await db.transfers.find(query).to_list(length=None)
+    candidates = await db.transfers.find(query, {
+        '_id': 0, 'transfer_code': 1, 'sender_name': 1, 'receiver_name': 1, 'amount': 1, 'created_at': 1
+    }).to_list(length=None)
+    matched = {
+        index
+        for name, field in ((sender_name, 'sender_name'), (receiver_name, 'receiver_name'))
+        for index, _ in rank_names(
+            name, [t.get(field) or '' for t in candidates],
+            threshold=NAME_MATCH_THRESHOLD, token_threshold=NAME_TOKEN_THRESHOLD
+        )
+    }
+    duplicates = [candidates[index] for index in sorted(matched)]
     
     if len(duplicates) > 0:
         return {
@@ -193,60 +293,13 @@ async def check_duplicate_transfers(sender_name: str, receiver_name: str, amount
     
     return {'is_duplicate': False, 'count': 0, 'transfers': []}
 
-async def read_id_card_with_ai(image_url: str) -> dict:
+async def read_id_card_with_ai(image_url: str = None, image_data: bytes = None, mode: str = NAME_THREE_PART) -> dict:
     """
-    Use OpenAI Vision to read name from ID card image
-    Returns dict with extracted_name and confidence
+    Read the name from an ID card image (URL, or the image bytes directly)
+    mode: NAME_THREE_PART (receive) or NAME_FULL (3 or 4 part name, verify-id-name)
+    Returns dict with success and extracted_name (or error) - cached per image, see id_name_extraction.py
     """
-    # تحقق من توفر مكتبة AI
-    if not EMERGENT_AI_AVAILABLE:
-        return {
-            'success': False, 
-            'error': 'AI features not available - emergentintegrations not installed'
-        }
-    
-    try:
-        # Download image and convert to base64
-        async with httpx.AsyncClient() as client:
-            response = await client.get(image_url)
-            if response.status_code != 200:
-                return {'success': False, 'error': 'Failed to download image'}
-            
-            image_data = response.content
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-        
-        # Initialize LLM with Vision
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        if not api_key:
-            return {'success': False, 'error': 'No API key found'}
-        
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"id-card-{uuid.uuid4()}",
-            system_message="أنت خبير في قراءة الهويات العراقية. مهمتك استخراج الاسم الثلاثي الكامل بالعربي من صورة الهوية."
-        ).with_model("openai", "gpt-4o")
-        
-        # Create image content
-        image_content = ImageContent(image_base64=image_base64)
-        
-        # Ask AI to extract name
-        user_message = UserMessage(
-            text="اقرأ الاسم الثلاثي الكامل من هذه الهوية العراقية. أجب فقط بالاسم الثلاثي بدون أي نص إضافي. مثال: أحمد علي حسن",
-            file_contents=[image_content]
-        )
-        
-        response = await chat.send_message(user_message)
-        
-        extracted_name = response.strip()
-        
-        return {
-            'success': True,
-            'extracted_name': extracted_name
-        }
-        
-    except Exception as e:
-        logger.error(f"Error reading ID card with AI: {str(e)}")
-        return {'success': False, 'error': str(e)}
+    return await id_name_extractor.extract(image_data=image_data, image_url=image_url, mode=mode)
 
 async def create_ai_notification(admin_id: str, notification_type: str, title: str, message: str, related_transfer_id: str = None):
     """
@@ -263,12 +316,13 @@ async def create_ai_notification(admin_id: str, notification_type: str, title: s
         'severity': 'high'
     }
     
-    await db.notifications.insert_one(notification)
+    await db.notifications.insert_one({**notification, 'expires_at': notification_expires_at(notification)})
     
     # Emit socket event for real-time notification
     await sio.emit('new_notification', {
         'notification': notification
     }, room=f'admin_{admin_id}')
+    await push_unread_counts(await unread_counters.add(None, 1))
 
 # ============ Helper Functions ============
 
@@ -477,7 +531,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user = await db.users.find_one({'id': user_id}, {'_id': 0})
+        user = await user_cache.get(user_id)
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         
@@ -508,24 +562,205 @@ async def log_audit(transfer_id: Optional[str], user_id: Optional[str], action:
     }
     await db.audit_logs.insert_one(audit_doc)
 
-def check_rate_limit(identifier: str, storage: dict, max_attempts: int, lockout_minutes: int) -> bool:
-    """Check if identifier is rate limited"""
-    entry = storage[identifier]
-    
-    if entry['locked_until']:
-        if datetime.now(timezone.utc) < entry['locked_until']:
-            return False
-        else:
-            entry['count'] = 0
-            entry['locked_until'] = None
-    
-    entry['count'] += 1
-    
-    if entry['count'] >= max_attempts:
-        entry['locked_until'] = datetime.now(timezone.utc) + timedelta(minutes=lockout_minutes)
-        return False
-    
-    return True
+async def claim_transfer(transfer_id: str, update: dict, from_status: str = 'pending') -> Optional[dict]:
+    """
+    Atomically move a transfer out of from_status in one round trip (receive / cancel).
+    Returns the transfer as it was before the update, or None if another request already
+    moved it - only the caller that gets the document back may post wallets and entries.
+    """
+    before = await db.transfers.find_one_and_update(
+        {'id': transfer_id, 'status': from_status},
+        {'$set': update},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is not None:
+        await apply_transfer_transition(db, before, {**before, **update})
+    return before
+
+async def patch_uploaded_id_image(job: dict, url: str):
+    """Called by the ID image pipeline once the background upload succeeded"""
+    await db.transfers.update_one(
+        {'id': job['transfer_id'], 'id_image_upload_id': job['_id']},
+        {'$set': {'id_image_url': url}}
+    )
+    await db.receipts.update_many(
+        {'transfer_id': job['transfer_id'], 'id_image_upload_id': job['_id']},
+        {'$set': {'id_image_path': url}}
+    )
+    await log_audit(job['transfer_id'], None, 'id_image_uploaded', {'upload_id': job['_id'], 'id_image_url': url})
+
+async def record_admin_commission(commission_doc: dict):
+    """
+    Insert an admin commission and keep commission_daily_rollups in sync.
+    One rollup row per (day, agent_id, currency, type) so reports sum at most
+    one row per day instead of scanning every commission document.
+    """
+    await db.admin_commissions.insert_one(commission_doc)
+    commission_doc.pop('_id', None)
+
+    await db.commission_daily_rollups.update_one(
+        {
+            'day': commission_doc['created_at'][:10],
+            'agent_id': commission_doc.get('agent_id'),
+            'currency': commission_doc.get('currency', 'IQD'),
+            'type': commission_doc.get('type')
+        },
+        {
+            '$inc': {'amount': commission_doc.get('amount', 0), 'count': 1},
+            '$set': {
+                'agent_name': commission_doc.get('agent_name'),
+                'updated_at': datetime.now(timezone.utc).isoformat()
+            }
+        },
+        upsert=True
+    )
+    await report_cache.bump(DOMAIN_COMMISSIONS, commission_doc['created_at'])
+
+async def rebuild_commission_daily_rollups() -> int:
+    """
+    Rebuild commission_daily_rollups from admin_commissions (backfill).
+    Built into a scratch collection and copied key by key, so concurrent
+    record_admin_commission upserts are not wiped out by an $out swap.
+    """
+    rebuilt_at = datetime.now(timezone.utc).isoformat()
+    scratch = f'commission_daily_rollups_rebuild_{uuid.uuid4().hex[:8]}'
+    await db.admin_commissions.aggregate([
+        {'$group': {
+            '_id': {
+                'day': {'$substrBytes': ['$created_at', 0, 10]},
+                'agent_id': '$agent_id',
+                'currency': {'$ifNull': ['$currency', 'IQD']},
+                'type': '$type'
+            },
+            'amount': {'$sum': {'$ifNull': ['$amount', 0]}},
+            'count': {'$sum': 1},
+            'agent_name': {'$last': '$agent_name'}
+        }},
+        {'$project': {
+            '_id': 0,
+            'day': '$_id.day',
+            'agent_id': '$_id.agent_id',
+            'currency': '$_id.currency',
+            'type': '$_id.type',
+            'amount': 1,
+            'count': 1,
+            'agent_name': 1,
+            'updated_at': rebuilt_at
+        }},
+        # $out to a scratch collection; $merge would reject null agent_id keys
+        {'$out': scratch}
+    ]).to_list(length=None)
+    rows = await merge_rebuilt_rollups(db, scratch, 'commission_daily_rollups', ['day', 'agent_id', 'currency', 'type'], rebuilt_at)
+    await report_cache.bump(DOMAIN_COMMISSIONS, '1970-01-01')
+    return rows
+
+async def sum_commission_rollups(start_day: str, end_day: str, agent_id: Optional[str] = None, group_by_agent: bool = False) -> list:
+    """
+    Sum commission_daily_rollups for days in [start_day, end_day).
+    Returns rows of {agent_id?, currency, type, amount, count}.
+    """
+    match = {'day': {'$gte': start_day, '$lt': end_day}}
+    if agent_id:
+        match['agent_id'] = agent_id
+
+    group_id = {'currency': '$currency', 'type': '$type'}
+    if group_by_agent:
+        group_id['agent_id'] = '$agent_id'
+
+    rows = await db.commission_daily_rollups.aggregate([
+        {'$match': match},
+        {'$sort': {'day': 1}},
+        {'$group': {
+            '_id': group_id,
+            'amount': {'$sum': '$amount'},
+            'count': {'$sum': '$count'},
+            'agent_name': {'$last': '$agent_name'}
+        }}
+    ]).to_list(length=None)
+
+    return [{**row['_id'], 'amount': row['amount'], 'count': row['count'], 'agent_name': row.get('agent_name')} for row in rows]
+
+def get_report_date_range(report_type: str, date: str) -> tuple:
+    """Return (start, end) datetimes for a daily/monthly/yearly report, end exclusive"""
+    if report_type == "daily":
+        start_date = datetime.strptime(date, '%Y-%m-%d')
+        end_date = start_date + timedelta(days=1)
+    elif report_type == "monthly":
+        start_date = datetime.strptime(date[:7] + "-01", '%Y-%m-%d')
+        next_month = start_date.month + 1 if start_date.month < 12 else 1
+        next_year = start_date.year if start_date.month < 12 else start_date.year + 1
+        end_date = datetime(next_year, next_month, 1)
+    elif report_type == "yearly":
+        start_date = datetime.strptime(date[:4] + "-01-01", '%Y-%m-%d')
+        end_date = datetime(start_date.year + 1, 1, 1)
+    else:
+        raise HTTPException(status_code=400, detail="Invalid report_type")
+    return start_date, end_date
+
+async def check_rate_limit(identifier: str, policy: RateLimitPolicy) -> bool:
+    """Check if identifier is rate limited (counts this attempt)"""
+    result = await rate_limiter.hit(policy, identifier)
+    return result.allowed
+
+# ============ Export Columns (CSV / XLSX) ============
+
+TRANSFER_EXPORT_COLUMNS = [
+    ('transfer_code', 'رقم الحوالة'),
+    ('tracking_number', 'رقم التتبع'),
+    ('created_at', 'التاريخ'),
+    ('from_agent_name', 'الصراف المرسل'),
+    ('to_agent_name', 'الصراف المستلم'),
+    ('to_governorate', 'المحافظة'),
+    ('sender_name', 'المرسل'),
+    ('receiver_name', 'المستلم'),
+    ('amount', 'المبلغ'),
+    ('currency', 'العملة'),
+    ('commission', 'العمولة'),
+    ('incoming_commission', 'عمولة الاستلام'),
+    ('status', 'الحالة'),
+    ('note', 'ملاحظات')
+]
+
+STATEMENT_EXPORT_COLUMNS = TRANSFER_EXPORT_COLUMNS + [
+    ('is_reversal', 'قيد عكسي'),
+    ('cancelled_at', 'تاريخ الإلغاء')
+]
+
+LEDGER_EXPORT_COLUMNS = [
+    ('date', 'التاريخ'),
+    ('entry_number', 'رقم القيد'),
+    ('description', 'البيان'),
+    ('debit', 'مدين'),
+    ('credit', 'دائن'),
+    ('balance', 'الرصيد'),
+    ('currency', 'العملة')
+]
+
+TRIAL_BALANCE_EXPORT_COLUMNS = [
+    ('code', 'رمز الحساب'),
+    ('name_ar', 'اسم الحساب'),
+    ('category', 'التصنيف'),
+    ('debit', 'مدين'),
+    ('credit', 'دائن'),
+    ('balance', 'الرصيد')
+]
+
+COMMISSION_EXPORT_COLUMNS = [
+    ('created_at', 'التاريخ'),
+    ('type', 'النوع'),
+    ('transfer_code', 'رقم الحوالة'),
+    ('agent_name', 'الصراف'),
+    ('amount', 'العمولة'),
+    ('currency', 'العملة'),
+    ('commission_percentage', 'النسبة'),
+    ('note', 'ملاحظات')
+]
+
+def export_projection(columns: list) -> dict:
+    """Projection with only the exported fields"""
+    projection = {field: 1 for field, _ in columns}
+    projection['_id'] = 0
+    return projection
 
 # ============ Models ============
 
@@ -846,11 +1081,12 @@ class WalletTransaction(BaseModel):
     user_display_name: str
     amount: float
     currency: str
-    transaction_type: str  # 'deposit', 'transfer_sent', 'transfer_received'
+    transaction_type: str  # 'deposit', 'transfer_sent', 'transfer_received', 'transfer_cancelled', 'exchange_buy', ...
     reference_id: Optional[str] = None  # transfer_id for transfers
     added_by_admin_id: Optional[str] = None
     added_by_admin_name: Optional[str] = None
     note: Optional[str] = None
+    balance_after: Optional[float] = None  # رصيد المحفظة بعد العملية (wallet.py)
     created_at: str
 
 class WalletDeposit(BaseModel):
@@ -1073,6 +1309,7 @@ async def register_user(user_data: UserCreate, current_user: dict = Depends(requ
             }
         )
         logger.info(f"✅ Linked account {actual_account_code} to agent {user_data.display_name}")
+        await report_cache.bump(DOMAIN_JOURNAL, '1970-01-01')
     
     user_doc.pop('_id', None)
     user_doc.pop('password_hash', None)
@@ -1117,7 +1354,7 @@ async def login(credentials: LoginRequest, request: Request):
     client_ip = request.client.host
     
     # Check rate limit
-    if not check_rate_limit(client_ip, login_attempts, MAX_LOGIN_ATTEMPTS, LOCKOUT_DURATION):
+    if not await check_rate_limit(client_ip, LOGIN_RATE_LIMIT):
         raise HTTPException(status_code=429, detail="Too many login attempts. Try again later.")
     
     # Find user
@@ -1130,7 +1367,7 @@ async def login(credentials: LoginRequest, request: Request):
         raise HTTPException(status_code=403, detail="Account suspended")
     
     # Reset rate limit on successful login
-    login_attempts[client_ip] = {'count': 0, 'locked_until': None}
+    await rate_limiter.reset(LOGIN_RATE_LIMIT, client_ip)
     
     # Create token
     access_token = create_access_token({'sub': user['id'], 'role': user['role']})
@@ -1209,9 +1446,23 @@ async def get_user_by_id(user_id: str, current_user: dict = Depends(get_current_
     return user
 
 
+async def iter_statement_rows(agent_id: str, statement_filter: dict):
+    """Stream statement rows from the cursor, expanding cancelled sent transfers into reversals"""
+    cursor = db.transfers.find(
+        statement_filter, export_projection(STATEMENT_EXPORT_COLUMNS + [('from_agent_id', ''), ('to_agent_id', '')])
+    ).sort('created_at', -1)
+    async for transfer in cursor:
+        if transfer['status'] == 'completed':
+            yield transfer
+        elif transfer.get('from_agent_id') == agent_id:
+            transfer['is_reversal'] = True
+            transfer['note'] = f"قيد عكسي - حوالة ملغاة ({transfer.get('transfer_code')})"
+            yield transfer
+
 @api_router.get("/agents/{agent_id}/statement", response_model=AgentStatement)
-async def get_agent_statement(agent_id: str, current_user: dict = Depends(get_current_user)):
-    """Get agent statement (كشف حساب) with all transactions and totals"""
+async def get_agent_statement(agent_id: str, format: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Get agent statement (كشف حساب) with all transactions and totals (format=csv|xlsx to export)"""
+    export_format = validate_export_format(format)
     # Check permissions: admin or the agent themselves
     if current_user['role'] != 'admin' and current_user['id'] != agent_id:
         raise HTTPException(status_code=403, detail="غير مصرح لك بعرض هذا الكشف")
@@ -1223,13 +1474,21 @@ async def get_agent_statement(agent_id: str, current_user: dict = Depends(get_cu
     
     # Get all transfers for this agent (sent and received)
     # Get completed transfers AND cancelled transfers (for reversal entries)
-    transfers_cursor = db.transfers.find({
+    statement_filter = {
         '$or': [
             {'from_agent_id': agent_id},
             {'to_agent_id': agent_id}
         ],
         'status': {'$in': ['completed', 'cancelled']}  # Include cancelled for reversal entries
-    }, {'_id': 0, 'pin_hash': 0}).sort('created_at', -1)
+    }
+    
+    if export_format:
+        return stream_export(
+            iter_statement_rows(agent_id, statement_filter),
+            STATEMENT_EXPORT_COLUMNS, export_format, f"statement_{agent.get('display_name', agent_id)}"
+        )
+    
+    transfers_cursor = db.transfers.find(statement_filter, {'_id': 0, 'pin_hash': 0}).sort('created_at', -1)
     
     transfers_list = await transfers_cursor.to_list(10000)
     
@@ -1461,7 +1720,33 @@ async def create_transfer(transfer_data: TransferCreate, current_user: dict = De
         'updated_at': datetime.now(timezone.utc).isoformat()
     }
     
-    await db.transfers.insert_one(transfer_doc)
+    # Debit sender's wallet before the transfer exists (balance + wallet_limit must cover the amount;
+    # admin incoming transfers from an exchange company are not limited)
+    try:
+        await wallet_service.debit(
+            current_user['id'], transfer_data.currency, transfer_data.amount,
+            transaction={
+                'user_display_name': current_user['display_name'],
+                'transaction_type': 'transfer_sent',
+                'reference_id': transfer_id,
+                'note': f'حوالة مرسلة: {transfer_code}'
+            },
+            check_funds=not is_admin_incoming, use_limit=True
+        )
+    except InsufficientBalanceError as e:
+        raise HTTPException(status_code=400, detail=f"رصيد المحفظة غير كافٍ. الرصيد الحالي: {e.balance:,.2f} {e.currency}")
+    
+    try:
+        await db.transfers.insert_one(transfer_doc)
+    except Exception:
+        await wallet_service.credit(current_user['id'], transfer_data.currency, transfer_data.amount, transaction={
+            'user_display_name': current_user['display_name'],
+            'transaction_type': 'transfer_reverted',
+            'reference_id': transfer_id,
+            'note': f'إرجاع حوالة لم تُحفظ: {transfer_code}'
+        })
+        raise
+    await apply_transfer_transition(db, None, transfer_doc)
     await log_audit(transfer_id, current_user['id'], 'transfer_created', {'transfer_code': transfer_code})
     
     # ============ AI MONITORING - Check for duplicates ============
@@ -1496,16 +1781,9 @@ async def create_transfer(transfer_data: TransferCreate, current_user: dict = De
         logger.error(f"Error in duplicate detection: {str(e)}")
     # ============ END AI MONITORING ============
     
-    # Update sender's wallet (decrease balance)
-    wallet_field = f'wallet_balance_{transfer_data.currency.lower()}'
-    await db.users.update_one(
-        {'id': current_user['id']},
-        {'$inc': {wallet_field: -transfer_data.amount}}
-    )
-    
     # Record earned commission for admin (من الحوالة الصادرة)
     if commission > 0:
-        await db.admin_commissions.insert_one({
+        await record_admin_commission({
             'id': str(uuid.uuid4()),
             'type': 'earned',  # عمولة محققة
             'amount': commission,
@@ -1616,6 +1894,7 @@ async def create_transfer(transfer_data: TransferCreate, current_user: dict = De
             }
             
             await db.journal_entries.insert_one(journal_entry_transfer)
+            await report_cache.bump(DOMAIN_JOURNAL)
             
             # Update balances for transfer
             # Sender account increases (debit for assets - استلم نقدية من الزبون)
@@ -1688,6 +1967,7 @@ async def create_transfer(transfer_data: TransferCreate, current_user: dict = De
                 }
                 
                 await db.journal_entries.insert_one(journal_entry_commission)
+                await report_cache.bump(DOMAIN_JOURNAL)
                 
                 # Update balances for commission
                 # حساب الوكيل المُرسل (مدين - عمولة مدفوعة)
@@ -1708,19 +1988,6 @@ async def create_transfer(transfer_data: TransferCreate, current_user: dict = De
         logger.error(f"Error creating journal entry for transfer: {str(e)}")
     # ============ END ACCOUNTING ENTRY ============
     
-    # Log wallet transaction
-    await db.wallet_transactions.insert_one({
-        'id': str(uuid.uuid4()),
-        'user_id': current_user['id'],
-        'user_display_name': current_user['display_name'],
-        'amount': -transfer_data.amount,
-        'currency': transfer_data.currency,
-        'transaction_type': 'transfer_sent',
-        'reference_id': transfer_id,
-        'note': f'حوالة مرسلة: {transfer_code}',
-        'created_at': datetime.now(timezone.utc).isoformat()
-    })
-    
     # ============================================
     # AI Monitoring: Analyze transfer for suspicious activity
     # ============================================
@@ -1765,7 +2032,7 @@ async def create_transfer(transfer_data: TransferCreate, current_user: dict = De
         'to_agent_id': transfer_data.to_agent_id,
         'amount': transfer_data.amount,
         'sender_name': transfer_data.sender_name
-    }, room=f"gov_{transfer_data.to_governorate}")
+    }, to=transfer_rooms(transfer_data.model_dump()))
     
     # Create notification for specific agent or all agents in governorate
     if transfer_data.to_agent_id:
@@ -1813,9 +2080,11 @@ async def get_transfers(
     agent_id: Optional[str] = None,
     page: int = 1,
     limit: int = 50,
+    format: Optional[str] = None,  # csv / xlsx: export every matching transfer
     current_user: dict = Depends(get_current_user)
 ):
     """Get transfers list with filters and pagination"""
+    export_format = validate_export_format(format)
     query = {}
     
     if status:
@@ -1870,6 +2139,10 @@ async def get_transfers(
             {'is_admin_incoming': True, 'to_governorate': current_user.get('governorate')}  # حوالات واردة من المدير
         ]
     
+    if export_format:
+        cursor = db.transfers.find(query, export_projection(TRANSFER_EXPORT_COLUMNS)).sort('created_at', -1)
+        return stream_export(cursor, TRANSFER_EXPORT_COLUMNS, export_format, 'transfers')
+    
     # Calculate skip for pagination
     skip = (page - 1) * limit
     
@@ -1991,16 +2264,16 @@ async def cancel_transfer(transfer_id: str, current_user: dict = Depends(get_cur
         raise HTTPException(status_code=400, detail="لا يمكن إلغاء حوالة مكتملة")
     
     # Update status to cancelled
-    await db.transfers.update_one(
-        {'id': transfer_id},
-        {'$set': {
-            'status': 'cancelled',
-            'cancelled_at': datetime.now(timezone.utc).isoformat(),
-            'cancelled_by': current_user['id'],
-            'cancelled_by_name': current_user['display_name'],
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        }}
-    )
+    cancel_update = {
+        'status': 'cancelled',
+        'cancelled_at': datetime.now(timezone.utc).isoformat(),
+        'cancelled_by': current_user['id'],
+        'cancelled_by_name': current_user['display_name'],
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }
+    transfer = await claim_transfer(transfer_id, cancel_update)
+    if transfer is None:
+        raise HTTPException(status_code=400, detail="لا يمكن إلغاء حوالة مكتملة")
     
     # Subtract amount from transit account (return from transit)
     await update_transit_balance(
@@ -2012,23 +2285,11 @@ async def cancel_transfer(transfer_id: str, current_user: dict = Depends(get_cur
     )
     
     # Return money to sender's wallet (المبلغ فقط بدون العمولة)
-    wallet_field = f'wallet_balance_{transfer["currency"].lower()}'
-    await db.users.update_one(
-        {'id': current_user['id']},
-        {'$inc': {wallet_field: transfer['amount']}}
-    )
-    
-    # Log wallet transaction
-    await db.wallet_transactions.insert_one({
-        'id': str(uuid.uuid4()),
-        'user_id': current_user['id'],
+    await wallet_service.credit(current_user['id'], transfer['currency'], transfer['amount'], transaction={
         'user_display_name': current_user['display_name'],
-        'amount': transfer['amount'],
-        'currency': transfer['currency'],
         'transaction_type': 'transfer_cancelled',
         'reference_id': transfer_id,
-        'note': f'إلغاء حوالة: {transfer["transfer_code"]}',
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'note': f'إلغاء حوالة: {transfer["transfer_code"]}'
     })
     
     await log_audit(transfer_id, current_user['id'], 'transfer_cancelled', {})
@@ -2078,6 +2339,7 @@ async def cancel_transfer(transfer_id: str, current_user: dict = Depends(get_cur
             }
             
             await db.journal_entries.insert_one(journal_entry)
+            await report_cache.bump(DOMAIN_JOURNAL)
             
             # Update account balances
             # Transit account increases (debit for assets)
@@ -2119,46 +2381,9 @@ async def update_transfer(
     if transfer['status'] != 'pending':
         raise HTTPException(status_code=400, detail="لا يمكن تعديل حوالة مكتملة")
     
-    # Store old values for audit
-    old_values = {
-        'sender_name': transfer.get('sender_name'),
-        'receiver_name': transfer.get('receiver_name'),
-        'amount': transfer.get('amount'),
-        'note': transfer.get('note')
-    }
-    
-    # Handle amount change (need to update wallet and transit)
+    amount_diff = 0
     if update_data.amount is not None and update_data.amount != transfer['amount']:
         amount_diff = update_data.amount - transfer['amount']
-        wallet_field = f'wallet_balance_{transfer["currency"].lower()}'
-        
-        # Decrease or increase wallet balance
-        await db.users.update_one(
-            {'id': current_user['id']},
-            {'$inc': {wallet_field: -amount_diff}}
-        )
-        
-        # Update transit account accordingly
-        if amount_diff > 0:
-            # Amount increased - add difference to transit
-            await update_transit_balance(
-                amount=amount_diff,
-                currency=transfer['currency'],
-                operation='add',
-                reference_id=transfer_id,
-                note=f'زيادة مبلغ حوالة {transfer["transfer_code"]} - فرق: {amount_diff}'
-            )
-        else:
-            # Amount decreased - subtract difference from transit
-            await update_transit_balance(
-                amount=abs(amount_diff),
-                currency=transfer['currency'],
-                operation='subtract',
-                reference_id=transfer_id,
-                note=f'تقليل مبلغ حوالة {transfer["transfer_code"]} - فرق: {abs(amount_diff)}'
-            )
-        
-        # Recalculate commission
         commission = (update_data.amount * 0.13) / 100
     else:
         commission = transfer.get('commission')
@@ -2180,11 +2405,70 @@ async def update_transfer(
     if update_data.note is not None:
         update_doc['note'] = update_data.note
     
-    # Update transfer
-    await db.transfers.update_one(
-        {'id': transfer_id},
-        {'$set': update_doc}
+    # Decrease or increase wallet balance (an increase must be covered by the wallet)
+    if amount_diff:
+        try:
+            await wallet_service.apply(
+                current_user['id'], {transfer['currency']: -amount_diff},
+                transaction={
+                    'user_display_name': current_user['display_name'],
+                    'transaction_type': 'transfer_amended',
+                    'reference_id': transfer_id,
+                    'note': f'تعديل مبلغ حوالة: {transfer["transfer_code"]}'
+                },
+                check_funds=True, use_limit=True
+            )
+        except InsufficientBalanceError as e:
+            raise HTTPException(status_code=400, detail=f"رصيد المحفظة غير كافٍ. الرصيد الحالي: {e.balance:,.2f} {e.currency}")
+    
+    # Update transfer only if it is still pending with the amount the diff was based on
+    # (a concurrent receive/cancel/edit wins - undo the wallet move and report the conflict)
+    before = await db.transfers.find_one_and_update(
+        {'id': transfer_id, 'status': 'pending', 'amount': transfer['amount']},
+        {'$set': update_doc},
+        return_document=ReturnDocument.BEFORE
     )
+    if before is None:
+        if amount_diff:
+            await wallet_service.apply(
+                current_user['id'], {transfer['currency']: amount_diff},
+                transaction={
+                    'user_display_name': current_user['display_name'],
+                    'transaction_type': 'transfer_reverted',
+                    'reference_id': transfer_id,
+                    'note': f'إلغاء تعديل مبلغ حوالة: {transfer["transfer_code"]}'
+                }
+            )
+        raise HTTPException(status_code=409, detail="تم تعديل الحوالة أو معالجتها من طلب آخر، أعد المحاولة")
+    await apply_transfer_transition(db, before, {**before, **update_doc})
+    
+    # Store old values for audit
+    old_values = {
+        'sender_name': before.get('sender_name'),
+        'receiver_name': before.get('receiver_name'),
+        'amount': before.get('amount'),
+        'note': before.get('note')
+    }
+    
+    # Update transit account accordingly
+    if amount_diff > 0:
+        # Amount increased - add difference to transit
+        await update_transit_balance(
+            amount=amount_diff,
+            currency=transfer['currency'],
+            operation='add',
+            reference_id=transfer_id,
+            note=f'زيادة مبلغ حوالة {transfer["transfer_code"]} - فرق: {amount_diff}'
+        )
+    elif amount_diff < 0:
+        # Amount decreased - subtract difference from transit
+        await update_transit_balance(
+            amount=abs(amount_diff),
+            currency=transfer['currency'],
+            operation='subtract',
+            reference_id=transfer_id,
+            note=f'تقليل مبلغ حوالة {transfer["transfer_code"]} - فرق: {abs(amount_diff)}'
+        )
     
     await log_audit(transfer_id, current_user['id'], 'transfer_updated', {
         'old_values': old_values,
@@ -2259,8 +2543,7 @@ async def verify_id_name(
     current_user: dict = Depends(get_current_user)
 ):
     """Extract name from ID image and compare with receiver name using AI"""
-    # تحقق من توفر مكتبة AI
-    if not EMERGENT_AI_AVAILABLE:
+    if not id_name_extractor.available:
         # إرجاع تطابق جزئي كـ fallback
         return {
             "extracted_name": receiver_name,
@@ -2269,99 +2552,33 @@ async def verify_id_name(
             "message": "ميزة AI غير متوفرة - يرجى التحقق يدوياً"
         }
     
+    # نفس تجهيز صورة الاستلام (الكاش حسب محتوى الصورة المجهزة)
     try:
-        # Read image
-        contents = await id_image.read()
-        
-        # Convert to base64
-        import base64
-        image_base64 = base64.b64encode(contents).decode('utf-8')
-        
-        # Use AI to extract name from ID
-        try:
-            from emergentintegrations import EasyAI
-            ai = EasyAI()
-        except ImportError:
-            return {
-                "extracted_name": receiver_name,
-                "receiver_name": receiver_name,
-                "match_status": "partial_match",
-                "message": "ميزة AI غير متوفرة - يرجى التحقق يدوياً"
-            }
-        
-        prompt = f"""
-أنت خبير في استخراج البيانات من بطاقات الهوية العراقية.
-يرجى استخراج الاسم الكامل من هذه الصورة.
-أعد الاسم فقط بدون أي كلام إضافي.
-إذا كان الاسم ثلاثي، أعده كما هو.
-إذا كان الاسم رباعي، أعده كاملاً.
-"""
-        
-        response = ai.messages(
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{image_base64}"
-                        }
-                    }
-                ]
-            }]
-        ).with_model("openai", "gpt-4o").run()
-        
-        extracted_name = response.get("content", "").strip()
-        
-        # Compare names
-        def normalize_name(name):
-            """Normalize name for comparison"""
-            return name.strip().replace('  ', ' ').lower()
-        
-        extracted_normalized = normalize_name(extracted_name)
-        receiver_normalized = normalize_name(receiver_name)
-        
-        # Split names into parts
-        extracted_parts = extracted_normalized.split()
-        receiver_parts = receiver_normalized.split()
-        
-        # Determine match status
-        if extracted_normalized == receiver_normalized:
-            match_status = "exact_match"
-        elif len(extracted_parts) == 3 and len(receiver_parts) == 4:
-            # Extracted is 3 names, receiver is 4 names
-            # Check if first 3 parts match
-            if extracted_parts == receiver_parts[:3]:
-                match_status = "partial_match"
-            else:
-                match_status = "no_match"
-        elif len(extracted_parts) == 3 and len(receiver_parts) == 3:
-            # Both are 3 names - should match exactly
-            if extracted_parts == receiver_parts:
-                match_status = "exact_match"
-            else:
-                match_status = "no_match"
-        elif all(part in receiver_parts for part in extracted_parts[:2]):
-            # At least first 2 names match
-            match_status = "partial_match"
-        else:
-            match_status = "no_match"
-        
-        return {
-            "extracted_name": extracted_name,
-            "receiver_name": receiver_name,
-            "match_status": match_status,
-            "message": {
-                "exact_match": "الاسم مطابق بشكل كامل",
-                "partial_match": "الاسم مطابق جزئياً - يرجى التحقق",
-                "no_match": "الاسم غير مطابق"
-            }[match_status]
-        }
-        
-    except Exception as e:
-        logging.error(f"Error verifying ID name: {e}")
-        raise HTTPException(status_code=500, detail=f"خطأ في التحقق من الاسم: {str(e)}")
+        image_data = await id_image_pipeline.prepare(await id_image.read())
+    except InvalidImageError:
+        raise HTTPException(status_code=400, detail="صورة الهوية غير صالحة")
+    
+    # الاسم الكامل (ثلاثي أو رباعي) كما يظهر في الهوية
+    ai_result = await read_id_card_with_ai(image_data=image_data, mode=NAME_FULL)
+    if not ai_result['success']:
+        raise HTTPException(status_code=500, detail=f"خطأ في التحقق من الاسم: {ai_result['error']}")
+    
+    extracted_name = ai_result['extracted_name']
+    
+    # Compare names (normalised Arabic, token-level Jaro-Winkler - name_matching.py)
+    match_status, similarity = match_names(extracted_name, receiver_name)
+    
+    return {
+        "extracted_name": extracted_name,
+        "receiver_name": receiver_name,
+        "match_status": match_status,
+        "similarity": round(similarity, 3),
+        "message": {
+            "exact_match": "الاسم مطابق بشكل كامل",
+            "partial_match": "الاسم مطابق جزئياً - يرجى التحقق",
+            "no_match": "الاسم غير مطابق"
+        }[match_status]
+    }
 
 @api_router.post("/transfers/{transfer_id}/receive-with-id")
 async def receive_transfer_with_id(
@@ -2399,20 +2616,13 @@ async def receive_transfer_with_id(
     if not verify_pin(pin, transfer['pin_hash']):
         raise HTTPException(status_code=401, detail="الرقم السري غير صحيح")
     
-    # Upload ID image to Cloudinary
-    id_image_url = None
+    # Save ID image locally - uploaded in the background, id_image_url is patched in when done
+    id_image_upload_id = None
     try:
-        contents = await id_image.read()
-        upload_result = cloudinary.uploader.upload(
-            contents,
-            folder="money_transfer/id_images",
-            resource_type="image",
-            format="jpg"
-        )
-        id_image_url = upload_result['secure_url']
+        id_image_upload_id, _ = await id_image_pipeline.save(await id_image.read(), transfer_id)
     except Exception as e:
-        logging.error(f"Cloudinary upload error: {e}")
-        # Continue even if upload fails - we already verified the name
+        logging.error(f"ID image save error: {e}")
+        # Continue even if the image is unusable - we already verified the name
     
     # Determine actual receiving agent
     receiving_agent_id = current_user.get('agent_id') if current_user['role'] == 'user' else current_user['id']
@@ -2448,21 +2658,25 @@ async def receive_transfer_with_id(
                 break
     
     # Update transfer status
-    await db.transfers.update_one(
-        {'id': transfer_id},
-        {'$set': {
-            'status': 'completed',
-            'to_agent_id': receiving_agent_id,
-            'to_agent_name': receiving_agent_name,
-            'incoming_commission': incoming_commission,
-            'incoming_commission_percentage': incoming_commission_percentage,
-            'receiver_phone': receiver_phone,
-            'received_at': datetime.now(timezone.utc).isoformat(),
-            'updated_at': datetime.now(timezone.utc).isoformat(),
-            'id_image_url': id_image_url,
-            'name_verification': verification_data
-        }}
-    )
+    receive_update = {
+        'status': 'completed',
+        'to_agent_id': receiving_agent_id,
+        'to_agent_name': receiving_agent_name,
+        'incoming_commission': incoming_commission,
+        'incoming_commission_percentage': incoming_commission_percentage,
+        'receiver_phone': receiver_phone,
+        'received_at': datetime.now(timezone.utc).isoformat(),
+        'updated_at': datetime.now(timezone.utc).isoformat(),
+        'id_image_url': None,
+        'id_image_upload_id': id_image_upload_id,
+        'name_verification': verification_data
+    }
+    transfer = await claim_transfer(transfer_id, receive_update)
+    if transfer is None:
+        await id_image_pipeline.discard(id_image_upload_id)
+        raise HTTPException(status_code=400, detail="Transfer already processed")
+    # The transfer now carries id_image_upload_id - let the background upload patch it
+    await id_image_pipeline.release(id_image_upload_id)
     
     # Subtract amount from transit account
     await update_transit_balance(
@@ -2473,25 +2687,13 @@ async def receive_transfer_with_id(
         note=f'حوالة مُسلَّمة إلى {receiving_agent_name} - {transfer.get("transfer_code", transfer.get("tracking_number"))}'
     )
     
-    # Update receiver's wallet
-    wallet_field = f'wallet_balance_{transfer["currency"].lower()}'
+    # Update receiver's wallet (amount + incoming commission)
     total_amount_to_add = transfer['amount'] + incoming_commission
-    await db.users.update_one(
-        {'id': receiving_agent_id},
-        {'$inc': {wallet_field: total_amount_to_add}}
-    )
-    
-    # Log wallet transaction
-    await db.wallet_transactions.insert_one({
-        'id': str(uuid.uuid4()),
-        'user_id': receiving_agent_id,
+    await wallet_service.credit(receiving_agent_id, transfer['currency'], total_amount_to_add, transaction={
         'user_display_name': receiving_agent_name,
-        'amount': transfer['amount'],
-        'currency': transfer['currency'],
         'transaction_type': 'transfer_received',
         'reference_id': transfer_id,
-        'note': f'حوالة مستلمة: {transfer.get("transfer_code", transfer.get("tracking_number"))}',
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'note': f'حوالة مستلمة: {transfer.get("transfer_code", transfer.get("tracking_number"))}'
     })
     
     # Create journal entries for incoming commission
@@ -2536,6 +2738,7 @@ async def receive_transfer_with_id(
         
         if journal_entries:
             await db.journal_entries.insert_many(journal_entries)
+            await report_cache.bump(DOMAIN_JOURNAL)
     
     return {
         'success': True,
@@ -2610,18 +2813,18 @@ async def receive_transfer_simple(
                 break
     
     # Update transfer status
-    await db.transfers.update_one(
-        {'id': transfer_id},
-        {'$set': {
-            'status': 'completed',
-            'to_agent_id': receiving_agent_id,
-            'to_agent_name': receiving_agent_name,
-            'incoming_commission': incoming_commission,
-            'incoming_commission_percentage': incoming_commission_percentage,
-            'received_at': datetime.now(timezone.utc).isoformat(),
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        }}
-    )
+    receive_update = {
+        'status': 'completed',
+        'to_agent_id': receiving_agent_id,
+        'to_agent_name': receiving_agent_name,
+        'incoming_commission': incoming_commission,
+        'incoming_commission_percentage': incoming_commission_percentage,
+        'received_at': datetime.now(timezone.utc).isoformat(),
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }
+    transfer = await claim_transfer(transfer_id, receive_update)
+    if transfer is None:
+        raise HTTPException(status_code=400, detail="Transfer already processed")
     
     # Subtract amount from transit account
     await update_transit_balance(
@@ -2632,25 +2835,13 @@ async def receive_transfer_simple(
         note=f'حوالة مُسلَّمة إلى {receiving_agent_name} - {transfer.get("transfer_code", transfer.get("tracking_number"))}'
     )
     
-    # Update receiver's wallet
-    wallet_field = f'wallet_balance_{transfer["currency"].lower()}'
+    # Update receiver's wallet (amount + incoming commission)
     total_amount_to_add = transfer['amount'] + incoming_commission
-    await db.users.update_one(
-        {'id': receiving_agent_id},
-        {'$inc': {wallet_field: total_amount_to_add}}
-    )
-    
-    # Log wallet transaction
-    await db.wallet_transactions.insert_one({
-        'id': str(uuid.uuid4()),
-        'user_id': receiving_agent_id,
+    await wallet_service.credit(receiving_agent_id, transfer['currency'], total_amount_to_add, transaction={
         'user_display_name': receiving_agent_name,
-        'amount': transfer['amount'],
-        'currency': transfer['currency'],
         'transaction_type': 'transfer_received',
         'reference_id': transfer_id,
-        'note': f'حوالة مستلمة: {transfer.get("transfer_code", transfer.get("tracking_number"))}',
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'note': f'حوالة مستلمة: {transfer.get("transfer_code", transfer.get("tracking_number"))}'
     })
     
     # Create journal entries for incoming commission
@@ -2695,6 +2886,7 @@ async def receive_transfer_simple(
         
         if journal_entries:
             await db.journal_entries.insert_many(journal_entries)
+            await report_cache.bump(DOMAIN_JOURNAL)
     
     return {
         'success': True,
@@ -2729,7 +2921,7 @@ async def receive_transfer(
     
     # Check rate limit for PIN attempts
     rate_limit_key = f"{transfer_id}_{current_user['id']}"
-    if not check_rate_limit(rate_limit_key, pin_attempts_cache, MAX_PIN_ATTEMPTS, LOCKOUT_DURATION):
+    if not await check_rate_limit(rate_limit_key, PIN_RATE_LIMIT):
         raise HTTPException(status_code=429, detail="Too many PIN attempts. Try again later.")
     
     # Verify receiver full name
@@ -2751,7 +2943,8 @@ async def receive_transfer(
                 'attempt_ip': request.client.host if request else None,
                 'success': False,
                 'failure_reason': 'incorrect_name',
-                'created_at': datetime.now(timezone.utc).isoformat()
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'expires_at': pin_attempt_expires_at()
             })
             await log_audit(transfer_id, current_user['id'], 'name_failed', {
                 'ip': request.client.host if request else None,
@@ -2769,37 +2962,33 @@ async def receive_transfer(
             'attempt_ip': request.client.host if request else None,
             'success': False,
             'failure_reason': 'incorrect_pin',
-            'created_at': datetime.now(timezone.utc).isoformat()
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'expires_at': pin_attempt_expires_at()
         })
         await log_audit(transfer_id, current_user['id'], 'pin_failed', {'ip': request.client.host if request else None})
         raise HTTPException(status_code=401, detail="الرقم السري غير صحيح")
     
-    # Upload ID image to Cloudinary
+    # Save ID image locally - uploaded in the background, id_image_path is patched in when done
     try:
-        contents = await id_image.read()
-        upload_result = cloudinary.uploader.upload(
-            contents,
-            folder="money_transfer/id_images",
-            resource_type="image",
-            format="jpg"
-        )
-        id_image_url = upload_result['secure_url']
+        id_image_upload_id, id_image_data = await id_image_pipeline.save(await id_image.read(), transfer_id)
+    except InvalidImageError:
+        raise HTTPException(status_code=400, detail="صورة الهوية غير صالحة")
     except Exception as e:
-        logging.error(f"Cloudinary upload error: {e}")
-        raise HTTPException(status_code=500, detail="Failed to upload ID image")
+        logging.error(f"ID image save error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to save ID image")
     
     # ============ AI MONITORING ============
     
     # 1. Read ID card with AI and check if name matches
     try:
-        ai_result = await read_id_card_with_ai(id_image_url)
+        ai_result = await read_id_card_with_ai(image_data=id_image_data)
         
         if ai_result.get('success'):
             extracted_name = ai_result.get('extracted_name', '').strip()
             input_name = receiver_fullname.strip()
             
-            # Compare names (exact match)
-            if extracted_name != input_name:
+            # Compare names (after Arabic normalisation - diacritics, hamza, taa marbuta...)
+            if match_names(extracted_name, input_name)[0] != EXACT_MATCH:
                 # Get admin users
                 admin_users = await db.users.find({'role': 'admin'}).to_list(length=None)
                 
@@ -2820,17 +3009,6 @@ async def receive_transfer(
     
     # ============ END AI MONITORING ============
     
-    # Create receipt
-    receipt_doc = {
-        'id': str(uuid.uuid4()),
-        'transfer_id': transfer_id,
-        'receiver_fullname': receiver_fullname,
-        'id_image_path': id_image_url,
-        'received_by_agent': current_user['id'],
-        'received_at': datetime.now(timezone.utc).isoformat()
-    }
-    await db.receipts.insert_one(receipt_doc)
-    
     # Update transfer status
     # Calculate incoming commission for receiving agent
     incoming_commission = 0.0
@@ -2873,17 +3051,32 @@ async def receive_transfer(
                 incoming_commission = (transfer['amount'] * incoming_commission_percentage) / 100
                 break
     
-    await db.transfers.update_one(
-        {'id': transfer_id},
-        {'$set': {
-            'status': 'completed',
-            'to_agent_id': receiving_agent_id,
-            'to_agent_name': receiving_agent_name,
-            'incoming_commission': incoming_commission,
-            'incoming_commission_percentage': incoming_commission_percentage,
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        }}
-    )
+    receive_update = {
+        'status': 'completed',
+        'to_agent_id': receiving_agent_id,
+        'to_agent_name': receiving_agent_name,
+        'incoming_commission': incoming_commission,
+        'incoming_commission_percentage': incoming_commission_percentage,
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }
+    transfer = await claim_transfer(transfer_id, receive_update)
+    if transfer is None:
+        await id_image_pipeline.discard(id_image_upload_id)
+        raise HTTPException(status_code=400, detail="Transfer already processed")
+    
+    # Create receipt (only for the request that completed the transfer)
+    receipt_doc = {
+        'id': str(uuid.uuid4()),
+        'transfer_id': transfer_id,
+        'receiver_fullname': receiver_fullname,
+        'id_image_path': None,
+        'id_image_upload_id': id_image_upload_id,
+        'received_by_agent': current_user['id'],
+        'received_at': datetime.now(timezone.utc).isoformat()
+    }
+    await db.receipts.insert_one(receipt_doc)
+    # The receipt now carries id_image_upload_id - let the background upload patch it
+    await id_image_pipeline.release(id_image_upload_id)
     
     # Subtract amount from transit account (الحوالات الواردة لم تُسلَّم)
     await update_transit_balance(
@@ -2895,16 +3088,17 @@ async def receive_transfer(
     )
     
     # Update receiver's wallet (increase balance + incoming commission)
-    wallet_field = f'wallet_balance_{transfer["currency"].lower()}'
     total_amount_to_add = transfer['amount'] + incoming_commission
-    await db.users.update_one(
-        {'id': current_user['id']},
-        {'$inc': {wallet_field: total_amount_to_add}}
-    )
+    await wallet_service.credit(current_user['id'], transfer['currency'], total_amount_to_add, transaction={
+        'user_display_name': current_user['display_name'],
+        'transaction_type': 'transfer_received',
+        'reference_id': transfer_id,
+        'note': f'حوالة مستلمة: {transfer["transfer_code"]}'
+    })
     
     # Record paid commission for admin (عمولة مدفوعة للمستلم)
     if incoming_commission > 0:
-        await db.admin_commissions.insert_one({
+        await record_admin_commission({
             'id': str(uuid.uuid4()),
             'type': 'paid',  # عمولة مدفوعة
             'amount': incoming_commission,
@@ -2918,19 +3112,6 @@ async def receive_transfer(
             'created_at': datetime.now(timezone.utc).isoformat()
         })
     
-    # Log wallet transaction for receiver
-    await db.wallet_transactions.insert_one({
-        'id': str(uuid.uuid4()),
-        'user_id': current_user['id'],
-        'user_display_name': current_user['display_name'],
-        'amount': transfer['amount'],
-        'currency': transfer['currency'],
-        'transaction_type': 'transfer_received',
-        'reference_id': transfer_id,
-        'note': f'حوالة مستلمة: {transfer["transfer_code"]}',
-        'created_at': datetime.now(timezone.utc).isoformat()
-    })
-    
     # Log successful PIN attempt
     await db.pin_attempts.insert_one({
         'id': str(uuid.uuid4()),
@@ -2938,12 +3119,13 @@ async def receive_transfer(
         'attempted_by_agent': current_user['id'],
         'attempt_ip': request.client.host if request else None,
         'success': True,
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'expires_at': pin_attempt_expires_at()
     })
     
     await log_audit(transfer_id, current_user['id'], 'transfer_completed', {
         'receiver_fullname': receiver_fullname,
-        'id_image_url': id_image_url
+        'id_image_upload_id': id_image_upload_id
     })
     
     # ============ CREATE ACCOUNTING JOURNAL ENTRY ============
@@ -3004,6 +3186,7 @@ async def receive_transfer(
             }
             
             await db.journal_entries.insert_one(journal_entry)
+            await report_cache.bump(DOMAIN_JOURNAL)
             
             # Update account balances
             # Transit account decreases (credit for assets - إخراج من الترانزيت)
@@ -3078,6 +3261,7 @@ async def receive_transfer(
                 }
                 
                 await db.journal_entries.insert_one(journal_entry_commission)
+                await report_cache.bump(DOMAIN_JOURNAL)
                 
                 # Update balances for commission
                 # حساب 701 عمولات مدفوعة (مدين - مصروف عند المدير)
@@ -3108,8 +3292,10 @@ async def receive_transfer(
         notification_type="transfer_received"
     )
     
-    # Notify via WebSocket
-    await sio.emit('transfer_completed', {'transfer_id': transfer_id})
+    # Notify via WebSocket (sender agent, receiving agent, admins)
+    await sio.emit('transfer_completed', {'transfer_id': transfer_id}, to=list({
+        agent_room(transfer['from_agent_id']), agent_room(user_agent_id), ADMIN_ROOM
+    }))
     
     return {'success': True, 'message': 'Transfer completed successfully'}
 
@@ -3199,6 +3385,46 @@ async def get_audit_logs(
     logs = await db.audit_logs.find(query, {'_id': 0}).sort('created_at', -1).limit(limit).to_list(limit)
     return logs
 
+@api_router.get("/audit-logs/archive")
+async def search_archived_audit_logs(
+    transfer_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    action: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = 100,
+    current_user: dict = Depends(require_admin)
+):
+    """Search audit logs moved out of audit_logs by the retention job (admin only, newest first)"""
+    return await search_audit_archive(
+        db, transfer_id=transfer_id, user_id=user_id, action=action,
+        start_date=start_date, end_date=end_date, limit=max(1, min(limit, 1000))
+    )
+
+@api_router.get("/admin/retention")
+async def get_retention_status(current_user: dict = Depends(require_admin)):
+    """Retention policies, last run and archived audit log months"""
+    lock = await db[RETENTION_LOCK_COLLECTION].find_one({'_id': 'lock'}, {'_id': 0, 'last_run': 1})
+    return {
+        'policies': {
+            'notifications_by_severity_days': NOTIFICATION_RETENTION_DAYS,
+            'notifications_by_type_days': NOTIFICATION_TYPE_RETENTION_DAYS,
+            'pin_attempts_days': PIN_ATTEMPTS_RETENTION_DAYS,
+            'audit_logs_hot_months': AUDIT_HOT_MONTHS,
+            'interval_hours': RETENTION_INTERVAL_HOURS
+        },
+        'last_run': (lock or {}).get('last_run'),
+        'audit_archive': await archive_stats(db)
+    }
+
+@api_router.post("/admin/retention/run")
+async def trigger_retention_run(current_user: dict = Depends(require_admin)):
+    """Run the retention policies now"""
+    stats = await run_retention(db)
+    if stats is None:
+        raise HTTPException(status_code=409, detail="Retention run already in progress")
+    return stats
+
 @api_router.get("/commissions/report")
 async def get_commissions_report(
     start_date: Optional[str] = None,
@@ -3270,26 +3496,15 @@ async def add_wallet_deposit(deposit: WalletDeposit, current_user: dict = Depend
     if not user:
         raise HTTPException(status_code=404, detail="المستخدم غير موجود")
     
-    # Update wallet balance
-    wallet_field = f'wallet_balance_{deposit.currency.lower()}'
-    await db.users.update_one(
-        {'id': deposit.user_id},
-        {'$inc': {wallet_field: deposit.amount}}
-    )
-    
-    # Log wallet transaction
+    # Update wallet balance + log wallet transaction
     transaction_id = str(uuid.uuid4())
-    await db.wallet_transactions.insert_one({
+    await wallet_service.credit(deposit.user_id, deposit.currency, deposit.amount, transaction={
         'id': transaction_id,
-        'user_id': deposit.user_id,
         'user_display_name': user['display_name'],
-        'amount': deposit.amount,
-        'currency': deposit.currency,
         'transaction_type': 'deposit',
         'added_by_admin_id': current_user['id'],
         'added_by_admin_name': current_user['display_name'],
-        'note': deposit.note or 'إضافة رصيد من قبل الإدارة',
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'note': deposit.note or 'إضافة رصيد من قبل الإدارة'
     })
     
     await log_audit(None, current_user['id'], 'wallet_deposit', {
@@ -3350,6 +3565,7 @@ async def update_user_status(user_id: str, is_active: bool, current_user: dict =
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="المستخدم غير موجود")
     
+    await user_cache.invalidate(user_id)
     await log_audit(None, current_user['id'], 'user_status_changed', {'target_user_id': user_id, 'is_active': is_active})
     
     return {'success': True}
@@ -3396,6 +3612,7 @@ async def update_profile(user_data: UserUpdate, current_user: dict = Depends(get
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="المستخدم غير موجود")
     
+    await user_cache.invalidate(current_user['id'])
     await log_audit(None, current_user['id'], 'profile_updated', {'fields': list(update_fields.keys())})
     
     # Return updated user
@@ -3467,6 +3684,7 @@ async def update_user_by_admin(user_id: str, user_data: UserUpdate, current_user
             
             update_fields['account_id'] = user_data.account_id
             logger.info(f"✅ Linked agent {user_id} to account {user_data.account_id}")
+            await report_cache.bump(DOMAIN_JOURNAL, '1970-01-01')
         else:
             # If empty string, remove the link
             user = await db.users.find_one({'id': user_id})
@@ -3476,6 +3694,7 @@ async def update_user_by_admin(user_id: str, user_data: UserUpdate, current_user
                     {'code': old_account_id},
                     {'$unset': {'agent_id': ''}}
                 )
+                await report_cache.bump(DOMAIN_JOURNAL, '1970-01-01')
             update_fields['account_id'] = None
     
     # Admin can set new password without current password
@@ -3496,6 +3715,7 @@ async def update_user_by_admin(user_id: str, user_data: UserUpdate, current_user
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="المستخدم غير موجود")
     
+    await user_cache.invalidate(user_id)
     await log_audit(None, current_user['id'], 'user_updated_by_admin', {'target_user_id': user_id, 'fields': list(update_fields.keys())})
     
     # Return updated user
@@ -3520,6 +3740,7 @@ async def delete_user_by_admin(user_id: str, current_user: dict = Depends(requir
             {'code': user['account_id']},
             {'$unset': {'agent_id': ''}}
         )
+        await report_cache.bump(DOMAIN_JOURNAL, '1970-01-01')
     
     # Delete user
     result = await db.users.delete_one({'id': user_id})
@@ -3527,6 +3748,7 @@ async def delete_user_by_admin(user_id: str, current_user: dict = Depends(requir
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="فشل الحذف")
     
+    await user_cache.invalidate(user_id)
     await log_audit(None, current_user['id'], 'user_deleted', {'target_user_id': user_id, 'username': user.get('username')})
     
     return {"message": "تم حذف المستخدم بنجاح"}
@@ -3547,27 +3769,61 @@ async def toggle_user_status(user_id: str, status_data: dict, current_user: dict
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="المستخدم غير موجود")
     
+    await user_cache.invalidate(user_id)
     await log_audit(None, current_user['id'], 'user_status_changed', {'target_user_id': user_id, 'new_status': new_status})
     
     return {"message": f"تم تغيير حالة المستخدم إلى {new_status}"}
 
 # ============ WebSocket Events ============
 
+def _socket_token(environ: dict, auth) -> Optional[str]:
+    """JWT من auth عند الاتصال، أو Authorization header، أو ?token="""
+    if isinstance(auth, dict) and auth.get('token'):
+        return auth['token']
+    header = environ.get('HTTP_AUTHORIZATION', '')
+    if header.lower().startswith('bearer '):
+        return header[7:]
+    for part in environ.get('QUERY_STRING', '').split('&'):
+        if part.startswith('token='):
+            return part[6:]
+    return None
+
 @sio.event
-async def connect(sid, environ):
-    print(f"Client connected: {sid}")
+async def connect(sid, environ, auth=None):
+    """Authenticate with the JWT and join the user's rooms"""
+    token = _socket_token(environ, auth)
+    user = None
+    if token:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+            user = await user_cache.get(payload.get('sub'))
+        except jwt.PyJWTError:
+            user = None
+    if not user or not user.get('is_active', True):
+        sio.counters['rejected'] += 1
+        raise socketio.exceptions.ConnectionRefusedError('Unauthorized')
+    
+    sio.counters['connections'] += 1
+    await sio.save_session(sid, {'user_id': user['id'], 'role': user.get('role'), 'governorate': user.get('governorate')})
+    for room in rooms_for_user(user):
+        await sio.enter_room(sid, room)
 
 @sio.event
 async def disconnect(sid):
-    print(f"Client disconnected: {sid}")
+    pass
 
 @sio.event
 async def join_governorate(sid, data):
-    """Join governorate room for notifications"""
-    governorate = data.get('governorate')
-    if governorate:
-        sio.enter_room(sid, f"gov_{governorate}")
-        print(f"Client {sid} joined governorate {governorate}")
+    """Join governorate room (own governorate only, any for admins)"""
+    governorate = (data or {}).get('governorate')
+    session = await sio.get_session(sid)
+    if governorate and (session.get('role') == 'admin' or governorate == session.get('governorate')):
+        await sio.enter_room(sid, gov_room(governorate))
+
+@api_router.get("/admin/socket/metrics")
+async def get_socket_metrics(current_user: dict = Depends(require_admin)):
+    """Connected clients, room sizes and send-queue counters (this worker)"""
+    return sio.metrics()
 
 # ============ Commission Rate Endpoints ============
 
@@ -3773,71 +4029,85 @@ async def calculate_commission_preview(
 
 @api_router.get("/reports/commissions")
 async def get_detailed_commissions_report(
+    request: Request,
     report_type: str = "daily",  # daily, monthly, yearly
     date: str = None,  # YYYY-MM-DD for daily, YYYY-MM for monthly, YYYY for yearly
+    include_details: bool = False,
+    format: Optional[str] = None,  # csv / xlsx: export the commission lines
     current_user: dict = Depends(require_admin)
 ):
+    """
+    Get commissions report - cached per data version
+    Totals only by default; lines are fetched on drill-down from /reports/commissions/details
+    """
+    if not date:
+        date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    start_date, end_date = get_report_date_range(report_type, date)
+    
+    export_format = validate_export_format(format)
+    if export_format:
+        cursor = db.admin_commissions.find(
+            {'created_at': {'$gte': start_date.isoformat(), '$lt': end_date.isoformat()}},
+            export_projection(COMMISSION_EXPORT_COLUMNS)
+        ).sort('created_at', 1)
+        return stream_export(cursor, COMMISSION_EXPORT_COLUMNS, export_format, f'commissions_{report_type}_{date}')
+    
+    return await report_cache.serve(
+        request, 'commissions_report',
+        {'report_type': report_type, 'date': date, 'include_details': include_details},
+        domains=[DOMAIN_COMMISSIONS],
+        compute=lambda: build_commissions_report(report_type, date, include_details),
+        period_end=(end_date - timedelta(days=1)).strftime('%Y-%m-%d')
+    )
+
+async def build_commissions_report(report_type: str = "daily", date: str = None, include_details: bool = False) -> dict:
     """
     Get commissions report
     report_type: daily, monthly, yearly
     date: specific date/month/year to filter
+    include_details: include the individual commission lines (totals come from daily rollups)
     """
-    from datetime import datetime as dt, timedelta
-    
     # Parse date parameter
     if not date:
         date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
     
-    # Build query based on report type
-    if report_type == "daily":
-        start_date = dt.strptime(date, '%Y-%m-%d')
-        end_date = start_date + timedelta(days=1)
-    elif report_type == "monthly":
-        start_date = dt.strptime(date + "-01", '%Y-%m-%d')
-        next_month = start_date.month + 1 if start_date.month < 12 else 1
-        next_year = start_date.year if start_date.month < 12 else start_date.year + 1
-        end_date = dt(next_year, next_month, 1)
-    elif report_type == "yearly":
-        start_date = dt.strptime(date + "-01-01", '%Y-%m-%d')
-        end_date = dt(start_date.year + 1, 1, 1)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid report_type")
-    
+    start_date, end_date = get_report_date_range(report_type, date)
     start_iso = start_date.isoformat()
     end_iso = end_date.isoformat()
     
-    # Get earned commissions (عمولات محققة)
-    earned_commissions = await db.admin_commissions.find({
-        'type': 'earned',
-        'created_at': {'$gte': start_iso, '$lt': end_iso}
-    }).to_list(length=None)
-    
-    # Get paid commissions (عمولات مدفوعة)
-    paid_commissions = await db.admin_commissions.find({
-        'type': 'paid',
-        'created_at': {'$gte': start_iso, '$lt': end_iso}
-    }).to_list(length=None)
-    
-    # Calculate totals by currency
+    # Calculate totals by currency from the daily rollups
     totals = {
-        'IQD': {'earned': 0, 'paid': 0, 'net': 0},
-        'USD': {'earned': 0, 'paid': 0, 'net': 0}
+        'IQD': {'earned': 0, 'paid': 0, 'net': 0, 'earned_count': 0, 'paid_count': 0},
+        'USD': {'earned': 0, 'paid': 0, 'net': 0, 'earned_count': 0, 'paid_count': 0}
     }
     
-    for comm in earned_commissions:
-        comm.pop('_id', None)
-        currency = comm.get('currency', 'IQD')
-        totals[currency]['earned'] += comm.get('amount', 0)
-    
-    for comm in paid_commissions:
-        comm.pop('_id', None)
-        currency = comm.get('currency', 'IQD')
-        totals[currency]['paid'] += comm.get('amount', 0)
+    rollups = await sum_commission_rollups(start_iso[:10], end_iso[:10])
+    for row in rollups:
+        if row['type'] not in ('earned', 'paid'):
+            continue
+        currency_totals = totals.setdefault(row['currency'], {'earned': 0, 'paid': 0, 'net': 0, 'earned_count': 0, 'paid_count': 0})
+        currency_totals[row['type']] += row['amount']
+        currency_totals[f"{row['type']}_count"] += row['count']
     
     # Calculate net profit
     for currency in totals:
         totals[currency]['net'] = totals[currency]['earned'] - totals[currency]['paid']
     
+    earned_commissions = []
+    paid_commissions = []
+    if include_details:
+        # Get earned commissions (عمولات محققة)
+        earned_commissions = await db.admin_commissions.find({
+            'type': 'earned',
+            'created_at': {'$gte': start_iso, '$lt': end_iso}
+        }, {'_id': 0}).to_list(length=None)
+        
+        # Get paid commissions (عمولات مدفوعة)
+        paid_commissions = await db.admin_commissions.find({
+            'type': 'paid',
+            'created_at': {'$gte': start_iso, '$lt': end_iso}
+        }, {'_id': 0}).to_list(length=None)
+    
     return {
         "report_type": report_type,
         "date": date,
@@ -3858,67 +4128,59 @@ async def get_detailed_commissions_report(
 
 @api_router.get("/reports/agents-profit")
 async def get_agents_profit_report(
+    request: Request,
     report_type: str = "daily",
     date: str = None,
     current_user: dict = Depends(require_admin)
 ):
+    """Get profit report per agent - cached per data version"""
+    if not date:
+        date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    _, end_date = get_report_date_range(report_type, date)
+    return await report_cache.serve(
+        request, 'agents_profit',
+        {'report_type': report_type, 'date': date},
+        domains=[DOMAIN_COMMISSIONS],
+        compute=lambda: build_agents_profit_report(report_type, date),
+        period_end=(end_date - timedelta(days=1)).strftime('%Y-%m-%d')
+    )
+
+async def build_agents_profit_report(report_type: str = "daily", date: str = None) -> dict:
     """
     Get profit report per agent (صافي ربح كل صيرفة)
+    Served from commission_daily_rollups; use /reports/commissions/details to drill down
     """
-    from datetime import datetime as dt, timedelta
-    
     if not date:
         date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
     
-    # Build date range
-    if report_type == "daily":
-        start_date = dt.strptime(date, '%Y-%m-%d')
-        end_date = start_date + timedelta(days=1)
-    elif report_type == "monthly":
-        start_date = dt.strptime(date + "-01", '%Y-%m-%d')
-        next_month = start_date.month + 1 if start_date.month < 12 else 1
-        next_year = start_date.year if start_date.month < 12 else start_date.year + 1
-        end_date = dt(next_year, next_month, 1)
-    elif report_type == "yearly":
-        start_date = dt.strptime(date + "-01-01", '%Y-%m-%d')
-        end_date = dt(start_date.year + 1, 1, 1)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid report_type")
-    
+    start_date, end_date = get_report_date_range(report_type, date)
     start_iso = start_date.isoformat()
     end_iso = end_date.isoformat()
     
-    # Get all commissions in date range
-    all_commissions = await db.admin_commissions.find({
-        'created_at': {'$gte': start_iso, '$lt': end_iso}
-    }).to_list(length=None)
+    rollups = await sum_commission_rollups(start_iso[:10], end_iso[:10], group_by_agent=True)
     
     # Group by agent
     agents_data = {}
     
-    for comm in all_commissions:
-        agent_id = comm.get('agent_id')
-        agent_name = comm.get('agent_name', 'Unknown')
-        currency = comm.get('currency', 'IQD')
-        amount = comm.get('amount', 0)
-        comm_type = comm.get('type')
+    for row in rollups:
+        agent_id = row.get('agent_id')
+        currency = row['currency']
+        comm_type = row['type']
         
         if agent_id not in agents_data:
             agents_data[agent_id] = {
                 'agent_id': agent_id,
-                'agent_name': agent_name,
+                'agent_name': row.get('agent_name') or 'Unknown',
                 'IQD': {'earned': 0, 'paid': 0, 'net': 0},
                 'USD': {'earned': 0, 'paid': 0, 'net': 0},
-                'earned_transactions': [],
-                'paid_transactions': []
+                'earned_count': 0,
+                'paid_count': 0
             }
         
-        if comm_type == 'earned':
-            agents_data[agent_id][currency]['earned'] += amount
-            agents_data[agent_id]['earned_transactions'].append(comm)
-        elif comm_type == 'paid':
-            agents_data[agent_id][currency]['paid'] += amount
-            agents_data[agent_id]['paid_transactions'].append(comm)
+        if comm_type in ('earned', 'paid'):
+            agents_data[agent_id].setdefault(currency, {'earned': 0, 'paid': 0, 'net': 0})
+            agents_data[agent_id][currency][comm_type] += row['amount']
+            agents_data[agent_id][f'{comm_type}_count'] += row['count']
     
     # Calculate net profit for each agent
     for agent_id in agents_data:
@@ -3936,153 +4198,326 @@ async def get_agents_profit_report(
         "agents": list(agents_data.values())
     }
 
-
-@api_router.get("/admin-commissions")
-async def get_admin_commissions(
+@api_router.get("/reports/commissions/details")
+async def get_commissions_report_details(
+    report_type: str = "daily",
+    date: str = None,
+    agent_id: Optional[str] = None,
     type: Optional[str] = None,  # 'earned' or 'paid'
+    currency: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: dict = Depends(require_admin)
+):
+    """Drill-down: individual commission lines behind a rollup total"""
+    if not date:
+        date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    
+    start_date, end_date = get_report_date_range(report_type, date)
+    query = {'created_at': {'$gte': start_date.isoformat(), '$lt': end_date.isoformat()}}
+    if agent_id:
+        query['agent_id'] = agent_id
+    if type:
+        query['type'] = type
+    if currency:
+        query['currency'] = currency
+    
+    limit = max(1, min(limit, 500))
+    commissions = await db.admin_commissions.find(query, {'_id': 0}).sort('created_at', -1).skip(skip).limit(limit + 1).to_list(length=limit + 1)
+    
+    return {
+        "commissions": commissions[:limit],
+        "skip": skip,
+        "limit": limit,
+        "has_more": len(commissions) > limit
+    }
+
+@api_router.post("/reports/commissions/rebuild-rollups")
+async def rebuild_commission_rollups_endpoint(current_user: dict = Depends(require_admin)):
+    """Rebuild commission_daily_rollups from admin_commissions"""
+    rows = await rebuild_commission_daily_rollups()
+    return {"success": True, "rollup_rows": rows}
+
+@api_router.get("/analytics/transfers")
+async def get_transfers_analytics(
+    group_by: str = "day",  # comma separated: day, month, year, agent_id, to_agent_id, governorate, currency, status
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     agent_id: Optional[str] = None,
+    to_agent_id: Optional[str] = None,
+    governorate: Optional[str] = None,
     currency: Optional[str] = None,
+    status: Optional[str] = None,
     current_user: dict = Depends(require_admin)
 ):
     """
-    Get admin commissions (earned or paid) from both admin_commissions collection and transfers
-    Combines old data (from transfers) with new data (from admin_commissions)
-    Supports filtering by date, agent, and currency
+    Transfer volume analytics served from transfer_rollups
+    Returns count, amount, commission and incoming_commission per group
     """
+    dimensions = [d.strip() for d in group_by.split(',') if d.strip()]
+    invalid = [d for d in dimensions if d not in GROUP_BY_FIELDS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid group_by: {', '.join(invalid)}")
+    
+    rows = await query_transfer_rollups(
+        db,
+        dimensions,
+        start_date=start_date,
+        end_date=end_date,
+        filters={
+            'agent_id': agent_id,
+            'to_agent_id': to_agent_id,
+            'governorate': governorate,
+            'currency': currency,
+            'status': status
+        }
+    )
     
-    # Debug logging
-    logger.info(f"Admin commissions filter - agent_id: {agent_id}, type: {type}, currency: {currency}")
-    
-    # ============ Get from admin_commissions collection (New Data) ============
+    return {
+        "group_by": dimensions,
+        "start_date": start_date,
+        "end_date": end_date,
+        "rows": rows
+    }
+
+@api_router.post("/analytics/transfers/rebuild")
+async def rebuild_transfers_analytics(current_user: dict = Depends(require_admin)):
+    """Rebuild transfer_rollups from transfers"""
+    rows = await rebuild_transfer_rollups(db)
+    return {"success": True, "rollup_rows": rows}
+
+
+def legacy_transfer_commissions_pipeline(transfer_match: dict, type: Optional[str] = None, agent_id: Optional[str] = None) -> list:
+    """
+    Pipeline over completed transfers (old data) that emits one document per
+    earned/paid commission, normalised to the admin_commissions shape.
+    """
+    transfer_code = {'$ifNull': ['$transfer_code', {'$substrCP': ['$id', 0, 8]}]}
+    candidates = []
+    if not type or type == 'earned':
+        candidates.append({
+            'id': {'$concat': ['t_earned_', '$id']},
+            'type': 'earned',
+            'amount': '$commission',
+            'agent_id': '$from_agent_id',
+            'agent_name': {'$ifNull': ['$sender_name', 'Unknown']},
+            'commission_percentage': {'$literal': 0},
+            'note': {'$concat': ['عمولة محققة من حوالة ', transfer_code]},
+            'created_at': '$created_at'
+        })
+    if not type or type == 'paid':
+        candidates.append({
+            'id': {'$concat': ['t_paid_', '$id']},
+            'type': 'paid',
+            'amount': '$incoming_commission',
+            'agent_id': '$to_agent_id',
+            'agent_name': {'$ifNull': ['$receiver_name', 'Unknown']},
+            'note': {'$concat': ['عمولة مدفوعة من حوالة ', transfer_code]},
+            'created_at': {'$ifNull': ['$updated_at', '$created_at']}
+        })
+
+    commission_match = {'commission.amount': {'$gt': 0}}
+    if agent_id:
+        commission_match['commission.agent_id'] = agent_id
+
+    return [
+        {'$match': transfer_match},
+        {'$project': {
+            '_id': 0,
+            'commission': candidates,
+            'currency': '$currency',
+            'transfer_id': '$id',
+            'transfer_code': transfer_code
+        }},
+        {'$unwind': '$commission'},
+        {'$match': commission_match},
+        {'$replaceRoot': {'newRoot': {'$mergeObjects': [
+            '$commission',
+            {'currency': '$currency', 'transfer_id': '$transfer_id', 'transfer_code': '$transfer_code'}
+        ]}}}
+    ]
+
+def build_created_at_filter(start_date: Optional[str], end_date: Optional[str]) -> Optional[dict]:
+    """created_at range filter for YYYY-MM-DD or full ISO bounds"""
+    created_at = {}
+    if start_date:
+        created_at['$gte'] = start_date if 'T' in start_date else f"{start_date}T00:00:00.000Z"
+    if end_date:
+        created_at['$lte'] = end_date if 'T' in end_date else f"{end_date}T23:59:59.999Z"
+    return created_at or None
+
+def recorded_commissions_anti_join() -> list:
+    """Drop legacy rows already stored in admin_commissions (same transfer_id and type)"""
+    return [
+        {'$lookup': {
+            'from': 'admin_commissions',
+            'let': {'transfer_id': '$transfer_id', 'type': '$type'},
+            'pipeline': [
+                {'$match': {'$expr': {'$and': [
+                    {'$eq': ['$transfer_id', '$$transfer_id']},
+                    {'$eq': ['$type', '$$type']}
+                ]}}},
+                {'$limit': 1},
+                {'$project': {'_id': 1}}
+            ],
+            'as': 'existing'
+        }},
+        {'$match': {'existing': {'$size': 0}}},
+        {'$project': {'existing': 0}}
+    ]
+
+def admin_commissions_pipeline(
+    type: Optional[str] = None,
+    created_at_filter: Optional[dict] = None,
+    agent_id: Optional[str] = None,
+    currency: Optional[str] = None,
+    after: Optional[tuple] = None
+) -> list:
+    """
+    admin_commissions plus (ADMIN_COMMISSIONS_LEGACY_UNION) commissions that only exist on
+    completed transfers. after=(created_at, id): keyset cursor, applied in the first $match
+    of each source so admin_commissions can use its created_at index.
+    """
     query_commissions = {}
-    
     if type:
         query_commissions['type'] = type
-    
-    if start_date and end_date:
-        # Make sure we're comparing with the same format
-        start_datetime = start_date if 'T' in start_date else f"{start_date}T00:00:00.000Z"
-        end_datetime = end_date if 'T' in end_date else f"{end_date}T23:59:59.999Z"
-        query_commissions['created_at'] = {
-            '$gte': start_datetime,
-            '$lte': end_datetime
-        }
-    elif start_date:
-        start_datetime = start_date if 'T' in start_date else f"{start_date}T00:00:00.000Z"
-        query_commissions['created_at'] = {'$gte': start_datetime}
-    elif end_date:
-        end_datetime = end_date if 'T' in end_date else f"{end_date}T23:59:59.999Z"
-        query_commissions['created_at'] = {'$lte': end_datetime}
-    
+    if created_at_filter:
+        query_commissions['created_at'] = created_at_filter
     if agent_id:
         query_commissions['agent_id'] = agent_id
-        logger.info(f"Applying agent_id filter: {agent_id}")
-    
     if currency:
         query_commissions['currency'] = currency
     
-    logger.info(f"Query for admin_commissions: {query_commissions}")
-    
-    commissions_new = await db.admin_commissions.find(query_commissions).sort('created_at', -1).to_list(length=None)
-    
-    logger.info(f"Found {len(commissions_new)} commissions from admin_commissions")
-    
-    for comm in commissions_new:
-        comm.pop('_id', None)
-    
-    # ============ Get from transfers collection (Old Data) ============
-    query_transfers = {'status': 'completed'}
+    cursor_match = None
+    if after:
+        cursor_match = {'$or': [
+            {'created_at': {'$lt': after[0]}},
+            {'created_at': after[0], 'id': {'$lt': after[1]}}
+        ]}
+        query_commissions = {'$and': [query_commissions, cursor_match]}
     
-    if start_date and end_date:
-        start_datetime = start_date if 'T' in start_date else f"{start_date}T00:00:00.000Z"
-        end_datetime = end_date if 'T' in end_date else f"{end_date}T23:59:59.999Z"
-        query_transfers['created_at'] = {
-            '$gte': start_datetime,
-            '$lte': end_datetime
-        }
-    elif start_date:
-        start_datetime = start_date if 'T' in start_date else f"{start_date}T00:00:00.000Z"
-        query_transfers['created_at'] = {'$gte': start_datetime}
-    elif end_date:
-        end_datetime = end_date if 'T' in end_date else f"{end_date}T23:59:59.999Z"
-        query_transfers['created_at'] = {'$lte': end_datetime}
-    
-    if currency:
-        query_transfers['currency'] = currency
+    pipeline = [
+        {'$match': query_commissions},
+        {'$project': {'_id': 0}}
+    ]
     
-    # For agent filter, we'll need to filter after conversion since
-    # transfers have different agent fields (from_agent_id, to_agent_id)
+    if ADMIN_COMMISSIONS_LEGACY_UNION:
+        query_transfers = {'status': 'completed'}
+        if created_at_filter:
+            query_transfers['created_at'] = created_at_filter
+        if currency:
+            query_transfers['currency'] = currency
+        if after:
+            # Both legacy rows are dated on or after the transfer's created_at
+            query_transfers = {'$and': [query_transfers, {'created_at': {'$lte': after[0]}}]}
+        
+        legacy_pipeline = legacy_transfer_commissions_pipeline(query_transfers, type=type, agent_id=agent_id)
+        if cursor_match:
+            legacy_pipeline.append({'$match': cursor_match})
+        # admin_commissions rows win when both sources describe the same commission
+        legacy_pipeline += recorded_commissions_anti_join()
+        pipeline.append({'$unionWith': {'coll': 'transfers', 'pipeline': legacy_pipeline}})
+    
+    return pipeline
+
+@api_router.get("/admin-commissions")
+async def get_admin_commissions(
+    type: Optional[str] = None,  # 'earned' or 'paid'
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    currency: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 1000,
+    format: Optional[str] = None,  # csv / xlsx: export every matching commission
+    current_user: dict = Depends(require_admin)
+):
+    """
+    Get admin commissions (earned or paid) from both admin_commissions collection and transfers
+    Combines old data (from transfers) with new data (from admin_commissions) in one
+    $unionWith aggregation, newest first; transfer commissions already stored in
+    admin_commissions (same transfer_id and type) are skipped.
+    Supports filtering by date, agent and currency, plus cursor pagination (next_cursor).
+    """
+    logger.info(f"Admin commissions filter - agent_id: {agent_id}, type: {type}, currency: {currency}")
     
-    logger.info(f"Query for transfers: {query_transfers}")
+    created_at_filter = build_created_at_filter(start_date, end_date)
+    filters = {'type': type, 'created_at_filter': created_at_filter, 'agent_id': agent_id, 'currency': currency}
     
-    transfers = await db.transfers.find(query_transfers).to_list(length=None)
+    export_format = validate_export_format(format)
+    if export_format:
+        export_cursor = db.admin_commissions.aggregate(
+            admin_commissions_pipeline(**filters) + [{'$sort': {'created_at': -1, 'id': -1}}], allowDiskUse=True
+        )
+        return stream_export(export_cursor, COMMISSION_EXPORT_COLUMNS, export_format, 'admin_commissions')
     
-    logger.info(f"Found {len(transfers)} completed transfers")
+    # Cursor pagination on (created_at, id), newest first
+    limit = max(1, min(limit, 5000))
+    after = None
+    if cursor:
+        try:
+            after = tuple(base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1))
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if len(after) != 2:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    items = await db.admin_commissions.aggregate(
+        admin_commissions_pipeline(**filters, after=after) + [
+            {'$sort': {'created_at': -1, 'id': -1}},
+            {'$limit': limit + 1}
+        ],
+        allowDiskUse=True
+    ).to_list(length=limit + 1)
+    # Totals cover the whole filter, not just the pages after the cursor
+    totals_rows = await db.admin_commissions.aggregate(
+        admin_commissions_pipeline(**filters) + [
+            {'$group': {'_id': '$currency', 'amount': {'$sum': '$amount'}, 'count': {'$sum': 1}}}
+        ],
+        allowDiskUse=True
+    ).to_list(length=None)
     
-    # Convert transfers to commission format
-    commissions_old = []
+    commissions = items[:limit]
+    next_cursor = None
+    if len(items) > limit:
+        last = commissions[-1]
+        next_cursor = base64.urlsafe_b64encode(f"{last.get('created_at', '')}|{last.get('id', '')}".encode()).decode()
     
-    for transfer in transfers:
-        # Earned commission (outgoing transfers)
-        if (not type or type == 'earned') and transfer.get('commission', 0) > 0:
-            from_agent_id = transfer.get('from_agent_id')
-            
-            # Apply agent filter for earned commissions
-            if agent_id:
-                logger.debug(f"Comparing agent_id filter '{agent_id}' with from_agent_id '{from_agent_id}' - Match: {from_agent_id == agent_id}")
-                if from_agent_id != agent_id:
-                    continue
-            
-            commissions_old.append({
-                'id': f"t_earned_{transfer['id']}",
-                'type': 'earned',
-                'amount': transfer['commission'],
-                'currency': transfer['currency'],
-                'transfer_id': transfer['id'],
-                'transfer_code': transfer.get('transfer_code', transfer['id'][:8]),
-                'agent_id': from_agent_id,
-                'agent_name': transfer.get('sender_name', 'Unknown'),
-                'commission_percentage': 0,
-                'note': f'عمولة محققة من حوالة {transfer.get("transfer_code", transfer["id"][:8])}',
-                'created_at': transfer['created_at']
-            })
-        
-        # Paid commission (incoming transfers)
-        if (not type or type == 'paid') and transfer.get('incoming_commission', 0) > 0:
-            to_agent_id = transfer.get('to_agent_id')
-            
-            # Apply agent filter for paid commissions
-            if agent_id:
-                logger.debug(f"Comparing agent_id filter '{agent_id}' with to_agent_id '{to_agent_id}' - Match: {to_agent_id == agent_id}")
-                if to_agent_id != agent_id:
-                    continue
-            
-            commissions_old.append({
-                'id': f"t_paid_{transfer['id']}",
-                'type': 'paid',
-                'amount': transfer['incoming_commission'],
-                'currency': transfer['currency'],
-                'transfer_id': transfer['id'],
-                'transfer_code': transfer.get('transfer_code', transfer['id'][:8]),
-                'agent_id': to_agent_id,
-                'agent_name': transfer.get('receiver_name', 'Unknown'),
-                'note': f'عمولة مدفوعة من حوالة {transfer.get("transfer_code", transfer["id"][:8])}',
-                'created_at': transfer.get('updated_at', transfer['created_at'])
-            })
+    totals = {row['_id']: {'amount': row['amount'], 'count': row['count']} for row in totals_rows}
     
-    logger.info(f"Found {len(commissions_old)} commissions from old transfers")
+    logger.info(f"Admin commissions returned: {len(commissions)} (total {sum(t['count'] for t in totals.values())})")
     
-    # Combine both sources
-    all_commissions = commissions_new + commissions_old
+    return {
+        'commissions': commissions,
+        'totals': totals,
+        'total_count': sum(t['count'] for t in totals.values()),
+        'next_cursor': next_cursor
+    }
+
+@api_router.post("/admin-commissions/backfill-legacy")
+async def backfill_legacy_admin_commissions(current_user: dict = Depends(require_admin)):
+    """
+    One-off migration: copy commissions that only exist on completed transfers
+    into admin_commissions, so ADMIN_COMMISSIONS_LEGACY_UNION can be turned off.
+    """
+    before = await db.admin_commissions.count_documents({})
+    
+    pipeline = legacy_transfer_commissions_pipeline({'status': 'completed'}) + recorded_commissions_anti_join()
+    pipeline += [
+        {'$addFields': {
+            'source': 'legacy_transfer',
+            'backfilled_at': datetime.now(timezone.utc).isoformat()
+        }},
+        {'$merge': {'into': 'admin_commissions', 'whenMatched': 'keepExisting', 'whenNotMatched': 'insert'}}
+    ]
+    await db.transfers.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
     
-    logger.info(f"Total commissions returned: {len(all_commissions)}")
+    inserted = await db.admin_commissions.count_documents({}) - before
+    rollup_rows = await rebuild_commission_daily_rollups()
     
-    # Sort by date (newest first)
-    all_commissions.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    logger.info(f"Backfilled {inserted} legacy commissions into admin_commissions")
     
-    return {'commissions': all_commissions}
+    return {"success": True, "inserted": inserted, "rollup_rows": rollup_rows}
 
 # ============================================
 # Transit Account Endpoints
@@ -4254,19 +4689,14 @@ async def check_duplicate_transfers_today(sender_name: str, receiver_name: str)
     
     return count
 
-async def check_delayed_transfers():
+async def run_delayed_transfer_check() -> dict:
     """
-    Check for delayed transfers (pending for more than 1-2 days)
+    Notify admins about transfers that crossed a delay threshold (24h / 48h) since the last check
     """
-    one_day_ago = datetime.now(timezone.utc) - timedelta(days=1)
-    two_days_ago = datetime.now(timezone.utc) - timedelta(days=2)
-    
-    delayed_transfers = await db.transfers.find({
-        'status': 'pending',
-        'created_at': {'$lt': one_day_ago.isoformat()}
-    }).to_list(length=None)
-    
-    return delayed_transfers
+    escalated = await scan_delayed_transfers(db, create_notifications_bulk)
+    if any(escalated.values()):
+        logger.info(f"Delayed transfers escalated: {escalated}")
+    return escalated
 
 async def create_notification(
     title: str, 
@@ -4282,9 +4712,45 @@ async def create_notification(
     Create a notification for admin or specific user
     severity: low, medium, high, critical
     notification_type: wallet_deposit, new_transfer, transfer_received, duplicate_transfer, 
-                      name_mismatch, id_verification_failed, suspicious_activity, ai_warning, system
+                      name_mismatch, id_verification_failed, suspicious_activity, ai_warning,
+                      delayed_transfer, system
     """
-    notification = {
+    notification = build_notification(
+        title, message, severity, related_transfer_id, related_agent_id, user_id, notification_type, ai_analysis
+    )
+    
+    await db.notifications.insert_one({**notification, 'expires_at': notification_expires_at(notification)})
+    await push_unread_counts(await unread_counters.add(user_id, 1))
+    return notification
+
+async def create_notifications_bulk(notifications: List[dict]):
+    """
+    Insert many notifications at once (same arguments as create_notification, one dict each)
+    """
+    docs = [build_notification(**kwargs) for kwargs in notifications]
+    if not docs:
+        return []
+    await db.notifications.insert_many(
+        [{**doc, 'expires_at': notification_expires_at(doc)} for doc in docs], ordered=False
+    )
+    per_inbox: Dict[Optional[str], int] = {}
+    for doc in docs:
+        per_inbox[doc['user_id']] = per_inbox.get(doc['user_id'], 0) + 1
+    for user_id, count in per_inbox.items():
+        await push_unread_counts(await unread_counters.add(user_id, count))
+    return docs
+
+def build_notification(
+    title: str, 
+    message: str, 
+    severity: str, 
+    related_transfer_id: str = None, 
+    related_agent_id: str = None,
+    user_id: str = None,
+    notification_type: str = 'system',
+    ai_analysis: str = None
+) -> dict:
+    return {
         'id': str(uuid.uuid4()),
         'title': title,
         'message': message,
@@ -4297,9 +4763,28 @@ async def create_notification(
         'is_read': False,
         'created_at': datetime.now(timezone.utc).isoformat()
     }
-    
-    await db.notifications.insert_one(notification)
-    return notification
+
+async def push_unread_counts(counts: Dict[str, int]):
+    """Push unread counter changes over Socket.IO (replaces polling /notifications)"""
+    for key, unread in counts.items():
+        room = ADMIN_ROOM if key == ADMIN_INBOX else agent_room(key)
+        try:
+            await sio.emit('unread_count', {'unread_count': unread}, room=room)
+        except Exception as e:
+            logger.warning(f"Failed to push unread count to {room}: {str(e)}")
+
+def notification_inbox(current_user: dict) -> Optional[str]:
+    """
+    Admins get the admin inbox (None = every notification), agents their own
+    and employees their agent's inbox
+    """
+    if current_user['role'] == 'admin':
+        return None
+    if current_user['role'] == 'agent':
+        return current_user['id']
+    if current_user['role'] == 'user' and current_user.get('agent_id'):
+        return current_user['agent_id']
+    raise HTTPException(status_code=403, detail="لا توجد إشعارات لهذا الحساب")
 
 async def analyze_and_notify_if_suspicious(transfer_data: dict):
     """
@@ -4330,34 +4815,45 @@ async def analyze_and_notify_if_suspicious(transfer_data: dict):
 async def get_notifications(
     unread_only: bool = False,
     limit: int = 50,
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get notifications for current user (admin or agent)
+    cursor: next_cursor from the previous page (newest first)
     """
-    query = {}
-    
-    # If agent, only show their notifications
-    if current_user['role'] == 'agent':
-        query['user_id'] = current_user['id']
-    # Admin sees all notifications
+    inbox = notification_inbox(current_user)
+    limit = max(1, min(limit, 200))
+    query = {'user_id': inbox} if inbox else {}
     
     if unread_only:
         query['is_read'] = False
     
-    notifications = await db.notifications.find(query).sort('created_at', -1).limit(limit).to_list(length=limit)
+    # Cursor pagination on (created_at, id), newest first
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query['$or'] = [
+            {'created_at': {'$lt': cursor_created_at}},
+            {'created_at': cursor_created_at, 'id': {'$lt': cursor_id}}
+        ]
     
-    for notif in notifications:
-        notif.pop('_id', None)
+    notifications = await db.notifications.find(query, {'_id': 0, 'expires_at': 0}).sort(
+        [('created_at', -1), ('id', -1)]
+    ).limit(limit + 1).to_list(length=limit + 1)
     
-    # Count unread for current user
-    unread_query = {'is_read': False}
-    if current_user['role'] == 'agent':
-        unread_query['user_id'] = current_user['id']
+    next_cursor = None
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        last = notifications[-1]
+        next_cursor = base64.urlsafe_b64encode(f"{last.get('created_at', '')}|{last.get('id', '')}".encode()).decode()
     
     return {
         "notifications": notifications,
-        "unread_count": await db.notifications.count_documents(unread_query)
+        "unread_count": await unread_counters.get(inbox),
+        "next_cursor": next_cursor
     }
 
 @api_router.patch("/notifications/{notification_id}/mark-read")
@@ -4368,48 +4864,81 @@ async def mark_notification_read(
     """
     Mark notification as read
     """
-    # Build query - agents can only mark their own notifications
-    query = {'id': notification_id}
-    if current_user['role'] == 'agent':
-        query['user_id'] = current_user['id']
+    # Build query - agents and employees can only mark their own inbox
+    query = {'id': notification_id, 'is_read': False}
+    inbox = notification_inbox(current_user)
+    if inbox:
+        query['user_id'] = inbox
     
-    result = await db.notifications.update_one(
+    notification = await db.notifications.find_one_and_update(
         query,
-        {'$set': {'is_read': True}}
+        {'$set': {'is_read': True}},
+        projection={'user_id': 1}
     )
     
-    if result.modified_count == 0:
+    if notification is None:
         raise HTTPException(status_code=404, detail="Notification not found or no permission")
     
+    await push_unread_counts(await unread_counters.add(notification.get('user_id'), -1))
+    
     return {"message": "Notification marked as read"}
 
+@api_router.post("/notifications/mark-all-read")
+async def mark_all_notifications_read(current_user: dict = Depends(get_current_user)):
+    """
+    Mark every unread notification in the current user's inbox as read
+    Only admins can clear the admin inbox (every notification in the system)
+    """
+    counts = await unread_counters.mark_all_read(notification_inbox(current_user))
+    await push_unread_counts(counts)
+    
+    return {"message": "All notifications marked as read", "unread_count": 0}
+
 @api_router.post("/monitoring/check-delayed-transfers")
 async def manual_check_delayed_transfers(current_user: dict = Depends(require_admin)):
     """
     Manually trigger check for delayed transfers
+    Only transfers not yet notified at their current threshold get a new notification
+    Runs under the scheduler's delayed_transfers lock - 409 while a check is in progress
     """
-    delayed = await check_delayed_transfers()
-    
-    for transfer in delayed:
-        # Calculate delay in hours
-        created_at = datetime.fromisoformat(transfer['created_at'].replace('Z', '+00:00'))
-        now = datetime.now(timezone.utc)
-        delay_hours = (now - created_at).total_seconds() / 3600
-        
-        if delay_hours >= 24:
-            await create_notification(
-                title="⏰ حوالة متأخرة!",
-                message=f"الحوالة رقم {transfer['transfer_code']} معلقة منذ {delay_hours:.1f} ساعة. المرسل: {transfer['sender_name']}",
-                severity="medium" if delay_hours < 48 else "high",
-                related_transfer_id=transfer['id'],
-                related_agent_id=transfer.get('from_agent_id')
-            )
+    job = scheduler.jobs.get('delayed_transfers') or Job(
+        'delayed_transfers', DELAYED_TRANSFER_CHECK_MINUTES * 60, run_delayed_transfer_check, 600
+    )
+    try:
+        escalated = await scheduler.trigger(job)
+    except JobLockedError:
+        raise HTTPException(status_code=409, detail="فحص الحوالات المتأخرة قيد التشغيل حالياً")
+    delayed_count = await count_delayed_transfers(db)
     
     return {
-        "message": f"تم فحص {len(delayed)} حوالة متأخرة",
-        "delayed_count": len(delayed)
+        "message": f"تم فحص {delayed_count} حوالة متأخرة",
+        "delayed_count": delayed_count,
+        "new_notifications": escalated
     }
 
+@api_router.get("/admin/id-image-uploads")
+async def get_id_image_uploads(current_user: dict = Depends(require_admin)):
+    """
+    Background ID image uploads: counts per status and the latest failures
+    """
+    return await id_image_pipeline.stats()
+
+@api_router.post("/admin/id-image-uploads/{upload_id}/retry")
+async def retry_id_image_upload(upload_id: str, current_user: dict = Depends(require_admin)):
+    """
+    Queue a failed ID image upload again
+    """
+    if not await id_image_pipeline.retry(upload_id):
+        raise HTTPException(status_code=404, detail="Failed upload not found")
+    return {"message": "Upload queued"}
+
+@api_router.get("/admin/scheduler")
+async def get_scheduler_status(current_user: dict = Depends(require_admin)):
+    """
+    Periodic jobs: next run, last run and the worker that ran it
+    """
+    return {"enabled": SCHEDULER_ENABLED, "jobs": await scheduler.status()}
+
 # ============================================
 # Accounting Endpoints (الحسابات)
 # ============================================
@@ -4504,6 +5033,9 @@ async def initialize_chart_of_accounts(current_user: dict = Depends(require_admi
                 )
                 updated_count += 1
     
+    if inserted_count or updated_count:
+        await report_cache.bump(DOMAIN_JOURNAL, '1970-01-01')
+    
     return {
         "message": f"تم إنشاء {inserted_count} حساب جديد وتحديث {updated_count} حساب موجود",
         "inserted": inserted_count,
@@ -4554,6 +5086,7 @@ async def create_account(account_data: AccountCreate, current_user: dict = Depen
     
     await db.chart_of_accounts.insert_one(account)
     account.pop('_id', None)
+    await report_cache.bump(DOMAIN_JOURNAL, '1970-01-01')
     
     return account
 
@@ -4571,10 +5104,27 @@ async def get_account(account_code: str, current_user: dict = Depends(require_ad
 
 @api_router.get("/accounting/reports/trial-balance")
 async def get_trial_balance(
+    request: Request,
     start_date: str = None,
     end_date: str = None,
+    format: Optional[str] = None,
     current_user: dict = Depends(require_admin)
 ):
+    """Get trial balance report (ميزان المراجعة) - cached per data version"""
+    export_format = validate_export_format(format)
+    if export_format:
+        trial_balance = await build_trial_balance(start_date, end_date)
+        return stream_export(trial_balance['accounts'], TRIAL_BALANCE_EXPORT_COLUMNS, export_format, 'trial_balance')
+    
+    return await report_cache.serve(
+        request, 'trial_balance',
+        {'start_date': start_date, 'end_date': end_date},
+        domains=[DOMAIN_JOURNAL],
+        compute=lambda: build_trial_balance(start_date, end_date),
+        period_end=end_date
+    )
+
+async def build_trial_balance(start_date: str = None, end_date: str = None) -> dict:
     """
     Get trial balance report (ميزان المراجعة)
     Shows all accounts with debit and credit totals
@@ -4649,10 +5199,21 @@ async def get_trial_balance(
 
 @api_router.get("/accounting/reports/income-statement")
 async def get_income_statement(
+    request: Request,
     start_date: str = None,
     end_date: str = None,
     current_user: dict = Depends(require_admin)
 ):
+    """Get income statement (قائمة الدخل) - cached per data version"""
+    return await report_cache.serve(
+        request, 'income_statement',
+        {'start_date': start_date, 'end_date': end_date},
+        domains=[DOMAIN_JOURNAL],
+        compute=lambda: build_income_statement(start_date, end_date),
+        period_end=end_date
+    )
+
+async def build_income_statement(start_date: str = None, end_date: str = None) -> dict:
     """
     Get income statement (قائمة الدخل)
     Shows revenues, expenses, and net profit/loss
@@ -4738,9 +5299,20 @@ async def get_income_statement(
 
 @api_router.get("/accounting/reports/balance-sheet")
 async def get_balance_sheet(
+    request: Request,
     end_date: str = None,
     current_user: dict = Depends(require_admin)
 ):
+    """Get balance sheet (الميزانية العمومية) - cached per data version"""
+    return await report_cache.serve(
+        request, 'balance_sheet',
+        {'end_date': end_date},
+        domains=[DOMAIN_JOURNAL],
+        compute=lambda: build_balance_sheet(end_date),
+        period_end=end_date
+    )
+
+async def build_balance_sheet(end_date: str = None) -> dict:
     """
     Get balance sheet (الميزانية العمومية)
     Shows assets, liabilities, and equity at a specific date
@@ -4832,7 +5404,7 @@ async def get_balance_sheet(
             total_equity += balance
     
     # Add net income to equity
-    income_statement = await get_income_statement(None, end_date, current_user)
+    income_statement = await build_income_statement(None, end_date)
     net_income = income_statement['net_profit']
     if net_income != 0:
         equity.append({
@@ -4878,6 +5450,7 @@ async def delete_account(account_code: str, current_user: dict = Depends(require
     
     # Delete the account
     result = await db.chart_of_accounts.delete_one({'code': account_code})
+    await report_cache.bump(DOMAIN_JOURNAL)
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=500, detail="Failed to delete account")
@@ -5194,6 +5767,7 @@ async def update_account(
         {'code': account_code},
         {'$set': update_data}
     )
+    await report_cache.bump(DOMAIN_JOURNAL, '1970-01-01')
     
     # Get updated account
     updated = await db.chart_of_accounts.find_one({'code': account_code})
@@ -5257,6 +5831,7 @@ async def create_journal_entry(entry_data: JournalEntryCreate, current_user: dic
     }
     
     await db.journal_entries.insert_one(journal_entry)
+    await report_cache.bump(DOMAIN_JOURNAL)
     
     # Update account balances in chart_of_accounts
     for line in entry_data.lines:
@@ -5337,6 +5912,33 @@ async def get_journal_entries(
         "total_pages": (total + limit - 1) // limit
     }
 
+async def iter_ledger_rows(account: dict, currency: str, query: dict):
+    """Stream ledger lines of one account/currency with a running balance"""
+    account_code = account['code']
+    debit_increases = account.get('category', '') in ['أصول', 'مصاريف']
+    running_balance = 0
+    
+    cursor = db.journal_entries.find(
+        {**query, 'lines.account_code': account_code},
+        {'_id': 0, 'date': 1, 'entry_number': 1, 'description': 1, 'lines': 1}
+    ).sort('date', 1)
+    async for entry in cursor:
+        for line in entry.get('lines', []):
+            if line.get('account_code') != account_code or line.get('currency', 'IQD') != currency:
+                continue
+            debit = line.get('debit', 0)
+            credit = line.get('credit', 0)
+            running_balance += (debit - credit) if debit_increases else (credit - debit)
+            yield {
+                'date': entry['date'],
+                'entry_number': entry.get('entry_number', 'N/A'),
+                'description': entry.get('description', ''),
+                'debit': debit,
+                'credit': credit,
+                'balance': running_balance,
+                'currency': currency
+            }
+
 @api_router.get("/accounting/ledger/{account_code}")
 async def get_account_ledger(
     account_code: str,
@@ -5345,6 +5947,7 @@ async def get_account_ledger(
     currency: str = None,  # فلتر العملة: IQD, USD, EUR, GBP (مطلوب - لا يوجد "الكل")
     page: int = 1,
     limit: int = 100,
+    format: Optional[str] = None,  # csv / xlsx: export the full ledger
     current_user: dict = Depends(require_admin)
 ):
     """
@@ -5386,6 +5989,13 @@ async def get_account_ledger(
         end_datetime = end_date if 'T' in end_date else f"{end_date}T23:59:59.999Z"
         query['date'] = {'$lte': end_datetime}
     
+    export_format = validate_export_format(format)
+    if export_format:
+        return stream_export(
+            iter_ledger_rows(account, currency, query),
+            LEDGER_EXPORT_COLUMNS, export_format, f'ledger_{account_code}_{currency}'
+        )
+    
     # Calculate skip for pagination
     skip = (page - 1) * limit
     
@@ -5535,6 +6145,7 @@ async def update_journal_entry(
         {'id': entry_id},
         {'$set': updated_entry}
     )
+    await report_cache.bump(DOMAIN_JOURNAL, existing.get('date'))
     
     result = await db.journal_entries.find_one({'id': entry_id})
     result.pop('_id', None)
@@ -5586,6 +6197,7 @@ async def cancel_journal_entry(entry_id: str, current_user: dict = Depends(requi
             }
         }
     )
+    await report_cache.bump(DOMAIN_JOURNAL, existing.get('date'))
     
     return {"message": "تم إلغاء القيد بنجاح", "entry_id": entry_id}
 
@@ -5598,7 +6210,7 @@ async def get_exchange_rates(current_user: dict = Depends(require_admin)):
     """
     Get current exchange rates (أسعار الصرف الحالية)
     """
-    rates = await db.exchange_rates.find_one(sort=[('updated_at', -1)])
+    rates = await exchange_rate_service.current(KIND_BUY_SELL)
     
     if not rates:
         # Create default rates if none exist
@@ -5610,9 +6222,10 @@ async def get_exchange_rates(current_user: dict = Depends(require_admin)):
             'updated_at': datetime.now(timezone.utc).isoformat()
         }
         await db.exchange_rates.insert_one(default_rates)
+        default_rates.pop('_id', None)
+        await exchange_rate_service.record(KIND_BUY_SELL, default_rates)
         rates = default_rates
     
-    rates.pop('_id', None)
     return rates
 
 @api_router.post("/exchange-rates")
@@ -5642,8 +6255,9 @@ async def update_exchange_rates(
     
     await db.exchange_rates.insert_one(new_rates)
     new_rates.pop('_id', None)
+    version = await exchange_rate_service.record(KIND_BUY_SELL, new_rates)
     
-    return new_rates
+    return {**new_rates, 'version': version}
 
 @api_router.post("/exchange/buy")
 async def buy_currency(
@@ -5663,42 +6277,35 @@ async def buy_currency(
     amount_iqd = operation.amount_usd * operation.exchange_rate
     
     # Get current rates to calculate profit
-    current_rates = await db.exchange_rates.find_one(sort=[('updated_at', -1)])
+    current_rates = await exchange_rate_service.current(KIND_BUY_SELL)
     if not current_rates:
         raise HTTPException(status_code=400, detail="لا توجد أسعار صرف محددة")
     
     # Profit = (buy_rate - actual_rate) * amount_usd
     profit = (current_rates['buy_rate'] - operation.exchange_rate) * operation.amount_usd
     
-    # Update admin wallet
-    admin = await db.users.find_one({'id': current_user['id']})
-    if not admin:
+    # Update admin wallet (one conditional update: the IQD side must be covered)
+    operation_id = str(uuid.uuid4())
+    try:
+        await wallet_service.apply(
+            current_user['id'],
+            {'IQD': -amount_iqd, 'USD': operation.amount_usd},
+            transaction={
+                'user_display_name': current_user['display_name'],
+                'transaction_type': 'exchange_buy',
+                'reference_id': operation_id,
+                'note': f"شراء دولار: {operation.amount_usd:,.2f} USD بسعر {operation.exchange_rate:,.2f}"
+            },
+            check_funds=True
+        )
+    except WalletNotFoundError:
         raise HTTPException(status_code=404, detail="المستخدم غير موجود")
-    
-    current_iqd = admin.get('wallet_balance_iqd', 0)
-    current_usd = admin.get('wallet_balance_usd', 0)
-    
-    # Check if admin has enough IQD
-    if current_iqd < amount_iqd:
+    except InsufficientBalanceError as e:
         raise HTTPException(
             status_code=400,
-            detail=f"رصيد الدينار غير كافٍ. الرصيد الحالي: {current_iqd:,.0f}"
+            detail=f"رصيد الدينار غير كافٍ. الرصيد الحالي: {e.balance:,.0f}"
         )
     
-    new_iqd = current_iqd - amount_iqd
-    new_usd = current_usd + operation.amount_usd
-    
-    await db.users.update_one(
-        {'id': current_user['id']},
-        {
-            '$set': {
-                'wallet_balance_iqd': new_iqd,
-                'wallet_balance_usd': new_usd,
-                'updated_at': datetime.now(timezone.utc).isoformat()
-            }
-        }
-    )
-    
     # Create journal entry
     journal_entry = {
         'id': str(uuid.uuid4()),
@@ -5720,10 +6327,11 @@ async def buy_currency(
     }
     
     await db.journal_entries.insert_one(journal_entry)
+    await report_cache.bump(DOMAIN_JOURNAL)
     
     # Create exchange operation record
     exchange_op = {
-        'id': str(uuid.uuid4()),
+        'id': operation_id,
         'operation_type': 'buy',
         'amount_usd': operation.amount_usd,
         'amount_iqd': amount_iqd,
@@ -5737,6 +6345,7 @@ async def buy_currency(
     }
     
     await db.exchange_operations.insert_one(exchange_op)
+    await report_cache.bump(DOMAIN_EXCHANGE)
     exchange_op.pop('_id', None)
     
     return exchange_op
@@ -5759,42 +6368,35 @@ async def sell_currency(
     amount_iqd = operation.amount_usd * operation.exchange_rate
     
     # Get current rates to calculate profit
-    current_rates = await db.exchange_rates.find_one(sort=[('updated_at', -1)])
+    current_rates = await exchange_rate_service.current(KIND_BUY_SELL)
     if not current_rates:
         raise HTTPException(status_code=400, detail="لا توجد أسعار صرف محددة")
     
     # Profit = (actual_rate - sell_rate) * amount_usd
     profit = (operation.exchange_rate - current_rates['sell_rate']) * operation.amount_usd
     
-    # Update admin wallet
-    admin = await db.users.find_one({'id': current_user['id']})
-    if not admin:
+    # Update admin wallet (one conditional update: the USD side must be covered)
+    operation_id = str(uuid.uuid4())
+    try:
+        await wallet_service.apply(
+            current_user['id'],
+            {'USD': -operation.amount_usd, 'IQD': amount_iqd},
+            transaction={
+                'user_display_name': current_user['display_name'],
+                'transaction_type': 'exchange_sell',
+                'reference_id': operation_id,
+                'note': f"بيع دولار: {operation.amount_usd:,.2f} USD بسعر {operation.exchange_rate:,.2f}"
+            },
+            check_funds=True
+        )
+    except WalletNotFoundError:
         raise HTTPException(status_code=404, detail="المستخدم غير موجود")
-    
-    current_iqd = admin.get('wallet_balance_iqd', 0)
-    current_usd = admin.get('wallet_balance_usd', 0)
-    
-    # Check if admin has enough USD
-    if current_usd < operation.amount_usd:
+    except InsufficientBalanceError as e:
         raise HTTPException(
             status_code=400,
-            detail=f"رصيد الدولار غير كافٍ. الرصيد الحالي: {current_usd:,.2f}"
+            detail=f"رصيد الدولار غير كافٍ. الرصيد الحالي: {e.balance:,.2f}"
         )
     
-    new_iqd = current_iqd + amount_iqd
-    new_usd = current_usd - operation.amount_usd
-    
-    await db.users.update_one(
-        {'id': current_user['id']},
-        {
-            '$set': {
-                'wallet_balance_iqd': new_iqd,
-                'wallet_balance_usd': new_usd,
-                'updated_at': datetime.now(timezone.utc).isoformat()
-            }
-        }
-    )
-    
     # Create journal entry
     journal_entry = {
         'id': str(uuid.uuid4()),
@@ -5816,10 +6418,11 @@ async def sell_currency(
     }
     
     await db.journal_entries.insert_one(journal_entry)
+    await report_cache.bump(DOMAIN_JOURNAL)
     
     # Create exchange operation record
     exchange_op = {
-        'id': str(uuid.uuid4()),
+        'id': operation_id,
         'operation_type': 'sell',
         'amount_usd': operation.amount_usd,
         'amount_iqd': amount_iqd,
@@ -5833,6 +6436,7 @@ async def sell_currency(
     }
     
     await db.exchange_operations.insert_one(exchange_op)
+    await report_cache.bump(DOMAIN_EXCHANGE)
     exchange_op.pop('_id', None)
     
     return exchange_op
@@ -5865,10 +6469,24 @@ async def get_exchange_operations(
 
 @api_router.get("/exchange/profit-report")
 async def get_exchange_profit_report(
+    request: Request,
     report_type: str = "daily",  # daily, monthly, yearly
     date: str = None,
     current_user: dict = Depends(require_admin)
 ):
+    """Get exchange profit report - cached per data version"""
+    if not date:
+        date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    _, end_date = get_report_date_range(report_type, date)
+    return await report_cache.serve(
+        request, 'exchange_profit',
+        {'report_type': report_type, 'date': date},
+        domains=[DOMAIN_EXCHANGE],
+        compute=lambda: build_exchange_profit_report(report_type, date),
+        period_end=(end_date - timedelta(days=1)).strftime('%Y-%m-%d')
+    )
+
+async def build_exchange_profit_report(report_type: str = "daily", date: str = None) -> dict:
     """
     Get exchange profit report (تقرير أرباح فرق الصرف)
     """
@@ -6188,21 +6806,62 @@ async def get_agent_ledger(
 
 @api_router.get("/agent-commissions-report")
 async def get_agent_commissions_report(
+    request: Request,
     report_type: str = 'daily',  # daily, monthly, yearly
     date: str = None,
+    include_details: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get agent's own commissions report"""
+    """
+    Get agent's own commissions report - cached per data version
+    Totals only by default; lines are fetched on drill-down from /agent-commissions-report/details
+    """
     
     # Only agents can access
     if current_user['role'] != 'agent':
         raise HTTPException(status_code=403, detail="هذه الصفحة مخصصة للصرافين فقط")
     
-    agent_id = current_user['id']
+    if not date:
+        date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    _, end_date = get_report_date_range(report_type, date)
+    return await report_cache.serve(
+        request, 'agent_commissions_report',
+        {'agent_id': current_user['id'], 'agent_name': current_user['display_name'],
+         'report_type': report_type, 'date': date, 'include_details': include_details},
+        domains=[DOMAIN_COMMISSIONS],
+        compute=lambda: build_agent_commissions_report(current_user, report_type, date, include_details),
+        period_end=(end_date - timedelta(days=1)).strftime('%Y-%m-%d')
+    )
+
+@api_router.get("/agent-commissions-report/details")
+async def get_agent_commissions_report_details(
+    report_type: str = 'daily',
+    date: str = None,
+    type: Optional[str] = None,  # 'earned' or 'paid'
+    skip: int = 0,
+    limit: int = 100,
+    current_user: dict = Depends(get_current_user)
+):
+    """Drill-down: the agent's own commission lines behind a report total"""
+    if current_user['role'] != 'agent':
+        raise HTTPException(status_code=403, detail="هذه الصفحة مخصصة للصرافين فقط")
     
-    # Parse date and calculate range
-    from datetime import datetime, timezone, timedelta
+    date_from, date_to = get_agent_report_date_range(report_type, date)
+    limit = max(1, min(limit, 500))
+    lines = await fetch_agent_commission_lines(
+        current_user['id'], date_from, date_to, types=[type] if type else ['earned', 'paid'],
+        skip=skip, limit=limit + 1
+    )
     
+    return {
+        'commissions': lines[:limit],
+        'skip': skip,
+        'limit': limit,
+        'has_more': len(lines) > limit
+    }
+
+def get_agent_report_date_range(report_type: str, date: str = None):
+    """(date_from, date_to) inclusive bounds for the agent commissions report"""
     if not date:
         date = datetime.now(timezone.utc).isoformat().split('T')[0]
     
@@ -6224,64 +6883,70 @@ async def get_agent_commissions_report(
         date_to = datetime(year, 12, 31, 23, 59, 59, tzinfo=timezone.utc)
     else:
         raise HTTPException(status_code=400, detail="نوع التقرير غير صحيح")
-    
-    # Get earned commissions (from outgoing transfers)
-    earned_commissions_docs = await db.admin_commissions.find({
+    return date_from, date_to
+
+async def fetch_agent_commission_lines(agent_id: str, date_from: datetime, date_to: datetime,
+                                       types: List[str], skip: int = 0, limit: int = 0) -> List[dict]:
+    """Agent commission lines (newest first) with the transfer amount, in two queries"""
+    query = db.admin_commissions.find({
         'agent_id': agent_id,
-        'type': 'earned',
+        'type': {'$in': types},
         'created_at': {
             '$gte': date_from.isoformat(),
             '$lte': date_to.isoformat()
         }
-    }).to_list(length=None)
+    }, {'_id': 0}).sort('created_at', -1).skip(skip)
+    if limit:
+        query = query.limit(limit)
+    commission_docs = await query.to_list(length=None)
+    
+    transfer_ids = list({comm['transfer_id'] for comm in commission_docs})
+    transfer_amounts = {
+        t['id']: t['amount']
+        async for t in db.transfers.find({'id': {'$in': transfer_ids}}, {'_id': 0, 'id': 1, 'amount': 1})
+    }
     
-    # Get paid commissions (from incoming transfers)
-    paid_commissions_docs = await db.admin_commissions.find({
-        'agent_id': agent_id,
-        'type': 'paid',
-        'created_at': {
-            '$gte': date_from.isoformat(),
-            '$lte': date_to.isoformat()
+    # Enhance commission data with transfer details
+    return [
+        {
+            'id': comm['id'],
+            'type': comm['type'],
+            'transfer_id': comm['transfer_id'],
+            'transfer_code': comm['transfer_code'],
+            'transfer_amount': transfer_amounts[comm['transfer_id']],
+            'amount': comm['amount'],
+            'currency': comm['currency'],
+            'commission_percentage': comm.get('commission_percentage', 0),
+            'created_at': comm['created_at']
         }
-    }).to_list(length=None)
+        for comm in commission_docs
+        if comm['transfer_id'] in transfer_amounts
+    ]
+
+async def build_agent_commissions_report(current_user: dict, report_type: str = 'daily', date: str = None, include_details: bool = False) -> dict:
+    """Get agent's own commissions report (totals from commission_daily_rollups)"""
+    agent_id = current_user['id']
+    date_from, date_to = get_agent_report_date_range(report_type, date)
     
-    # Enhance commission data with transfer details
     earned_commissions = []
-    for comm in earned_commissions_docs:
-        transfer = await db.transfers.find_one({'id': comm['transfer_id']})
-        if transfer:
-            earned_commissions.append({
-                'id': comm['id'],
-                'transfer_id': comm['transfer_id'],
-                'transfer_code': comm['transfer_code'],
-                'transfer_amount': transfer['amount'],
-                'amount': comm['amount'],
-                'currency': comm['currency'],
-                'commission_percentage': comm.get('commission_percentage', 0),
-                'created_at': comm['created_at']
-            })
-    
     paid_commissions = []
-    for comm in paid_commissions_docs:
-        transfer = await db.transfers.find_one({'id': comm['transfer_id']})
-        if transfer:
-            paid_commissions.append({
-                'id': comm['id'],
-                'transfer_id': comm['transfer_id'],
-                'transfer_code': comm['transfer_code'],
-                'transfer_amount': transfer['amount'],
-                'amount': comm['amount'],
-                'currency': comm['currency'],
-                'commission_percentage': comm.get('commission_percentage', 0),
-                'created_at': comm['created_at']
-            })
+    if include_details:
+        for line in await fetch_agent_commission_lines(agent_id, date_from, date_to, types=['earned', 'paid']):
+            (earned_commissions if line['type'] == 'earned' else paid_commissions).append(line)
     
-    # Calculate totals by currency
-    earned_iqd = sum(c['amount'] for c in earned_commissions if c['currency'] == 'IQD')
-    earned_usd = sum(c['amount'] for c in earned_commissions if c['currency'] == 'USD')
+    # Calculate totals by currency from the daily rollups
+    totals = {
+        'IQD': {'earned': 0, 'paid': 0, 'net': 0, 'earned_count': 0, 'paid_count': 0},
+        'USD': {'earned': 0, 'paid': 0, 'net': 0, 'earned_count': 0, 'paid_count': 0}
+    }
+    end_day = (date_to + timedelta(days=1)).isoformat()[:10]
+    for row in await sum_commission_rollups(date_from.isoformat()[:10], end_day, agent_id=agent_id):
+        if row['type'] in ('earned', 'paid') and row['currency'] in totals:
+            totals[row['currency']][row['type']] += row['amount']
+            totals[row['currency']][f"{row['type']}_count"] += row['count']
     
-    paid_iqd = sum(c['amount'] for c in paid_commissions if c['currency'] == 'IQD')
-    paid_usd = sum(c['amount'] for c in paid_commissions if c['currency'] == 'USD')
+    for currency in totals:
+        totals[currency]['net'] = totals[currency]['earned'] - totals[currency]['paid']
     
     return {
         'agent_name': current_user['display_name'],
@@ -6290,18 +6955,7 @@ async def get_agent_commissions_report(
         'date_to': date_to.isoformat(),
         'earned_commissions': earned_commissions,
         'paid_commissions': paid_commissions,
-        'totals': {
-            'IQD': {
-                'earned': earned_iqd,
-                'paid': paid_iqd,
-                'net': earned_iqd - paid_iqd
-            },
-            'USD': {
-                'earned': earned_usd,
-                'paid': paid_usd,
-                'net': earned_usd - paid_usd
-            }
-        }
+        'totals': totals
     }
 
 # ============================================
@@ -6309,9 +6963,18 @@ async def get_agent_commissions_report(
 # ============================================
 
 @api_router.get("/exchange-rates/current")
-async def get_current_exchange_rate(current_user: dict = Depends(get_current_user)):
-    """Get the current exchange rate (latest)"""
-    rate_doc = await db.exchange_rates_daily.find_one(sort=[('created_at', -1)])
+async def get_current_exchange_rate(
+    at: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the current exchange rate (latest), or the rate in effect at a point in time (?at=ISO date/time)"""
+    if at:
+        try:
+            rate_doc = await exchange_rate_service.rate_at(KIND_DAILY, parse_time(at))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date")
+    else:
+        rate_doc = await exchange_rate_service.current(KIND_DAILY)
     
     if not rate_doc:
         # Return default rate if none exists
@@ -6321,21 +6984,26 @@ async def get_current_exchange_rate(current_user: dict = Depends(get_current_use
             'is_default': True
         }
     
-    rate_doc.pop('_id', None)
     return rate_doc
 
 @api_router.get("/exchange-rates/history")
 async def get_exchange_rates_history(
     limit: int = 30,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    kind: str = KIND_DAILY,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get exchange rate history"""
-    rates = await db.exchange_rates_daily.find().sort('created_at', -1).limit(limit).to_list(length=limit)
-    
-    for rate in rates:
-        rate.pop('_id', None)
+    """Get exchange rate history (every change, newest first) - kind: daily | buy_sell"""
+    if kind not in EXCHANGE_RATE_KINDS:
+        raise HTTPException(status_code=400, detail="Invalid kind")
+    try:
+        since_dt = parse_time(since) if since else None
+        until_dt = parse_time(until) if until else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
     
-    return rates
+    return await exchange_rate_service.history(kind, since=since_dt, until=until_dt, limit=max(1, min(limit, 1000)))
 
 @api_router.post("/exchange-rates")
 async def create_exchange_rate(
@@ -6351,14 +7019,14 @@ async def create_exchange_rate(
     
     if existing:
         # Update existing rate
-        await db.exchange_rates_daily.update_one(
-            {'date': rate_date},
-            {'$set': {
-                'rate': rate_data.rate,
-                'set_by_admin': current_user['display_name'],
-                'updated_at': datetime.now(timezone.utc).isoformat()
-            }}
-        )
+        changes = {
+            'rate': rate_data.rate,
+            'set_by_admin': current_user['display_name'],
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }
+        await db.exchange_rates_daily.update_one({'date': rate_date}, {'$set': changes})
+        existing.pop('_id', None)
+        await exchange_rate_service.record(KIND_DAILY, {**existing, **changes}, at=day_start(rate_date))
         return {'message': 'Exchange rate updated', 'rate': rate_data.rate}
     else:
         # Create new rate
@@ -6372,6 +7040,8 @@ async def create_exchange_rate(
         }
         
         await db.exchange_rates_daily.insert_one(rate_doc)
+        rate_doc.pop('_id', None)
+        await exchange_rate_service.record(KIND_DAILY, rate_doc, at=day_start(rate_date))
         return {'message': 'Exchange rate created', 'id': rate_id, 'rate': rate_data.rate}
 
 @api_router.post("/currency-revaluation")
@@ -6518,6 +7188,7 @@ async def create_currency_revaluation(
         }
         
         await db.journal_entries.insert_one(journal_entry)
+        await report_cache.bump(DOMAIN_JOURNAL)
         
         # Create revaluation record
         revaluation_doc = {
@@ -6641,6 +7312,9 @@ async def sync_agents_to_chart_of_accounts(current_user: dict = Depends(require_
             await db.chart_of_accounts.insert_one(account_doc)
             synced_count += 1
     
+    if synced_count or updated_count:
+        await report_cache.bump(DOMAIN_JOURNAL, '1970-01-01')
+    
     return {
         'success': True,
         'synced': synced_count,
@@ -6712,6 +7386,9 @@ async def initialize_sample_accounts(current_user: dict = Depends(require_admin)
             await db.chart_of_accounts.insert_one(acc)
             created_count += 1
     
+    if created_count:
+        await report_cache.bump(DOMAIN_JOURNAL, '1970-01-01')
+    
     return {
         'success': True,
         'created': created_count,
@@ -6747,66 +7424,70 @@ async def get_currency_revaluations(
 
 
 @api_router.get("/admin/backup/export-all")
-async def export_all_data(current_user: dict = Depends(require_admin)):
+async def export_all_data(
+    compression: str = "gzip",
+    mode: str = "full",
+    current_user: dict = Depends(require_admin)
+):
     """
     Export all database data for backup purposes (Admin only)
-    Returns a complete dump of all collections in JSON format
+    Streams every collection as compressed NDJSON (gzip or zstd) straight from
+    the cursors, with a manifest header and per-collection counts and checksums
+    mode=incremental: only documents changed since the previous backup in the chain
     """
+    if mode not in ('full', 'incremental'):
+        raise HTTPException(status_code=400, detail="نوع النسخة غير مدعوم (full أو incremental)")
+    if compression not in BACKUP_COMPRESSIONS:
+        raise HTTPException(status_code=400, detail="صيغة الضغط غير مدعومة (gzip, zstd, none)")
+    if compression == 'zstd' and not ZSTD_AVAILABLE:
+        raise HTTPException(status_code=400, detail="ضغط zstd غير متوفر على الخادم")
+    
+    collections_to_backup = await list_backup_collections(db)
     try:
-        backup_data = {
-            "backup_timestamp": datetime.now(timezone.utc).isoformat(),
-            "backup_version": "1.0",
-            "database_name": os.environ['DB_NAME'],
-            "collections": {}
-        }
-        
-        # List of all collections to backup
-        collections_to_backup = [
-            "users",
-            "transfers",
-            "agents",
-            "chart_of_accounts",
-            "journal_entries",
-            "transit_account",
-            "transit_transactions",
-            "wallet_transactions",
-            "commission_rates",
-            "admin_commissions",
-            "notifications",
-            "categories",
-            "currency_revaluations"
-        ]
-        
-        # Export each collection
-        for collection_name in collections_to_backup:
-            try:
-                collection_data = await db[collection_name].find().to_list(length=None)
-                
-                # Remove MongoDB _id field for cleaner export
-                for doc in collection_data:
-                    if '_id' in doc:
-                        doc.pop('_id')
-                
-                backup_data["collections"][collection_name] = collection_data
-                
-            except Exception as e:
-                # If collection doesn't exist, skip it
-                backup_data["collections"][collection_name] = []
-                logging.warning(f"Could not export collection {collection_name}: {str(e)}")
-        
-        # Add metadata
-        backup_data["metadata"] = {
-            "total_collections": len(collections_to_backup),
-            "total_documents": sum(len(docs) for docs in backup_data["collections"].values()),
-            "exported_by": current_user.get("username", "unknown"),
-            "export_timestamp": datetime.now(timezone.utc).isoformat()
+        plan = await plan_backup(db, collections_to_backup, mode)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="لا توجد نسخة سابقة - أنشئ نسخة كاملة أولاً")
+    
+    estimated_documents = 0
+    for collection_name in collections_to_backup:
+        estimated_documents += await db[collection_name].estimated_document_count()
+    
+    backup_timestamp = datetime.now(timezone.utc)
+    manifest = {
+        "backup_timestamp": backup_timestamp.isoformat(),
+        "database_name": os.environ['DB_NAME'],
+        "exported_by": current_user.get("username", "unknown"),
+        "estimated_documents": estimated_documents
+    }
+    
+    media_type, extension = BACKUP_COMPRESSIONS[compression]
+    suffix = '' if mode == 'full' else f"_inc{plan['sequence']}"
+    filename = f"backup_{backup_timestamp.strftime('%Y-%m-%d_%H-%M-%S')}{suffix}{extension}"
+    
+    return StreamingResponse(
+        stream_planned_backup(db, collections_to_backup, plan, manifest, compression=compression),
+        media_type=media_type,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Backup-Collections': str(len(collections_to_backup)),
+            'X-Backup-Estimated-Documents': str(estimated_documents),
+            'X-Backup-Id': plan['backup_id'],
+            'X-Backup-Mode': plan['source'],
+            'Cache-Control': 'no-store'
         }
-        
-        return backup_data
-        
-    except Exception as e:
-        logging.error(f"Backup export failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"خطأ في تصدير النسخة الاحتياطية: {str(e)}")
+    )
+
+
+@api_router.get("/admin/backup/chain")
+async def get_backup_chain(limit: int = 50, current_user: dict = Depends(require_admin)):
+    """
+    Recent backups in the chain (newest first)
+    Restore = the last full backup followed by every incremental one after it, in order
+    """
+    backups = await db[BACKUP_CHAIN_COLLECTION].find(
+        {}, {'_id': 0, 'resume_token': 0, 'watermarks': 0}
+    ).sort('created_at', -1).limit(min(limit, 500)).to_list(length=None)
+    return {'backups': backups}
 
 
 # ============ Templates Endpoints ============
@@ -7061,344 +7742,33 @@ async def import_from_excel(
     page_size: str = Form('A5_landscape'),
     current_user: dict = Depends(require_admin)
 ):
-    """Import design from Excel file"""
+    """
+    Import design from Excel file (excel_import.py)
+    Large files return {'job_id', 'status': 'pending'} - poll /import-from-excel/jobs/{job_id}
+    """
     try:
-        from openpyxl import load_workbook
-        from openpyxl.utils import get_column_letter
-        import io
-        
-        # قراءة الملف
         contents = await file.read()
-        workbook = load_workbook(io.BytesIO(contents))
-        sheet = workbook.active
-        
-        # تحديد حجم الصفحة من Excel
-        excel_page_size = page_size
-        excel_orientation = 'landscape'
-        
-        # محاولة قراءة إعدادات الصفحة من Excel
-        if sheet.page_setup:
-            if sheet.page_setup.paperSize == 9:  # A4
-                excel_page_size = 'A4'
-            elif sheet.page_setup.paperSize == 11:  # A5
-                excel_page_size = 'A5'
-            
-            if sheet.page_setup.orientation == 'portrait':
-                excel_orientation = 'portrait'
-            else:
-                excel_orientation = 'landscape'
-        
-        # دمج حجم واتجاه الصفحة
-        final_page_size = f"{excel_page_size}_{excel_orientation}"
-        if final_page_size not in ['A4_portrait', 'A4_landscape', 'A5_portrait', 'A5_landscape']:
-            final_page_size = page_size
-        
-        page_sizes = {
-            'A4_portrait': {'width': 794, 'height': 1123},
-            'A4_landscape': {'width': 1123, 'height': 794},
-            'A5_portrait': {'width': 559, 'height': 794},
-            'A5_landscape': {'width': 794, 'height': 559},
-            'thermal_80mm': {'width': 302, 'height': 600},
-        }
-        page_config = page_sizes.get(final_page_size, page_sizes['A5_landscape'])
-        
-        # معامل التحويل من Excel لبكسل
-        # Excel column width: 1 unit = ~7 pixels
-        # Excel row height: 1 unit = ~1.33 pixels
-        col_to_px = 7
-        row_to_px = 1.33
-        
-        elements = []
-        element_id = 1
-        
-        # قراءة كل الخلايا المدمجة
-        merged_ranges = list(sheet.merged_cells.ranges)
-        
-        # قراءة جميع الخلايا
-        for row in sheet.iter_rows():
-            for cell in row:
-                # التحقق من الخلايا المدمجة أولاً (قبل فحص القيمة!)
-                is_merged = False
-                should_skip = False
-                
-                for merged_range in merged_ranges:
-                    if cell.coordinate in merged_range:
-                        is_merged = True
-                        # حساب حجم المنطقة المدمجة
-                        min_col, min_row, max_col, max_row = merged_range.min_col, merged_range.min_row, merged_range.max_col, merged_range.max_row
-                        
-                        # فقط معالجة الخلية الأولى (أعلى-يسار) في المنطقة المدمجة
-                        if cell.column == min_col and cell.row == min_row:
-                            # هذه هي الخلية الرئيسية - نستمر في معالجتها
-                            pass
-                        else:
-                            # هذه خلية ثانوية في منطقة مدمجة - نتجاهلها تماماً
-                            should_skip = True
-                            break
-                        break
-                
-                # تجاهل الخلايا الثانوية في المناطق المدمجة
-                if should_skip:
-                    continue
-                
-                # الآن نتحقق من القيمة
-                if cell.value is None:
-                    continue
-                
-                # حساب الموقع
-                col_idx = cell.column - 1
-                row_idx = cell.row - 1
-                
-                # حساب العرض الإجمالي للأعمدة السابقة
-                x = sum(sheet.column_dimensions[get_column_letter(i+1)].width or 8.43 for i in range(col_idx)) * col_to_px
-                y = sum(sheet.row_dimensions[i+1].height or 15 for i in range(row_idx)) * row_to_px
-                
-                # حجم الخلية
-                cell_width = (sheet.column_dimensions[get_column_letter(cell.column)].width or 8.43) * col_to_px
-                cell_height = (sheet.row_dimensions[cell.row].height or 15) * row_to_px
-                
-                # إذا كانت جزء من منطقة مدمجة، نحسب الحجم الكامل
-                if is_merged:
-                    for merged_range in merged_ranges:
-                        if cell.coordinate in merged_range:
-                            min_col, min_row, max_col, max_row = merged_range.min_col, merged_range.min_row, merged_range.max_col, merged_range.max_row
-                            cell_width = sum(sheet.column_dimensions[get_column_letter(i)].width or 8.43 for i in range(min_col, max_col + 1)) * col_to_px
-                            cell_height = sum(sheet.row_dimensions[i].height or 15 for i in range(min_row, max_row + 1)) * row_to_px
-                            break
-                
-                # استخراج التنسيق
-                font_size = 11
-                font_weight = 'normal'
-                text_color = '#000000'
-                bg_color = 'transparent'
-                text_align = 'right'
-                border_width = 0
-                border_color = '#000000'
-                
-                if cell.font:
-                    if cell.font.size:
-                        font_size = int(cell.font.size)
-                    if cell.font.bold:
-                        font_weight = 'bold'
-                    if cell.font.color and cell.font.color.rgb:
-                        try:
-                            rgb = cell.font.color.rgb
-                            if len(rgb) == 8:  # ARGB
-                                rgb = rgb[2:]
-                            text_color = f'#{rgb}'
-                        except:
-                            pass
-                
-                # استخراج لون الخلفية (فقط إذا كان fill_type موجود وليس None)
-                if cell.fill and cell.fill.fill_type and cell.fill.fill_type != 'none':
-                    if hasattr(cell.fill, 'fgColor') and cell.fill.fgColor and cell.fill.fgColor.rgb:
-                        try:
-                            rgb = cell.fill.fgColor.rgb
-                            if len(rgb) == 8:  # ARGB format
-                                # تجاهل alpha channel واستخرج RGB فقط
-                                rgb_part = rgb[2:]
-                                # تحقق من أن اللون ليس أبيض أو أسود افتراضي
-                                if rgb_part and rgb_part.lower() not in ['ffffff', '000000']:
-                                    bg_color = f'#{rgb_part}'
-                                elif rgb_part and rgb_part.lower() == '333333':
-                                    # رمادي غامق (مثل العنوان)
-                                    bg_color = f'#{rgb_part}'
-                            elif len(rgb) == 6:  # RGB format
-                                if rgb.lower() not in ['ffffff', '000000']:
-                                    bg_color = f'#{rgb}'
-                        except:
-                            pass
-                
-                if cell.alignment:
-                    if cell.alignment.horizontal == 'center':
-                        text_align = 'center'
-                    elif cell.alignment.horizontal == 'left':
-                        text_align = 'left'
-                
-                # استخراج الحدود بشكل أفضل
-                has_top_border = False
-                has_bottom_border = False
-                has_left_border = False
-                has_right_border = False
-                has_any_border = False
-                
-                if cell.border:
-                    if cell.border.top and cell.border.top.style:
-                        has_top_border = True
-                        has_any_border = True
-                        border_width = 2 if cell.border.top.style == 'thick' else 1
-                    if cell.border.bottom and cell.border.bottom.style:
-                        has_bottom_border = True
-                        has_any_border = True
-                    if cell.border.left and cell.border.left.style:
-                        has_left_border = True
-                        has_any_border = True
-                    if cell.border.right and cell.border.right.style:
-                        has_right_border = True
-                        has_any_border = True
-                    
-                    if cell.border.top and cell.border.top.color and cell.border.top.color.rgb:
-                        try:
-                            rgb = cell.border.top.color.rgb
-                            if len(rgb) == 8:
-                                rgb = rgb[2:]
-                            border_color = f'#{rgb}'
-                        except:
-                            pass
-                
-                # إذا كانت الخلية تحتوي على حدود كاملة، نبقي الحدود والخلفية على عنصر النص نفسه
-                if has_top_border and has_bottom_border and has_left_border and has_right_border:
-                    # الحدود والخلفية ستُطبق مباشرة على عنصر النص (لا نفعل شيء هنا)
-                    pass
-                
-                # إنشاء خطوط فردية للحدود الجزئية (ليس كل الجوانب)
-                elif has_any_border:
-                    if has_top_border:
-                        line_element = {
-                            'id': str(element_id),
-                            'type': 'line',
-                            'x': int(x),
-                            'y': int(y),
-                            'width': int(cell_width),
-                            'height': 2,
-                            'text': '',
-                            'fontSize': 14,
-                            'fontWeight': 'normal',
-                            'color': '#000000',
-                            'backgroundColor': border_color,
-                            'textAlign': 'right',
-                            'borderWidth': 0,
-                            'borderColor': border_color,
-                            'fontFamily': 'Arial',
-                            'borderStyle': 'solid',
-                            'letterSpacing': '0',
-                            'opacity': 1,
-                            'rotation': 0
-                        }
-                        elements.append(line_element)
-                        element_id += 1
-                    
-                    if has_bottom_border:
-                        line_element = {
-                            'id': str(element_id),
-                            'type': 'line',
-                            'x': int(x),
-                            'y': int(y + cell_height - 2),
-                            'width': int(cell_width),
-                            'height': 2,
-                            'text': '',
-                            'fontSize': 14,
-                            'fontWeight': 'normal',
-                            'color': '#000000',
-                            'backgroundColor': border_color,
-                            'textAlign': 'right',
-                            'borderWidth': 0,
-                            'borderColor': border_color,
-                            'fontFamily': 'Arial',
-                            'borderStyle': 'solid',
-                            'letterSpacing': '0',
-                            'opacity': 1,
-                            'rotation': 0
-                        }
-                        elements.append(line_element)
-                        element_id += 1
-                    
-                    if has_left_border:
-                        line_element = {
-                            'id': str(element_id),
-                            'type': 'vertical_line',
-                            'x': int(x),
-                            'y': int(y),
-                            'width': 2,
-                            'height': int(cell_height),
-                            'text': '',
-                            'fontSize': 14,
-                            'fontWeight': 'normal',
-                            'color': '#000000',
-                            'backgroundColor': border_color,
-                            'textAlign': 'right',
-                            'borderWidth': 0,
-                            'borderColor': border_color,
-                            'fontFamily': 'Arial',
-                            'borderStyle': 'solid',
-                            'letterSpacing': '0',
-                            'opacity': 1,
-                            'rotation': 0
-                        }
-                        elements.append(line_element)
-                        element_id += 1
-                    
-                    if has_right_border:
-                        line_element = {
-                            'id': str(element_id),
-                            'type': 'vertical_line',
-                            'x': int(x + cell_width - 2),
-                            'y': int(y),
-                            'width': 2,
-                            'height': int(cell_height),
-                            'text': '',
-                            'fontSize': 14,
-                            'fontWeight': 'normal',
-                            'color': '#000000',
-                            'backgroundColor': border_color,
-                            'textAlign': 'right',
-                            'borderWidth': 0,
-                            'borderColor': border_color,
-                            'fontFamily': 'Arial',
-                            'borderStyle': 'solid',
-                            'letterSpacing': '0',
-                            'opacity': 1,
-                            'rotation': 0
-                        }
-                        elements.append(line_element)
-                        element_id += 1
-                    
-                    border_width = 0  # إزالة الحدود من النص
-                
-                # تحديد نوع العنصر
-                element_type = 'static_text'
-                cell_text = str(cell.value).strip()
-                
-                # إنشاء عنصر النص
-                # border_width يكون > 0 فقط عندما تكون هناك حدود كاملة، وإلا سيكون 0
-                element = {
-                    'id': str(element_id),
-                    'type': element_type,
-                    'x': int(x),
-                    'y': int(y),
-                    'width': int(cell_width),
-                    'height': int(cell_height),
-                    'text': cell_text,
-                    'fontSize': font_size,
-                    'fontWeight': font_weight,
-                    'color': text_color,
-                    'backgroundColor': bg_color,
-                    'textAlign': text_align,
-                    'borderWidth': border_width,  # يحتفظ بقيمته للحدود الكاملة
-                    'borderColor': border_color,
-                    'fontFamily': 'Arial',
-                    'borderStyle': 'solid',
-                    'letterSpacing': '0',
-                    'opacity': 1,
-                    'rotation': 0
-                }
-                
-                elements.append(element)
-                element_id += 1
-        
-        result = {
-            'suggested_name': file.filename.replace('.xlsx', '').replace('.xls', ''),
-            'elements': elements,
-            'page_size': final_page_size
-        }
-        
-        return result
-        
+        if excel_importer.is_large(contents):
+            job_id = await excel_importer.submit(contents, page_size, file.filename, current_user['id'])
+            return {'job_id': job_id, 'status': 'pending'}
+        return await excel_importer.parse(contents, page_size, file.filename)
+
+    except ExcelImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"Error importing from Excel: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في استيراد ملف Excel: {str(e)}")
 
 
+@api_router.get("/import-from-excel/jobs/{job_id}")
+async def get_excel_import_job(job_id: str, current_user: dict = Depends(require_admin)):
+    """Status of a background Excel import - result included when done"""
+    job = await excel_importer.job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="مهمة الاستيراد غير موجودة")
+    return job
+
+
 # ==================== إدارة المستخدمين والصلاحيات ====================
 
 @api_router.get("/admin/users")
@@ -7486,6 +7856,7 @@ async def update_user(
     if update_data:
         update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
         await db.users.update_one({'id': user_id}, {'$set': update_data})
+        await user_cache.invalidate(user_id)
     
     return {'message': 'تم تحديث المستخدم بنجاح'}
 
@@ -7503,6 +7874,7 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="المستخدم غير موجود")
     
+    await user_cache.invalidate(user_id)
     return {'message': 'تم حذف المستخدم بنجاح'}
 
 
@@ -7518,6 +7890,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Disposition", "X-Backup-Collections", "X-Backup-Estimated-Documents", "X-Backup-Id", "X-Backup-Mode"],
 )
 
 logging.basicConfig(
@@ -7526,6 +7899,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_background_logging():
+    # الكتابة الفعلية للسجلات في خيط منفصل (log_queue.py)
+    start_queue_logging()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await user_cache.stop()
+    await scheduler.stop()
+    await id_image_pipeline.stop()
+    await id_name_extractor.close()
+    await excel_importer.close()
+    client.close()
+    stop_queue_logging()
\ No newline at end of file
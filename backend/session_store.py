@@ -0,0 +1,213 @@
+# Session Store
+# تخزين الجلسات (security_config: create_session / validate_session) حسب hash الـ token
+#
+# - البحث O(1) بـ token hash (مفتاح المستند/القاموس) بدل المرور على جلسات المستخدم
+# - انتهاء الصلاحية بعد SESSION_TTL_MINUTES من آخر نشاط
+# - حد أقصى MAX_SESSIONS_PER_USER لكل مستخدم (تُحذف الأقدم نشاطاً)
+#
+# الخلفيات (SESSION_STORE):
+# - memory: داخل العملية
+# - mongo: مجموعة sessions مشتركة بين العمليات + TTL index + كاش قراءة محلي قصير
+#   (الإلغاء يسري على العمليات الأخرى خلال SESSION_CACHE_TTL_SECONDS كحد أقصى)
+
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import os
+import time
+
+# ============ Configuration ============
+
+SESSION_STORE = os.environ.get('SESSION_STORE', 'memory').lower()
+SESSION_TTL_MINUTES = int(os.environ.get('SESSION_TTL_MINUTES', 480))
+MAX_SESSIONS_PER_USER = int(os.environ.get('MAX_SESSIONS_PER_USER', 3))
+SESSION_CACHE_TTL_SECONDS = float(os.environ.get('SESSION_CACHE_TTL_SECONDS', 30))
+# آخر نشاط يُكتب في القاعدة مرة كل دقيقة على الأكثر لكل جلسة
+SESSION_TOUCH_SECONDS = 60
+SESSIONS_COLLECTION = 'sessions'
+
+
+def _as_utc(value: datetime) -> datetime:
+    # pymongo يعيد datetime بدون tzinfo
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class MemorySessionStore:
+    """داخل العملية: OrderedDict مرتب حسب آخر نشاط (الأقدم أولاً) + فهرس لكل مستخدم"""
+
+    def __init__(self, ttl_minutes: int = SESSION_TTL_MINUTES, max_per_user: int = MAX_SESSIONS_PER_USER):
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self.max_per_user = max_per_user
+        self.sessions = OrderedDict()  # {token_hash: session}
+        self.by_user: Dict[str, Dict[str, str]] = {}  # {user_id: {session_id: token_hash}}
+
+    def _remove(self, token_hash: str):
+        session = self.sessions.pop(token_hash, None)
+        if session is None:
+            return
+        user_sessions = self.by_user.get(session['user_id'], {})
+        user_sessions.pop(session['session_id'], None)
+        if not user_sessions:
+            self.by_user.pop(session['user_id'], None)
+
+    def _purge(self, now: datetime):
+        # الأقدم نشاطاً في البداية - التوقف عند أول جلسة صالحة
+        while self.sessions:
+            token_hash, session = next(iter(self.sessions.items()))
+            if session['expires_at'] > now:
+                break
+            self._remove(token_hash)
+
+    async def create(self, user_id: str, session_id: str, token_hash: str, ip: str):
+        now = datetime.now(timezone.utc)
+        self._purge(now)
+        self._remove(token_hash)
+        user_sessions = self.by_user.setdefault(user_id, {})
+        while len(user_sessions) >= self.max_per_user:
+            oldest = min(user_sessions.values(), key=lambda h: self.sessions[h]['last_active'])
+            self._remove(oldest)
+            user_sessions = self.by_user.setdefault(user_id, {})
+        self.sessions[token_hash] = {
+            'session_id': session_id,
+            'user_id': user_id,
+            'ip': ip,
+            'created_at': now,
+            'last_active': now,
+            'expires_at': now + self.ttl
+        }
+        user_sessions[session_id] = token_hash
+
+    async def validate(self, user_id: str, token_hash: str) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        self._purge(now)
+        session = self.sessions.get(token_hash)
+        if session is None or session['user_id'] != user_id:
+            return None
+        session['last_active'] = now
+        session['expires_at'] = now + self.ttl
+        self.sessions.move_to_end(token_hash)
+        return session
+
+    async def revoke(self, user_id: str, session_id: str):
+        token_hash = self.by_user.get(user_id, {}).get(session_id)
+        if token_hash:
+            self._remove(token_hash)
+
+    async def revoke_all(self, user_id: str):
+        for token_hash in list(self.by_user.get(user_id, {}).values()):
+            self._remove(token_hash)
+
+    async def list_sessions(self, user_id: str) -> List[dict]:
+        self._purge(datetime.now(timezone.utc))
+        return [dict(self.sessions[h]) for h in self.by_user.get(user_id, {}).values()]
+
+
+class MongoSessionStore:
+    """
+    مستند لكل جلسة في sessions: _id = token hash
+    expires_at عليه TTL index (MongoDB يحذف الجلسات المنتهية)
+    """
+
+    def __init__(self, db, ttl_minutes: int = SESSION_TTL_MINUTES, max_per_user: int = MAX_SESSIONS_PER_USER,
+                 cache_ttl: float = SESSION_CACHE_TTL_SECONDS, collection: str = SESSIONS_COLLECTION):
+        self.collection = db[collection]
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self.max_per_user = max_per_user
+        self.cache_ttl = cache_ttl
+        self.cache = OrderedDict()  # {token_hash: (cached_until, session)}
+        self.cache_max_entries = 10000
+
+    async def create_indexes(self):
+        await self.collection.create_index([('expires_at', 1)], expireAfterSeconds=0)
+        await self.collection.create_index([('user_id', 1), ('last_active', -1)])
+        await self.collection.create_index([('session_id', 1)], unique=True)
+
+    def _cache_put(self, token_hash: str, session: dict):
+        if self.cache_ttl <= 0:
+            return
+        self.cache[token_hash] = (time.monotonic() + self.cache_ttl, session)
+        self.cache.move_to_end(token_hash)
+        while len(self.cache) > self.cache_max_entries:
+            self.cache.popitem(last=False)
+
+    async def create(self, user_id: str, session_id: str, token_hash: str, ip: str):
+        now = datetime.now(timezone.utc)
+        session = {
+            'session_id': session_id,
+            'user_id': user_id,
+            'ip': ip,
+            'created_at': now,
+            'last_active': now,
+            'expires_at': now + self.ttl
+        }
+        await self.collection.replace_one({'_id': token_hash}, session, upsert=True)
+        self._cache_put(token_hash, session)
+
+        # حذف الجلسات الزائدة (الأقدم نشاطاً)
+        extra = await self.collection.find(
+            {'user_id': user_id}, {'_id': 1}
+        ).sort('last_active', -1).skip(self.max_per_user).to_list(None)
+        if extra:
+            hashes = [doc['_id'] for doc in extra]
+            await self.collection.delete_many({'_id': {'$in': hashes}})
+            for h in hashes:
+                self.cache.pop(h, None)
+
+    async def validate(self, user_id: str, token_hash: str) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        entry = self.cache.get(token_hash)
+        if entry is not None and entry[0] > time.monotonic():
+            session = entry[1]
+        else:
+            self.cache.pop(token_hash, None)
+            session = await self.collection.find_one({'_id': token_hash}, {'_id': 0})
+            if session is None:
+                return None
+            for field in ('created_at', 'last_active', 'expires_at'):
+                session[field] = _as_utc(session[field])
+            self._cache_put(token_hash, session)
+
+        if session['user_id'] != user_id or session['expires_at'] <= now:
+            return None
+
+        if (now - session['last_active']).total_seconds() >= SESSION_TOUCH_SECONDS:
+            session['last_active'] = now
+            session['expires_at'] = now + self.ttl
+            await self.collection.update_one(
+                {'_id': token_hash},
+                {'$set': {'last_active': now, 'expires_at': session['expires_at']}}
+            )
+        return session
+
+    async def revoke(self, user_id: str, session_id: str):
+        doc = await self.collection.find_one_and_delete({'user_id': user_id, 'session_id': session_id}, {'_id': 1})
+        if doc:
+            self.cache.pop(doc['_id'], None)
+
+    async def revoke_all(self, user_id: str):
+        docs = await self.collection.find({'user_id': user_id}, {'_id': 1}).to_list(None)
+        await self.collection.delete_many({'user_id': user_id})
+        for doc in docs:
+            self.cache.pop(doc['_id'], None)
+
+    async def list_sessions(self, user_id: str) -> List[dict]:
+        return await self.collection.find(
+            {'user_id': user_id, 'expires_at': {'$gt': datetime.now(timezone.utc)}}, {'_id': 0}
+        ).sort('last_active', -1).to_list(None)
+
+
+_session_store = MemorySessionStore()
+
+
+def get_session_store():
+    return _session_store
+
+
+def configure_session_store(db=None, backend: str = SESSION_STORE):
+    """اختيار الخلفية عند بدء التطبيق (SESSION_STORE=memory|mongo)"""
+    global _session_store
+    if backend == 'mongo' and db is not None:
+        _session_store = MongoSessionStore(db)
+    else:
+        _session_store = MemorySessionStore()
+    return _session_store
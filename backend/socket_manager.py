@@ -0,0 +1,225 @@
+# Socket.IO Client Manager
+# توزيع أحداث Socket.IO بين عدة workers (uvicorn --workers N)
+#
+# بدون manager مشترك: الغرف (gov_{code} / admin_{id}) في ذاكرة كل worker،
+# والـ emit يصل فقط للعملاء المتصلين بنفس الـ worker.
+#
+# SOCKETIO_MANAGER:
+# - memory (افتراضي): worker واحد
+# - mongo: capped collection + tailable cursor في نفس قاعدة البيانات (بدون خدمة إضافية)
+# - redis: socketio.AsyncRedisManager على SOCKETIO_REDIS_URL (يتطلب حزمة redis)
+#
+# الغرف (ينضم إليها العميل تلقائياً بعد التحقق من الـ JWT عند الاتصال):
+# - agent_{id}: الصراف (وموظفوه عبر agent_id)  - gov_{code}: محافظة المستخدم
+# - admin + admin_{id}: المدراء
+
+from bson import ObjectId
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from engineio import json
+from pymongo import CursorType
+import asyncio
+import logging
+import os
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from socketio.packet import EVENT, BINARY_EVENT
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+SOCKETIO_MANAGER = os.environ.get('SOCKETIO_MANAGER', 'memory').lower()
+SOCKETIO_REDIS_URL = os.environ.get('SOCKETIO_REDIS_URL', 'redis://localhost:6379/0')
+SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'socketio')
+SOCKETIO_COLLECTION = 'socketio_messages'
+SOCKETIO_COLLECTION_BYTES = int(os.environ.get('SOCKETIO_COLLECTION_BYTES', 16 * 1024 * 1024))
+# حد رسائل الانتظار لكل اتصال - العميل البطيء يُفصل (يعيد الاتصال ويجلب الحالة من الـ API)
+SOCKETIO_MAX_SEND_QUEUE = int(os.environ.get('SOCKETIO_MAX_SEND_QUEUE', 100))
+
+ADMIN_ROOM = 'admin'
+
+
+# ============ Rooms ============
+
+def agent_room(agent_id: str) -> str:
+    return f"agent_{agent_id}"
+
+
+def gov_room(governorate: str) -> str:
+    return f"gov_{governorate}"
+
+
+def admin_room(admin_id: str) -> str:
+    return f"admin_{admin_id}"
+
+
+def rooms_for_user(user: dict) -> List[str]:
+    """الغرف التي ينضم إليها المستخدم عند الاتصال"""
+    rooms = []
+    if user.get('role') == 'admin':
+        rooms += [ADMIN_ROOM, admin_room(user['id'])]
+    elif user.get('role') == 'user' and user.get('agent_id'):
+        # موظف الصراف يستلم أحداث صرافه
+        rooms.append(agent_room(user['agent_id']))
+    else:
+        rooms.append(agent_room(user['id']))
+    if user.get('governorate'):
+        rooms.append(gov_room(user['governorate']))
+    return rooms
+
+
+def transfer_rooms(transfer: dict) -> List[str]:
+    """مستلمو حدث new_transfer: الصراف المحدد فقط، أو صرافو المحافظة إذا لم يُحدد"""
+    if transfer.get('to_agent_id'):
+        return [agent_room(transfer['to_agent_id'])]
+    return [gov_room(transfer['to_governorate'])]
+
+
+# ============ Server ============
+
+class BoundedAsyncServer(socketio.AsyncServer):
+    """AsyncServer مع حد لطابور الإرسال لكل اتصال وعدادات للمراقبة"""
+
+    def __init__(self, *args, max_send_queue: int = SOCKETIO_MAX_SEND_QUEUE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_send_queue = max_send_queue
+        self.counters = {'connections': 0, 'rejected': 0, 'events_sent': 0, 'events_dropped': 0, 'slow_disconnects': 0}
+        self._slow = set()
+
+    def _admit(self, eio_sid) -> bool:
+        """False إذا امتلأ طابور الاتصال - الحدث يُسقط ويُفصل العميل"""
+        socket = self.eio.sockets.get(eio_sid)
+        if socket is not None and self.max_send_queue and socket.queue.qsize() >= self.max_send_queue:
+            self.counters['events_dropped'] += 1
+            if eio_sid not in self._slow:
+                self._slow.add(eio_sid)
+                self.counters['slow_disconnects'] += 1
+                logger.warning(f"Socket.IO client {eio_sid} send queue full - disconnecting")
+                self.start_background_task(self._disconnect_slow, eio_sid)
+            return False
+        self.counters['events_sent'] += 1
+        return True
+
+    async def _send_packet(self, eio_sid, pkt):
+        if pkt.packet_type in (EVENT, BINARY_EVENT) and not self._admit(eio_sid):
+            return
+        await super()._send_packet(eio_sid, pkt)
+
+    async def _send_eio_packet(self, eio_sid, eio_pkt):
+        # البث للغرف (manager.emit) يرمّز الحدث مرة واحدة ويرسله من هنا
+        if not self._admit(eio_sid):
+            return
+        await super()._send_eio_packet(eio_sid, eio_pkt)
+
+    async def _disconnect_slow(self, eio_sid):
+        try:
+            await self.eio.disconnect(eio_sid)
+        finally:
+            self._slow.discard(eio_sid)
+
+    def metrics(self, namespace: str = '/', top: int = 50) -> dict:
+        """الاتصالات وأحجام الغرف في هذا الـ worker"""
+        rooms = self.manager.rooms.get(namespace, {})
+        sizes = {room: len(members) for room, members in rooms.items() if room is not None and room not in members}
+        largest = sorted(sizes.items(), key=lambda item: -item[1])[:top]
+        queues = [socket.queue.qsize() for socket in self.eio.sockets.values()]
+        return {
+            'worker_pid': os.getpid(),
+            'manager': getattr(self.manager, 'name', 'default'),
+            'connected_clients': len(rooms.get(None, {})),
+            'rooms': len(sizes),
+            'room_sizes': dict(largest),
+            'max_send_queue': self.max_send_queue,
+            'largest_send_queue': max(queues, default=0),
+            **self.counters
+        }
+
+
+class AsyncMongoManager(AsyncPubSubManager):
+    """
+    Pub/sub عبر MongoDB: كل رسالة مستند في capped collection
+    وكل worker يتابعها بـ tailable cursor (TAILABLE_AWAIT) ويطبقها على عملائه
+    """
+    name = 'asyncmongo'
+
+    def __init__(self, db, channel: str = SOCKETIO_CHANNEL, write_only: bool = False, logger=None,
+                 collection: str = SOCKETIO_COLLECTION, collection_bytes: int = SOCKETIO_COLLECTION_BYTES):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.db = db
+        self.collection_name = collection
+        self.collection_bytes = collection_bytes
+        self._ready = False
+
+    async def _ensure_collection(self):
+        if self._ready:
+            return
+        try:
+            if self.collection_name not in await self.db.list_collection_names():
+                await self.db.create_collection(self.collection_name, capped=True, size=self.collection_bytes)
+        except Exception as e:
+            # أنشأها worker آخر في نفس اللحظة
+            logger.debug(f"Socket.IO message collection: {str(e)}")
+        self._ready = True
+
+    async def _publish(self, data):
+        await self._ensure_collection()
+        message = {
+            'channel': self.channel,
+            'payload': json.dumps(data),
+            'created_at': datetime.now(timezone.utc)
+        }
+        for attempt in range(2):
+            try:
+                await self.db[self.collection_name].insert_one(message)
+                return
+            except Exception as e:
+                if attempt:
+                    self._get_logger().error(f"Socket.IO publish failed: {str(e)}")
+                    return
+                message.pop('_id', None)
+                await asyncio.sleep(0.1)
+
+    async def _listen(self):
+        await self._ensure_collection()
+        collection = self.db[self.collection_name]
+        # tailable cursor على مجموعة فارغة ينتهي فوراً - مستند بداية لكل worker
+        await collection.insert_one({'channel': self.channel, 'kind': 'start', 'created_at': datetime.now(timezone.utc)})
+        # البدء من الآن - الأحداث القديمة لا تعني شيئاً لـ worker بدأ للتو
+        query = {'channel': self.channel, '_id': {'$gte': ObjectId.from_datetime(datetime.now(timezone.utc))}}
+        # ترتيب الإدراج في capped collection لا يطابق _id بين العمليات دائماً - منع التكرار بعد إعادة الفتح
+        seen = deque(maxlen=1000)
+        seen_set = set()
+
+        while True:
+            try:
+                cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                async for doc in cursor:
+                    if doc['_id'] in seen_set:
+                        continue
+                    if len(seen) == seen.maxlen:
+                        seen_set.discard(seen[0])
+                    seen.append(doc['_id'])
+                    seen_set.add(doc['_id'])
+                    # إعادة الفتح من آخر رسالة مع هامش ثانية (التكرار يُستبعد أعلاه)
+                    query['_id'] = {'$gte': ObjectId.from_datetime(doc['_id'].generation_time - timedelta(seconds=1))}
+                    if 'payload' in doc:
+                        yield doc['payload']
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._get_logger().warning(f"Socket.IO listener error: {str(e)}")
+            await asyncio.sleep(1)
+
+
+def create_client_manager(db=None, backend: str = SOCKETIO_MANAGER):
+    """الـ client_manager لـ socketio.AsyncServer حسب SOCKETIO_MANAGER (None = داخل العملية)"""
+    if backend == 'mongo' and db is not None:
+        return AsyncMongoManager(db)
+    if backend == 'redis':
+        try:
+            return socketio.AsyncRedisManager(SOCKETIO_REDIS_URL, channel=SOCKETIO_CHANNEL)
+        except Exception as e:
+            logger.error(f"⚠️ Socket.IO Redis manager unavailable ({str(e)}) - using a single-worker manager")
+    return None
@@ -0,0 +1,167 @@
+# Transfer OLAP Rollups
+# تجميعات الحوالات: يوم × الصراف المرسل × الصراف المستلم × المحافظة × العملة × الحالة
+#
+# كل انتقال في حالة الحوالة (إنشاء / استلام / إلغاء / تعديل) ينقل الحوالة من حاوية
+# إلى أخرى: $inc سالب على الحاوية القديمة و $inc موجب على الجديدة.
+# اليوم = يوم إنشاء الحوالة، لذلك الحاويات تساوي دائماً تجميع transfers حسب الحالة الحالية.
+#
+# إعادة البناء تُكتب في مجموعة مؤقتة ثم تُنسخ حاوية حاوية إلى المجموعة الحية، وليس $out
+# عليها مباشرة: $out يستبدل المجموعة كاملة ويضيع كل $inc وصل أثناء التجميع.
+
+from pymongo import ReplaceOne, UpdateOne
+from datetime import datetime, timezone
+from uuid import uuid4
+from typing import List, Optional
+
+ROLLUP_COLLECTION = 'transfer_rollups'
+
+# الأبعاد المخزنة في كل حاوية
+ROLLUP_DIMENSIONS = ['day', 'agent_id', 'to_agent_id', 'governorate', 'currency', 'status']
+
+# المقاييس المجمعة
+ROLLUP_MEASURES = ['count', 'amount', 'commission', 'incoming_commission']
+
+# أبعاد التجميع المسموحة في /analytics/transfers
+GROUP_BY_FIELDS = {
+    'day': '$day',
+    'month': {'$substrBytes': ['$day', 0, 7]},
+    'year': {'$substrBytes': ['$day', 0, 4]},
+    'agent_id': '$agent_id',
+    'to_agent_id': '$to_agent_id',
+    'governorate': '$governorate',
+    'currency': '$currency',
+    'status': '$status'
+}
+
+
+def rollup_key(transfer: dict) -> dict:
+    """حاوية الحوالة"""
+    return {
+        'day': (transfer.get('created_at') or '')[:10],
+        'agent_id': transfer.get('from_agent_id'),
+        'to_agent_id': transfer.get('to_agent_id'),
+        'governorate': transfer.get('to_governorate'),
+        'currency': transfer.get('currency', 'IQD'),
+        'status': transfer.get('status')
+    }
+
+
+def _measures(transfer: dict, sign: int) -> dict:
+    return {
+        'count': sign,
+        'amount': sign * (transfer.get('amount') or 0),
+        'commission': sign * (transfer.get('commission') or 0),
+        'incoming_commission': sign * (transfer.get('incoming_commission') or 0)
+    }
+
+
+async def apply_transfer_transition(db, old: Optional[dict], new: Optional[dict]):
+    """
+    نقل الحوالة بين الحاويات
+    old=None عند الإنشاء، new = المستند بعد التحديث
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    operations = []
+    if old:
+        operations.append(UpdateOne(
+            rollup_key(old),
+            {'$inc': _measures(old, -1), '$set': {'updated_at': now}},
+            upsert=True
+        ))
+    if new:
+        operations.append(UpdateOne(
+            rollup_key(new),
+            {'$inc': _measures(new, 1), '$set': {'updated_at': now}},
+            upsert=True
+        ))
+    if operations:
+        await db[ROLLUP_COLLECTION].bulk_write(operations, ordered=False)
+
+
+async def create_rollup_indexes(db):
+    await db[ROLLUP_COLLECTION].create_index([(d, 1) for d in ROLLUP_DIMENSIONS], unique=True)
+    await db[ROLLUP_COLLECTION].create_index([('governorate', 1), ('day', 1)])
+    await db[ROLLUP_COLLECTION].create_index([('agent_id', 1), ('day', 1)])
+
+
+async def merge_rebuilt_rollups(db, source: str, target: str, key_fields: List[str], rebuilt_at: str) -> int:
+    """
+    نسخ التجميعات المعاد بناؤها من source إلى target حاوية حاوية ثم حذف source
+    - كل حاوية في source تستبدل نظيرتها (أو تُضاف)، والحاويات الأخرى لا تُمس
+    - حاويات target غير الموجودة في source ولم تُحدَّث بعد rebuilt_at تُحذف
+    (مستندات source تحمل updated_at = rebuilt_at، والكتابات التراكمية تحمل وقتاً أحدث)
+    """
+    operations = []
+    async for doc in db[source].find({}, {'_id': 0}):
+        operations.append(ReplaceOne({f: doc.get(f) for f in key_fields}, doc, upsert=True))
+        if len(operations) >= 1000:
+            await db[target].bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await db[target].bulk_write(operations, ordered=False)
+    await db[target].delete_many({'updated_at': {'$lt': rebuilt_at}})
+    await db[source].drop()
+    return await db[target].count_documents({})
+
+
+async def rebuild_transfer_rollups(db) -> int:
+    """إعادة بناء التجميعات من transfers (للتعبئة الأولى أو بعد الترحيل)"""
+    rebuilt_at = datetime.now(timezone.utc).isoformat()
+    scratch = f'{ROLLUP_COLLECTION}_rebuild_{uuid4().hex[:8]}'
+    await db.transfers.aggregate([
+        {'$group': {
+            '_id': {
+                'day': {'$substrBytes': [{'$ifNull': ['$created_at', '']}, 0, 10]},
+                'agent_id': '$from_agent_id',
+                'to_agent_id': '$to_agent_id',
+                'governorate': '$to_governorate',
+                'currency': {'$ifNull': ['$currency', 'IQD']},
+                'status': '$status'
+            },
+            'count': {'$sum': 1},
+            'amount': {'$sum': {'$ifNull': ['$amount', 0]}},
+            'commission': {'$sum': {'$ifNull': ['$commission', 0]}},
+            'incoming_commission': {'$sum': {'$ifNull': ['$incoming_commission', 0]}}
+        }},
+        {'$replaceRoot': {'newRoot': {'$mergeObjects': [
+            '$_id',
+            {m: f'${m}' for m in ROLLUP_MEASURES},
+            {'updated_at': rebuilt_at}
+        ]}}},
+        # $out إلى مجموعة مؤقتة وليس $merge: to_agent_id فارغ للحوالات المعلقة و $merge يرفض مفاتيح null
+        {'$out': scratch}
+    ], allowDiskUse=True).to_list(length=None)
+    return await merge_rebuilt_rollups(db, scratch, ROLLUP_COLLECTION, ROLLUP_DIMENSIONS, rebuilt_at)
+
+
+async def query_transfer_rollups(
+    db,
+    group_by: List[str],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    filters: Optional[dict] = None
+) -> List[dict]:
+    """
+    group_by: أبعاد من GROUP_BY_FIELDS
+    start_date / end_date: YYYY-MM-DD (شاملة)
+    filters: {بعد: قيمة} على الأبعاد المخزنة
+    """
+    match = {k: v for k, v in (filters or {}).items() if v is not None}
+    if start_date or end_date:
+        match['day'] = {}
+        if start_date:
+            match['day']['$gte'] = start_date[:10]
+        if end_date:
+            match['day']['$lte'] = end_date[:10]
+
+    pipeline = [
+        {'$match': match},
+        {'$group': {
+            '_id': {field: GROUP_BY_FIELDS[field] for field in group_by} or None,
+            **{m: {'$sum': f'${m}'} for m in ROLLUP_MEASURES}
+        }},
+        {'$match': {'count': {'$ne': 0}}},
+        {'$sort': {f'_id.{field}': 1 for field in group_by} or {'count': -1}}
+    ]
+    rows = await db[ROLLUP_COLLECTION].aggregate(pipeline).to_list(length=None)
+    return [{**(row['_id'] or {}), **{m: row[m] for m in ROLLUP_MEASURES}} for row in rows]
@@ -0,0 +1,140 @@
+# Authenticated User Cache
+# كاش المستخدم الحالي (get_current_user) داخل العملية مع TTL قصير وإبطال صريح
+#
+# - كل طلب مصادق كان ينفذ db.users.find_one؛ الآن مرة واحدة كل USER_CACHE_TTL_SECONDS لكل مستخدم
+# - مسارات تعديل المستخدم (الحالة، التعديل، الحذف، الملف الشخصي) تبطل المدخل فوراً
+# - الإيقاف يسري على العمليات الأخرى خلال TTL كحد أقصى، أو فوراً عند تفعيل
+#   USER_CACHE_INVALIDATION=mongo (قناة إبطال عبر capped collection مشتركة بين العمليات)
+
+from pymongo import CursorType
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import copy
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# ============ Configuration ============
+
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 30))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000))
+USER_CACHE_INVALIDATION = os.environ.get('USER_CACHE_INVALIDATION', 'none').lower()
+
+INVALIDATION_COLLECTION = 'user_cache_invalidations'
+INVALIDATION_COLLECTION_BYTES = 1024 * 1024
+
+
+class UserCache:
+    """LRU + TTL لمستندات المستخدمين حسب id"""
+
+    def __init__(self, db, ttl: float = USER_CACHE_TTL_SECONDS, max_entries: int = USER_CACHE_MAX_ENTRIES,
+                 channel: str = USER_CACHE_INVALIDATION):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.channel = channel
+        self.entries = OrderedDict()  # {user_id: (expires_at, user)}
+        self.origin = uuid.uuid4().hex
+        self.hits = 0
+        self.misses = 0
+        self._listener = None
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        """المستخدم من الكاش أو من القاعدة (نسخة - حتى لا يعدل المعالج المدخل المخزن)"""
+        entry = self.entries.get(user_id)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return copy.copy(entry[1])
+
+        self.misses += 1
+        user = await self.db.users.find_one({'id': user_id}, {'_id': 0})
+        if user is None:
+            self.entries.pop(user_id, None)
+            return None
+        if self.ttl > 0:
+            self.entries[user_id] = (now + self.ttl, user)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return copy.copy(user)
+
+    def invalidate_local(self, user_id: Optional[str] = None):
+        if user_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(user_id, None)
+
+    async def invalidate(self, user_id: Optional[str] = None):
+        """إبطال المستخدم (أو الكل) هنا وفي العمليات الأخرى إذا كانت القناة مفعلة"""
+        self.invalidate_local(user_id)
+        if self.channel != 'mongo':
+            return
+        try:
+            await self.db[INVALIDATION_COLLECTION].insert_one({
+                'user_id': user_id,
+                'origin': self.origin,
+                'created_at': datetime.now(timezone.utc)
+            })
+        except Exception as e:
+            # TTL يبقى الحد الأقصى للتأخير
+            logger.warning(f"User cache invalidation publish failed: {str(e)}")
+
+    # ============ Cross-worker channel ============
+
+    async def start(self):
+        """تشغيل مستمع الإبطال (عند USER_CACHE_INVALIDATION=mongo)"""
+        if self.channel != 'mongo' or self._listener is not None:
+            return
+        try:
+            if INVALIDATION_COLLECTION not in await self.db.list_collection_names():
+                await self.db.create_collection(INVALIDATION_COLLECTION, capped=True, size=INVALIDATION_COLLECTION_BYTES)
+            # tailable cursor على مجموعة فارغة ينتهي فوراً
+            await self.db[INVALIDATION_COLLECTION].insert_one({
+                'kind': 'start', 'origin': self.origin, 'created_at': datetime.now(timezone.utc)
+            })
+        except Exception as e:
+            logger.warning(f"User cache invalidation channel unavailable: {str(e)}")
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self):
+        # البدء من الآن - الرسائل القديمة لا تعني شيئاً لعملية بدأت للتو
+        since = datetime.now(timezone.utc)
+        while True:
+            try:
+                cursor = self.db[INVALIDATION_COLLECTION].find(
+                    {'created_at': {'$gte': since}},
+                    cursor_type=CursorType.TAILABLE_AWAIT
+                )
+                async for message in cursor:
+                    since = message['created_at']
+                    if message.get('origin') != self.origin and message.get('kind') != 'start':
+                        self.invalidate_local(message.get('user_id'))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # رسائل الانقطاع ضاعت - كاش العملية غير موثوق
+                logger.warning(f"User cache invalidation listener error: {str(e)}")
+                self.invalidate_local()
+            await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.entries),
+            'ttl_seconds': self.ttl,
+            'channel': self.channel
+        }
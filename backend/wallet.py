@@ -0,0 +1,120 @@
+# Wallet Ledger
+# كل تغيير على أرصدة المحافظ (wallet_balance_iqd / wallet_balance_usd) يمر من هنا
+#
+# - apply(): $inc واحد (find_one_and_update) لكل العملات معاً ويعيد الرصيد الجديد -
+#   بدل قراءة الرصيد ثم $set القيمة المحسوبة (تحديثات العمليات المتزامنة كانت تضيع)
+# - الخصم المشروط في نفس الفلتر: wallet_balance >= المبلغ
+#   (أو >= المبلغ - wallet_limit عند use_limit: حد السحب المسموح للصراف)
+#   وإلا InsufficientBalanceError بدون أي تغيير
+# - سطر wallet_transactions لكل عملة بالمبلغ الفعلي و balance_after بعد التحديث
+
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from typing import Dict, Optional
+import uuid
+
+
+WALLET_CURRENCIES = ('IQD', 'USD')
+
+
+def wallet_field(currency: str) -> str:
+    return f'wallet_balance_{currency.lower()}'
+
+
+def limit_field(currency: str) -> str:
+    return f'wallet_limit_{currency.lower()}'
+
+
+class InsufficientBalanceError(Exception):
+    def __init__(self, currency: str, balance: float):
+        super().__init__(f"Insufficient {currency} balance: {balance}")
+        self.currency = currency
+        self.balance = balance
+
+
+class WalletNotFoundError(Exception):
+    pass
+
+
+class WalletService:
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _funds_condition(currency: str, amount: float, use_limit: bool) -> dict:
+        field = wallet_field(currency)
+        if not use_limit:
+            return {field: {'$gte': amount}}
+        # الرصيد + حد السحب >= المبلغ (الحقول الناقصة = 0)
+        return {'$expr': {'$gte': [
+            {'$add': [{'$ifNull': [f'${field}', 0]}, {'$ifNull': [f'${limit_field(currency)}', 0]}]},
+            amount
+        ]}}
+
+    async def apply(self, user_id: str, deltas: Dict[str, float], transaction: Optional[dict] = None,
+                    check_funds: bool = False, use_limit: bool = False) -> Dict[str, float]:
+        """
+        deltas: {'IQD': -1000.0, 'USD': 5.0} - يعيد الأرصدة الجديدة {'IQD': ..., 'USD': ...}
+        transaction: حقول سطر wallet_transactions (user_display_name, transaction_type, reference_id, note...)
+                     - None = بدون سطر
+        check_funds: كل خصم مشروط برصيد كافٍ (InsufficientBalanceError)
+        """
+        currencies = list(deltas)
+        projection = {'_id': 0, **{wallet_field(currency): 1 for currency in currencies}}
+        deltas = {currency: amount for currency, amount in deltas.items() if amount}
+        if not deltas:
+            user = await self.db.users.find_one({'id': user_id}, projection)
+            if user is None:
+                raise WalletNotFoundError(user_id)
+            return {currency: user.get(wallet_field(currency), 0.0) for currency in currencies}
+
+        query = {'id': user_id}
+        if check_funds:
+            conditions = [
+                self._funds_condition(currency, -amount, use_limit)
+                for currency, amount in deltas.items() if amount < 0
+            ]
+            if conditions:
+                query['$and'] = conditions
+
+        # الرصيد قبل التحديث + المبلغ = نفس نتيجة $inc
+        before = await self.db.users.find_one_and_update(
+            query,
+            {'$inc': {wallet_field(currency): amount for currency, amount in deltas.items()}},
+            projection=projection,
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            current = await self.db.users.find_one({'id': user_id}, projection)
+            if current is None:
+                raise WalletNotFoundError(user_id)
+            currency = next(c for c, amount in deltas.items() if amount < 0)
+            raise InsufficientBalanceError(currency, current.get(wallet_field(currency), 0.0))
+
+        # كل العملات المطلوبة، وليس فقط التي تغيرت (delta = 0 تُحذف من $inc أعلاه)
+        balances = {currency: before.get(wallet_field(currency), 0.0) + deltas.get(currency, 0) for currency in currencies}
+        if transaction is not None:
+            now = datetime.now(timezone.utc).isoformat()
+            await self.db.wallet_transactions.insert_many([
+                {
+                    'id': str(uuid.uuid4()),
+                    'user_id': user_id,
+                    **transaction,
+                    'amount': amount,
+                    'currency': currency,
+                    'balance_after': balances[currency],
+                    'created_at': now
+                }
+                for currency, amount in deltas.items()
+            ])
+        return balances
+
+    async def credit(self, user_id: str, currency: str, amount: float,
+                     transaction: Optional[dict] = None) -> float:
+        return (await self.apply(user_id, {currency: amount}, transaction))[currency]
+
+    async def debit(self, user_id: str, currency: str, amount: float, transaction: Optional[dict] = None,
+                    check_funds: bool = True, use_limit: bool = False) -> float:
+        return (await self.apply(
+            user_id, {currency: -amount}, transaction, check_funds=check_funds, use_limit=use_limit
+        ))[currency]
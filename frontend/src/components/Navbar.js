@@ -1,41 +1,19 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import { Button } from './ui/button';
 import { useWebSocket } from '../contexts/WebSocketContext';
-import api from '../services/api';
 
 const Navbar = () => {
   const navigate = useNavigate();
   const { user, logout } = useAuth();
-  const { connected } = useWebSocket();
+  const { connected, unreadCount } = useWebSocket();
   const [mobileMenuOpen, setMobileMenuOpen] = useState(false);
-  const [unreadCount, setUnreadCount] = useState(0);
   const [accountingMenuOpen, setAccountingMenuOpen] = useState(false);
   const [mobileAccountingOpen, setMobileAccountingOpen] = useState(false);
   const [agentCommissionsMenuOpen, setAgentCommissionsMenuOpen] = useState(false);
   const [mobileAgentCommissionsOpen, setMobileAgentCommissionsOpen] = useState(false);
 
-  useEffect(() => {
-    if (user) {
-      fetchUnreadCount();
-      // Poll every 30 seconds
-      const interval = setInterval(fetchUnreadCount, 30000);
-      return () => clearInterval(interval);
-    }
-  }, [user]);
-
-  const fetchUnreadCount = async () => {
-    try {
-      const response = await api.get('/notifications', {
-        params: { unread_only: true }
-      });
-      setUnreadCount(response.data.unread_count || 0);
-    } catch (error) {
-      console.error('Error fetching unread count:', error);
-    }
-  };
-
   const handleLogout = () => {
     logout();
     navigate('/login');
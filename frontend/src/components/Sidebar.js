@@ -23,7 +23,7 @@ import {
   TrendingUp,
   TrendingDown
 } from 'lucide-react';
-import api from '../services/api';
+import { useWebSocket } from '../contexts/WebSocketContext';
 
 const Sidebar = ({ onCollapsedChange }) => {
   const navigate = useNavigate();
@@ -31,7 +31,7 @@ const Sidebar = ({ onCollapsedChange }) => {
   const { user } = useAuth();
   const [collapsed, setCollapsed] = useState(false);
   const [mobileOpen, setMobileOpen] = useState(false);
-  const [unreadCount, setUnreadCount] = useState(0);
+  const { unreadCount } = useWebSocket();
   const [accountingOpen, setAccountingOpen] = useState(false);
   const [commissionsOpen, setCommissionsOpen] = useState(false);
 
@@ -42,25 +42,6 @@ const Sidebar = ({ onCollapsedChange }) => {
     }
   }, [collapsed, onCollapsedChange]);
 
-  useEffect(() => {
-    if (user) {
-      fetchUnreadCount();
-      const interval = setInterval(fetchUnreadCount, 30000);
-      return () => clearInterval(interval);
-    }
-  }, [user]);
-
-  const fetchUnreadCount = async () => {
-    try {
-      const response = await api.get('/notifications', {
-        params: { unread_only: true }
-      });
-      setUnreadCount(response.data.unread_count || 0);
-    } catch (error) {
-      console.error('Error fetching unread count:', error);
-    }
-  };
-
   const isActive = (path) => location.pathname === path;
 
   const MenuItem = ({ icon: Icon, label, onClick, active, badge, submenu, subOpen, onSubToggle, items }) => (
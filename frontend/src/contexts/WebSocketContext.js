@@ -2,6 +2,7 @@ import React, { createContext, useContext, useEffect, useState } from 'react';
 import { io } from 'socket.io-client';
 import { useAuth } from './AuthContext';
 import { toast } from 'sonner';
+import api from '../services/api';
 
 const WebSocketContext = createContext(null);
 
@@ -11,22 +12,37 @@ const WS_URL = process.env.REACT_APP_BACKEND_URL;
 export const WebSocketProvider = ({ children }) => {
   const [socket, setSocket] = useState(null);
   const [connected, setConnected] = useState(false);
+  const [unreadCount, setUnreadCount] = useState(0);
   const { user, isAuthenticated } = useAuth();
 
   useEffect(() => {
     if (isAuthenticated && user) {
+      // الخادم يتحقق من الـ token ويضيف الاتصال إلى غرف الصراف/المحافظة تلقائياً
       const newSocket = io(WS_URL, {
-        transports: ['websocket', 'polling']
+        transports: ['websocket', 'polling'],
+        auth: { token: localStorage.getItem('token') }
       });
 
+      // العداد يُجلب مرة عند كل اتصال (قد تكون فاتتنا أحداث أثناء الانقطاع) ثم يُحدث من الخادم
+      const fetchUnreadCount = async () => {
+        try {
+          const response = await api.get('/notifications', {
+            params: { unread_only: true, limit: 1 }
+          });
+          setUnreadCount(response.data.unread_count || 0);
+        } catch (error) {
+          console.error('Error fetching unread count:', error);
+        }
+      };
+
       newSocket.on('connect', () => {
         console.log('WebSocket connected');
         setConnected(true);
-        
-        // Join governorate room
-        if (user.governorate) {
-          newSocket.emit('join_governorate', { governorate: user.governorate });
-        }
+        fetchUnreadCount();
+      });
+
+      newSocket.on('unread_count', (data) => {
+        setUnreadCount(data.unread_count || 0);
       });
 
       newSocket.on('disconnect', () => {
@@ -58,7 +74,7 @@ export const WebSocketProvider = ({ children }) => {
   }, [isAuthenticated, user]);
 
   return (
-    <WebSocketContext.Provider value={{ socket, connected }}>
+    <WebSocketContext.Provider value={{ socket, connected, unreadCount, setUnreadCount }}>
       {children}
     </WebSocketContext.Provider>
   );
@@ -20,6 +20,10 @@ const AgentCommissionsPage = () => {
   const [reportType, setReportType] = useState('daily');
   const [selectedDate, setSelectedDate] = useState(new Date().toISOString().split('T')[0]);
   const [activeTab, setActiveTab] = useState('summary'); // summary, earned, paid
+  // تفاصيل العمولات تُجلب عند فتح التبويب من /agent-commissions-report/details
+  const [commissionLines, setCommissionLines] = useState({ earned: null, paid: null });
+  const [hasMoreLines, setHasMoreLines] = useState({ earned: false, paid: false });
+  const [loadingLines, setLoadingLines] = useState(null); // 'earned' | 'paid'
 
   // Only agents can access
   if (user?.role !== 'agent') {
@@ -31,24 +35,31 @@ const AgentCommissionsPage = () => {
     fetchReport();
   }, [reportType, selectedDate]);
 
+  useEffect(() => {
+    if (reportData && (activeTab === 'earned' || activeTab === 'paid') && commissionLines[activeTab] === null) {
+      fetchLines(activeTab);
+    }
+  }, [activeTab, reportData, commissionLines]);
+
+  const getDateParam = () => {
+    if (reportType === 'monthly') return selectedDate.substring(0, 7); // YYYY-MM
+    if (reportType === 'yearly') return selectedDate.substring(0, 4); // YYYY
+    return selectedDate;
+  };
+
   const fetchReport = async () => {
     setLoading(true);
     try {
-      let dateParam = selectedDate;
-      if (reportType === 'monthly') {
-        dateParam = selectedDate.substring(0, 7); // YYYY-MM
-      } else if (reportType === 'yearly') {
-        dateParam = selectedDate.substring(0, 4); // YYYY
-      }
-
       const response = await api.get('/agent-commissions-report', {
         params: {
           report_type: reportType,
-          date: dateParam
+          date: getDateParam()
         }
       });
       
       setReportData(response.data);
+      setCommissionLines({ earned: null, paid: null });
+      setHasMoreLines({ earned: false, paid: false });
     } catch (error) {
       console.error('Error fetching report:', error);
       toast.error('خطأ في تحميل التقرير');
@@ -57,6 +68,23 @@ const AgentCommissionsPage = () => {
     }
   };
 
+  const fetchLines = async (type) => {
+    const current = commissionLines[type] || [];
+    setLoadingLines(type);
+    try {
+      const response = await api.get('/agent-commissions-report/details', {
+        params: { report_type: reportType, date: getDateParam(), type, skip: current.length }
+      });
+      setCommissionLines((prev) => ({ ...prev, [type]: [...current, ...(response.data.commissions || [])] }));
+      setHasMoreLines((prev) => ({ ...prev, [type]: response.data.has_more }));
+    } catch (error) {
+      console.error('Error fetching report:', error);
+      toast.error('خطأ في تحميل التقرير');
+      setCommissionLines((prev) => ({ ...prev, [type]: current }));
+    }
+    setLoadingLines(null);
+  };
+
   const formatCurrency = (amount, currency = 'IQD') => {
     return `${amount?.toLocaleString() || 0} ${currency}`;
   };
@@ -284,7 +312,7 @@ const AgentCommissionsPage = () => {
                             {formatCurrency(reportData.totals.IQD.earned, 'IQD')}
                           </p>
                           <p className="text-xs text-green-700 mt-1">
-                            من {reportData.earned_commissions.filter(c => c.currency === 'IQD').length} حوالة صادرة
+                            من {reportData.totals.IQD.earned_count} حوالة صادرة
                           </p>
                         </CardContent>
                       </Card>
@@ -298,13 +326,15 @@ const AgentCommissionsPage = () => {
                             {formatCurrency(reportData.totals.USD.earned, 'USD')}
                           </p>
                           <p className="text-xs text-green-700 mt-1">
-                            من {reportData.earned_commissions.filter(c => c.currency === 'USD').length} حوالة صادرة
+                            من {reportData.totals.USD.earned_count} حوالة صادرة
                           </p>
                         </CardContent>
                       </Card>
                     </div>
 
-                    {reportData.earned_commissions.length > 0 ? (
+                    {commissionLines.earned === null ? (
+                      <div className="text-center py-12 text-muted-foreground">جاري التحميل...</div>
+                    ) : commissionLines.earned.length > 0 ? (
                       <Card>
                         <CardHeader>
                           <CardTitle className="text-xl">📋 تفاصيل العمولات المحققة</CardTitle>
@@ -322,7 +352,7 @@ const AgentCommissionsPage = () => {
                                 </tr>
                               </thead>
                               <tbody>
-                                {reportData.earned_commissions.map((comm, idx) => (
+                                {commissionLines.earned.map((comm, idx) => (
                                   <tr key={idx} className="border-b hover:bg-green-50">
                                     <td className="p-3 text-sm">{formatDate(comm.created_at)}</td>
                                     <td className="p-3 font-bold text-primary">
@@ -343,6 +373,13 @@ const AgentCommissionsPage = () => {
                               </tbody>
                             </table>
                           </div>
+                          {hasMoreLines.earned && (
+                            <div className="flex justify-center mt-4">
+                              <Button variant="outline" onClick={() => fetchLines('earned')} disabled={loadingLines === 'earned'}>
+                                {loadingLines === 'earned' ? 'جاري التحميل...' : 'عرض المزيد'}
+                              </Button>
+                            </div>
+                          )}
                         </CardContent>
                       </Card>
                     ) : (
@@ -366,7 +403,7 @@ const AgentCommissionsPage = () => {
                             {formatCurrency(reportData.totals.IQD.paid, 'IQD')}
                           </p>
                           <p className="text-xs text-red-700 mt-1">
-                            من {reportData.paid_commissions.filter(c => c.currency === 'IQD').length} حوالة واردة
+                            من {reportData.totals.IQD.paid_count} حوالة واردة
                           </p>
                         </CardContent>
                       </Card>
@@ -380,13 +417,15 @@ const AgentCommissionsPage = () => {
                             {formatCurrency(reportData.totals.USD.paid, 'USD')}
                           </p>
                           <p className="text-xs text-red-700 mt-1">
-                            من {reportData.paid_commissions.filter(c => c.currency === 'USD').length} حوالة واردة
+                            من {reportData.totals.USD.paid_count} حوالة واردة
                           </p>
                         </CardContent>
                       </Card>
                     </div>
 
-                    {reportData.paid_commissions.length > 0 ? (
+                    {commissionLines.paid === null ? (
+                      <div className="text-center py-12 text-muted-foreground">جاري التحميل...</div>
+                    ) : commissionLines.paid.length > 0 ? (
                       <Card>
                         <CardHeader>
                           <CardTitle className="text-xl">📋 تفاصيل العمولات المدفوعة</CardTitle>
@@ -404,7 +443,7 @@ const AgentCommissionsPage = () => {
                                 </tr>
                               </thead>
                               <tbody>
-                                {reportData.paid_commissions.map((comm, idx) => (
+                                {commissionLines.paid.map((comm, idx) => (
                                   <tr key={idx} className="border-b hover:bg-red-50">
                                     <td className="p-3 text-sm">{formatDate(comm.created_at)}</td>
                                     <td className="p-3 font-bold text-primary">
@@ -425,6 +464,13 @@ const AgentCommissionsPage = () => {
                               </tbody>
                             </table>
                           </div>
+                          {hasMoreLines.paid && (
+                            <div className="flex justify-center mt-4">
+                              <Button variant="outline" onClick={() => fetchLines('paid')} disabled={loadingLines === 'paid'}>
+                                {loadingLines === 'paid' ? 'جاري التحميل...' : 'عرض المزيد'}
+                              </Button>
+                            </div>
+                          )}
                         </CardContent>
                       </Card>
                     ) : (
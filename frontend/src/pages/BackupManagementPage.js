@@ -67,22 +67,27 @@ const BackupManagementPage = () => {
     try {
       const token = localStorage.getItem('token');
       const response = await api.get('/admin/backup/export-all', {
-        headers: { Authorization: `Bearer ${token}` }
+        headers: { Authorization: `Bearer ${token}` },
+        params: { compression: 'gzip' },
+        responseType: 'blob'
       });
 
-      const backupData = response.data;
-      
-      // Store stats
-      setBackupStats(backupData.metadata);
+      // Store stats (from response headers - the body is a compressed NDJSON stream)
+      setBackupStats({
+        total_documents: parseInt(response.headers['x-backup-estimated-documents'] || '0', 10),
+        total_collections: parseInt(response.headers['x-backup-collections'] || '0', 10),
+        exported_by: user?.username || user?.display_name || '-'
+      });
 
-      // Create filename with date and time
+      // Filename from the server (backup_YYYY-MM-DD_HH-MM-SS.ndjson.gz)
       const now = new Date();
       const timestamp = now.toISOString().replace(/[:.]/g, '-').slice(0, 19);
-      const filename = `backup_${timestamp}.json`;
+      const disposition = response.headers['content-disposition'] || '';
+      const match = disposition.match(/filename="?([^";]+)"?/);
+      const filename = match ? match[1] : `backup_${timestamp}.ndjson.gz`;
 
-      // Create blob and download
-      const blob = new Blob([JSON.stringify(backupData, null, 2)], { type: 'application/json' });
-      const url = window.URL.createObjectURL(blob);
+      // Download blob
+      const url = window.URL.createObjectURL(response.data);
       const link = document.createElement('a');
       link.href = url;
       link.download = filename;
@@ -333,7 +338,7 @@ const BackupManagementPage = () => {
                 يتم حفظ النسخ الاحتياطية في مجلد <strong>التنزيلات</strong> الخاص بك
               </p>
               <p className="text-sm text-gray-700 mt-2">
-                اسم الملف: <code className="bg-white px-2 py-1 rounded">backup_YYYY-MM-DD_HH-MM-SS.json</code>
+                اسم الملف: <code className="bg-white px-2 py-1 rounded">backup_YYYY-MM-DD_HH-MM-SS.ndjson.gz</code>
               </p>
             </div>
 
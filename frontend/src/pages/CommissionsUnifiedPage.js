@@ -27,6 +27,13 @@ const CommissionsUnifiedPage = () => {
   // Data
   const [paidCommissions, setPaidCommissions] = useState([]);
   const [earnedCommissions, setEarnedCommissions] = useState([]);
+  // الإجماليات من الخادم (كل الفترة) - القوائم صفحات بـ next_cursor
+  const [paidTotals, setPaidTotals] = useState({});
+  const [earnedTotals, setEarnedTotals] = useState({});
+  const [paidCursor, setPaidCursor] = useState(null);
+  const [earnedCursor, setEarnedCursor] = useState(null);
+  const [searchParams, setSearchParams] = useState({});
+  const [loadingMore, setLoadingMore] = useState(null); // 'paid' | 'earned'
   const [showPaidDetails, setShowPaidDetails] = useState(false);
   const [showEarnedDetails, setShowEarnedDetails] = useState(false);
 
@@ -93,6 +100,11 @@ const CommissionsUnifiedPage = () => {
       
       setPaidCommissions(paidResponse.data.commissions || []);
       setEarnedCommissions(earnedResponse.data.commissions || []);
+      setPaidTotals(paidResponse.data.totals || {});
+      setEarnedTotals(earnedResponse.data.totals || {});
+      setPaidCursor(paidResponse.data.next_cursor || null);
+      setEarnedCursor(earnedResponse.data.next_cursor || null);
+      setSearchParams(params);
       
     } catch (error) {
       console.error('Error fetching commissions:', error);
@@ -102,16 +114,35 @@ const CommissionsUnifiedPage = () => {
     }
   };
 
-  const calculateTotal = (commissions, currency = null) => {
-    return commissions
-      .filter(c => !currency || c.currency === currency)
-      .reduce((sum, c) => sum + (c.amount || 0), 0);
+  const fetchMoreCommissions = async (type) => {
+    const cursor = type === 'paid' ? paidCursor : earnedCursor;
+    if (!cursor) return;
+    setLoadingMore(type);
+    try {
+      const response = await api.get('/admin-commissions', {
+        params: { ...searchParams, type, cursor }
+      });
+      const commissions = response.data.commissions || [];
+      if (type === 'paid') {
+        setPaidCommissions((prev) => [...prev, ...commissions]);
+        setPaidCursor(response.data.next_cursor || null);
+      } else {
+        setEarnedCommissions((prev) => [...prev, ...commissions]);
+        setEarnedCursor(response.data.next_cursor || null);
+      }
+    } catch (error) {
+      console.error('Error fetching commissions:', error);
+      toast.error('خطأ في تحميل العمولات');
+    }
+    setLoadingMore(null);
   };
 
-  const totalPaidIQD = calculateTotal(paidCommissions, 'IQD');
-  const totalPaidUSD = calculateTotal(paidCommissions, 'USD');
-  const totalEarnedIQD = calculateTotal(earnedCommissions, 'IQD');
-  const totalEarnedUSD = calculateTotal(earnedCommissions, 'USD');
+  const totalFor = (totals, currency) => totals[currency]?.amount || 0;
+
+  const totalPaidIQD = totalFor(paidTotals, 'IQD');
+  const totalPaidUSD = totalFor(paidTotals, 'USD');
+  const totalEarnedIQD = totalFor(earnedTotals, 'IQD');
+  const totalEarnedUSD = totalFor(earnedTotals, 'USD');
   const netIQD = totalEarnedIQD - totalPaidIQD;
   const netUSD = totalEarnedUSD - totalPaidUSD;
 
@@ -416,6 +447,13 @@ const CommissionsUnifiedPage = () => {
                       </tbody>
                     </table>
                   </div>
+                  {paidCursor && (
+                    <div className="flex justify-center mt-4">
+                      <Button variant="outline" onClick={() => fetchMoreCommissions('paid')} disabled={loadingMore === 'paid'}>
+                        {loadingMore === 'paid' ? 'جاري التحميل...' : `عرض المزيد (${paidCommissions.length} من ${Object.values(paidTotals).reduce((sum, t) => sum + t.count, 0)})`}
+                      </Button>
+                    </div>
+                  )}
                 </CardContent>
               </Card>
             )}
@@ -459,6 +497,13 @@ const CommissionsUnifiedPage = () => {
                       </tbody>
                     </table>
                   </div>
+                  {earnedCursor && (
+                    <div className="flex justify-center mt-4">
+                      <Button variant="outline" onClick={() => fetchMoreCommissions('earned')} disabled={loadingMore === 'earned'}>
+                        {loadingMore === 'earned' ? 'جاري التحميل...' : `عرض المزيد (${earnedCommissions.length} من ${Object.values(earnedTotals).reduce((sum, t) => sum + t.count, 0)})`}
+                      </Button>
+                    </div>
+                  )}
                 </CardContent>
               </Card>
             )}
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
+import { useWebSocket } from '../contexts/WebSocketContext';
 import { Button } from '../components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from '../components/ui/card';
 import { toast } from 'sonner';
@@ -10,8 +11,11 @@ import api from '../services/api';
 const NotificationsPage = () => {
   const navigate = useNavigate();
   const { user } = useAuth();
+  const { unreadCount } = useWebSocket();
   const [notifications, setNotifications] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [filter, setFilter] = useState('all'); // all, unread
 
   useEffect(() => {
@@ -25,6 +29,7 @@ const NotificationsPage = () => {
         params: { unread_only: filter === 'unread' }
       });
       setNotifications(response.data.notifications || []);
+      setNextCursor(response.data.next_cursor || null);
     } catch (error) {
       console.error('Error fetching notifications:', error);
       toast.error('خطأ في جلب الإشعارات');
@@ -32,15 +37,48 @@ const NotificationsPage = () => {
     setLoading(false);
   };
 
+  const fetchMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await api.get('/notifications', {
+        params: { unread_only: filter === 'unread', cursor: nextCursor }
+      });
+      setNotifications((prev) => [...prev, ...(response.data.notifications || [])]);
+      setNextCursor(response.data.next_cursor || null);
+    } catch (error) {
+      console.error('Error fetching notifications:', error);
+      toast.error('خطأ في جلب الإشعارات');
+    }
+    setLoadingMore(false);
+  };
+
   const markAsRead = async (notificationId) => {
     try {
-      await api.patch('/notifications/${notificationId}/mark-read');
-      fetchNotifications();
+      await api.patch(`/notifications/${notificationId}/mark-read`);
+      // العداد يصل عبر WebSocket - تحديث القائمة محلياً بدون إعادة الجلب
+      setNotifications((prev) =>
+        filter === 'unread'
+          ? prev.filter((n) => n.id !== notificationId)
+          : prev.map((n) => (n.id === notificationId ? { ...n, is_read: true } : n))
+      );
     } catch (error) {
       console.error('Error marking as read:', error);
     }
   };
 
+  const markAllAsRead = async () => {
+    try {
+      await api.post('/notifications/mark-all-read');
+      setNotifications((prev) => (filter === 'unread' ? [] : prev.map((n) => ({ ...n, is_read: true }))));
+      if (filter === 'unread') setNextCursor(null);
+      toast.success('تم تعليم جميع الإشعارات كمقروءة');
+    } catch (error) {
+      console.error('Error marking all as read:', error);
+      toast.error('خطأ في تعليم الإشعارات');
+    }
+  };
+
   const getSeverityColor = (severity) => {
     switch (severity) {
       case 'critical':
@@ -77,6 +115,7 @@ const NotificationsPage = () => {
       'id_verification_failed': '🆔',
       'suspicious_activity': '🔍',
       'ai_warning': '🤖',
+      'delayed_transfer': '⏰',
       'system': '⚙️'
     };
     return typeIcons[type] || '🔔';
@@ -117,8 +156,13 @@ const NotificationsPage = () => {
                 variant={filter === 'unread' ? 'default' : 'outline'}
                 onClick={() => setFilter('unread')}
               >
-                غير المقروءة
+                غير المقروءة{unreadCount > 0 ? ` (${unreadCount})` : ''}
               </Button>
+              {unreadCount > 0 && (
+                <Button variant="outline" onClick={markAllAsRead}>
+                  ✓ تعليم الكل كمقروء
+                </Button>
+              )}
             </div>
           </CardContent>
         </Card>
@@ -188,7 +232,7 @@ const NotificationsPage = () => {
                         size="sm"
                         variant="link"
                         className="h-auto p-0"
-                        onClick={() => navigate('/transfers/${notification.related_transfer_id}')}
+                        onClick={() => navigate(`/transfers/${notification.related_transfer_id}`)}
                       >
                         🔗 عرض الحوالة
                       </Button>
@@ -197,6 +241,13 @@ const NotificationsPage = () => {
                 </CardContent>
               </Card>
             ))}
+            {nextCursor && (
+              <div className="flex justify-center">
+                <Button variant="outline" onClick={fetchMore} disabled={loadingMore}>
+                  {loadingMore ? 'جاري التحميل...' : 'عرض المزيد'}
+                </Button>
+              </div>
+            )}
           </div>
         )}
       </div>
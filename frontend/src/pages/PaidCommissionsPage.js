@@ -15,6 +15,10 @@ const PaidCommissionsPage = () => {
   const { user } = useAuth();
   const [loading, setLoading] = useState(false);
   const [reportData, setReportData] = useState(null);
+  // تفاصيل العمولات تُجلب على دفعات من /reports/commissions/details
+  const [paidCommissions, setPaidCommissions] = useState([]);
+  const [hasMore, setHasMore] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   
   // Report filters
   const [reportType, setReportType] = useState('daily');
@@ -30,24 +34,32 @@ const PaidCommissionsPage = () => {
     fetchReport();
   }, [reportType, selectedDate]);
 
+  const getDateParam = () => {
+    if (reportType === 'monthly') return selectedDate.substring(0, 7); // YYYY-MM
+    if (reportType === 'yearly') return selectedDate.substring(0, 4); // YYYY
+    return selectedDate;
+  };
+
+  const fetchDetails = async (skip) => {
+    const response = await api.get('/reports/commissions/details', {
+      params: { report_type: reportType, date: getDateParam(), type: 'paid', skip }
+    });
+    setHasMore(response.data.has_more);
+    return response.data.commissions || [];
+  };
+
   const fetchReport = async () => {
     setLoading(true);
     try {
-      let dateParam = selectedDate;
-      if (reportType === 'monthly') {
-        dateParam = selectedDate.substring(0, 7); // YYYY-MM
-      } else if (reportType === 'yearly') {
-        dateParam = selectedDate.substring(0, 4); // YYYY
-      }
-
       const response = await api.get('/reports/commissions', {
         params: {
           report_type: reportType,
-          date: dateParam
+          date: getDateParam()
         }
       });
       
       setReportData(response.data);
+      setPaidCommissions(await fetchDetails(0));
     } catch (error) {
       console.error('Error fetching report:', error);
       toast.error('خطأ في تحميل التقرير');
@@ -56,6 +68,18 @@ const PaidCommissionsPage = () => {
     }
   };
 
+  const fetchMore = async () => {
+    setLoadingMore(true);
+    try {
+      const more = await fetchDetails(paidCommissions.length);
+      setPaidCommissions((prev) => [...prev, ...more]);
+    } catch (error) {
+      console.error('Error fetching report:', error);
+      toast.error('خطأ في تحميل التقرير');
+    }
+    setLoadingMore(false);
+  };
+
   const formatCurrency = (amount, currency = 'IQD') => {
     return `${amount.toLocaleString()} ${currency}`;
   };
@@ -133,7 +157,7 @@ const PaidCommissionsPage = () => {
                         {formatCurrency(reportData.totals.IQD.paid, 'IQD')}
                       </p>
                       <p className="text-sm text-red-700 mt-2">
-                        عدد العمليات: {reportData.paid_commissions.filter(c => c.currency === 'IQD').length}
+                        عدد العمليات: {reportData.totals.IQD.paid_count}
                       </p>
                     </CardContent>
                   </Card>
@@ -147,7 +171,7 @@ const PaidCommissionsPage = () => {
                         {formatCurrency(reportData.totals.USD.paid, 'USD')}
                       </p>
                       <p className="text-sm text-red-700 mt-2">
-                        عدد العمليات: {reportData.paid_commissions.filter(c => c.currency === 'USD').length}
+                        عدد العمليات: {reportData.totals.USD.paid_count}
                       </p>
                     </CardContent>
                   </Card>
@@ -162,7 +186,7 @@ const PaidCommissionsPage = () => {
                 </div>
 
                 {/* Paid Commissions Table */}
-                {reportData.paid_commissions.length > 0 ? (
+                {paidCommissions.length > 0 ? (
                   <Card>
                     <CardHeader>
                       <CardTitle className="text-xl">📋 تفاصيل العمولات المدفوعة</CardTitle>
@@ -181,7 +205,7 @@ const PaidCommissionsPage = () => {
                             </tr>
                           </thead>
                           <tbody>
-                            {reportData.paid_commissions.map((comm, idx) => (
+                            {paidCommissions.map((comm, idx) => (
                               <tr key={comm.id || idx} className="border-b hover:bg-red-50">
                                 <td className="p-3">
                                   {new Date(comm.created_at).toLocaleDateString('ar-IQ', {
@@ -211,6 +235,13 @@ const PaidCommissionsPage = () => {
                           </tbody>
                         </table>
                       </div>
+                      {hasMore && (
+                        <div className="flex justify-center mt-4">
+                          <Button variant="outline" onClick={fetchMore} disabled={loadingMore}>
+                            {loadingMore ? 'جاري التحميل...' : 'عرض المزيد'}
+                          </Button>
+                        </div>
+                      )}
                     </CardContent>
                   </Card>
                 ) : (
@@ -22,6 +22,11 @@ const ReportsPage = () => {
   // Report data
   const [commissionsReport, setCommissionsReport] = useState(null);
   const [agentsReport, setAgentsReport] = useState(null);
+  // تفاصيل العمولات تُجلب على دفعات من /reports/commissions/details
+  const [commissionLines, setCommissionLines] = useState({ earned: [], paid: [] });
+  const [hasMoreLines, setHasMoreLines] = useState({ earned: false, paid: false });
+  const [detailsParams, setDetailsParams] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(null); // 'earned' | 'paid'
   
   // Tab state
   const [activeTab, setActiveTab] = useState('summary'); // summary, agents
@@ -51,6 +56,16 @@ const ReportsPage = () => {
       });
       setCommissionsReport(commissionsRes.data);
       
+      // First page of commission lines for each type
+      const params = { report_type: reportType, date: dateParam };
+      const [earnedRes, paidRes] = await Promise.all([
+        api.get('/reports/commissions/details', { params: { ...params, type: 'earned' } }),
+        api.get('/reports/commissions/details', { params: { ...params, type: 'paid' } })
+      ]);
+      setCommissionLines({ earned: earnedRes.data.commissions || [], paid: paidRes.data.commissions || [] });
+      setHasMoreLines({ earned: earnedRes.data.has_more, paid: paidRes.data.has_more });
+      setDetailsParams(params);
+      
       // Fetch agents profit report
       const agentsRes = await api.get('/reports/agents-profit', {
         params: { report_type: reportType, date: dateParam }
@@ -65,6 +80,21 @@ const ReportsPage = () => {
     setLoading(false);
   };
 
+  const fetchMoreLines = async (type) => {
+    setLoadingMore(type);
+    try {
+      const response = await api.get('/reports/commissions/details', {
+        params: { ...detailsParams, type, skip: commissionLines[type].length }
+      });
+      setCommissionLines((prev) => ({ ...prev, [type]: [...prev[type], ...(response.data.commissions || [])] }));
+      setHasMoreLines((prev) => ({ ...prev, [type]: response.data.has_more }));
+    } catch (error) {
+      console.error('Error fetching reports:', error);
+      toast.error('خطأ في تحميل التقارير');
+    }
+    setLoadingMore(null);
+  };
+
   const getDateInputType = () => {
     if (reportType === 'daily') return 'date';
     if (reportType === 'monthly') return 'month';
@@ -313,11 +343,11 @@ const ReportsPage = () => {
                   <CardHeader>
                     <CardTitle>تفاصيل العمولات المحققة</CardTitle>
                     <CardDescription>
-                      {commissionsReport.earned_commissions?.length || 0} عملية
+                      {(commissionsReport.totals.IQD?.earned_count || 0) + (commissionsReport.totals.USD?.earned_count || 0)} عملية
                     </CardDescription>
                   </CardHeader>
                   <CardContent>
-                    {commissionsReport.earned_commissions?.length > 0 ? (
+                    {commissionLines.earned.length > 0 ? (
                       <div className="overflow-x-auto">
                         <table className="w-full text-sm">
                           <thead className="bg-gray-100">
@@ -330,7 +360,7 @@ const ReportsPage = () => {
                             </tr>
                           </thead>
                           <tbody>
-                            {commissionsReport.earned_commissions.map((comm, idx) => (
+                            {commissionLines.earned.map((comm, idx) => (
                               <tr key={idx} className="border-t">
                                 <td className="p-2">{new Date(comm.created_at).toLocaleDateString('ar-IQ')}</td>
                                 <td className="p-2">{comm.agent_name}</td>
@@ -343,6 +373,13 @@ const ReportsPage = () => {
                             ))}
                           </tbody>
                         </table>
+                        {hasMoreLines.earned && (
+                          <div className="flex justify-center mt-4">
+                            <Button variant="outline" onClick={() => fetchMoreLines('earned')} disabled={loadingMore === 'earned'}>
+                              {loadingMore === 'earned' ? 'جاري التحميل...' : 'عرض المزيد'}
+                            </Button>
+                          </div>
+                        )}
                       </div>
                     ) : (
                       <p className="text-center py-4 text-muted-foreground">لا توجد عمليات</p>
@@ -354,11 +391,11 @@ const ReportsPage = () => {
                   <CardHeader>
                     <CardTitle>تفاصيل العمولات المدفوعة</CardTitle>
                     <CardDescription>
-                      {commissionsReport.paid_commissions?.length || 0} عملية
+                      {(commissionsReport.totals.IQD?.paid_count || 0) + (commissionsReport.totals.USD?.paid_count || 0)} عملية
                     </CardDescription>
                   </CardHeader>
                   <CardContent>
-                    {commissionsReport.paid_commissions?.length > 0 ? (
+                    {commissionLines.paid.length > 0 ? (
                       <div className="overflow-x-auto">
                         <table className="w-full text-sm">
                           <thead className="bg-gray-100">
@@ -371,7 +408,7 @@ const ReportsPage = () => {
                             </tr>
                           </thead>
                           <tbody>
-                            {commissionsReport.paid_commissions.map((comm, idx) => (
+                            {commissionLines.paid.map((comm, idx) => (
                               <tr key={idx} className="border-t">
                                 <td className="p-2">{new Date(comm.created_at).toLocaleDateString('ar-IQ')}</td>
                                 <td className="p-2">{comm.agent_name}</td>
@@ -384,6 +421,13 @@ const ReportsPage = () => {
                             ))}
                           </tbody>
                         </table>
+                        {hasMoreLines.paid && (
+                          <div className="flex justify-center mt-4">
+                            <Button variant="outline" onClick={() => fetchMoreLines('paid')} disabled={loadingMore === 'paid'}>
+                              {loadingMore === 'paid' ? 'جاري التحميل...' : 'عرض المزيد'}
+                            </Button>
+                          </div>
+                        )}
                       </div>
                     ) : (
                       <p className="text-center py-4 text-muted-foreground">لا توجد عمليات</p>
@@ -292,22 +292,41 @@ const VisualTemplateDesignerPage = () => {
       formData.append('file', file);
       formData.append('page_size', pageSize);
 
+      const headers = { Authorization: `Bearer ${localStorage.getItem('token')}` };
       const response = await api.post(
         '/import-from-excel',
         formData,
         { 
           headers: { 
-            Authorization: `Bearer ${localStorage.getItem('token')}`,
+            ...headers,
             'Content-Type': 'multipart/form-data'
           } 
         }
       );
 
-      if (response.data.elements) {
-        setElements(response.data.elements);
-        setTemplateName(response.data.suggested_name || 'تصميم من Excel');
-        setPageSize(response.data.page_size || pageSize);
-        toast.success(`🎉 تم استيراد ${response.data.elements.length} عنصر من Excel!`);
+      // الملفات الكبيرة تُحلل في الخلفية - ننتظر النتيجة بـ job_id
+      let result = response.data;
+      if (result.job_id) {
+        toast.info('⏳ الملف كبير - جاري التحليل...');
+        while (true) {
+          await new Promise((resolve) => setTimeout(resolve, 1500));
+          const job = await api.get(`/import-from-excel/jobs/${result.job_id}`, { headers });
+          if (job.data.status === 'failed') {
+            toast.error(job.data.error || 'خطأ في استيراد ملف Excel');
+            return;
+          }
+          if (job.data.status === 'done') {
+            result = job.data.result;
+            break;
+          }
+        }
+      }
+
+      if (result.elements) {
+        setElements(result.elements);
+        setTemplateName(result.suggested_name || 'تصميم من Excel');
+        setPageSize(result.page_size || pageSize);
+        toast.success(`🎉 تم استيراد ${result.elements.length} عنصر من Excel!`);
       }
     } catch (error) {
       console.error('Excel Import Error:', error);
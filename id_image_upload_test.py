@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+🪪 اختبار مسار رفع صورة الهوية: save → upload → patch (backend/id_image_uploads.py)
+
+**المشكلة:**
+save() كان يضع المهمة في الطابور ويوقظ الـ workers قبل أن يُكتب الإيصال بـ id_image_upload_id
+(في /receive يُكتب بعد قراءة الهوية و claim_transfer). إذا انتهى الرفع أولاً لا يجد
+on_uploaded ما يحدّثه، وتصبح المهمة done و id_image_path يبقى None للأبد.
+
+**الإصلاح:** المهمة تبدأ held ولا تُرفع إلا بعد release() (بعد كتابة الإيصال)
+
+**الاختبار (LocalBackend + mongomock، بدون Cloudinary أو MongoDB):**
+1. save() ثم run_once() قبل كتابة الإيصال → لا شيء يُرفع
+2. كتابة الإيصال ثم release() ثم run_once() → المهمة done والإيصال يحمل الرابط
+3. مهمة لم تُحرر تُرفع بعد ID_IMAGE_HOLD_SECONDS
+4. discard() (طلب آخر استلم الحوالة) يحذف المهمة وملفها ولا يُرفع شيء
+
+التشغيل:
+    python id_image_upload_test.py
+"""
+
+import asyncio
+import io
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+sys.path.append(str(ROOT_DIR / 'backend'))
+
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from id_image_uploads import IdImagePipeline, LocalBackend  # noqa: E402
+
+TRANSFER_ID = 'test-transfer'
+
+
+def sample_image() -> bytes:
+    output = io.BytesIO()
+    Image.new('RGB', (3000, 2000), (200, 30, 30)).save(output, format='PNG')
+    return output.getvalue()
+
+
+async def run(tmp: Path):
+    db = AsyncMongoMockClient()['id_image_upload_test']
+    pipeline = IdImagePipeline(db, backend=LocalBackend(tmp / 'uploaded'), storage_dir=tmp / 'pending')
+
+    async def patch_uploaded_id_image(job: dict, url: str):
+        # نفس تحديث server.py
+        await db.receipts.update_many(
+            {'transfer_id': job['transfer_id'], 'id_image_upload_id': job['_id']},
+            {'$set': {'id_image_path': url}}
+        )
+
+    pipeline.on_uploaded = patch_uploaded_id_image
+
+    # 1. الصورة محفوظة محلياً، والإيصال لم يُكتب بعد
+    upload_id, jpeg = await pipeline.save(sample_image(), TRANSFER_ID)
+    assert max(Image.open(io.BytesIO(jpeg)).size) <= 1600, 'الصورة لم تُصغّر'
+    assert not await pipeline.run_once(), 'رُفعت المهمة قبل كتابة الإيصال'
+
+    # 2. الإيصال ثم release
+    await db.receipts.insert_one({
+        'id': 'receipt-1',
+        'transfer_id': TRANSFER_ID,
+        'id_image_path': None,
+        'id_image_upload_id': upload_id
+    })
+    await pipeline.release(upload_id)
+    assert await pipeline.run_once(), 'المهمة لم تُرفع بعد release'
+
+    job = await db.id_image_uploads.find_one({'_id': upload_id})
+    receipt = await db.receipts.find_one({'id': 'receipt-1'})
+    assert job['status'] == 'done', f"حالة المهمة: {job['status']}"
+    assert receipt['id_image_path'] == job['url'], f"id_image_path: {receipt['id_image_path']}"
+    assert (tmp / 'uploaded' / f'{upload_id}.jpg').exists()
+    assert not (tmp / 'pending' / f'{upload_id}.jpg').exists()
+
+    # 3. مهمة لم تُحرر (الطلب توقف) تُرفع بعد انتهاء الحجز
+    orphan_id, _ = await pipeline.save(sample_image(), 'orphan-transfer')
+    assert not await pipeline.run_once()
+    await db.id_image_uploads.update_one(
+        {'_id': orphan_id}, {'$set': {'next_attempt_at': datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    )
+    assert await pipeline.run_once(), 'مهمة held منتهية الحجز لم تُرفع'
+    assert (await db.id_image_uploads.find_one({'_id': orphan_id}))['status'] == 'done'
+
+    # 4. claim_transfer خسر السباق - المهمة المحجوزة تُحذف مع ملفها
+    lost_id, _ = await pipeline.save(sample_image(), 'lost-transfer')
+    await pipeline.discard(lost_id)
+    assert await db.id_image_uploads.find_one({'_id': lost_id}) is None, 'المهمة بقيت بعد discard'
+    assert not (tmp / 'pending' / f'{lost_id}.jpg').exists(), 'الملف بقي بعد discard'
+    assert not await pipeline.run_once()
+
+    pipeline.executor.shutdown()
+
+
+def test_save_upload_patch():
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(Path(tmp)))
+
+
+def main():
+    try:
+        test_save_upload_patch()
+    except AssertionError as e:
+        print(f'❌ {e}')
+        return 1
+    print('✅ الإيصال يحمل رابط الصورة بعد الرفع (الرفع لا يبدأ قبل كتابة الإيصال)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
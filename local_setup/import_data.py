@@ -2,64 +2,293 @@
 """
 سكربت استيراد البيانات إلى MongoDB
 شغّل هذا السكربت بعد تثبيت MongoDB
+
+    python import_data.py                                  # ملفات database/*.json أو *.ndjson
+    python import_data.py backup_2025-01-01_00-00-00.ndjson.gz   # نسخة احتياطية من /admin/backup/export-all
+
+- القراءة تدريجية (لا يُحمّل أي ملف كاملاً في الذاكرة)
+- الإدخال على دفعات insert_many(ordered=False) بحجم محدود
+- عدة مجموعات بالتوازي
+- الفهارس الثانوية تُحذف قبل التحميل وتُبنى بعده (خيارات المجموعة مثل capped و timeseries تبقى)
 """
+import argparse
 import json
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from bson import json_util
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
 
 # الاتصال بـ MongoDB
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/money_transfer_db')
-client = MongoClient(MONGO_URL)
-db = client['money_transfer_db']
+DB_NAME = os.environ.get('DB_NAME', 'money_transfer_db')
 
 # مسار ملفات البيانات
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'database')
 
-def import_collection(name):
-    """استيراد collection واحد"""
-    file_path = os.path.join(DATA_DIR, f'{name}.json')
-    
-    if not os.path.exists(file_path):
-        print(f'⚠️  ملف {name}.json غير موجود')
-        return 0
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    if not data:
-        print(f'📭 {name}: فارغ')
-        return 0
-    
-    # حذف البيانات القديمة
-    db[name].delete_many({})
-    
-    # إدخال البيانات الجديدة
-    db[name].insert_many(data)
-    print(f'✅ {name}: {len(data)} سجل')
-    return len(data)
+# قراءة صيغة النسخ الاحتياطي المتدفق (backend/backup.py)
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-def main():
+BATCH_SIZE = 1000
+WORKERS = 4
+READ_CHUNK = 1024 * 1024
+
+
+class Stats:
+    """عدادات الإنتاجية لكل مجموعة"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.collections = {}
+
+    def start(self, name):
+        with self.lock:
+            self.collections.setdefault(name, {'docs': 0, 'errors': 0, 'started': time.time(), 'finished': None})
+
+    def add(self, name, docs, errors=0):
+        with self.lock:
+            self.collections[name]['docs'] += docs
+            self.collections[name]['errors'] += errors
+
+    def finish(self, name):
+        with self.lock:
+            self.collections[name]['finished'] = time.time()
+
+    def total(self):
+        return sum(c['docs'] for c in self.collections.values())
+
+
+# ============ Parsing ============
+
+def iter_json_array(path):
+    """عناصر ملف JSON على شكل [...] واحداً تلو الآخر بدون تحميل الملف كاملاً"""
+    decoder = json.JSONDecoder(object_hook=json_util.object_hook)
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(READ_CHUNK).lstrip('\ufeff').lstrip()
+        eof = not buffer
+        if not buffer.startswith('['):
+            raise ValueError(f'{path}: ليس مصفوفة JSON')
+        pos = 1
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    raise ValueError(f'{path}: نهاية غير متوقعة للملف')
+                chunk = f.read(READ_CHUNK)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            if end is None or (end == len(buffer) and not eof):
+                # العنصر مقطوع عند نهاية الدفعة - قراءة المزيد
+                chunk = f.read(READ_CHUNK)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield obj
+            pos = end
+            if pos > READ_CHUNK:
+                buffer, pos = buffer[pos:], 0
+
+
+def iter_ndjson(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json_util.loads(line)
+
+
+def iter_batches(docs, batch_size):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ============ Loading ============
+
+def collection_options(db, name):
+    """خيارات إنشاء المجموعة (capped، timeseries، validator...) - {} إذا لم تكن موجودة"""
+    info = next(db.list_collections(filter={'name': name}), None)
+    if not info or info.get('type') not in (None, 'collection', 'timeseries'):
+        return {}
+    options = dict(info.get('options', {}))
+    timeseries = options.get('timeseries')
+    if timeseries and 'granularity' in timeseries:
+        # bucket* تُشتق من granularity ولا تُقبل معها عند الإنشاء
+        options['timeseries'] = {k: v for k, v in timeseries.items() if not k.startswith('bucket')}
+    return options
+
+
+def prepare_collection(db, name):
+    """
+    حفظ تعريف الفهارس الثانوية ثم حذف المجموعة (أسرع من delete_many)
+    وإعادة إنشائها بنفس الخيارات - socketio_messages (capped) و exchange_rate_history
+    (time-series) لا تعود مجموعات عادية
+    """
+    options = collection_options(db, name)
+    indexes = [
+        (spec['key'], {k: v for k, v in spec.items() if k not in ('key', 'v', 'ns')} | {'name': index_name})
+        for index_name, spec in db[name].index_information().items()
+        if index_name != '_id_'
+    ]
+    db[name].drop()
+    if options:
+        db.create_collection(name, **options)
+    return indexes
+
+
+def rebuild_indexes(db, name, indexes):
+    for keys, options in indexes:
+        db[name].create_index(keys, **options)
+    return len(indexes)
+
+
+def insert_batch(db, name, batch, stats):
+    try:
+        result = db[name].insert_many(batch, ordered=False)
+        stats.add(name, len(result.inserted_ids))
+    except BulkWriteError as e:
+        inserted = e.details.get('nInserted', 0)
+        stats.add(name, inserted, len(batch) - inserted)
+
+
+def import_collection_file(db, name, path, batch_size, stats):
+    """استيراد collection واحد من ملفه"""
+    stats.start(name)
+    indexes = prepare_collection(db, name)
+    docs = iter_ndjson(path) if path.endswith('.ndjson') else iter_json_array(path)
+    for batch in iter_batches(docs, batch_size):
+        insert_batch(db, name, batch, stats)
+    rebuild_indexes(db, name, indexes)
+    stats.finish(name)
+
+
+def import_directory(db, data_dir, workers, batch_size, stats):
+    """كل ملف مجموعة في عامل مستقل"""
+    files = {}
+    for filename in sorted(os.listdir(data_dir)):
+        name, ext = os.path.splitext(filename)
+        if ext in ('.json', '.ndjson'):
+            files[name] = os.path.join(data_dir, filename)
+
+    # الملفات الأكبر أولاً حتى لا تبقى في النهاية وحدها
+    ordered = sorted(files.items(), key=lambda item: os.path.getsize(item[1]), reverse=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(import_collection_file, db, name, path, batch_size, stats): name for name, path in ordered}
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f'❌ {futures[future]}: {e}')
+    return sum(os.path.getsize(path) for path in files.values())
+
+
+def import_backup(db, path, workers, batch_size, stats):
+    """
+    نسخة احتياطية متدفقة: القراءة في هذا الخيط والإدخال على دفعات في عدة عمال
+    الفهارس تُبنى بعد انتهاء كل الدفعات
+    """
+    from backup import open_backup, iter_backup
+
+    indexes = {}
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    futures = []
+    batch, current = [], None
+
+    def submit(name, docs):
+        in_flight.acquire()
+        future = pool.submit(insert_batch, db, name, docs, stats)
+        future.add_done_callback(lambda _: in_flight.release())
+        futures.append(future)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, open_backup(path) as stream:
+        for kind, payload in iter_backup(stream):
+            if kind == 'manifest':
+                if payload.get('mode', 'full') != 'full':
+                    raise ValueError('نسخة تزايدية - استخدم scripts/restore_backup.py مع النسخة الكاملة')
+                print(f"📦 نسخة {payload.get('database_name')} بتاريخ {payload.get('backup_timestamp')}")
+                continue
+            if kind != 'doc':
+                continue
+            name, doc = payload
+            if name != current:
+                if batch:
+                    submit(current, batch)
+                batch, current = [], name
+                if name not in indexes:
+                    stats.start(name)
+                    indexes[name] = prepare_collection(db, name)
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                submit(current, batch)
+                batch = []
+        if batch:
+            submit(current, batch)
+
+        wait(futures)
+        for future in futures:
+            future.result()
+        wait([pool.submit(rebuild_indexes, db, name, specs) for name, specs in indexes.items()])
+
+    for name in indexes:
+        stats.finish(name)
+    return os.path.getsize(path)
+
+
+def print_stats(stats, total_bytes, elapsed):
+    for name, c in sorted(stats.collections.items(), key=lambda item: -item[1]['docs']):
+        seconds = (c['finished'] or time.time()) - c['started']
+        rate = c['docs'] / seconds if seconds > 0 else 0
+        errors = f" ⚠️ {c['errors']} مرفوض" if c['errors'] else ''
+        print(f"✅ {name}: {c['docs']} سجل في {seconds:.2f}s ({rate:,.0f} سجل/ث){errors}")
+    total = stats.total()
     print('=' * 50)
-    print('🚀 بدء استيراد البيانات إلى MongoDB')
+    print(f'🎉 تم استيراد {total} سجل في {elapsed:.2f}s')
+    if elapsed > 0:
+        print(f'⚡ {total / elapsed:,.0f} سجل/ث - {total_bytes / elapsed / 1024 / 1024:.1f} MB/s')
     print('=' * 50)
-    
-    # قائمة الـ collections
-    collections = [
-        'users', 'transfers', 'chart_of_accounts', 'journal_entries',
-        'wallet_transactions', 'admin_commissions', 'commission_rates',
-        'notifications', 'visual_templates', 'templates', 'receipts',
-        'exchange_rates', 'account_categories', 'audit_logs',
-        'pin_attempts', 'transit_account', 'transit_transactions',
-        'counters', 'accounts', 'currency_revaluations'
-    ]
-    
-    total = 0
-    for col in collections:
-        total += import_collection(col)
-    
+
+
+def main():
+    parser = argparse.ArgumentParser(description='استيراد البيانات إلى MongoDB')
+    parser.add_argument('source', nargs='?', default=DATA_DIR, help='مجلد ملفات JSON أو ملف نسخة احتياطية')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
     print('=' * 50)
-    print(f'🎉 تم استيراد {total} سجل بنجاح!')
+    print('🚀 بدء استيراد البيانات إلى MongoDB')
     print('=' * 50)
 
+    client = MongoClient(MONGO_URL, maxPoolSize=args.workers + 2)
+    db = client[DB_NAME]
+    stats = Stats()
+    started = time.time()
+
+    if os.path.isdir(args.source):
+        total_bytes = import_directory(db, args.source, args.workers, args.batch_size, stats)
+    else:
+        total_bytes = import_backup(db, args.source, args.workers, args.batch_size, stats)
+
+    print_stats(stats, total_bytes, time.time() - started)
+    client.close()
+
 if __name__ == '__main__':
     main()
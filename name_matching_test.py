@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+🔤 اختبار مطابقة الأسماء (backend/name_matching.py + backend/iraqi_id_validator.py)
+
+**المشكلة:**
+عتبة 0.9 مع مكافأة البادئة في Jaro-Winkler كانت تقبل أسماء قصيرة مختلفة:
+حسن/حسين 0.933، سعد/سعيد 0.933، محمد/محمود 0.953، علي/عليا 0.942.
+validate_receiver_name('حسن علي', 'حسين') كانت True، و
+match_names('محمد علي حسن', 'محمود علي حسن') كانت partial_match.
+
+**الإصلاح:** كل مقطع يجب أن يكون نفسه بعد التطبيع، أو باستبدال حرف واحد في مقطع
+من 5 أحرف أو أكثر، وبدون مكافأة البادئة للمقاطع القصيرة
+
+**الاختبار:**
+1. الأزواج أعلاه لا تتطابق (الاسم الأول، الاسم الكامل، كشف التكرار)
+2. المطابقة الصحيحة ما زالت تعمل: نفس الاسم، عبد الله/عبدالله، ثلاثي مقابل رباعي،
+   حرف واحد مختلف في اسم طويل
+
+التشغيل (بدون خادم أو قاعدة بيانات):
+    python name_matching_test.py
+"""
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+sys.path.append(str(ROOT_DIR / 'backend'))
+
+from iraqi_id_validator import validate_receiver_name  # noqa: E402
+from name_matching import (  # noqa: E402
+    EXACT_MATCH, NO_MATCH, PARTIAL_MATCH, first_names_match, match_names, rank_names
+)
+
+DIFFERENT_SHORT_NAMES = [('حسن', 'حسين'), ('سعد', 'سعيد'), ('محمد', 'محمود'), ('علي', 'عليا')]
+
+
+def test_different_short_names_do_not_match():
+    for a, b in DIFFERENT_SHORT_NAMES:
+        assert not first_names_match(a, b), f'{a}/{b}: الاسم الأول متطابق'
+        full_a, full_b = f'{a} علي حسن', f'{b} علي حسن'
+        status, score = match_names(full_a, full_b)
+        assert status == NO_MATCH, f'{full_a}/{full_b}: {status} {score:.3f}'
+
+    assert not validate_receiver_name('حسن علي', 'حسين')[0]
+    assert match_names('محمد علي حسن', 'محمود علي حسن')[0] == NO_MATCH
+    assert match_names('احمد حسن كاظم', 'احمد حسين كاظم')[0] == NO_MATCH
+    assert rank_names('محمد علي حسن', ['محمود علي حسن'], threshold=0.9, token_threshold=0.85) == []
+
+
+def test_same_person_still_matches():
+    assert match_names('محمد علي حسن', 'محمد علي حسن')[0] == EXACT_MATCH
+    assert match_names('عبد الله كريم', 'عبدالله كريم')[0] == EXACT_MATCH
+    assert match_names('محمد علي حسن', 'محمد علي حسن جاسم')[0] == PARTIAL_MATCH
+    # خطأ حرف واحد في اسم طويل (عبدالرحمن / عبدالرحمز)
+    assert first_names_match('عبدالرحمن', 'عبدالرحمز')
+    assert match_names('عبدالرحمن علي', 'عبدالرحمز علي')[0] == PARTIAL_MATCH
+    assert validate_receiver_name('حسن علي', 'حسن')[0]
+    assert validate_receiver_name('أحمد علي', 'احمد')[0]
+
+
+def main():
+    try:
+        test_different_short_names_do_not_match()
+        test_same_person_still_matches()
+    except AssertionError as e:
+        print(f'❌ {e}')
+        return 1
+    print('✅ الأسماء القصيرة المختلفة (حسن/حسين، محمد/محمود...) لا تتطابق')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+🚦 اختبار فصل السياسات في MemoryBackend (backend/rate_limiter.py)
+
+**المشكلة:**
+MemoryBackend كان يخزن الحالة بالمفتاح فقط (IP)، بينما سياسة requests (middleware)
+وسياسة login تستخدمان نفس IP. نافذتاهما المختلفتان كانتا تصفّران عدادات بعضهما،
+فيُسمح بكل محاولات تسجيل الدخول رغم الحد.
+
+**الاختبار:**
+1. طلب middleware (requests) قبل كل محاولة login لنفس IP
+2. يجب أن يُسمح بـ 5 محاولات login فقط من 50 (مثل بدون middleware)
+3. reset لسياسة login لا يمس عداد requests
+
+التشغيل (بدون خادم أو قاعدة بيانات):
+    python rate_limiter_test.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+sys.path.append(str(ROOT_DIR / 'backend'))
+
+from rate_limiter import MemoryBackend, RateLimitPolicy  # noqa: E402
+
+IP = '203.0.113.7'
+LOGIN = RateLimitPolicy('login', 5, 900, 900)
+REQUESTS = RateLimitPolicy('requests', 1000, 60)
+ATTEMPTS = 50
+
+
+async def interleaved_login_attempts(backend: MemoryBackend, now: float) -> int:
+    allowed = 0
+    for attempt in range(ATTEMPTS):
+        t = now + attempt
+        await backend.hit(REQUESTS, IP, t, 1)
+        if (await backend.hit(LOGIN, IP, t, 1)).allowed:
+            allowed += 1
+    return allowed
+
+
+def test_policies_on_same_key_are_isolated():
+    backend = MemoryBackend()
+    now = 1_000_000.0
+
+    allowed = asyncio.run(interleaved_login_attempts(backend, now))
+    assert allowed == LOGIN.limit, f'login: {allowed}/{ATTEMPTS} مسموح'
+    assert backend.size() == 2
+
+    requests = asyncio.run(backend.peek(REQUESTS, IP, now + ATTEMPTS))
+    assert requests.allowed and requests.remaining < REQUESTS.limit
+
+    asyncio.run(backend.reset(LOGIN, IP))
+    assert asyncio.run(backend.peek(LOGIN, IP, now + ATTEMPTS)).allowed
+    assert asyncio.run(backend.peek(REQUESTS, IP, now + ATTEMPTS)).remaining == requests.remaining
+
+
+def main():
+    try:
+        test_policies_on_same_key_are_isolated()
+    except AssertionError as e:
+        print(f'❌ {e}')
+        return 1
+    print(f'✅ {LOGIN.limit}/{ATTEMPTS} محاولات login مسموحة رغم طلبات requests على نفس IP')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Arabic name normalisation and batch matching
+
+    python scripts/benchmark_name_matching.py
+    python scripts/benchmark_name_matching.py --candidates 50000
+
+Compares, on the same generated names:
+- before: iraqi_id_validator.normalize_name as it was (verbose regex compiled on every call)
+          + char-by-char zip similarity - reproduced below
+- after:  name_matching (str.translate tables, token-level Jaro-Winkler, rank_names batch API)
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent / 'backend'
+sys.path.append(str(ROOT_DIR))
+
+from name_matching import name_tokens, normalize_name, rank_names, _token_similarity
+
+FIRST_NAMES = ['مُحَمَّد', 'أحمد', 'علي', 'حسين', 'حسن', 'عبد الله', 'مصطفى', 'زينب', 'فاطمة', 'كاظم',
+               'جاسم', 'عباس', 'كريم', 'جواد', 'إبراهيم', 'يوسف', 'عمر', 'سجاد', 'مرتضى', 'نور']
+
+# ============ Previous implementation ============
+
+def legacy_normalize_name(name: str) -> str:
+    if not name:
+        return ""
+    name = name.lower().strip()
+    arabic_diacritics = re.compile("""
+        ّ    | # Tashdid
+        َ    | # Fatha
+        ً    | # Tanwin Fath
+        ُ    | # Damma
+        ٌ    | # Tanwin Damm
+        ِ    | # Kasra
+        ٍ    | # Tanwin Kasr
+        ْ    | # Sukun
+        ـ     # Tatwil/Kashida
+    """, re.VERBOSE)
+    name = re.sub(arabic_diacritics, '', name)
+    return ' '.join(name.split())
+
+
+def legacy_similarity(name1: str, name2: str) -> float:
+    a, b = legacy_normalize_name(name1), legacy_normalize_name(name2)
+    if not a or not b:
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / max(len(a), len(b))
+
+
+def legacy_rank(name: str, candidates, threshold: float):
+    scored = [(i, legacy_similarity(name, c)) for i, c in enumerate(candidates)]
+    return sorted([s for s in scored if s[1] >= threshold], key=lambda s: s[1], reverse=True)
+
+
+# ============ Benchmark ============
+
+def generate_names(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(FIRST_NAMES) for _ in range(rng.choice((3, 3, 4)))) for _ in range(count)]
+
+
+def timed(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Arabic name matching benchmark')
+    parser.add_argument('--candidates', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    candidates = generate_names(args.candidates)
+    queries = generate_names(args.queries, seed=11)
+
+    # التطبيع وحده (بدون كاش - أسماء مختلفة في كل استدعاء)
+    normalize_before = timed(lambda: [legacy_normalize_name(n) for n in candidates])
+    name_tokens.cache_clear()
+    normalize_after = timed(lambda: [normalize_name(n) for n in candidates])
+
+    # اسم واحد مقابل كل المرشحين (مثل كشف التكرار والبحث)
+    rank_before = timed(lambda: [legacy_rank(q, candidates, 0.9) for q in queries])
+    name_tokens.cache_clear()
+    _token_similarity.cache_clear()
+    rank_after = timed(lambda: [rank_names(q, candidates, threshold=0.9) for q in queries])
+
+    print(f"📊 {args.candidates:,} candidate names, {args.queries} queries")
+    print(f"   normalise  before {normalize_before / args.candidates * 1e6:8.2f} µs/name"
+          f"   after {normalize_after / args.candidates * 1e6:8.2f} µs/name"
+          f"   ({normalize_before / normalize_after:.1f}x)")
+    per_query = lambda elapsed: elapsed / args.queries * 1000
+    print(f"   rank       before {per_query(rank_before):8.2f} ms/query"
+          f"   after {per_query(rank_after):8.2f} ms/query"
+          f"   ({rank_before / rank_after:.1f}x)")
+    print(f"   token-pair cache: {_token_similarity.cache_info().currsize:,} pairs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request overhead of the security middleware stack
+
+    python scripts/benchmark_security_middleware.py
+    python scripts/benchmark_security_middleware.py --requests 20000
+
+Compares, on the same FastAPI endpoint (ASGI calls, no network):
+- bare:   no middleware
+- before: the previous five BaseHTTPMiddleware layers (Security, RequestLogging,
+          RateLimit, SQLInjectionProtection, Timeout) - reproduced below
+- after:  security_middleware.SecurityMiddleware (single pure-ASGI layer)
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent / 'backend'
+sys.path.append(str(ROOT_DIR))
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from security_config import SECURITY_HEADERS, check_ip_blocked
+from security_middleware import SecurityMiddleware, DANGEROUS_PATTERNS
+
+# ============ Previous implementation (BaseHTTPMiddleware per layer) ============
+
+class LegacySecurityMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        if await check_ip_blocked(request.client.host):
+            return JSONResponse(status_code=403, content={"detail": "blocked"})
+        start_time = time.time()
+        response = await call_next(request)
+        for header_name, header_value in SECURITY_HEADERS.items():
+            response.headers[header_name] = header_value
+        response.headers["X-Process-Time"] = str(time.time() - start_time)
+        return response
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        url = str(request.url)
+        logging.getLogger('security').info(f"[REQUEST] {request.method} {url} from {request.client.host}")
+        response = await call_next(request)
+        logging.getLogger('security').info(f"[RESPONSE] {request.method} {url} - Status: {response.status_code}")
+        return response
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, max_requests: int = 100, window: int = 60):
+        super().__init__(app)
+        self.max_requests = max_requests
+        self.window = window
+        self.requests = {}
+
+    async def dispatch(self, request, call_next):
+        client_ip = request.client.host
+        now = time.time()
+        self.requests[client_ip] = [ts for ts in self.requests.get(client_ip, []) if now - ts < self.window]
+        if len(self.requests[client_ip]) >= self.max_requests:
+            return JSONResponse(status_code=429, content={"detail": "limit"})
+        self.requests[client_ip].append(now)
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(self.max_requests)
+        response.headers["X-RateLimit-Remaining"] = str(self.max_requests - len(self.requests[client_ip]))
+        response.headers["X-RateLimit-Reset"] = str(int(now + self.window))
+        return response
+
+
+class LegacySQLInjectionProtectionMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        url_lower = str(request.url).lower()
+        for pattern in DANGEROUS_PATTERNS:
+            if pattern.lower() in url_lower:
+                return JSONResponse(status_code=400, content={"detail": "invalid"})
+        return await call_next(request)
+
+
+class LegacyTimeoutMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        try:
+            return await asyncio.wait_for(call_next(request), timeout=30)
+        except asyncio.TimeoutError:
+            return JSONResponse(status_code=504, content={"detail": "timeout"})
+
+
+# ============ Benchmark ============
+
+def build_app(variant: str, max_requests: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.get('/api/ping')
+    async def ping():
+        return {'ok': True}
+
+    if variant == 'before':
+        app.add_middleware(LegacyTimeoutMiddleware)
+        app.add_middleware(LegacySQLInjectionProtectionMiddleware)
+        app.add_middleware(LegacyRateLimitMiddleware, max_requests=max_requests, window=60)
+        app.add_middleware(LegacyRequestLoggingMiddleware)
+        app.add_middleware(LegacySecurityMiddleware)
+    elif variant == 'after':
+        app.add_middleware(SecurityMiddleware, max_requests=max_requests, window=60, timeout_seconds=30)
+    return app
+
+
+async def run_requests(app, count: int, clients: int) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        done = asyncio.Event()
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                done.set()
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': '/api/ping', 'raw_path': b'/api/ping',
+            'query_string': b'page=1', 'root_path': '', 'headers': [(b'host', b'bench')],
+            'client': (f'10.0.{(i % clients) // 256}.{i % 256}', 50000), 'server': ('bench', 80),
+        }
+        await app(scope, receive, send)
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Security middleware overhead benchmark')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=50, help='distinct client IPs')
+    args = parser.parse_args()
+
+    # تسجيل الطلبات يعمل كما في الإنتاج لكن بدون كتابة على الشاشة
+    logging.getLogger('security').addHandler(logging.NullHandler())
+    logging.getLogger('security').propagate = False
+    logging.getLogger('security').setLevel(logging.INFO)
+
+    # الحد أعلى من عدد الطلبات حتى يصل كل طلب إلى الـ endpoint
+    max_requests = args.requests + 1
+    results = {}
+    for variant in ('bare', 'before', 'after'):
+        app = build_app(variant, max_requests)
+        await run_requests(app, 200, args.clients)  # warm-up
+        results[variant] = await run_requests(app, args.requests, args.clients)
+
+    bare = results['bare'] / args.requests * 1e6
+    print(f"📊 {args.requests} requests, {args.clients} client IPs")
+    for variant, elapsed in results.items():
+        per_request = elapsed / args.requests * 1e6
+        overhead = '' if variant == 'bare' else f" (+{per_request - bare:,.0f} µs middleware)"
+        print(f"   {variant:7} {per_request:8,.0f} µs/request{overhead}")
+    before = results['before'] / args.requests * 1e6 - bare
+    after = results['after'] / args.requests * 1e6 - bare
+    if after > 0:
+        print(f"✅ middleware overhead {before / after:.1f}x lower")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Run data migrations (scripts/migrations)
+
+    python scripts/migrate.py list
+    python scripts/migrate.py run                       # all pending (non-manual) migrations in order
+    python scripts/migrate.py run 0004 link_agents_to_chart_of_accounts --dry-run
+    python scripts/migrate.py run 6 --batch-size 500 --restart
+
+Interrupted runs resume from the last completed batch (schema_migrations collection)
+"""
+import argparse
+import asyncio
+import os
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from pathlib import Path
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent / 'backend'
+load_dotenv(ROOT_DIR / '.env')
+sys.path.append(str(Path(__file__).parent))
+
+from migrations import get_checkpoint, ordered_migrations, resolve, run_migration
+from migrations.framework import DEFAULT_BATCH_SIZE
+
+async def list_migrations(db):
+    for m in ordered_migrations():
+        checkpoint = await get_checkpoint(db, m) or {}
+        status = checkpoint.get('status', 'pending')
+        if status == 'running':
+            status = f"interrupted at {checkpoint.get('processed', 0)}"
+        manual = ' [manual]' if m.manual else ''
+        print(f"   {m.key:45} {status:20} {m.description}{manual}")
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run data migrations')
+    parser.add_argument('command', choices=['list', 'run'])
+    parser.add_argument('targets', nargs='*', help='migration number or name (default: all pending)')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint of an interrupted run')
+    parser.add_argument('--force', action='store_true', help='run again even if already applied')
+    args = parser.parse_args(argv)
+
+    mongo_url = os.environ['MONGO_URL']
+    db_name = os.environ['DB_NAME']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+    print(f"📊 Database: {db_name}")
+
+    try:
+        if args.command == 'list':
+            await list_migrations(db)
+            return 0
+
+        migrations = resolve(args.targets) if args.targets else [m for m in ordered_migrations() if not m.manual]
+        for m in migrations:
+            await run_migration(db, m, dry_run=args.dry_run, batch_size=args.batch_size,
+                                restart=args.restart, force=args.force)
+        return 0
+    finally:
+        client.close()
+
+if __name__ == '__main__':
+    try:
+        sys.exit(asyncio.run(main()))
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
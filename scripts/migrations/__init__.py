@@ -0,0 +1,15 @@
+"""
+Versioned data migrations (run with scripts/migrate.py)
+الترحيلات مرتبة حسب الرقم؛ كل ملف يسجل ترحيلاته بـ @migration
+"""
+import sys
+from pathlib import Path
+
+# الجداول المشتركة مع الخادم (مثل رموز المحافظات)
+sys.path.append(str(Path(__file__).parent.parent.parent / 'backend'))
+
+from .framework import (
+    MIGRATIONS, Migration, UpdateMigration, MigrationContext,
+    migration, ordered_migrations, resolve, run_migration, get_checkpoint
+)
+from . import users, transfers, journal, chart_of_accounts  # noqa: F401 - registration
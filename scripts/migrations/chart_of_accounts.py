@@ -0,0 +1,165 @@
+"""ترحيلات ربط الصرافين بالدليل المحاسبي"""
+import re
+from datetime import datetime, timezone
+
+from pymongo import DeleteMany, DeleteOne, InsertOne, UpdateOne
+
+from governorates import GOVERNORATE_CODE_TO_NAME
+from .framework import Migration, migration
+
+EXCHANGE_CATEGORY = 'شركات الصرافة'
+AGENT_PROJECTION = {'_id': 1, 'id': 1, 'display_name': 1, 'username': 1, 'account_id': 1, 'governorate': 1}
+
+
+async def load_agent_accounts(db):
+    """(حساب كل صراف حسب agent_id، كل رموز الدليل)"""
+    accounts_by_agent = {}
+    codes = set()
+    async for account in db.chart_of_accounts.find({}, {'_id': 0, 'code': 1, 'agent_id': 1}):
+        codes.add(account['code'])
+        if account.get('agent_id'):
+            accounts_by_agent[account['agent_id']] = account['code']
+    return accounts_by_agent, codes
+
+
+def agent_name(agent: dict) -> str:
+    return agent.get('display_name', agent.get('username'))
+
+
+@migration
+class LinkAgentsToChartOfAccounts(Migration):
+    """
+    كل صراف له حساب في الدليل المحاسبي (فئة شركات الصرافة) و users.account_id يشير إليه
+    - حساب موجود بـ agent_id: تصحيح account_id
+    - account_id يشير لحساب بدون agent_id: ربط الحساب بالصراف
+    - غير ذلك: إنشاء حساب جديد 2xxx
+    """
+    version = 5
+    name = 'link_agents_to_chart_of_accounts'
+    description = 'Link every agent to an exchange-company account in chart_of_accounts'
+    collection = 'users'
+    query = {'role': 'agent'}
+    projection = AGENT_PROJECTION
+
+    async def setup(self, ctx):
+        self.accounts_by_agent, self.codes = await load_agent_accounts(ctx.db)
+        numbers = [int(code) for code in self.codes if re.fullmatch(r'2\d{3}', str(code))]
+        self.last_number = max(numbers) - 2000 if numbers else 0
+        self.created = 0
+        self.relinked = 0
+
+    def next_code(self) -> str:
+        while True:
+            self.last_number += 1
+            code = f"2{self.last_number:03d}"
+            if code not in self.codes:
+                self.codes.add(code)
+                return code
+
+    async def transform(self, docs, ctx):
+        now = datetime.now(timezone.utc).isoformat()
+        operations = []
+        for agent in docs:
+            agent_id = agent['id']
+            account_id = agent.get('account_id')
+
+            code = self.accounts_by_agent.get(agent_id)
+            if code:
+                if account_id != code:
+                    operations.append(UpdateOne({'_id': agent['_id']}, {'$set': {'account_id': code}}))
+                    self.relinked += 1
+                continue
+
+            if account_id and account_id in self.codes:
+                ctx.queue('chart_of_accounts', UpdateOne({'code': account_id}, {'$set': {'agent_id': agent_id}}))
+                self.accounts_by_agent[agent_id] = account_id
+                self.relinked += 1
+                continue
+
+            governorate_code = agent.get('governorate', 'BG')
+            governorate_name = GOVERNORATE_CODE_TO_NAME.get(governorate_code, governorate_code)
+            name = agent_name(agent)
+            code = self.next_code()
+            ctx.queue('chart_of_accounts', InsertOne({
+                'code': code,
+                'name': f"صيرفة {name} - {governorate_name}",
+                'name_ar': f"صيرفة {name} - {governorate_name}",
+                'name_en': f"Exchange {name} - {governorate_name}",
+                'category': EXCHANGE_CATEGORY,
+                'type': EXCHANGE_CATEGORY,
+                'balance': 0.0,
+                'balance_iqd': 0.0,
+                'balance_usd': 0.0,
+                'currencies': ['IQD', 'USD'],
+                'is_active': True,
+                'agent_id': agent_id,
+                'created_at': now,
+                'updated_at': now
+            }))
+            operations.append(UpdateOne({'_id': agent['_id']}, {'$set': {'account_id': code}}))
+            self.accounts_by_agent[agent_id] = code
+            self.created += 1
+        return operations
+
+    async def finalize(self, ctx):
+        ctx.note(f"🏦 accounts created: {self.created}, links fixed: {self.relinked}")
+        if ctx.dry_run:
+            return
+        _, codes = await load_agent_accounts(ctx.db)
+        unlinked = 0
+        async for agent in ctx.db.users.find({'role': 'agent'}, {'_id': 0, 'account_id': 1}):
+            if agent.get('account_id') not in codes:
+                unlinked += 1
+        if unlinked:
+            ctx.note(f"⚠️ {unlinked} agents still not linked to a valid account")
+
+
+@migration
+class CleanupLegacyAccounts(Migration):
+    """
+    الاعتماد على الدليل المحاسبي فقط:
+    حذف مجموعة accounts القديمة، تصحيح ربط الصرافين، وحذف الصرافين بدون حساب في الدليل
+    مدمر - يُشغل بالاسم فقط (جرّب --dry-run أولاً)
+    """
+    version = 6
+    name = 'cleanup_legacy_accounts'
+    description = 'Drop legacy accounts, relink agents, delete agents without a chart_of_accounts account'
+    collection = 'users'
+    query = {'role': 'agent'}
+    projection = AGENT_PROJECTION
+    manual = True
+
+    async def setup(self, ctx):
+        self.accounts_by_agent, self.codes = await load_agent_accounts(ctx.db)
+        legacy = await ctx.db.accounts.count_documents({})
+        if legacy:
+            ctx.note(f"🗑️ legacy accounts to delete: {legacy}")
+            ctx.queue('accounts', DeleteMany({}))
+        self.deleted_agents = []
+        self.relinked = 0
+
+    async def transform(self, docs, ctx):
+        operations = []
+        for agent in docs:
+            account_id = agent.get('account_id')
+            if account_id and account_id in self.codes:
+                continue
+            code = self.accounts_by_agent.get(agent['id'])
+            if code:
+                operations.append(UpdateOne({'_id': agent['_id']}, {'$set': {'account_id': code}}))
+                self.relinked += 1
+            else:
+                operations.append(DeleteOne({'_id': agent['_id']}))
+                self.deleted_agents.append(agent_name(agent))
+        return operations
+
+    async def finalize(self, ctx):
+        ctx.note(f"👥 agents relinked: {self.relinked}, deleted: {len(self.deleted_agents)}")
+        for name in self.deleted_agents[:20]:
+            ctx.note(f"   • {name}")
+        invalid_entries = await ctx.db.journal_entries.count_documents({
+            'lines': {'$elemMatch': {'account_code': {'$nin': list(self.codes) + [None, '']}}}
+        })
+        if invalid_entries:
+            # تبقى للسجلات التاريخية لكنها لا تظهر في التقارير
+            ctx.note(f"⚠️ journal entries referencing unknown accounts (kept): {invalid_entries}")
@@ -0,0 +1,239 @@
+"""
+Migration framework
+إطار ترحيل البيانات: سجل ترحيلات مرقمة، دفعات من الـ cursor تُطبق بـ bulk_write،
+نقطة استئناف (checkpoint) بعد كل دفعة، وضع تجربة (dry-run) وتقرير تقدم وسرعة.
+
+كل ترحيل يعرّف:
+- collection / query: المستندات التي تحتاج ترحيلاً (يجب أن يكون الترحيل idempotent)
+- transform(docs, ctx): عمليات الكتابة (UpdateOne / InsertOne / ...) لدفعة واحدة
+- setup(ctx) / finalize(ctx): تحميل جداول مساعدة مرة واحدة وخطوات ختامية
+الكتابة في مجموعات أخرى عبر ctx.queue(collection, operation)
+"""
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateMany
+
+CHECKPOINT_COLLECTION = 'schema_migrations'
+DEFAULT_BATCH_SIZE = 1000
+PROGRESS_INTERVAL_SECONDS = 2.0
+
+# ============ Registry ============
+
+MIGRATIONS: Dict[str, 'Migration'] = {}
+
+
+def migration(cls):
+    """تسجيل الترحيل حسب رقمه - المفتاح: '0001_wallet_fields'"""
+    instance = cls()
+    key = f"{instance.version:04d}_{instance.name}"
+    if key in MIGRATIONS or any(m.version == instance.version for m in MIGRATIONS.values()):
+        raise ValueError(f"Duplicate migration version: {key}")
+    MIGRATIONS[key] = instance
+    return cls
+
+
+def ordered_migrations() -> List['Migration']:
+    return sorted(MIGRATIONS.values(), key=lambda m: m.version)
+
+
+def resolve(targets: List[str]) -> List['Migration']:
+    """الترحيلات حسب الرقم (1 / 0001) أو الاسم الكامل أو الاسم المختصر"""
+    resolved = []
+    for target in targets:
+        found = None
+        for m in ordered_migrations():
+            if target in (m.key, m.name) or (target.isdigit() and int(target) == m.version):
+                found = m
+                break
+        if found is None:
+            raise ValueError(f"Unknown migration: {target}")
+        resolved.append(found)
+    return sorted(resolved, key=lambda m: m.version)
+
+
+class Migration(ABC):
+    version: int = 0
+    name: str = ''
+    description: str = ''
+    collection: str = ''
+    query: dict = {}
+    projection: Optional[dict] = None
+    # ترحيلات مدمرة لا تُشغل مع "run" بدون تسميتها صراحةً
+    manual: bool = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.version:04d}_{self.name}"
+
+    async def setup(self, ctx: 'MigrationContext'):
+        pass
+
+    @abstractmethod
+    async def transform(self, docs: List[dict], ctx: 'MigrationContext') -> List:
+        ...
+
+    async def finalize(self, ctx: 'MigrationContext'):
+        pass
+
+
+class UpdateMigration(Migration):
+    """ترحيل بتحديث ثابت (update document أو pipeline) لكل مستند يطابق query"""
+    update = None
+    projection = {'_id': 1}
+
+    async def transform(self, docs, ctx):
+        return [UpdateMany({'_id': {'$in': [doc['_id'] for doc in docs]}}, self.update)]
+
+
+# ============ Runner ============
+
+class MigrationContext:
+    def __init__(self, db, dry_run: bool = False):
+        self.db = db
+        self.dry_run = dry_run
+        self.pending: Dict[str, List] = {}
+        self.stats = {'processed': 0, 'operations': 0, 'modified': 0, 'inserted': 0, 'deleted': 0, 'upserted': 0}
+        self.notes: List[str] = []
+
+    def queue(self, collection: str, operation):
+        """عملية كتابة على مجموعة أخرى - تُنفذ مع الدفعة الحالية"""
+        self.pending.setdefault(collection, []).append(operation)
+
+    def note(self, message: str):
+        self.notes.append(message)
+        print(f"   {message}")
+
+    async def write(self, collection: str, operations: List):
+        if not operations:
+            return
+        self.stats['operations'] += len(operations)
+        if self.dry_run:
+            return
+        result = await self.db[collection].bulk_write(operations, ordered=False)
+        self.stats['modified'] += result.modified_count
+        self.stats['inserted'] += result.inserted_count
+        self.stats['deleted'] += result.deleted_count
+        self.stats['upserted'] += result.upserted_count
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+        for collection, operations in pending.items():
+            await self.write(collection, operations)
+
+
+async def get_checkpoint(db, m: Migration) -> Optional[dict]:
+    return await db[CHECKPOINT_COLLECTION].find_one({'_id': m.key})
+
+
+async def save_checkpoint(db, m: Migration, **fields):
+    fields['updated_at'] = datetime.now(timezone.utc).isoformat()
+    await db[CHECKPOINT_COLLECTION].update_one(
+        {'_id': m.key},
+        {'$set': {'version': m.version, 'name': m.name, **fields}},
+        upsert=True
+    )
+
+
+class _Progress:
+    def __init__(self, m: Migration, total: int):
+        self.m = m
+        self.total = total
+        self.started = time.time()
+        self.last_print = 0.0
+        self.last_processed = None
+
+    def report(self, processed: int, force: bool = False):
+        now = time.time()
+        if processed == self.last_processed:
+            return
+        if not force and now - self.last_print < PROGRESS_INTERVAL_SECONDS:
+            return
+        self.last_print = now
+        self.last_processed = processed
+        elapsed = now - self.started
+        rate = processed / elapsed if elapsed > 0 else 0
+        percent = f" ({processed * 100 // self.total}%)" if self.total else ''
+        print(f"   ⏳ {self.m.collection}: {processed}/{self.total}{percent} - {rate:,.0f} docs/s")
+
+
+async def run_migration(
+    db,
+    m: Migration,
+    dry_run: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    restart: bool = False,
+    force: bool = False
+) -> Optional[dict]:
+    """
+    تشغيل ترحيل واحد مع الاستئناف من آخر _id مكتمل
+    restart: تجاهل نقطة الاستئناف / force: إعادة تشغيل ترحيل مكتمل
+    """
+    checkpoint = await get_checkpoint(db, m)
+    if checkpoint and checkpoint.get('status') == 'done' and not force:
+        print(f"⏭️  {m.key}: already applied ({checkpoint.get('finished_at')})")
+        return None
+
+    last_id = None
+    processed = 0
+    if checkpoint and checkpoint.get('status') == 'running' and not restart and not force:
+        last_id = checkpoint.get('last_id')
+        processed = checkpoint.get('processed', 0)
+        print(f"↩️  {m.key}: resuming after {processed} documents")
+
+    mode = ' (dry-run)' if dry_run else ''
+    print(f"🚀 {m.key}{mode}: {m.description}")
+    ctx = MigrationContext(db, dry_run)
+    started = time.time()
+
+    await m.setup(ctx)
+    await ctx.flush()
+
+    query = dict(m.query)
+    if last_id is not None:
+        query = {'$and': [m.query, {'_id': {'$gt': last_id}}]}
+    total = await db[m.collection].count_documents(query) + processed
+    progress = _Progress(m, total)
+
+    if not dry_run:
+        await save_checkpoint(db, m, status='running', started_at=(checkpoint or {}).get('started_at')
+                              or datetime.now(timezone.utc).isoformat(), last_id=last_id, processed=processed)
+
+    cursor = db[m.collection].find(query, m.projection).sort('_id', 1).batch_size(batch_size)
+    batch = []
+
+    async def apply(docs):
+        nonlocal processed
+        operations = await m.transform(docs, ctx)
+        await ctx.flush()
+        await ctx.write(m.collection, operations or [])
+        processed += len(docs)
+        ctx.stats['processed'] = processed
+        if not dry_run:
+            await save_checkpoint(db, m, last_id=docs[-1]['_id'], processed=processed)
+        progress.report(processed)
+
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await apply(batch)
+            batch = []
+    if batch:
+        await apply(batch)
+
+    await m.finalize(ctx)
+    await ctx.flush()
+
+    elapsed = time.time() - started
+    progress.report(processed, force=True)
+    stats = ctx.stats
+    if dry_run:
+        print(f"🔍 {m.key}: {processed} documents, {stats['operations']} operations would be applied")
+    else:
+        await save_checkpoint(db, m, status='done', finished_at=datetime.now(timezone.utc).isoformat(),
+                              processed=processed, stats=stats, notes=ctx.notes)
+        print(f"✅ {m.key}: {processed} documents in {elapsed:.1f}s - "
+              f"modified {stats['modified']}, inserted {stats['inserted']}, deleted {stats['deleted']}")
+    return stats
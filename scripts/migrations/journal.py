@@ -0,0 +1,48 @@
+"""ترحيلات القيود المحاسبية"""
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from .framework import Migration, migration
+
+
+@migration
+class JournalLineCurrency(Migration):
+    """
+    إضافة العملة لأسطر القيود القديمة: أول عملة في حساب السطر، أو IQD
+    جدول الحسابات يُحمّل مرة واحدة بدل find_one لكل سطر
+    """
+    version = 4
+    name = 'journal_line_currency'
+    description = 'Add currency codes to old journal entry lines'
+    collection = 'journal_entries'
+    query = {'lines': {'$elemMatch': {'$or': [{'currency': {'$exists': False}}, {'currency': None}, {'currency': ''}]}}}
+    projection = {'_id': 1, 'lines': 1}
+
+    async def setup(self, ctx):
+        self.default_currency = {}
+        async for account in ctx.db.chart_of_accounts.find({}, {'_id': 0, 'code': 1, 'currencies': 1}):
+            currencies = account.get('currencies') or ['IQD']
+            self.default_currency[account['code']] = currencies[0]
+        self.unknown_accounts = set()
+
+    async def transform(self, docs, ctx):
+        now = datetime.now(timezone.utc).isoformat()
+        operations = []
+        for entry in docs:
+            lines = entry.get('lines', [])
+            for line in lines:
+                if not line.get('currency'):
+                    code = line.get('account_code')
+                    if code not in self.default_currency:
+                        self.unknown_accounts.add(code)
+                    line['currency'] = self.default_currency.get(code, 'IQD')
+            operations.append(UpdateOne(
+                {'_id': entry['_id']},
+                {'$set': {'lines': lines, 'migrated_currency': True, 'migration_date': now}}
+            ))
+        return operations
+
+    async def finalize(self, ctx):
+        if self.unknown_accounts:
+            ctx.note(f"⚠️ {len(self.unknown_accounts)} accounts not found in chart_of_accounts, lines defaulted to IQD")
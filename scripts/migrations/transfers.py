@@ -0,0 +1,12 @@
+"""ترحيلات الحوالات"""
+from .framework import UpdateMigration, migration
+
+
+@migration
+class ReceiverName(UpdateMigration):
+    version = 3
+    name = 'receiver_name'
+    description = 'Add receiver_name to old transfers (sender_name as fallback)'
+    collection = 'transfers'
+    query = {'receiver_name': {'$exists': False}}
+    update = [{'$set': {'receiver_name': '$sender_name'}}]
@@ -0,0 +1,32 @@
+"""ترحيلات حقول المستخدمين"""
+from .framework import UpdateMigration, migration
+
+
+@migration
+class WalletFields(UpdateMigration):
+    version = 1
+    name = 'wallet_fields'
+    description = 'Add wallet_balance fields to existing users'
+    collection = 'users'
+    query = {
+        '$or': [
+            {'wallet_balance_iqd': {'$exists': False}},
+            {'wallet_balance_usd': {'$exists': False}}
+        ]
+    }
+    update = {'$set': {'wallet_balance_iqd': 0.0, 'wallet_balance_usd': 0.0}}
+
+
+@migration
+class WalletLimits(UpdateMigration):
+    version = 2
+    name = 'wallet_limits'
+    description = 'Add wallet_limit fields to existing users'
+    collection = 'users'
+    query = {
+        '$or': [
+            {'wallet_limit_iqd': {'$exists': False}},
+            {'wallet_limit_usd': {'$exists': False}}
+        ]
+    }
+    update = {'$set': {'wallet_limit_iqd': 0.0, 'wallet_limit_usd': 0.0}}
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Rebuild transfer_rollups (analytics) from the transfers collection
+Use for the initial backfill or after bulk edits to transfers
+"""
+import asyncio
+import os
+import sys
+import time
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from pathlib import Path
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent / 'backend'
+load_dotenv(ROOT_DIR / '.env')
+sys.path.append(str(ROOT_DIR))
+
+from transfer_rollups import create_rollup_indexes, rebuild_transfer_rollups
+
+async def main():
+    mongo_url = os.environ['MONGO_URL']
+    db_name = os.environ['DB_NAME']
+
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+
+    print("Rebuilding transfer_rollups from transfers...")
+    started = time.time()
+
+    await create_rollup_indexes(db)
+    rows = await rebuild_transfer_rollups(db)
+    transfers = await db.transfers.estimated_document_count()
+
+    print(f"✅ Rebuild completed in {time.time() - started:.1f}s")
+    print(f"   - {transfers} transfers → {rows} rollup rows")
+
+    client.close()
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        print(f"❌ Rebuild failed: {e}")
+        sys.exit(1)
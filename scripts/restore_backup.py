@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Restore a backup chain: a full backup followed by its incremental backups, in order
+Usage: python scripts/restore_backup.py backup_full.ndjson.gz backup_..._inc1.ndjson.gz ...
+"""
+import asyncio
+import os
+import sys
+import time
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from pathlib import Path
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent / 'backend'
+load_dotenv(ROOT_DIR / '.env')
+sys.path.append(str(ROOT_DIR))
+
+from backup import read_manifest, restore_backup_chain
+
+async def main(paths):
+    mongo_url = os.environ['MONGO_URL']
+    db_name = os.environ['DB_NAME']
+
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+
+    print(f"Restoring {len(paths)} backup file(s) into {db_name}...")
+    for path in paths:
+        manifest = read_manifest(path)
+        print(f"   - {os.path.basename(path)}: {manifest.get('mode', 'full')} "
+              f"#{manifest.get('sequence', 0)} ({manifest.get('backup_timestamp')})")
+
+    started = time.time()
+    totals = await restore_backup_chain(db, paths)
+
+    print(f"✅ Restore completed in {time.time() - started:.1f}s")
+    for name, count in sorted(totals.items()):
+        print(f"   - {name}: {count}")
+
+    client.close()
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    try:
+        asyncio.run(main(sys.argv[1:]))
+    except Exception as e:
+        print(f"❌ Restore failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+🔌 اختبار توزيع أحداث Socket.IO بين عدة workers (backend/socket_manager.py)
+
+**المشكلة:**
+مع أكثر من worker، الـ emit إلى `gov_{code}` أو `admin_{id}` يصل فقط للعملاء
+المتصلين بنفس الـ worker.
+
+**الاختبار:**
+1. تشغيل عمليتين (uvicorn) على منفذين مختلفين مع AsyncMongoManager على mongod محلي
+2. عميل A يتصل بالـ worker الأول وينضم إلى `gov_BG`
+3. عميل B يتصل بالـ worker الثاني ويطلب emit إلى `gov_BG`
+4. يجب أن يستلم A الحدث مرة واحدة فقط، ولا يستلمه عميل C خارج الغرفة
+
+التشغيل (يتطلب mongod محلي):
+    MONGO_URL=mongodb://localhost:27017 python socketio_scaling_test.py
+"""
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+sys.path.append(str(ROOT_DIR / 'backend'))
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+TEST_DB = os.environ.get('SOCKETIO_TEST_DB', 'socketio_scaling_test')
+PORTS = (8765, 8766)
+
+# ============ Worker app (uvicorn socketio_scaling_test:worker_app) ============
+
+if os.environ.get('SOCKETIO_TEST_WORKER'):
+    import socketio
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from socket_manager import AsyncMongoManager
+
+    sio = socketio.AsyncServer(
+        async_mode='asgi',
+        client_manager=AsyncMongoManager(AsyncIOMotorClient(MONGO_URL)[TEST_DB])
+    )
+    worker_app = socketio.ASGIApp(sio)
+
+    @sio.event
+    async def join(sid, room):
+        await sio.enter_room(sid, room)
+        return True
+
+    @sio.event
+    async def relay(sid, data):
+        await sio.emit(data['event'], data['payload'], room=data['room'])
+        return True
+
+
+# ============ Test ============
+
+def start_worker(port):
+    env = dict(os.environ, SOCKETIO_TEST_WORKER='1', MONGO_URL=MONGO_URL, SOCKETIO_TEST_DB=TEST_DB)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'socketio_scaling_test:worker_app', '--port', str(port), '--log-level', 'warning'],
+        cwd=str(ROOT_DIR), env=env
+    )
+
+
+def connect(port, name, received):
+    import socketio
+    client = socketio.Client()
+
+    @client.on('new_transfer')
+    def on_new_transfer(data):
+        received.append((name, data))
+
+    for _ in range(50):
+        try:
+            client.connect(f'http://127.0.0.1:{port}', transports=['polling'])
+            return client
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f'worker on port {port} did not start')
+
+
+def main():
+    from pymongo import MongoClient
+    MongoClient(MONGO_URL)[TEST_DB].drop_collection('socketio_messages')
+
+    workers = [start_worker(port) for port in PORTS]
+    received = []
+    clients = []
+    try:
+        client_a = connect(PORTS[0], 'A', received)
+        client_b = connect(PORTS[1], 'B', received)
+        client_c = connect(PORTS[0], 'C', received)
+        clients = [client_a, client_b, client_c]
+
+        client_a.call('join', 'gov_BG')
+        # انتظار بدء المستمعين على الـ capped collection
+        time.sleep(2)
+        payload = {'transfer_id': 'test-transfer', 'to_governorate': 'BG'}
+        client_b.call('relay', {'event': 'new_transfer', 'payload': payload, 'room': 'gov_BG'})
+
+        deadline = time.time() + 10
+        while time.time() < deadline and not received:
+            time.sleep(0.1)
+        time.sleep(1)
+
+        if received == [('A', payload)]:
+            print('✅ الحدث من worker 2 وصل إلى عميل الغرفة على worker 1 (مرة واحدة)')
+            return 0
+        print(f'❌ النتيجة غير متوقعة: {received}')
+        return 1
+    finally:
+        for client in clients:
+            client.disconnect()
+        for worker in workers:
+            worker.terminate()
+            worker.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+🏁 اختبار التزامن: 100 طلب استلام متوازي لنفس الحوالة
+
+**المشكلة:**
+مسارات الاستلام والإلغاء كانت find_one → فحص status == 'pending' → update_one.
+صرافان يستلمان نفس الحوالة في نفس اللحظة يمران كلاهما من الفحص ويُضاف المبلغ للمحفظة مرتين.
+
+**الإصلاح:** claim_transfer() في server.py - find_one_and_update({'id', 'status': 'pending'})
+
+**الاختبار:**
+1. المرسل ينشئ حوالة
+2. المستلم يرسل 100 طلب receive-simple متوازي بنفس الـ PIN
+3. يجب أن ينجح طلب واحد فقط (200) والباقي "Transfer already processed" (400)
+4. رصيد محفظة المستلم يزيد مرة واحدة فقط (المبلغ + عمولة الاستلام)
+
+التشغيل (خادم يعمل مع MongoDB، ورصيد المرسل أو wallet_limit_iqd يغطي مبلغ الحوالة):
+    BASE_URL=http://localhost:8001/api python transfer_receive_race_test.py
+"""
+
+import asyncio
+import os
+import sys
+
+import httpx
+
+# Configuration
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001/api')
+SENDER_CREDENTIALS = {
+    "username": os.environ.get('SENDER_USERNAME', 'agent_baghdad'),
+    "password": os.environ.get('SENDER_PASSWORD', 'agent123')
+}
+RECEIVER_CREDENTIALS = {
+    "username": os.environ.get('RECEIVER_USERNAME', 'agent_basra'),
+    "password": os.environ.get('RECEIVER_PASSWORD', 'agent123')
+}
+PARALLEL_RECEIVES = int(os.environ.get('PARALLEL_RECEIVES', 100))
+AMOUNT = 1000
+
+
+async def login(client: httpx.AsyncClient, credentials: dict) -> dict:
+    response = await client.post('/login', json=credentials)
+    response.raise_for_status()
+    return {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+
+async def wallet_iqd(client: httpx.AsyncClient, headers: dict) -> float:
+    response = await client.get('/wallet/balance', headers=headers)
+    response.raise_for_status()
+    return response.json()['wallet_balance_iqd']
+
+
+async def run_race(client: httpx.AsyncClient, sender: dict, receiver: dict, parallel: int = PARALLEL_RECEIVES) -> bool:
+    response = await client.post('/transfers', json={
+        "sender_name": "اختبار التزامن",
+        "receiver_name": "اختبار التزامن",
+        "amount": AMOUNT,
+        "currency": "IQD",
+        "to_governorate": "BG",
+        "note": "اختبار استلام متوازي"
+    }, headers=sender)
+    response.raise_for_status()
+    transfer = response.json()
+    print(f"✅ Transfer created: {transfer['transfer_code']}")
+
+    balance_before = await wallet_iqd(client, receiver)
+
+    responses = await asyncio.gather(*[
+        client.post(f"/transfers/{transfer['id']}/receive-simple", json={'pin': transfer['pin']}, headers=receiver)
+        for _ in range(parallel)
+    ])
+    statuses = {}
+    for r in responses:
+        statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+    print(f"📊 {parallel} parallel receives: {statuses}")
+
+    winners = [r for r in responses if r.status_code == 200]
+    balance_after = await wallet_iqd(client, receiver)
+    credited = balance_after - balance_before
+    expected = AMOUNT + winners[0].json().get('commission', 0) if winners else 0
+    print(f"💰 Receiver wallet: +{credited} (expected +{expected})")
+
+    ok = len(winners) == 1 and statuses.get(400, 0) == parallel - 1 and abs(credited - expected) < 0.01
+    print('✅ Exactly one receive succeeded and the wallet was credited once' if ok else '❌ Race detected')
+    return ok
+
+
+async def main() -> int:
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as client:
+        sender = await login(client, SENDER_CREDENTIALS)
+        receiver = await login(client, RECEIVER_CREDENTIALS)
+        return 0 if await run_race(client, sender, receiver) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))